@@ -6,22 +6,34 @@ A web-based control panel for managing model downloads and tools for RunPod inst
 Supports CivitAI and direct script-based model downloads.
 """
 
+import atexit
 import os
-import re
-import glob
 import subprocess
 import threading
 import json
 from pathlib import Path
-import signal
 import time
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, send_file, stream_with_context
 from flask_wtf import FlaskForm
 from wtforms import SelectField, StringField, SubmitField
 from wtforms.validators import DataRequired, URL
 from dotenv import load_dotenv
 
+from aria2_rpc import Aria2Daemon, Aria2RPCBackend, Aria2RPCError, status_to_progress
+from bandwidth import BandwidthBudget, BandwidthGovernor, parse_rate, parse_rules
+from download_jobs import IDLE_STATUS, JobLimitError, JobRegistry
+from download_scheduler import DownloadScheduler, DownloadTask, format_eta, format_size, parse_size
+from disk_usage import DiskUsageIndex, check_space
+from download_spec import SpecCache
+from event_stream import StatusBroadcaster
+from log_buffer import LogBuffer
+from model_store import ModelStore, control_file
+from preset_catalog import FileGraph, ScriptCatalog
+from service_health import RestartHistory, probe_for
+from service_supervisor import ServiceSupervisor
+from trash_purge import TrashPurge
+
 # -------------------------------------------------------------------------
 # Constants
 # -------------------------------------------------------------------------
@@ -38,6 +50,7 @@ else:
     SCRIPTS_PATH = Path("scripts")
 
 PRESET_SCRIPTS_PATH = SCRIPTS_PATH / "preset_model_scripts"
+WORKSPACE_PATH = BASE_PATH.parent.parent
 
 # Default directories that should exist for models
 MODEL_DIRS = {
@@ -48,6 +61,65 @@ MODEL_DIRS = {
     'text_encoders': BASE_PATH / 'text_encoders'
 }
 
+# Parallel preset downloads (see download_scheduler.py)
+DOWNLOAD_MAX_CONCURRENT = int(os.environ.get('DOWNLOAD_MAX_CONCURRENT', '4'))
+DOWNLOAD_MAX_CONNECTIONS = int(os.environ.get('DOWNLOAD_MAX_CONNECTIONS', '32'))
+DOWNLOAD_PER_HOST_LIMIT = int(os.environ.get('DOWNLOAD_PER_HOST_LIMIT', '3'))
+
+# Download jobs running at the same time, and finished jobs kept for /jobs (see download_jobs.py)
+DOWNLOAD_MAX_JOBS = int(os.environ.get('DOWNLOAD_MAX_JOBS', '4'))
+DOWNLOAD_JOB_HISTORY = int(os.environ.get('DOWNLOAD_JOB_HISTORY', '50'))
+
+# Download rate budget shared by all jobs, 0 for unlimited (see bandwidth.py)
+DOWNLOAD_BANDWIDTH_LIMIT = parse_rate(os.environ.get('DOWNLOAD_BANDWIDTH_LIMIT', '0'))
+DOWNLOAD_DISK_WRITE_LIMIT = parse_rate(os.environ.get('DOWNLOAD_DISK_WRITE_LIMIT', '0'))
+DOWNLOAD_TRAINING_LIMIT = parse_rate(os.environ.get('DOWNLOAD_TRAINING_LIMIT', '25MiB'))
+DOWNLOAD_BANDWIDTH_RULES = os.environ.get('DOWNLOAD_BANDWIDTH_RULES', '')
+
+# SHA256/size record of the downloaded model files (see model_store.py)
+MODEL_STORE_PATH = Path(os.environ.get('MODEL_STORE_PATH', str(BASE_PATH / '.model_store.json')))
+MODEL_STORE_HASH_WORKERS = int(os.environ.get('MODEL_STORE_HASH_WORKERS', '4'))
+
+# aria2c daemon driven over JSON-RPC (see aria2_rpc.py)
+ARIA2_RPC_PORT = int(os.environ.get('ARIA2_RPC_PORT', '6800'))
+ARIA2_RPC_SECRET = os.environ.get('ARIA2_RPC_SECRET')
+# Generated secret when ARIA2_RPC_SECRET is unset, kept so a restarted panel can adopt the running daemon
+ARIA2_RPC_SECRET_PATH = Path(os.environ.get('ARIA2_RPC_SECRET_PATH', str(WORKSPACE_PATH / '.aria2_rpc_secret')))
+
+# Seconds a service gets to exit after SIGTERM, and to open its port after a restart
+SERVICE_STOP_TIMEOUT = float(os.environ.get('SERVICE_STOP_TIMEOUT', '10'))
+SERVICE_READY_TIMEOUT = float(os.environ.get('SERVICE_READY_TIMEOUT', '600'))
+
+# Durations of the recent restarts of each service (see service_health.py)
+SERVICE_RESTART_HISTORY_PATH = Path(os.environ.get(
+    'SERVICE_RESTART_HISTORY_PATH', str(WORKSPACE_PATH / '.service_restarts.json')))
+SERVICE_RESTART_HISTORY_SIZE = int(os.environ.get('SERVICE_RESTART_HISTORY_SIZE', '20'))
+
+# Directories indexed for the /storage views, refreshed every STORAGE_INDEX_INTERVAL seconds (see disk_usage.py)
+STORAGE_ROOTS = [Path(p) for p in os.environ.get('STORAGE_ROOTS', '').split(os.pathsep) if p] or [
+    BASE_PATH,  # ComfyUI models, including the trained LoRAs in loras/
+    WORKSPACE_PATH / 'training_models',
+    WORKSPACE_PATH / 'models',
+    WORKSPACE_PATH / 'datasets',
+    WORKSPACE_PATH / 'configs'
+]
+STORAGE_INDEX_PATH = Path(os.environ.get('STORAGE_INDEX_PATH', str(WORKSPACE_PATH / '.storage_index.json')))
+STORAGE_INDEX_INTERVAL = float(os.environ.get('STORAGE_INDEX_INTERVAL', '300'))
+
+# Space left free on a volume when checking whether a preset download fits
+DOWNLOAD_DISK_RESERVE = parse_size(os.environ.get('DOWNLOAD_DISK_RESERVE', '2GiB'))
+
+# Lines of training tool install output kept in memory, the full output goes to a file in TRAINING_TOOL_LOG_DIR
+TRAINING_TOOL_OUTPUT_LINES = int(os.environ.get('TRAINING_TOOL_OUTPUT_LINES', '2000'))
+TRAINING_TOOL_LOG_DIR = Path(os.environ.get('TRAINING_TOOL_LOG_DIR', str(WORKSPACE_PATH / 'logs')))
+
+# Trash emptied by the Empty Trash tool, and the unlinks running in parallel (see trash_purge.py)
+TRASH_PATH = os.environ.get('TRASH_PATH', '/workspace/.Trash-0')
+TRASH_PURGE_WORKERS = int(os.environ.get('TRASH_PURGE_WORKERS', '16'))
+
+# Maximum number of status updates per second pushed to each browser over /events
+EVENT_MAX_RATE = float(os.environ.get('EVENT_MAX_RATE', '4'))
+
 # -------------------------------------------------------------------------
 # Flask Application Setup
 # -------------------------------------------------------------------------
@@ -58,64 +130,61 @@ app.config['SECRET_KEY'] = 'your-secret-key-here'  # Change this in production
 # Load environment variables
 load_dotenv()
 
+# Shared aria2c daemon, started on the first download
+aria2_daemon = Aria2Daemon(port=ARIA2_RPC_PORT, secret=ARIA2_RPC_SECRET, secret_path=ARIA2_RPC_SECRET_PATH)
+atexit.register(aria2_daemon.stop)
+
+# Pushes status changes of the download, install and restart workers to the browser
+status_events = StatusBroadcaster(max_rate=EVENT_MAX_RATE)
+
+# Hashes of the model files, used to skip, link and resume preset downloads
+model_store = ModelStore(MODEL_STORE_PATH, hash_workers=MODEL_STORE_HASH_WORKERS)
+# Parsed downloads of the preset scripts
+download_specs = SpecCache()
+
 # -------------------------------------------------------------------------
 # Download Status Tracking
 # -------------------------------------------------------------------------
 
-# Download status objects for different downloaders
-civitai_download_status = {
-    "status": "idle",
-    "message": "",
-    "progress": 0,
-    "downloaded": "0B",
-    "total": "0B",
-    "speed": "0B/s",
-    "eta": "Unknown"
-}
-
-model_download_status = {
-    "status": "idle",
-    "message": "",
-    "progress": 0,
-    "downloaded": "0B",
-    "total": "0B",
-    "speed": "0B/s",
-    "eta": "Unknown",
-    "current_model": "",
-    "total_models": 0,
-    "completed_models": 0,
-    "script_name": "",
-    "display_name": "",
-    "existing_files_count": 0
-}
-
-huggingface_download_status = {
-    "status": "idle",
-    "message": "",
-    "progress": 0,
-    "downloaded": "0B",
-    "total": "0B",
-    "speed": "0B/s",
-    "eta": "Unknown",
-    "model_id": "",
-    "url": "",
-    "download_path": ""
+# Every CivitAI, HuggingFace and preset download is a job with its own status,
+# the per-kind endpoints show the latest job of their kind (see download_jobs.py)
+download_jobs = JobRegistry(max_active=DOWNLOAD_MAX_JOBS, history=DOWNLOAD_JOB_HISTORY)
+
+# Bandwidth and disk-write budget of the jobs, applied to aria2c while jobs run
+bandwidth_budget = BandwidthBudget(
+    limit=DOWNLOAD_BANDWIDTH_LIMIT,
+    disk_write_limit=DOWNLOAD_DISK_WRITE_LIMIT,
+    training_limit=DOWNLOAD_TRAINING_LIMIT,
+    rules=parse_rules(DOWNLOAD_BANDWIDTH_RULES)
+)
+
+# Status of a kind of download before its first job
+IDLE_STATUS_BY_KIND = {
+    "civitai": dict(IDLE_STATUS, gid=""),
+    "huggingface": dict(IDLE_STATUS, model_id="", url="", download_path="", gid=""),
+    "preset": dict(
+        IDLE_STATUS,
+        current_model="",
+        total_models=0,
+        completed_models=0,
+        script_name="",
+        display_name="",
+        existing_files_count=0,
+        active_files=0,
+        files=[]
+    ),
 }
 
-# Process tracking
-civitai_current_process = None
-model_current_process = None
-huggingface_current_process = None
-
-model_download_thread = None
-
 # Add this near the other status dictionaries
 training_tool_output = {
     "status": "idle",
     "message": "",
-    "output": []
+    "tool": None
 }
 
+# Numbered output lines of the running or last install (see log_buffer.py)
+training_tool_log = LogBuffer(TRAINING_TOOL_OUTPUT_LINES)
+
 # Add this near the top of the file with other global variables
 training_tool_process = None
 training_tool_thread = None
@@ -133,7 +202,16 @@ service_restart_status = {
 
 # Add this with other process tracking variables
 service_restart_thread = None
-service_restart_process = None
+
+# Launches and stops ComfyUI, diffusion-pipe, kohya and fluxgym (see service_supervisor.py)
+service_supervisor = ServiceSupervisor(term_timeout=SERVICE_STOP_TIMEOUT)
+service_restart_history = RestartHistory(SERVICE_RESTART_HISTORY_PATH, size=SERVICE_RESTART_HISTORY_SIZE)
+
+# The running or last trash purge
+trash_purge = None
+
+# Sizes of the workspace directories, largest files and duplicates
+storage_index = DiskUsageIndex(STORAGE_ROOTS, STORAGE_INDEX_PATH)
 
 # -------------------------------------------------------------------------
 # Helper Functions
@@ -146,45 +224,146 @@ def ensure_directories_exist():
     """
     os.system('mkdir -p "/workspace/ComfyUI/models/diffusion_models" "/workspace/ComfyUI/models/vae" "workspace/ComfyUI/models/text_encoders"')
 
-def parse_aria2c_output(line):
+def get_aria2():
     """
-    Parse aria2c output to extract download progress information.
-    
+    Return an RPC client for the shared aria2c daemon, starting it if needed.
+
+    The daemon is only probed again after an RPC call to it failed.
+    """
+    return aria2_daemon.ensure_running()
+
+def bandwidth_jobs():
+    """Running jobs as (job id, priority, aria2c GIDs) for the bandwidth governor."""
+    # Nothing else refreshes single-file jobs when no client is polling them
+    refresh_aria2_jobs()
+    result = []
+    for job in download_jobs.active():
+        if isinstance(job.handle, DownloadScheduler):
+            gids = job.handle.handles()
+        else:
+            gids = [job.handle] if job.handle else []
+        result.append((job.id, job.priority, gids))
+    return result
+
+bandwidth_governor = BandwidthGovernor(bandwidth_budget, get_aria2, bandwidth_jobs)
+
+def create_download_job(kind, label, priority='normal', **status):
+    """
+    Register a download job, starting from the idle status of its kind.
+
+    Raises:
+        JobLimitError: DOWNLOAD_MAX_JOBS downloads are already running
+        ValueError: Unknown priority
+    """
+    initial = dict(IDLE_STATUS_BY_KIND[kind])
+    initial.update(status, status="queued")
+    # Finished single-file downloads must not count against the limit
+    refresh_aria2_jobs()
+    job = download_jobs.create(kind, label, initial, priority=priority or 'normal')
+    bandwidth_governor.ensure_running()
+    status_events.notify()
+    return job
+
+def job_to_dict(job):
+    """Status of a job for /jobs, with its measured throughput."""
+    data = job.to_dict()
+    throughput = bandwidth_budget.job_throughput.get(job.id, 0) if job.active else 0
+    data.update(throughput_bytes=int(throughput), throughput=format_size(int(throughput)) + "/s")
+    return data
+
+def cancel_aria2_job(job):
+    """on_cancel of the single-file jobs: remove their download from aria2c."""
+    if job.handle:
+        get_aria2().force_remove(job.handle)
+
+def refresh_download_status(job, complete_message):
+    """
+    Refresh a single-file download job from aria2c.
+
+    Costs one aria2.tellStatus call and is only done while the download is active.
+
     Args:
-        line: A line of text from aria2c output
-        
-    Returns:
-        tuple: (downloaded, total, percent, speed, eta) or (None, None, None, None, None) if parsing fails
+        job: CivitAI or HuggingFace download job
+        complete_message: Message to show once aria2c reports the file complete
     """
-    # Pattern to match aria2c output like: [#bc945d 16GiB/31GiB(52%) CN:16 DL:80MiB ETA:3m12s]
-    pattern = r'\[#[0-9a-fA-F]+\s+([\d.]+(?:[KMG]i?B)?)/(?:([\d.]+)(?:[KMG]i?B)?)\((\d+(?:\.\d+)?)%\)(?:.*?CN:\d+\s+DL:([\d.]+(?:[KMG]i?B)?)?(?:.*?ETA:(?:(\d+)h)?(?:(\d+)m)?(?:(\d+)s)?)?)?'
-    
-    match = re.search(pattern, line)
-    if not match:
-        return None, None, None, None, None
-        
-    # Extract information from regex match
-    downloaded = match.group(1)
-    total = match.group(2)
-    percent = int(float(match.group(3)))  # Handle potential decimal percentages
-    speed = match.group(4) if match.group(4) else "0B"
-    
-    # Construct ETA string from components
-    eta_parts = []
-    if match.group(5): eta_parts.append(f"{match.group(5)}h")
-    if match.group(6): eta_parts.append(f"{match.group(6)}m")
-    if match.group(7): eta_parts.append(f"{match.group(7)}s")
-    
-    eta = "".join(eta_parts) if eta_parts else "Unknown"
-    
-    return downloaded, total, percent, speed, eta
+    if not job.handle or job.state != "downloading":
+        return
 
-def run_civitai_download(url, model_type, filename, token):
-    global civitai_download_status, civitai_current_process
     try:
-        civitai_download_status["status"] = "downloading"
-        civitai_download_status["message"] = "Starting download..."
-        civitai_download_status["progress"] = 0
+        progress = status_to_progress(get_aria2().tell_status(job.handle))
+    except Aria2RPCError as e:
+        job.update(
+            status="error",
+            message=f"Lost track of download: {str(e)}"
+        )
+        return
+
+    percent = int(100 * progress["downloaded"] / progress["total"]) if progress["total"] else 0
+    remaining = progress["total"] - progress["downloaded"]
+    job.update(
+        downloaded=format_size(progress["downloaded"]),
+        total=format_size(progress["total"]),
+        downloaded_bytes=progress["downloaded"],
+        total_bytes=progress["total"],
+        progress=percent,
+        speed=format_size(progress["speed"]) + "/s",
+        eta=format_eta(remaining / progress["speed"]) if progress["speed"] else "Unknown"
+    )
+
+    if progress["state"] == "complete":
+        job.update(
+            status="completed",
+            message=complete_message,
+            progress=100
+        )
+    elif progress["state"] == "error":
+        job.update(
+            status="error",
+            message=f"Download failed: {progress['error']}"
+        )
+    elif progress["state"] == "removed":
+        job.update(
+            status="stopped",
+            message="Download stopped by user"
+        )
+    else:
+        job.status["message"] = f"Downloading {job.status.get('filename', '')}... {percent}%"
+        return
+
+    try:
+        get_aria2().remove_download_result(job.handle)
+    except Aria2RPCError:
+        pass
+
+def refresh_job(job):
+    """Bring the status of a job up to date and return it."""
+    if job.kind == "civitai":
+        refresh_download_status(job, "Download Complete!")
+    elif job.kind == "huggingface":
+        refresh_download_status(job, f"Successfully downloaded to {job.status.get('target_path', '')}")
+    elif job.kind == "preset":
+        check_preset_job(job)
+    return job
+
+def refresh_aria2_jobs():
+    """Refresh the running CivitAI and HuggingFace downloads, which aria2c finishes on its own."""
+    for job in download_jobs.active():
+        if job.kind in ("civitai", "huggingface"):
+            refresh_job(job)
+
+def run_civitai_download(job, url, model_type, filename, token):
+    """
+    Submit a CivitAI download job to the aria2c daemon.
+
+    Progress is read from aria2c by the /civitai_status and /jobs endpoints.
+    """
+    try:
+        job.update(
+            status="downloading",
+            message="Starting download...",
+            progress=0,
+            gid=""
+        )
         
         print(f"DEBUG: Starting CivitAI download: {url}")
         
@@ -197,171 +376,61 @@ def run_civitai_download(url, model_type, filename, token):
         download_url = f"{url}?token={token}" if token else url
         print(f"DEBUG: Download filename: {filename}, directory: {download_dir}")
         
-        # Use stdbuf to disable output buffering
-        command = f"stdbuf -oL aria2c -x 16 -s 16 -d {download_dir} -o {filename} {download_url}"
-        
-        civitai_current_process = subprocess.Popen(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            shell=True, 
-            bufsize=1,
-            env=dict(os.environ, PYTHONUNBUFFERED="1")
+        gid = get_aria2().add_uri([download_url], {
+            "dir": str(download_dir),
+            "out": filename,
+            "max-connection-per-server": "16",
+            "split": "16"
+        })
+        job.handle = gid
+        job.on_cancel = cancel_aria2_job
+        job.update(
+            gid=gid,
+            filename=filename,
+            message=f"Downloading {filename}... 0%"
         )
-        
-        print(f"DEBUG: Started CivitAI download with PID: {civitai_current_process.pid}")
-        
-        # Read output line by line
-        for line in iter(civitai_current_process.stdout.readline, ''):
-            if not line.strip():
-                continue
-                
-            print(f"DEBUG: CivitAI output: {line.strip()}")
-            downloaded, total, percent, speed, eta = parse_aria2c_output(line.strip())
-            
-            if downloaded and total and percent is not None:
-                civitai_download_status.update({
-                    "downloaded": downloaded,
-                    "total": total,
-                    "progress": percent,
-                    "speed": speed + "/s",
-                    "eta": eta
-                })
-                
-                if percent == 100:
-                    civitai_download_status.update({
-                        "status": "completed",
-                        "message": "Download Complete!"
-                    })
-                else:
-                    civitai_download_status["message"] = f"Downloading {filename}... {percent}%"
-            else:
-                civitai_download_status["message"] = line.strip()
-        
-        # Wait for process to complete
-        return_code = civitai_current_process.wait()
-        print(f"DEBUG: CivitAI download completed with return code: {return_code}")
-        
-        if return_code == 0:
-            civitai_download_status.update({
-                "status": "completed",
-                "message": "Download Complete!",
-                "progress": 100
-            })
-        else:
-            civitai_download_status.update({
-                "status": "error",
-                "message": "Error during download. Please check the logs."
-            })
+        print(f"DEBUG: Started CivitAI download with GID: {gid}")
+        return gid
             
     except Exception as e:
         print(f"DEBUG: Error in run_civitai_download: {e}")
-        civitai_download_status.update({
-            "status": "error",
-            "message": f"Error: {str(e)}"
-        })
-    finally:
-        civitai_current_process = None
+        job.update(
+            status="error",
+            message=f"Error: {str(e)}"
+        )
+        return None
 
-def extract_aria2c_commands(script_paths):
+def cancel_huggingface_job(job):
     """
-    Extract aria2c commands from multiple download scripts.
-    
-    Args:
-        script_paths: List of paths to the download scripts
-        
-    Returns:
-        list: List of extracted aria2c commands
+    on_cancel of the HuggingFace jobs: remove the download from aria2c and
+    delete the partial file.
     """
-    print(f"DEBUG: Extracting commands from {len(script_paths)} scripts")
-    commands = []
-    
-    try:
-        for script_path in script_paths:
-            with open(script_path, 'r') as f:
-                current_command = None
-                
-                for line in f:
-                    line = line.strip()
-                    
-                    # Skip empty lines and comments
-                    if not line or line.startswith('#'):
-                        continue
-                        
-                    # Check if line starts with aria2c
-                    if line.startswith('aria2c'):
-                        if current_command:
-                            current_command = current_command.replace('\\', '')
-                            current_command = current_command.replace('  ', ' ')
-                            commands.append(current_command)
-                        current_command = line
-                    # Handle command continuation
-                    elif current_command and line.endswith('\\'):
-                        add_line = line[:-1]
-                        current_command += ' ' + add_line
-                    elif current_command and not line.startswith('echo'):
-                        current_command += ' ' + line
-                        
-                # Add the last command if exists and it's an aria2c command
-                if current_command and current_command.startswith('aria2c'):
-                    current_command = current_command.replace('\\', '')
-                    current_command = current_command.replace('  ', ' ')
-                    commands.append(current_command)
-                    
-        print(f"DEBUG: Found {len(commands)} total aria2c commands")
-    except Exception as e:
-        print(f"DEBUG: Error extracting aria2c commands: {e}")
-        
-    return commands
+    cancel_aria2_job(job)
+    download_path = job.status.get('download_path')
+    filename = job.status.get('filename')
+    if not download_path or not filename:
+        return
+    # Give aria2c a moment to close the file before deleting it
+    time.sleep(1)
+    for path in (os.path.join(download_path, filename), control_file(os.path.join(download_path, filename))):
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+                print(f"Deleted partial download file: {path}")
+        except OSError as e:
+            print(f"Error deleting partial download file: {e}")
 
-def extract_filename_from_command(cmd):
-    """
-    Extract the output filename from an aria2c command.
-    
-    Args:
-        cmd: The aria2c command string
-        
-    Returns:
-        str: The extracted filename, or None if not found
+def run_huggingface_download(job, url, token=None, download_path=None):
     """
-    if not isinstance(cmd, str):
-        return None
-        
-    # First try to find the output path using -o or --out
-    output_match = re.search(r'(?:--out=|\s-o\s+)["\']([^"\']+)["\']', cmd)
-    if output_match:
-        return output_match.group(1)
-    
-    # If no output path found, try to extract from the URL
-    url_match = re.search(r'https?://[^\s"\']+', cmd)
-    if url_match:
-        url = url_match.group(0)
-        # Extract filename from URL
-        filename = url.split('/')[-1]
-        # Remove any query parameters
-        filename = filename.split('?')[0]
-        return filename
-    
-    return None
+    Submit a HuggingFace download job to the aria2c daemon.
 
-def update_download_status(status_dict, **kwargs):
-    """
-    Update a download status dictionary with new values.
-    
-    Args:
-        status_dict: The status dictionary to update
-        **kwargs: Key-value pairs to update in the dictionary
-    """
-    status_dict.update(kwargs)
+    Progress is read from aria2c by the /huggingface_status and /jobs endpoints.
 
-def run_huggingface_download(url, token=None, download_path=None):
-    global huggingface_download_status, huggingface_current_process
-    
+    Returns:
+        bool: True if aria2c accepted the download
+    """
     try:
-        # Reset download status
-        update_download_status(
-            huggingface_download_status,
+        job.update(
             status="downloading",
             message="Starting download...",
             progress=0,
@@ -370,7 +439,8 @@ def run_huggingface_download(url, token=None, download_path=None):
             speed="0B/s",
             eta="Unknown",
             url=url,  # Store the URL in the status
-            download_path=download_path  # Store the download path in the status
+            download_path=download_path,  # Store the download path in the status
+            gid=""
         )
 
         # Create download directory if specified
@@ -389,72 +459,29 @@ def run_huggingface_download(url, token=None, download_path=None):
         filename = os.path.basename(url.split('?')[0])
         target_path = os.path.join(target_dir, filename)
 
-        # Use aria2c with progress tracking
-        cmd = f"stdbuf -oL aria2c -x 16 -s 16 -d '{target_dir}' -o '{filename}' '{url}'"
-        
-        # Start process in its own process group
-        huggingface_current_process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            shell=True,
-            bufsize=1,
-            env=dict(os.environ, PYTHONUNBUFFERED="1"),
-            preexec_fn=os.setsid  # Create new process group
+        gid = get_aria2().add_uri([url], {
+            "dir": target_dir,
+            "out": filename,
+            "max-connection-per-server": "16",
+            "split": "16"
+        })
+        job.handle = gid
+        job.on_cancel = cancel_huggingface_job
+        job.update(
+            gid=gid,
+            filename=filename,
+            target_path=target_path,
+            message=f"Downloading {filename}... 0%"
         )
-
-        # Process aria2c output
-        for line in iter(huggingface_current_process.stdout.readline, ''):
-            if not line.strip():
-                continue
-
-            # Try to parse download progress
-            downloaded, total, percent, speed, eta = parse_aria2c_output(line.strip())
-            if downloaded and total and percent is not None:
-                update_download_status(
-                    huggingface_download_status,
-                    downloaded=downloaded,
-                    total=total,
-                    progress=percent,
-                    speed=speed + "/s",
-                    eta=eta,
-                    message=f"Downloading {filename}... {percent}%"
-                )
-            else:
-                huggingface_download_status["message"] = line.strip()
-
-        # Wait for process to complete
-        return_code = huggingface_current_process.wait()
-        
-        if return_code == 0:
-            update_download_status(
-                huggingface_download_status,
-                status="completed",
-                message=f"Successfully downloaded to {target_path}",
-                progress=100
-            )
-            return True
-        else:
-            stderr_output = huggingface_current_process.stderr.read()
-            update_download_status(
-                huggingface_download_status,
-                status="error",
-                message=f"Download failed: {stderr_output}",
-                progress=0
-            )
-            return False
+        return True
 
     except Exception as e:
-        update_download_status(
-            huggingface_download_status,
+        job.update(
             status="error",
             message=f"Error: {str(e)}",
             progress=0
         )
         return False
-    finally:
-        huggingface_current_process = None
 
 def parse_script_header(script_path):
     """Parse the header comment from a script to get the model name."""
@@ -470,15 +497,18 @@ def parse_script_header(script_path):
             .replace('_', ' ')\
             .title()
             
-        # Look for Model/Description/Token/URL markers
+        # Look for Model/Tool/Description/Token/URL markers
         name = None
+        tool = None
         description = ''
         requires_token = False
         model_url = None
         
         for line in content:
             line = line.strip()
-            if line.startswith('# Model:'):
+            if line.startswith('# Tool:'):
+                tool = line.replace('# Tool:', '').strip()
+            elif line.startswith('# Model:'):
                 name = line.replace('# Model:', '').strip()
             elif line.startswith('# Description:'):
                 description = line.replace('# Description:', '').strip()
@@ -494,6 +524,7 @@ def parse_script_header(script_path):
         print(f"DEBUG: Parsed name: {name}, description: {description}, requires token: {requires_token}, url: {model_url}")
         return {
             'name': name,
+            'tool': tool,
             'description': description,
             'requires_token': requires_token,
             'model_url': model_url
@@ -508,6 +539,7 @@ def parse_script_header(script_path):
             .title()
         return {
             'name': fallback_name,
+            'tool': None,
             'description': '',
             'requires_token': False,
             'model_url': None
@@ -518,26 +550,37 @@ def parse_training_tool_script(script_path):
     script_name = os.path.basename(script_path).replace('_setup.sh', '')
     info = parse_script_header(script_path)
     
-    # For training tools, we still look for Tool: marker
-    try:
-        with open(script_path, 'r') as f:
-            content = f.readlines()
-            
-        for line in content:
-            line = line.strip()
-            if line.startswith('# Tool:'):
-                info['name'] = line.replace('# Tool:', '').strip()
-            elif line.startswith('# Description:'):
-                info['description'] = line.replace('# Description:', '').strip()
-    except Exception as e:
-        print(f"DEBUG: Error parsing training tool script: {e}")
-    
+    # For training tools the Tool: marker takes precedence over Model:
     return {
         'id': script_name,
-        'name': info['name'],
+        'name': info['tool'] or info['name'],
         'description': info['description']
     }
 
+def parse_preset_script(script_path):
+    """Parse a preset model script into the entry shown in the model lists."""
+    model_info = parse_script_header(script_path)
+    return {
+        'name': model_info['name'],
+        'description': model_info.get('description', ''),
+        'requires_token': model_info.get('requires_token', False),
+        'model_url': model_info.get('model_url', '')
+    }
+
+# Parsed script headers, rebuilt only when a script directory changes
+preset_catalog = ScriptCatalog(
+    PRESET_SCRIPTS_PATH,
+    'download_*.sh',
+    parse_preset_script,
+    lambda path: os.path.basename(path).replace('download_', '').replace('.sh', '')
+)
+training_tool_catalog = ScriptCatalog(
+    SCRIPTS_PATH / "training_tool_scripts",
+    '*setup.sh',
+    parse_training_tool_script,
+    lambda path: os.path.basename(path).replace('_setup.sh', '')
+)
+
 class LoraTrainingForm(FlaskForm):
     tool = SelectField('Select Training Tool', choices=[])
     submit = SubmitField('Install')
@@ -550,34 +593,9 @@ class HuggingFaceForm(FlaskForm):
 
 @app.route('/')
 def index():
-    # Get available download scripts
-    download_scripts = []
-    for script in glob.glob(f'{SCRIPTS_PATH}/preset_model_scripts/download_*.sh'):
-        script_name = os.path.basename(script).replace('download_', '').replace('.sh', '')
-        model_info = parse_script_header(script)
-        download_scripts.append({
-            'id': script_name,
-            'name': model_info['name'],
-            'description': model_info.get('description', ''),
-            'requires_token': model_info.get('requires_token', False),
-            'model_url': model_info.get('model_url', '')
-        })
-    
-    # Sort scripts alphabetically by name
-    download_scripts.sort(key=lambda x: x['name'].lower())
-    
-    # Get available training tools
-    training_tools = []
-    training_scripts = glob.glob(f'{SCRIPTS_PATH}/training_tool_scripts/*setup.sh')
-    print(f"DEBUG: Found training scripts: {training_scripts}")
-    for script in training_scripts:
-        tool_info = parse_training_tool_script(script)
-        print(f"DEBUG: Parsed tool info: {tool_info}")
-        training_tools.append(tool_info)
-    
-    # Sort training tools alphabetically by name
-    training_tools.sort(key=lambda x: x['name'].lower())
-    print(f"DEBUG: Final training tools list: {training_tools}")
+    # Available download scripts and training tools, sorted by name
+    download_scripts = preset_catalog.entries()
+    training_tools = training_tool_catalog.entries()
     
     # Create form with dynamic choices
     lora_form = LoraTrainingForm()
@@ -618,7 +636,8 @@ def run_training_tool_installation(script_path, tool):
             current_time = time.time()
             if current_time - last_output_time > timeout:
                 # Process is still running but no output for a while
-                training_tool_output["output"].append(f"[{time.strftime('%H:%M:%S')}] Waiting for process to continue...")
+                training_tool_log.append(f"[{time.strftime('%H:%M:%S')}] Waiting for process to continue...")
+                status_events.notify('training_tool')
                 last_output_time = current_time
                 continue
                 
@@ -628,8 +647,8 @@ def run_training_tool_installation(script_path, tool):
                 if line:
                     try:
                         decoded_line = line.strip()
-                        training_tool_output["output"].append(decoded_line)
-                        print(f"DEBUG: Output line: {decoded_line}")
+                        training_tool_log.append(decoded_line)
+                        status_events.notify('training_tool')
                         last_output_time = time.time()
                         
                         # Check for Gradio server startup message
@@ -641,7 +660,7 @@ def run_training_tool_installation(script_path, tool):
                             return
                     except Exception as e:
                         print(f"Warning: Error processing line: {e}")
-                        training_tool_output["output"].append("[Error processing output line]")
+                        training_tool_log.append("[Error processing output line]")
             except Exception as e:
                 print(f"Warning: Error reading output: {e}")
                 continue
@@ -669,6 +688,8 @@ def run_training_tool_installation(script_path, tool):
         })
     finally:
         training_tool_process = None
+        training_tool_log.close()
+        status_events.notify('training_tool')
 
 @app.route('/install_training_tool', methods=['POST'])
 def install_training_tool():
@@ -704,11 +725,12 @@ def install_training_tool():
             print(f"DEBUG: Available scripts: {available_scripts}")
             return jsonify({'status': 'error', 'message': error_msg}), 404
         
-        # Reset status
+        # Reset status, the output of this install replaces the previous one
+        training_tool_log.start(TRAINING_TOOL_LOG_DIR / f"{tool}_install.log")
         training_tool_output.update({
             "status": "installing",
             "message": f"Installing {tool}...",
-            "output": []
+            "tool": tool
         })
         
         # Start installation in a separate thread
@@ -734,9 +756,50 @@ def install_training_tool():
         })
         return jsonify({'status': 'error', 'message': error_msg}), 500
 
+def get_training_tool_status(since=None):
+    """
+    Status of the training tool install with its buffered output.
+
+    Args:
+        since: Only return the output lines from this sequence number on
+
+    Returns:
+        dict: status and message, the output lines, output_start (sequence
+        number of the first line), seq (sequence number of the next line),
+        dropped (lines only in the log file) and log_file
+    """
+    output = training_tool_log.since(since)
+    return dict(
+        training_tool_output,
+        output=output["lines"],
+        output_start=output["start"],
+        seq=output["next"],
+        dropped=output["dropped"],
+        log_file=training_tool_log.log_path
+    )
+
 @app.route('/training_tool_status')
 def training_tool_status():
-    return jsonify(training_tool_output)
+    """
+    API endpoint with the training tool install status.
+    
+    Optional ?since=N only returns the output lines from sequence number N on,
+    pass the seq of the previous response to get the new lines.
+    """
+    since = request.args.get('since')
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'since must be a number'}), 400
+    return jsonify(get_training_tool_status(since))
+
+@app.route('/training_tool_log')
+def training_tool_log_file():
+    """API endpoint with the full output of the last training tool install."""
+    if not training_tool_log.log_path or not os.path.exists(training_tool_log.log_path):
+        return jsonify({'status': 'error', 'message': 'No install log available'}), 404
+    return send_file(training_tool_log.log_path, mimetype='text/plain')
 
 @app.route('/download_huggingface', methods=['POST'])
 def download_huggingface():
@@ -746,18 +809,27 @@ def download_huggingface():
     
     if not model_url:
         return jsonify({'status': 'error', 'message': 'Model URL is required'}), 400
+    
+    try:
+        job = create_download_job('huggingface', model_url, request.form.get('priority'),
+                                  url=model_url, download_path=download_path)
+    except JobLimitError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 429
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
         
-    # Start download in a background thread
-    thread = threading.Thread(
-        target=run_huggingface_download,
-        args=(model_url, token, download_path)
-    )
-    thread.daemon = True
-    thread.start()
+    # Hand the download to the aria2c daemon, progress is polled via /huggingface_status
+    if not run_huggingface_download(job, model_url, token, download_path):
+        return jsonify({
+            'status': 'error',
+            'message': job.status.get('message'),
+            'job_id': job.id
+        }), 500
     
     return jsonify({
         "status": "started",
-        "message": f"Started downloading from {model_url}"
+        "message": f"Started downloading from {model_url}",
+        "job_id": job.id
     })
 
 @app.route('/download_civitai', methods=['POST'])
@@ -773,99 +845,99 @@ def download_civitai():
     if model_type not in MODEL_DIRS:
         return jsonify({"error": "Invalid model type"}), 400
     
-    # Reset download status
-    civitai_download_status.update({
-        "status": "idle",
-        "message": "Initializing download..."
-    })
+    try:
+        job = create_download_job('civitai', filename, request.form.get('priority'),
+                                  message="Initializing download...")
+    except JobLimitError as e:
+        return jsonify({"status": "error", "message": str(e)}), 429
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     
-    thread = threading.Thread(target=run_civitai_download, args=(url, model_type, filename, token))
-    thread.daemon = True
-    thread.start()
+    if not run_civitai_download(job, url, model_type, filename, token):
+        return jsonify({"status": "error", "message": job.status.get('message'), "job_id": job.id}), 500
     
-    return jsonify({"status": "started"})
+    return jsonify({"status": "started", "job_id": job.id})
+
+def stop_download_jobs(kind):
+    """Cancel every running job of a kind."""
+    for job in download_jobs.active(kind):
+        download_jobs.cancel(job.id)
+    status_events.notify()
 
 @app.route('/stop_civitai', methods=['POST'])
 def stop_civitai_download():
-    global civitai_current_process
-    if civitai_current_process:
-        try:
-            civitai_current_process.terminate()
-            civitai_current_process.wait(timeout=5)
-        except:
-            civitai_current_process.kill()
-        finally:
-            civitai_current_process = None
-            civitai_download_status.update({
-                "status": "stopped",
-                "message": "Download stopped by user"
-            })
+    stop_download_jobs('civitai')
     return jsonify({"status": "stopped"})
 
+def get_latest_job_status(kind):
+    """Status of the most recent job of a kind, for the per-kind status endpoints."""
+    job = download_jobs.latest(kind)
+    if job is None:
+        return IDLE_STATUS_BY_KIND[kind]
+    return refresh_job(job).status
+
+def get_civitai_status():
+    return get_latest_job_status('civitai')
+
+def get_huggingface_status():
+    return get_latest_job_status('huggingface')
+
 @app.route('/civitai_status')
 def civitai_status():
-    return jsonify(civitai_download_status)
+    return jsonify(get_civitai_status())
 
 @app.route('/huggingface_status')
 def huggingface_status():
     """
     Return the current status of HuggingFace downloads.
-    This endpoint is polled by the frontend to update progress.
+    Fallback for browsers that do not use /events.
     """
-    print(f"HF STATUS UPDATE: {huggingface_download_status.get('status')}, Progress: {huggingface_download_status.get('progress')}%, Message: {huggingface_download_status.get('message')}")
-    return jsonify(huggingface_download_status)
+    return jsonify(get_huggingface_status())
 
 @app.route('/stop_huggingface', methods=['POST'])
 def stop_huggingface_download():
-    global huggingface_current_process
-    if huggingface_current_process:
-        try:
-            # Get the process group ID (pgid) of the aria2c process
-            pgid = os.getpgid(huggingface_current_process.pid)
-            
-            # Kill the entire process group
-            os.killpg(pgid, signal.SIGTERM)
-            time.sleep(1)
-            # Delete the partial download file
-            try:
-                # Get URL from the stored status
-                model_url = huggingface_download_status.get('url', '')
-                if model_url:
-                    # Extract filename from URL (remove any query parameters)
-                    filename = os.path.basename(model_url.split('?')[0])
-                    if filename:
-                        # Check both possible locations
-                        possible_paths = []
-                        # Add custom download path if specified
-                        download_path = huggingface_download_status.get('download_path')
-                        if download_path:
-                            possible_paths.extend([
-                                os.path.join(download_path, filename),
-                                os.path.join(download_path, filename + ".aria2"),  # aria2 control file
-                            ])
-                        
-                        for path in possible_paths:
-                            if os.path.exists(path):
-                                os.remove(path)
-                                print(f"Deleted partial download file: {path}")
-            except Exception as e:
-                print(f"Error deleting partial download file: {e}")
-                
-        except ProcessLookupError:
-            # Process already terminated
-            pass
-        except Exception as e:
-            print(f"Error stopping download: {e}")
-        finally:
-            huggingface_current_process = None
-            update_download_status(
-                huggingface_download_status,
-                status="stopped",
-                message="Download stopped by user",
-                progress=0
-            )
+    stop_download_jobs('huggingface')
     return jsonify({"status": "stopped"})
 
+@app.route('/jobs')
+def jobs():
+    """
+    List the download jobs.
+
+    Optional ?kind=civitai|huggingface|preset and ?active=1 filter the list.
+    """
+    kind = request.args.get('kind') or None
+    active_only = request.args.get('active', '').lower() in ('1', 'true')
+    job_list = [refresh_job(job) for job in download_jobs.jobs(kind)]
+    if active_only:
+        job_list = [job for job in job_list if job.active]
+    return jsonify({
+        "jobs": [job_to_dict(job) for job in job_list],
+        "active": len(download_jobs.active()),
+        "max_active": download_jobs.max_active,
+        "bandwidth": bandwidth_budget.stats()
+    })
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = download_jobs.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": f"No download job {job_id}"}), 404
+    return jsonify(job_to_dict(refresh_job(job)))
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = download_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": f"No download job {job_id}"}), 404
+    status_events.notify()
+    return jsonify(job_to_dict(job))
+
+@app.route('/bandwidth')
+def bandwidth():
+    """Current download limit, why it applies and the measured throughput."""
+    return jsonify(bandwidth_budget.stats())
+
 @app.route('/health')
 def health_check():
     """
@@ -873,433 +945,259 @@ def health_check():
     """
     return jsonify({"status": "ok", "message": "Server is running"})
 
-def run_model_download(script_path, script_name, display_name, token=None):
+def build_file_graph(model_infos):
     """
-    Run a model download script and track its progress.
-    
+    Collect the files of the selected presets, deduplicated by source URL.
+
     Args:
-        script_path: Path to the download script
-        script_name: Name of the script
-        display_name: Display name of the model
-        token: Optional HuggingFace token
+        model_infos: List of (script_path, script_name, model_info) tuples
+
+    Returns:
+        FileGraph: One node per URL with its target paths and presets
     """
-    global model_download_status, model_current_process
-    
-    try:
-        print(f"DEBUG: Starting download for {display_name} from {script_path}")
-        
-        # Extract aria2c commands from the script
-        commands = extract_aria2c_commands(script_path)
-        
-        if not commands:
-            print(f"DEBUG: No aria2c commands found in {script_path}")
-            return False
-            
-        print(f"DEBUG: Found {len(commands)} commands to execute")
-            
-        # Run each command sequentially
-        for i, cmd in enumerate(commands):
-            if model_download_status.get('status') == 'stopped':
-                print("DEBUG: Download stopped by user")
-                return False
-                
-            # Update status for current file
-            model_download_status.update({
-                "current_model": f"{display_name} ({i+1}/{len(commands)})",
-                "message": f"Downloading {display_name} ({i+1}/{len(commands)})..."
-            })
-            
-            # Add token to URL if needed
-            if token:
-                # Find the URL in the command, handling both quoted and unquoted URLs
-                url_match = re.search(r'["\']?https?://[^\s"\']+(?=["\']|$)', cmd)
-                if url_match:
-                    url = url_match.group(0)
-                    # Remove any leading quotes from the URL
-                    # url = url.lstrip('"\'')
-                    # Add Authorization header with Bearer token
-                    cmd = cmd.replace(url_match.group(0), f'--header="Authorization: Bearer {token}" {url}')
-            
-            print(f"DEBUG: Executing command: {cmd}")
-            
-            # Run aria2c with unbuffered output
-            cmd = f"stdbuf -oL {cmd}"
-            model_current_process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                shell=True,
-                bufsize=1,
-                env=dict(os.environ, PYTHONUNBUFFERED="1"),
-                preexec_fn=os.setsid
-            )
-            
-            print(f"DEBUG: Started process with PID: {model_current_process.pid}")
-            
-            # Process output
-            while True:
-                output = model_current_process.stdout.readline()
-                if output == '' and model_current_process.poll() is not None:
-                    break
-                if output:
-                    line = output.strip()
-                    print(f"DEBUG: aria2c output: {line}")
-                    
-                    # Skip status legend messages
-                    if line.startswith('Status Legend:'):
-                        continue
-                    
-                    # If all files already exist, we'll see a pattern of completed messages without downloads
-                    if line.endswith("file already exists."):
-                        # We'll let our Completed download message handle the status updates
-                        print(f"DEBUG: File already exists detected: {line}")
-                        
-                    # Check for aria2c file already exists message - expanded patterns to catch all variations
-                    if ("file already exists" in line or 
-                        "download completed" in line or 
-                        "already downloaded" in line or
-                        "already exists" in line or
-                        "resume download not supported" in line):
-                        print(f"DEBUG: Detected file already exists: {line}")
-                        
-                        # If we've detected all files already exist
-                        total_commands = len(commands)
-                        existing_files_count = model_download_status.get("existing_files_count", 0) + 1
-                        model_download_status["existing_files_count"] = existing_files_count
-                        
-                        # If all files exist, update the message
-                        if existing_files_count == total_commands:
-                            model_download_status.update({
-                                "status": "completed",
-                                "message": "All files already exist. No download required.",
-                                "progress": 100,
-                                "downloaded": "0B",
-                                "total": "0B",
-                                "speed": "0B/s",
-                                "eta": "N/A"
-                            })
-                        
-                        # File already exists will be followed by a "Completed download" message from our script
-                        # No need to update status here
-                        continue
-                    
-                    downloaded, total, percent, speed, eta = parse_aria2c_output(line)
-                    if downloaded and total and percent is not None:
-                        model_download_status.update({
-                            "downloaded": downloaded,
-                            "total": total,
-                            "progress": percent,
-                            "speed": speed + "/s",
-                            "eta": eta,
-                            "message": f"Downloading {display_name} ({i+1}/{len(commands)})... {percent}%"
-                        })
-            
-            # Check for errors
-            stderr_output = model_current_process.stderr.read()
-            if stderr_output:
-                print(f"DEBUG: aria2c stderr: {stderr_output}")
-            
-            # Wait for process to complete
-            return_code = model_current_process.wait()
-            print(f"DEBUG: Process completed with return code: {return_code}")
-            
-            if return_code != 0:
-                model_download_status.update({
-                    "status": "error",
-                    "message": f"Error downloading {display_name} ({i+1}/{len(commands)}). Return code: {return_code}"
-                })
-                return False
-                
-            # Update status for successful completion of this file
-            model_download_status.update({
-                "progress": 100,
-                "message": f"Completed {display_name} ({i+1}/{len(commands)})"
-            })
-            
-            # If this was the last command, mark the overall download as complete
-            if i == len(commands) - 1:
-                model_download_status.update({
-                    "status": "completed",
-                    "message": f"Successfully downloaded {display_name}",
-                    "progress": 100
-                })
-                
-        return True
-        
-    except Exception as e:
-        print(f"DEBUG: Error in run_model_download: {str(e)}")
-        model_download_status.update({
-            "status": "error",
-            "message": f"Error: {str(e)}"
-        })
-        return False
-    finally:
-        model_current_process = None
+    graph = FileGraph()
+    for script_path, script_name, _ in model_infos:
+        for spec in download_specs.get(script_path):
+            if spec.tool != 'aria2c':
+                print(f"DEBUG: Skipping {spec.url} in {script_name}, repository downloads are not supported for presets")
+                continue
+            options = dict(spec.options)
+            # Connections are assigned by the scheduler
+            for name in ('max-connection-per-server', 'split'):
+                options.pop(name, None)
+            graph.add(script_name, spec.url, spec.directory, spec.filename,
+                      options=options, headers=spec.headers, command=spec.command)
+    return graph
+
+def build_download_tasks(graph, token=None):
+    """
+    Turn the file graph into scheduler tasks, one fetch per source URL.
 
-def run_model_downloads(model_infos, token=None):
-    global model_download_status, model_download_thread, model_current_process
-    
+    The file is downloaded to the first of its targets that is already on disk
+    (so existing files are reused), or else the first one; the other targets
+    become aliases linked to it afterwards.
+
+    Args:
+        graph: FileGraph of the selected presets
+        token: Optional HuggingFace token sent as a Bearer header
+
+    Returns:
+        list: DownloadTask objects
+    """
+    tasks = []
+    for node in graph.nodes():
+        headers = dict(node['headers'])
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        targets = node['targets']
+        primary = next((target for target in targets if os.path.exists(target)), targets[0])
+        tasks.append(DownloadTask(
+            len(tasks) + 1, node['url'], os.path.dirname(primary), os.path.basename(primary),
+            command=node['command'], headers=headers, options=dict(node['options']),
+            refs=len(node['presets']), aliases=[target for target in targets if target != primary]
+        ))
+    return tasks
+
+def download_space_shortfalls(tasks, sizes=None):
+    """
+    Check that the files still to download fit on their volumes.
+
+    Space aria2c already allocated for a partial file counts as used. Files
+    whose size is not known yet are not counted.
+
+    Args:
+        tasks: DownloadTask objects, only queued ones are checked
+        sizes: Optional dict of URL -> size for tasks without a size
+
+    Returns:
+        list: Volumes that are too small (see disk_usage.check_space)
+    """
+    requirements = []
+    for task in tasks:
+        if task.state != 'queued':
+            continue
+        size = task.size or (sizes or {}).get(task.url)
+        if not size:
+            continue
+        try:
+            allocated = os.stat(task.path).st_blocks * 512
+        except OSError:
+            allocated = 0
+        requirements.append((task.directory, size - allocated))
+    return check_space(requirements, DOWNLOAD_DISK_RESERVE)
+
+def describe_shortfalls(shortfalls):
+    return "Not enough disk space: " + "; ".join(
+        f"{format_size(entry['needed'])} needed on {entry['path']} but only {format_size(entry['free'])} free"
+        for entry in shortfalls
+    ) + f" ({format_size(DOWNLOAD_DISK_RESERVE)} are kept free)"
+
+def update_model_status_from_snapshot(job, snapshot):
+    """Copy the scheduler progress into the status of a preset job."""
+    if job.cancelled:
+        return
+
+    active = [f for f in snapshot["files"] if f["state"] == 'downloading']
+    current = ", ".join(f["label"] for f in active)
+    job.update(
+        progress=snapshot["progress"],
+        downloaded=snapshot["downloaded"],
+        total=snapshot["total"],
+        speed=snapshot["speed"],
+        eta=snapshot["eta"],
+        current_model=current,
+        total_models=snapshot["total_files"],
+        completed_models=snapshot["completed_files"],
+        existing_files_count=snapshot["existing_files"],
+        active_files=snapshot["active_files"],
+        files=snapshot["files"],
+        message=(
+            f"Downloading {len(active)} file(s), "
+            f"{snapshot['completed_files']}/{snapshot['total_files']} completed... {snapshot['progress']}%"
+        )
+    )
+    status_events.notify('model')
+
+def cancel_preset_job(job):
+    """on_cancel of the preset jobs: stop every file the scheduler is downloading."""
+    if job.handle:
+        job.handle.cancel()
+
+def run_model_downloads(job, model_infos, token=None, graph=None):
     try:
         # Reset status counters
-        model_download_status["existing_files_count"] = 0
+        job.update(
+            existing_files_count=0,
+            deduplicated_files=0,
+            saved_bytes=0,
+            saved="0B"
+        )
         
         # Check if we should stop before starting
-        if model_download_status.get('status') == 'stopped':
+        if job.cancelled:
             return
             
-        # Extract all aria2c commands from all scripts
-        script_paths = [info[0] for info in model_infos]
-        commands = extract_aria2c_commands(script_paths)
+        # Files of all scripts, every source URL only once
+        graph = graph or build_file_graph(model_infos)
         
-        if not commands:
-            model_download_status.update({
-                "status": "completed",
-                "message": "All files already downloaded. No download required.",
-                "progress": 100,
-                "downloaded": "0B",
-                "total": "0B",
-                "speed": "0B/s",
-                "eta": "N/A"
-            })
+        if not graph.nodes():
+            job.update(
+                status="completed",
+                message="All files already downloaded. No download required.",
+                progress=100,
+                downloaded="0B",
+                total="0B",
+                speed="0B/s",
+                eta="N/A"
+            )
             return
             
-        # Initialize status
-        model_download_status.update({
-            "status": "downloading",
-            "message": "Starting downloads...",
-            "progress": 0,
-            "downloaded": "0B",
-            "total": "0B",
-            "speed": "0B/s",
-            "eta": "Unknown",
-            "current_model": "",
-            "total_models": len(commands),
-            "completed_models": 0,
-            "current_file": 1
-        })
+        tasks = build_download_tasks(graph, token)
         
-        # Add token to URLs if needed
-        if token:
-            for i, cmd in enumerate(commands):
-                url_match = re.search(r'["\']?https?://[^\s"\']+(?=["\']|$)', cmd)
-                if url_match:
-                    url = url_match.group(0)
-                    commands[i] = cmd.replace(url_match.group(0), f'--header="Authorization: Bearer {token}" {url}')
-        
-        # Check if force flag is needed for aria2c
-        need_force_download = False
-        for cmd in commands:
-            # Check if any command is missing the -c or --continue flag
-            if all(flag not in cmd for flag in [' -c ', ' -c=', ' --continue ', ' --continue=']):
-                need_force_download = True
-                break
+        # Initialize status
+        job.update(
+            status="downloading",
+            message=f"Preparing {len(tasks)} downloads...",
+            progress=0,
+            downloaded="0B",
+            total="0B",
+            speed="0B/s",
+            eta="Unknown",
+            current_model="",
+            total_models=len(tasks),
+            completed_models=0,
+            active_files=0,
+            files=[task.to_dict() for task in tasks]
+        )
         
-        # Create a temporary script with all commands
-        temp_script = "/tmp/batch_download.sh"
-        with open(temp_script, 'w') as f:
-            f.write("#!/bin/bash\n")
-            f.write("set -e\n")  # Exit on error
-            
-            # Track overall progress
-            f.write("total_files=" + str(len(commands)) + "\n")
-            f.write("current_file=1\n")
-            
-            # Run each command sequentially (without the & at the end)
-            for i, cmd in enumerate(commands):
-                # Add force flag if needed to re-download existing files
-                if need_force_download and '--allow-overwrite=true' not in cmd:
-                    cmd = cmd.replace('aria2c', 'aria2c --allow-overwrite=true')
-                
-                # Add progress message before each download
-                f.write(f'echo "Starting download {i+1}/{len(commands)}..."\n')
-                f.write(f"{cmd}\n")  # Run command without & to make it sequential
-                
-                # After each command completes, increment the counter
-                f.write('current_file=$((current_file + 1))\n')
-                f.write('echo "Completed download $((current_file - 1))/$total_files"\n')
-            
-        os.chmod(temp_script, 0o755)
+        # Files the store knows are finished from disk (skipped or hardlinked), the
+        # rest is resumed: complete and mismatching files were dealt with before
+        # aria2c sees them, so it never has to overwrite anything. The presets ask
+        # for conditional-get, which lets a 304 mark a truncated file complete
+        model_store.prepare(tasks)
+        extra_options = {"continue": "true", "allow-overwrite": "false", "conditional-get": "false"}
+        scheduler = DownloadScheduler(
+            Aria2RPCBackend(get_aria2(), extra_options),
+            max_concurrent=DOWNLOAD_MAX_CONCURRENT,
+            max_connections=DOWNLOAD_MAX_CONNECTIONS,
+            per_host_limit=DOWNLOAD_PER_HOST_LIMIT,
+            on_update=lambda snapshot: update_model_status_from_snapshot(job, snapshot)
+        )
+        for task in tasks:
+            scheduler.add(task)
+        job.handle = scheduler
+        job.on_cancel = cancel_preset_job
+        if job.cancelled:
+            return
         
-        # Run all commands in a single subprocess with its own process group
-        cmd = f"stdbuf -oL {temp_script}"
-        model_current_process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            shell=True,
-            bufsize=1,
-            env=dict(os.environ, PYTHONUNBUFFERED="1"),
-            preexec_fn=os.setsid  # Create new process group
+        # Probe file sizes so small files can be scheduled first, and check files
+        # already on disk against the probed size and hash
+        scheduler.probe_sizes()
+        if scheduler.cancelled:
+            return
+        model_store.check_existing(tasks)
+        shortfalls = download_space_shortfalls(tasks)
+        if shortfalls:
+            job.update(status="error", message=describe_shortfalls(shortfalls))
+            return
+        plan = graph.summary({task.url: task.size or task.total for task in tasks})
+        job.update(
+            deduplicated_files=plan["aliases"],
+            saved_bytes=plan["saved_bytes"],
+            saved=format_size(plan["saved_bytes"])
         )
         
-        # Process output
-        while True:
-            # Check if we should stop
-            if model_download_status.get('status') == 'stopped':
-                try:
-                    # Get the process group ID and kill it
-                    pgid = os.getpgid(model_current_process.pid)
-                    os.killpg(pgid, signal.SIGTERM)
-                    time.sleep(1)
-                except:
-                    pass
-                finally:
-                    model_current_process = None
-                    # Clean up the temporary script
-                    try:
-                        os.remove(temp_script)
-                    except:
-                        pass
-                    return
-                    
-            output = model_current_process.stdout.readline()
-            if output == '' and model_current_process.poll() is not None:
-                break
-            if output:
-                line = output.strip()
-                print(f"DEBUG: aria2c output: {line}")
-                
-                # Check for our custom progress messages
-                if line.startswith("Starting download "):
-                    parts = line.split("download ")[1].split("/")
-                    current_file = int(parts[0])
-                    total_files = int(parts[1].strip("..."))
-                    
-                    model_download_status.update({
-                        "current_file": current_file,
-                        "message": f"Starting download {current_file}/{total_files}..."
-                    })
-                    continue
-                
-                if line.startswith("Completed download "):
-                    parts = line.split("download ")[1].split("/")
-                    completed = int(parts[0])
-                    total = int(parts[1])
-                    
-                    # Update completed count and calculate progress percentage
-                    model_download_status["completed_models"] = completed
-                    percent = int(100 * completed / total)
-                    
-                    model_download_status.update({
-                        "progress": percent,
-                        "message": f"Completed download {completed}/{total}"
-                    })
-                    
-                    # If all downloads complete, mark as finished
-                    if completed == total:
-                        # If all files exist, update with appropriate message
-                        if model_download_status.get("existing_files_count", 0) == total:
-                            model_download_status.update({
-                                "status": "completed",
-                                "message": "All files already exist. No download required.",
-                                "progress": 100,
-                                "downloaded": "0B",
-                                "total": "0B",
-                                "speed": "0B/s",
-                                "eta": "N/A"
-                            })
-                        else:
-                            model_download_status.update({
-                                "status": "completed",
-                                "message": "All downloads completed successfully!",
-                                "progress": 100
-                            })
-                    continue
-                
-                # Skip status legend messages
-                if line.startswith('Status Legend:'):
-                    continue
-                
-                # If all files already exist, we'll see a pattern of completed messages without downloads
-                if line.endswith("file already exists."):
-                    # Count this as an existing file
-                    existing_files_count = model_download_status.get("existing_files_count", 0) + 1
-                    model_download_status["existing_files_count"] = existing_files_count
-                    print(f"DEBUG: File already exists detected: {line}, count: {existing_files_count}/{len(commands)}")
-                    continue
-                
-                # Check for aria2c file already exists message - expanded patterns to catch all variations
-                if ("file already exists" in line or 
-                    "download completed" in line or 
-                    "already downloaded" in line or
-                    "already exists" in line or
-                    "resume download not supported" in line):
-                    print(f"DEBUG: Detected file already exists: {line}")
-                    
-                    # Count as an existing file
-                    existing_files_count = model_download_status.get("existing_files_count", 0) + 1
-                    model_download_status["existing_files_count"] = existing_files_count
-                    print(f"DEBUG: File already exists count: {existing_files_count}/{len(commands)}")
-                    
-                    # File already exists will be followed by a "Completed download" message from our script
-                    # No need to update status here
-                    continue
-                
-                downloaded, total, percent, speed, eta = parse_aria2c_output(line)
-                if downloaded and total and percent is not None:
-                    # Only update current_file when a new download starts (percent = 0)
-                    if percent == 0 and model_download_status["current_file"] < len(commands):
-                        model_download_status["current_file"] = model_download_status["completed_models"] + 1
-                    
-                    model_download_status.update({
-                        "downloaded": downloaded,
-                        "total": total,
-                        "progress": percent,
-                        "speed": speed + "/s",
-                        "eta": eta,
-                        "message": f"Downloading file {model_download_status['current_file']}/{len(commands)}... {percent}%"
-                    })
-                elif line == '(OK):download completed.':
-                    # Handle the final completion message
-                    if model_download_status["completed_models"] == len(commands):
-                        model_download_status.update({
-                            "status": "completed",
-                            "message": "All downloads completed successfully!",
-                            "progress": 100
-                        })
-                
-        # Check for errors
-        stderr_output = model_current_process.stderr.read()
-        if stderr_output:
-            print(f"DEBUG: aria2c stderr: {stderr_output}")
+        scheduler.run()
+        
+        if scheduler.cancelled or job.cancelled:
+            return
         
-        # Wait for process to complete
-        return_code = model_current_process.wait()
-        print(f"DEBUG: Process completed with return code: {return_code}")
+        job.update(message="Verifying downloaded files...")
+        status_events.notify('model')
+        saved = job.status["saved_bytes"] + model_store.verify(tasks)
+        model_store.link_aliases(tasks)
+        success = all(task.state == 'completed' for task in tasks)
+        job.update(saved_bytes=saved, saved=format_size(saved))
         
-        if return_code != 0:
-            model_download_status.update({
-                "status": "error",
-                "message": f"Error during download. Return code: {return_code}"
-            })
+        snapshot = scheduler.snapshot()
+        update_model_status_from_snapshot(job, snapshot)
+        if success:
+            if snapshot["existing_files"] == snapshot["total_files"]:
+                job.update(
+                    status="completed",
+                    message="All files already exist. No download required.",
+                    progress=100,
+                    downloaded="0B",
+                    total="0B",
+                    speed="0B/s",
+                    eta="N/A"
+                )
+            else:
+                job.update(
+                    status="completed",
+                    message="All downloads completed successfully!"
+                            + (f" {format_size(saved)} not downloaded thanks to shared files." if saved else ""),
+                    progress=100,
+                    speed="0B/s",
+                    eta="N/A"
+                )
         else:
-            # Ensure status is set to completed if all downloads finished successfully
-            if model_download_status.get('progress') == 100:
-                model_download_status.update({
-                    "status": "completed",
-                    "message": "All downloads completed successfully!",
-                    "progress": 100
-                })
-            
-        # Clean up temporary script
-        try:
-            os.remove(temp_script)
-        except:
-            pass
+            failed = [f["label"] for f in snapshot["files"] if f["state"] == 'error']
+            job.update(
+                status="error",
+                message=f"{len(failed)} of {snapshot['total_files']} downloads failed: {', '.join(failed)}"
+            )
             
     except Exception as e:
         print(f"Error in run_model_downloads: {e}")
-        model_download_status.update({
-            "status": "error",
-            "message": f"Error: {str(e)}"
-        })
+        job.update(
+            status="error",
+            message=f"Error: {str(e)}"
+        )
     finally:
-        model_download_thread = None
-        # Only set process to None after status is updated
-        if model_download_status.get('status') in ['completed', 'error']:
-            model_current_process = None
+        job.handle = None
+        storage_index.request_refresh()
+        status_events.notify('model')
 
 @app.route('/run_download_script', methods=['POST'])
 def run_download_script():
@@ -1312,12 +1210,11 @@ def run_download_script():
     # Get script info for all selected models
     model_infos = []
     for script_name in script_names:
-        download_script = f'{SCRIPTS_PATH}/preset_model_scripts/download_{script_name}.sh'
+        download_script, model_info = preset_catalog.get(script_name)
         
-        if not os.path.exists(download_script):
+        if not download_script:
             return jsonify({'status': 'error', 'message': f'Script not found for {script_name}'}), 404
         
-        model_info = parse_script_header(download_script)
         model_infos.append((download_script, script_name, model_info))
     
     # Check if any selected model requires a token but none is provided
@@ -1328,214 +1225,109 @@ def run_download_script():
             'message': 'HuggingFace token is required for one or more selected models'
         }), 400
     
+    # Plan the fetches: files shared by several presets are downloaded once
+    graph = build_file_graph(model_infos)
+    known_sizes = {url: info['size'] for url, info in model_store.urls.items()}
+    plan = graph.summary(known_sizes)
+    
+    # Refuse right away what does not fit with the sizes known from earlier
+    # downloads, the job checks again once the servers reported every size
+    shortfalls = download_space_shortfalls(build_download_tasks(graph), known_sizes)
+    if shortfalls:
+        return jsonify({'status': 'error', 'message': describe_shortfalls(shortfalls), 'shortfalls': shortfalls}), 507
+    
+    try:
+        job = create_download_job(
+            'preset', ", ".join(script_names), request.form.get('priority'),
+            script_name=",".join(script_names),
+            display_name=", ".join(info[2].get('name', info[1]) for info in model_infos)
+        )
+    except JobLimitError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 429
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
     # Start downloads in a background thread
-    global model_download_thread
-    model_download_thread = threading.Thread(
+    job.thread = threading.Thread(
         target=run_model_downloads,
-        args=(model_infos, token)
+        args=(job, model_infos, token, graph)
     )
-    model_download_thread.daemon = True
-    model_download_thread.start()
+    job.thread.daemon = True
+    job.thread.start()
     
+    message = f'Started downloading {len(script_names)} models: {plan["fetches"]} downloads for {plan["files"]} files'
+    if plan["aliases"]:
+        message += f', {plan["aliases"]} shared files are linked instead of downloaded again'
     return jsonify({
         'status': 'success',
-        'message': f'Started downloading {len(script_names)} models'
+        'message': message,
+        'plan': plan,
+        'job_id': job.id
     })
 
 @app.route('/stop_model_download', methods=['POST'])
 def stop_model_download():
-    global model_current_process, model_download_status, model_download_thread
-    
-    # Store the process in a local variable to avoid race conditions
-    current_process = model_current_process
-    
-    try:
-        # Update status first to signal the download thread to stop
-        model_download_status.update({
-            "status": "stopped",
-            "message": "Stopping download...",
-            "progress": 0,
-            "downloaded": "0B",
-            "total": "0B",
-            "speed": "0B/s",
-            "eta": "Unknown"
-        })
-        
-        # If we have a process, try to kill it
-        if current_process:
-            try:
-                # Get the process group ID and kill it
-                pgid = os.getpgid(current_process.pid)
-                os.killpg(pgid, signal.SIGTERM)
-                time.sleep(1)
-            except Exception as e:
-                print(f"Error killing process group: {e}")
-        
-        # Clean up the temporary script and any partial downloads
-        try:
-            if os.path.exists("/tmp/batch_download.sh"):
-                os.remove("/tmp/batch_download.sh")
-            # Clean up any .aria2 files
-            for root, dirs, files in os.walk(BASE_PATH):
-                for file in files:
-                    if file.endswith('.aria2'):
-                        try:
-                            os.remove(os.path.join(root, file))
-                        except:
-                            pass
-        except Exception as e:
-            print(f"Error cleaning up files: {e}")
-                
-    except Exception as e:
-        print(f"Error stopping download: {e}")
-        model_download_status.update({
-            "status": "error",
-            "message": f"Error stopping download: {str(e)}"
-        })
-    finally:
-        # Only set to None if it's still the same process
-        if model_current_process == current_process:
-            model_current_process = None
-        if model_download_thread:
-            model_download_thread = None
-        
-        # Reset the download status to idle after a short delay
-        time.sleep(1)  # Give time for any cleanup to complete
-        model_download_status.update({
-            "status": "idle",
-            "message": "",
-            "progress": 0,
-            "downloaded": "0B",
-            "total": "0B",
-            "speed": "0B/s",
-            "eta": "Unknown",
-            "current_model": "",
-            "total_models": 0,
-            "completed_models": 0,
-            "current_file": 1
-        })
-    
+    # Cancel every file the schedulers are still downloading. Partial downloads
+    # and their .aria2 control files are kept, the next download of the preset
+    # resumes them
+    stop_download_jobs('preset')
     return jsonify({"status": "stopped"})
 
+def check_preset_job(job):
+    """Mark a preset job whose download thread died as failed."""
+    if job.state != 'downloading':
+        return
+    
+    if job.status.get('progress') == 100:
+        # If progress is 100%, mark as completed regardless of thread state
+        job.update(
+            status="completed",
+            message="Download completed successfully!",
+            progress=100
+        )
+    elif not (job.thread and job.thread.is_alive()):
+        # The thread is gone and progress < 100%, this is an error
+        job.update(
+            status="error",
+            message="Download process exited unexpectedly. Please try again.",
+            progress=0,
+            downloaded="0B",
+            total="0B",
+            speed="0B/s",
+            eta="Unknown"
+        )
+
+def get_model_status():
+    """Return the status of the latest preset download job."""
+    return get_latest_job_status('preset')
+
 @app.route('/model_status')
 def model_status():
     """
     Return the current status of model downloads.
-    This endpoint is polled by the frontend to update progress.
+    Fallback for browsers that do not use /events.
     """
-    global model_current_process, model_download_thread
-    
-    # If we already have a completed or error status, just return it
-    if model_download_status.get('status') in ['completed', 'error', 'stopped', 'idle']:
-        return jsonify(model_download_status)
-    
-    # If we're in downloading state but process is None, check if it completed
-    if model_download_status.get('status') == 'downloading':
-        if model_download_status.get('progress') == 100:
-            # If progress is 100%, mark as completed regardless of process state
-            model_download_status.update({
-                "status": "completed",
-                "message": "Download completed successfully!",
-                "progress": 100
-            })
-        elif model_current_process is None:
-            # Process is None but progress is not 100% - check if thread is still alive
-            if model_download_thread and model_download_thread.is_alive():
-                # Thread is still running, probably setting up a new process
-                return jsonify(model_download_status)
-            else:
-                # Neither process nor thread is running and progress < 100%, this is an error
-                model_download_status.update({
-                    "status": "error",
-                    "message": "Download process exited unexpectedly. Please try again.",
-                    "progress": 0,
-                    "downloaded": "0B",
-                    "total": "0B",
-                    "speed": "0B/s",
-                    "eta": "Unknown"
-                })
-    
-    return jsonify(model_download_status)
+    return jsonify(get_model_status())
 
 @app.route('/model_downloader')
 def model_downloader():
-    # Get available download scripts
-    download_scripts = []
-    for script in glob.glob(f'{SCRIPTS_PATH}/preset_model_scripts/download_*.sh'):
-        script_name = os.path.basename(script).replace('download_', '').replace('.sh', '')
-        model_info = parse_script_header(script)
-        download_scripts.append({
-            'id': script_name,
-            'name': model_info['name'],
-            'description': model_info.get('description', ''),
-            'requires_token': model_info.get('requires_token', False),
-            'model_url': model_info.get('model_url', '')
-        })
-    
-    # Sort scripts alphabetically by name
-    download_scripts.sort(key=lambda x: x['name'].lower())
-    
-    return render_template('model_downloader.html', download_scripts=download_scripts)
+    return render_template('model_downloader.html', download_scripts=preset_catalog.entries())
+
+@app.route('/catalog')
+def catalog():
+    """Preset models and training tools as JSON, answered with 304 when the ETag still matches."""
+    etag = f"{preset_catalog.etag}-{training_tool_catalog.etag}"
+    response = jsonify({
+        'preset_models': preset_catalog.entries(),
+        'training_tools': training_tool_catalog.entries()
+    })
+    response.set_etag(etag)
+    return response.make_conditional(request)
 
 # -------------------------------------------------------------------------
 # Service Restart Functions
 # -------------------------------------------------------------------------
 
-def find_process_by_port(port):
-    """
-    Find a process using a specific port.
-    
-    Args:
-        port: The port number to check
-    
-    Returns:
-        int: PID of the process using the port, or None if not found
-    """
-    try:
-        # Run lsof to find process using the port
-        cmd = f"lsof -i :{port} -t"
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-        
-        if result.returncode == 0 and result.stdout.strip():
-            # Return the first PID (there might be multiple)
-            return int(result.stdout.strip().split('\n')[0])
-        return None
-    except Exception as e:
-        print(f"Error finding process by port: {e}")
-        return None
-
-def kill_process(pid):
-    """
-    Kill a process by its PID.
-    
-    Args:
-        pid: Process ID to kill
-    
-    Returns:
-        bool: True if successful, False otherwise
-    """
-    try:
-        # First try SIGTERM for graceful shutdown
-        os.kill(pid, signal.SIGTERM)
-        
-        # Wait a bit to see if it terminates
-        time.sleep(2)
-        
-        # Check if process still exists
-        try:
-            os.kill(pid, 0)  # Signal 0 is used to check if process exists
-            # Process still exists, use SIGKILL
-            os.kill(pid, signal.SIGKILL)
-            time.sleep(1)
-        except OSError:
-            # Process has already terminated
-            pass
-            
-        return True
-    except Exception as e:
-        print(f"Error killing process: {e}")
-        return False
-
 def determine_script_path(service, script_name):
     """
     Determine the path to the restart script for a service.
@@ -1552,15 +1344,17 @@ def determine_script_path(service, script_name):
 
 def run_service_restart(service, port, script_name):
     """
-    Restart a service by first killing any existing process and then running the restart script.
+    Restart a service: stop its processes, run the restart script and wait
+    until the service answers its health probe.
     
     Args:
         service: Service name
         port: Port the service runs on
         script_name: Name of the restart script
     """
-    global service_restart_status, service_restart_process
+    global service_restart_status
     
+    started = time.monotonic()
     try:
         # Update status
         service_restart_status.update({
@@ -1570,30 +1364,29 @@ def run_service_restart(service, port, script_name):
             "port": port,
             "pid": None,
             "script": script_name,
-            "output": []
+            "output": [],
+            "stop_seconds": None,
+            "ready_seconds": None,
+            "restart_seconds": None
         })
         
-        # Find process by port
-        pid = find_process_by_port(port)
-        service_restart_status["pid"] = pid
-        
-        if pid:
-            # Log found process
-            service_restart_status["message"] = f"Found {service} process with PID {pid}, attempting to kill..."
-            service_restart_status["output"].append(f"Found process on port {port} with PID {pid}")
-            
-            # Kill the process
-            if kill_process(pid):
-                service_restart_status["message"] = f"Successfully killed {service} process with PID {pid}"
-                service_restart_status["output"].append(f"Successfully killed process with PID {pid}")
-            else:
-                service_restart_status["message"] = f"Failed to kill {service} process with PID {pid}"
-                service_restart_status["output"].append(f"Failed to kill process with PID {pid}")
+        # Stop the process group the service was launched in and whatever owns its port
+        stopped = service_supervisor.stop(service, port)
+        service_restart_status["stop_seconds"] = round(stopped["seconds"], 2)
+        if stopped["pids"]:
+            service_restart_status["pid"] = stopped["pids"][0]
+            service_restart_status["output"].append(
+                f"Stopped {len(stopped['pids'])} process(es) of {service} ({', '.join(map(str, stopped['pids']))}) "
+                f"in {stopped['seconds']:.2f}s" + (" with SIGKILL" if stopped["forced"] else "")
+            )
+            if stopped["remaining"]:
+                service_restart_status["message"] = f"Failed to stop {service}, PIDs {stopped['remaining']} are still running"
+                service_restart_status["output"].append(service_restart_status["message"])
                 service_restart_status["status"] = "error"
                 return
         else:
-            service_restart_status["message"] = f"No process found running on port {port}"
             service_restart_status["output"].append(f"No process found running on port {port}")
+        status_events.notify('service')
         
         # Determine script path
         script_path = determine_script_path(service, script_name)
@@ -1605,40 +1398,56 @@ def run_service_restart(service, port, script_name):
             return
             
         # Run the restart script
-        service_restart_status["message"] = f"Running restart script for {service}..."
+        service_restart_status["message"] = f"Starting {service}..."
         service_restart_status["output"].append(f"Running restart script: {script_path}")
         
-        # Execute restart script
-        cmd = f"bash {script_path}"
-        service_restart_process = subprocess.Popen(
-            cmd,
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
+        process = service_supervisor.launch(
+            service,
+            ["bash", script_path],
             env=dict(os.environ, PYTHONUNBUFFERED="1")
         )
+        service_restart_status["pid"] = process.pid
         
         # Create a thread to read output in real-time
         output_thread = threading.Thread(
             target=read_process_output,
-            args=(service_restart_process, service)
+            args=(process, service)
         )
         output_thread.daemon = True
         output_thread.start()
         
-        # Wait for process to complete
-        return_code = service_restart_process.wait()
+        # Some scripts put the service in the background and exit, others keep
+        # running it in the foreground. Either way it is ready once it answers HTTP
+        probe = probe_for(service)
         
-        # Give the output thread time to finish reading
-        time.sleep(0.5)
+        def waiting(elapsed, detail):
+            service_restart_status["message"] = (
+                f"Waiting for {service} at {probe.url(port)} ({elapsed:.0f}s, {detail})"
+            )
+            status_events.notify('service')
         
-        if return_code == 0:
-            service_restart_status["message"] = f"{service} restarted successfully"
-            service_restart_status["status"] = "success"
+        ready, detail = probe.wait(
+            port,
+            SERVICE_READY_TIMEOUT,
+            abort=lambda: process.poll() not in (None, 0),
+            on_attempt=waiting
+        )
+        
+        if ready is not None:
+            total = time.monotonic() - started
+            service_restart_status.update({
+                "status": "success",
+                "message": f"{service} restarted successfully, ready after {ready:.1f}s ({total:.1f}s in total)",
+                "ready_seconds": round(ready, 2),
+                "restart_seconds": round(total, 2)
+            })
+        elif process.poll() not in (None, 0):
+            service_restart_status["message"] = f"Error restarting {service}. Return code: {process.returncode}"
+            service_restart_status["status"] = "error"
         else:
-            service_restart_status["message"] = f"Error restarting {service}. Return code: {return_code}"
+            service_restart_status["message"] = (
+                f"{service} did not answer at {probe.url(port)} within {SERVICE_READY_TIMEOUT:.0f}s ({detail})"
+            )
             service_restart_status["status"] = "error"
             
     except Exception as e:
@@ -1646,7 +1455,14 @@ def run_service_restart(service, port, script_name):
         service_restart_status["output"].append(f"Error: {str(e)}")
         service_restart_status["status"] = "error"
     finally:
-        service_restart_process = None
+        service_restart_history.record(
+            service,
+            service_restart_status["status"],
+            stop_seconds=service_restart_status.get("stop_seconds"),
+            ready_seconds=service_restart_status.get("ready_seconds"),
+            restart_seconds=service_restart_status.get("restart_seconds")
+        )
+        status_events.notify('service')
 
 def read_process_output(process, service):
     """
@@ -1668,11 +1484,7 @@ def read_process_output(process, service):
                 
             # Add to output list
             service_restart_status["output"].append(line.strip())
-            
-            # Check for completion indicators
-            if "server starting" in line.lower() or "running on" in line.lower():
-                service_restart_status["message"] = f"{service} restarted successfully"
-                service_restart_status["status"] = "success"
+            status_events.notify('service')
     except Exception as e:
         print(f"Error reading process output: {e}")
         service_restart_status["output"].append(f"Error reading process output: {str(e)}")
@@ -1736,98 +1548,155 @@ def check_service_status():
     if service != service_restart_status.get('service'):
         return jsonify({
             'status': 'error',
-            'message': f'No restart operation in progress for {service}'
+            'message': f'No restart operation in progress for {service}',
+            'recent_restarts': service_restart_history.recent(service),
+            'trend': service_restart_history.trend(service)
         })
         
-    return jsonify({
+    return jsonify(get_service_status())
+
+def get_service_status():
+    return {
         'status': service_restart_status.get('status'),
         'message': service_restart_status.get('message'),
         'service': service_restart_status.get('service'),
+        'pid': service_restart_status.get('pid'),
+        'stop_seconds': service_restart_status.get('stop_seconds'),
+        'ready_seconds': service_restart_status.get('ready_seconds'),
+        'restart_seconds': service_restart_status.get('restart_seconds'),
+        'recent_restarts': service_restart_history.recent(service_restart_status.get('service')),
+        'trend': service_restart_history.trend(service_restart_status.get('service')),
         'output': service_restart_status.get('output', [])
-    })
+    }
 
 # -------------------------------------------------------------------------
 # Storage Utilities
 # -------------------------------------------------------------------------
 
-def clear_trash_directory(trash_dir: str = "/workspace/.Trash-0"):
+def start_trash_purge(trash_dir=TRASH_PATH):
     """
-    Attempt to clear the contents of the specified trash directory.
-
-    Tries to fix common permission issues and force delete all contents
-    (including hidden files and directories).
+    Start emptying a trash directory in the background (see trash_purge.py).
 
     Returns:
-        dict: { status: 'success'|'error', message: str }
+        tuple: (status dict, HTTP status code)
     """
-    try:
-        # If the directory does not exist, nothing to do
-        if not os.path.exists(trash_dir):
-            return {
-                'status': 'success',
-                'message': f'Trash folder {trash_dir} not found. Nothing to clear.'
-            }
-
-        # Build a robust shell command to clear contents, including hidden files
-        # 1) Relax permissions and ownership where possible
-        # 2) Remove regular and hidden entries
-        # 3) Fallback to find -exec rm -rf
-        shell_cmd = (
-            f'if [ -d "{trash_dir}" ]; then '
-            f'  chmod -R u+rwX "{trash_dir}" 2>/dev/null || true; '
-            f'  chown -R $(id -u):$(id -g) "{trash_dir}" 2>/dev/null || true; '
-            f'  rm -rf {trash_dir}/* {trash_dir}/.[!.]* {trash_dir}/..?* 2>/dev/null || true; '
-            f'  find "{trash_dir}" -mindepth 1 -exec rm -rf {{}} + 2>/dev/null || true; '
-            f'fi'
-        )
+    global trash_purge
 
-        result = subprocess.run(
-            ["bash", "-lc", shell_cmd],
-            capture_output=True,
-            text=True
-        )
+    if trash_purge is not None and trash_purge.running:
+        return dict(trash_purge.to_dict(), message=f'Already emptying {trash_purge.root}'), 409
 
-        # Verify directory is empty
-        remaining = []
-        try:
-            remaining = os.listdir(trash_dir)
-        except Exception:
-            # If we cannot list it, assume it's fine if the directory is gone
-            if not os.path.exists(trash_dir):
-                remaining = []
-
-        if len(remaining) == 0:
-            return {
-                'status': 'success',
-                'message': f'Successfully cleared contents of {trash_dir}.'
-            }
-        else:
-            # Include some stderr to help diagnose
-            stderr_tail = (result.stderr or '').strip().splitlines()[-3:]
-            stderr_msg = ('\n'.join(stderr_tail)).strip()
-            return {
-                'status': 'error',
-                'message': (
-                    f'Attempted to clear {trash_dir}, but some items could not be removed.\n'
-                    f'Remaining entries (first 5 shown): {remaining[:5]}\n'
-                    f'Errors (if any): {stderr_msg or "None"}'
-                )
-            }
-    except Exception as e:
+    if not os.path.exists(trash_dir):
         return {
-            'status': 'error',
-            'message': f'Error clearing trash: {str(e)}'
-        }
+            'status': 'success',
+            'message': f'Trash folder {trash_dir} not found. Nothing to clear.'
+        }, 200
+
+    trash_purge = TrashPurge(trash_dir, workers=TRASH_PURGE_WORKERS, on_progress=lambda: status_events.notify('trash'))
+    trash_purge.start()
+    print(f"DEBUG: Emptying {trash_dir} with {TRASH_PURGE_WORKERS} workers")
+    return trash_purge.to_dict(), 200
 
+def get_trash_status():
+    if trash_purge is None:
+        return {'status': 'idle', 'message': ''}
+    return trash_purge.to_dict()
 
 @app.route('/clear_trash', methods=['POST'])
 def clear_trash():
-    """API endpoint to clear /workspace/.Trash-0 contents."""
-    result = clear_trash_directory("/workspace/.Trash-0")
-    http_status = 200 if result.get('status') == 'success' else 500
+    """API endpoint to start emptying /workspace/.Trash-0, follow it with /clear_trash/status."""
+    result, http_status = start_trash_purge(TRASH_PATH)
     return jsonify(result), http_status
 
+@app.route('/clear_trash/status', methods=['GET'])
+def clear_trash_status():
+    """API endpoint with the bytes freed and entries remaining of the trash purge."""
+    return jsonify(get_trash_status())
+
+@app.route('/clear_trash/cancel', methods=['POST'])
+def cancel_clear_trash():
+    """API endpoint to stop emptying the trash."""
+    if trash_purge is None or not trash_purge.running:
+        return jsonify({'status': 'error', 'message': 'The trash is not being emptied'}), 400
+    trash_purge.cancel()
+    return jsonify({'status': 'success', 'message': 'Stopping the trash purge...'})
+
+@app.route('/storage', methods=['GET'])
+def storage():
+    """
+    API endpoint with the size of the workspace directories.
+    
+    Optional ?path= lists the subdirectories and files of an indexed directory, largest first.
+    """
+    storage_index.start(STORAGE_INDEX_INTERVAL)
+    result = storage_index.summary()
+    path = request.args.get('path')
+    if path:
+        children = storage_index.children(path)
+        if children is None:
+            return jsonify({'status': 'error', 'message': f'{path} is not indexed'}), 404
+        result['path'] = path
+        result['children'] = children
+    return jsonify(result)
+
+@app.route('/storage/largest', methods=['GET'])
+def storage_largest():
+    """API endpoint with the largest files of the workspace (?limit=, default 50)."""
+    storage_index.start(STORAGE_INDEX_INTERVAL)
+    try:
+        limit = max(1, int(request.args.get('limit', 50)))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'limit must be a number'}), 400
+    return jsonify({'files': storage_index.largest_files(limit), 'refreshed_at': storage_index.refreshed_at})
+
+@app.route('/storage/duplicates', methods=['GET'])
+def storage_duplicates():
+    """API endpoint with groups of identical files found by the last index refresh."""
+    storage_index.start(STORAGE_INDEX_INTERVAL)
+    groups = storage_index.duplicate_groups
+    return jsonify({
+        'groups': groups,
+        'reclaimable_bytes': sum(group['reclaimable'] for group in groups),
+        'refreshed_at': storage_index.refreshed_at
+    })
+
+@app.route('/storage/refresh', methods=['POST'])
+def storage_refresh():
+    """API endpoint to refresh the storage index now instead of at the next interval."""
+    storage_index.start(STORAGE_INDEX_INTERVAL)
+    storage_index.request_refresh()
+    return jsonify({'status': 'success', 'message': 'Refreshing the storage index...'})
+
+# -------------------------------------------------------------------------
+# Status Event Stream
+# -------------------------------------------------------------------------
+
+status_events.register('model', get_model_status)
+status_events.register('civitai', get_civitai_status)
+status_events.register('huggingface', get_huggingface_status)
+status_events.register('training_tool', get_training_tool_status)
+status_events.register('service', get_service_status)
+status_events.register('trash', get_trash_status)
+
+@app.route('/events')
+def events():
+    """
+    Server-Sent Events stream of status changes.
+    
+    Sends the full state of every channel once, then only the changed keys.
+    Optional ?channels=model,huggingface limits the stream to some channels.
+    """
+    channels = [c for c in request.args.get('channels', '').split(',') if c] or None
+    response = Response(stream_with_context(status_events.stream(channels)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 if __name__ == '__main__':
     # Validate configuration
     ensure_directories_exist()
+    # Index the scripts once before serving the first page
+    preset_catalog.entries()
+    training_tool_catalog.entries()
+    # Index the workspace in the background
+    storage_index.start(STORAGE_INDEX_INTERVAL)
     app.run(host='0.0.0.0', port=5000) 
\ No newline at end of file
@@ -0,0 +1,509 @@
+"""
+aria2c JSON-RPC Backend
+
+Instead of starting one `stdbuf -oL aria2c ...` process per download and parsing
+its console output, the control panel keeps a single aria2c daemon running with
+--enable-rpc and drives it over JSON-RPC. Progress comes straight from aria2c as
+exact byte counters per GID, and one request is enough to refresh every
+download that is being tracked.
+
+The daemon outlives the control panel process it was started from. Its RPC
+secret is kept in a file, so a restarted control panel adopts the aria2c that
+is still answering on the port instead of starting a second one that cannot
+bind it.
+"""
+
+import json
+import os
+import re
+import secrets
+import shlex
+import signal
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from service_supervisor import port_owners, wait_for_exit
+
+# Short aria2c options used by the preset scripts and their long names
+SHORT_OPTIONS = {
+    '-d': 'dir',
+    '-o': 'out',
+    '-x': 'max-connection-per-server',
+    '-s': 'split',
+    '-k': 'min-split-size',
+    '-j': 'max-concurrent-downloads',
+    '-c': 'continue',
+}
+
+# Options that take no value on the command line
+FLAG_OPTIONS = {'-c': 'true', '--continue': 'true'}
+
+# Options aria2c accepts several times
+MULTI_OPTIONS = ('header',)
+
+# A bare URI argument (header values like "Referer: https://..." are not)
+URI_PATTERN = re.compile(r'^[A-Za-z][A-Za-z0-9+.-]*://')
+
+# aria2c exit/error code for "file already exists"
+FILE_EXISTS_ERROR = '13'
+
+STATUS_KEYS = ['gid', 'status', 'totalLength', 'completedLength', 'downloadSpeed',
+               'connections', 'errorCode', 'errorMessage', 'files']
+
+
+class Aria2RPCError(Exception):
+    """Raised when aria2c returns a JSON-RPC error or cannot be reached."""
+
+
+def aria2c_command_to_options(cmd):
+    """
+    Convert an aria2c command line into the URIs and options for aria2.addUri.
+
+    Args:
+        cmd: aria2c command string as found in the preset scripts
+
+    Returns:
+        tuple: (uris, options) where options maps long option names to values
+    """
+    return aria2c_args_to_options(shlex.split(cmd))
+
+
+def aria2c_args_to_options(tokens):
+    """
+    Convert already tokenized aria2c arguments into URIs and aria2.addUri options.
+
+    Args:
+        tokens: Argument list, with or without the leading aria2c
+
+    Returns:
+        tuple: (uris, options) where options maps long option names to values
+    """
+    tokens = list(tokens)
+    if tokens and os.path.basename(tokens[0]) == 'aria2c':
+        tokens = tokens[1:]
+
+    uris = []
+    options = {}
+
+    def set_option(name, value):
+        if name in MULTI_OPTIONS:
+            options.setdefault(name, []).append(value)
+        else:
+            options[name] = value
+
+    def takes_value(i):
+        # A long option without "=" takes the next token unless that is another option or a URI
+        return i + 1 < len(tokens) and not tokens[i + 1].startswith('-') and not URI_PATTERN.match(tokens[i + 1])
+
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token in FLAG_OPTIONS:
+            set_option(SHORT_OPTIONS.get(token, token[2:]), FLAG_OPTIONS[token])
+        elif token.startswith('--'):
+            if '=' in token:
+                name, value = token[2:].split('=', 1)
+            elif takes_value(i):
+                name, value = token[2:], tokens[i + 1]
+                i += 1
+            else:
+                name, value = token[2:], 'true'
+            set_option(name, value)
+        elif token in SHORT_OPTIONS and i + 1 < len(tokens):
+            set_option(SHORT_OPTIONS[token], tokens[i + 1])
+            i += 1
+        elif token[:2] in SHORT_OPTIONS and len(token) > 2:
+            # -x16 style
+            set_option(SHORT_OPTIONS[token[:2]], token[2:])
+        elif URI_PATTERN.match(token):
+            uris.append(token)
+        i += 1
+
+    return uris, options
+
+
+class Aria2RPC:
+    """
+    Minimal client for the aria2c JSON-RPC interface.
+
+    Args:
+        url: RPC endpoint, e.g. http://127.0.0.1:6800/jsonrpc
+        secret: Value of --rpc-secret, or None
+        timeout: HTTP timeout in seconds
+        on_failure: Optional callable, called when aria2c cannot be reached or
+            rejects the secret
+    """
+
+    def __init__(self, url='http://127.0.0.1:6800/jsonrpc', secret=None, timeout=5, on_failure=None):
+        self.url = url
+        self.secret = secret
+        self.timeout = timeout
+        self.on_failure = on_failure
+        self._ids = 0
+        self._lock = threading.Lock()
+
+    def _next_id(self):
+        with self._lock:
+            self._ids += 1
+            return str(self._ids)
+
+    def _params(self, params):
+        params = list(params)
+        if self.secret:
+            params.insert(0, f"token:{self.secret}")
+        return params
+
+    def _post(self, payload):
+        data = json.dumps(payload).encode('utf-8')
+        req = urllib.request.Request(self.url, data=data, headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                return json.loads(response.read().decode('utf-8'))
+        except urllib.error.HTTPError as e:
+            # aria2c answers RPC errors with HTTP 400 and a JSON body
+            try:
+                return json.loads(e.read().decode('utf-8'))
+            except Exception:
+                raise Aria2RPCError(f"HTTP {e.code} from aria2c")
+        except (urllib.error.URLError, OSError) as e:
+            if self.on_failure:
+                self.on_failure()
+            raise Aria2RPCError(f"Cannot reach aria2c at {self.url}: {e}")
+
+    def call(self, method, *params):
+        """Call a single RPC method and return its result."""
+        response = self._post({
+            'jsonrpc': '2.0',
+            'id': self._next_id(),
+            'method': method,
+            # system.multicall carries the token inside every sub call instead
+            'params': list(params) if method.startswith('system.') else self._params(params)
+        })
+        if 'error' in response:
+            message = response['error'].get('message', str(response['error']))
+            if message == 'Unauthorized' and self.on_failure:
+                self.on_failure()
+            raise Aria2RPCError(message)
+        return response.get('result')
+
+    def multicall(self, calls):
+        """
+        Run several calls in one HTTP request.
+
+        Args:
+            calls: List of (method, params) tuples
+
+        Returns:
+            list: One entry per call, either the result or an Aria2RPCError
+        """
+        if not calls:
+            return []
+        methods = [{'methodName': method, 'params': self._params(params)} for method, params in calls]
+        results = self.call('system.multicall', methods)
+        return [
+            Aria2RPCError(result.get('message', str(result))) if isinstance(result, dict) else result[0]
+            for result in results
+        ]
+
+    # Convenience wrappers -------------------------------------------------
+
+    def get_version(self):
+        return self.call('aria2.getVersion')
+
+    def add_uri(self, uris, options=None):
+        return self.call('aria2.addUri', list(uris), options or {})
+
+    def tell_status(self, gid, keys=None):
+        return self.call('aria2.tellStatus', gid, keys or STATUS_KEYS)
+
+    def tell_active(self, keys=None):
+        return self.call('aria2.tellActive', keys or STATUS_KEYS)
+
+    def pause(self, gid):
+        return self.call('aria2.pause', gid)
+
+    def unpause(self, gid):
+        return self.call('aria2.unpause', gid)
+
+    def remove(self, gid):
+        return self.call('aria2.remove', gid)
+
+    def force_remove(self, gid):
+        return self.call('aria2.forceRemove', gid)
+
+    def remove_download_result(self, gid):
+        return self.call('aria2.removeDownloadResult', gid)
+
+    def get_global_stat(self):
+        return self.call('aria2.getGlobalStat')
+
+    def change_option(self, gid, options):
+        return self.call('aria2.changeOption', gid, options)
+
+    def change_global_option(self, options):
+        return self.call('aria2.changeGlobalOption', options)
+
+
+class Aria2Daemon:
+    """
+    Owns the aria2c process that serves JSON-RPC for the control panel.
+
+    The daemon is only probed when it was not seen answering yet or an RPC call
+    failed since, not on every call.
+
+    Args:
+        port: RPC listen port
+        secret: RPC secret, read from (or generated into) secret_path when None
+        executable: aria2c binary
+        log_path: File receiving aria2c console output
+        max_concurrent_downloads: aria2c -j value, concurrency is limited by the scheduler
+        secret_path: File keeping the generated secret across restarts, None to keep it in memory only
+        proc_root: Mount point of procfs, used to find an aria2c holding the port
+    """
+
+    def __init__(self, port=6800, secret=None, executable='aria2c', log_path='/tmp/aria2c_rpc.log',
+                 max_concurrent_downloads=16, secret_path=None, proc_root='/proc'):
+        self.port = port
+        self.secret = secret or load_secret(secret_path)
+        self.executable = executable
+        self.log_path = log_path
+        self.max_concurrent_downloads = max_concurrent_downloads
+        self.proc_root = proc_root
+        self.process = None
+        # aria2c answered and no call failed since
+        self.healthy = False
+        self._lock = threading.Lock()
+        self.rpc = Aria2RPC(f"http://127.0.0.1:{port}/jsonrpc", self.secret, on_failure=self._lost)
+
+    def _lost(self):
+        self.healthy = False
+
+    def is_running(self):
+        try:
+            self.rpc.get_version()
+            return True
+        except Aria2RPCError:
+            return False
+
+    def ensure_running(self, timeout=10):
+        """
+        Return the RPC client, adopting or starting aria2c when it is not known to answer.
+
+        Returns:
+            Aria2RPC: Client connected to the daemon
+        """
+        with self._lock:
+            if self.healthy and (self.process is None or self.process.poll() is None):
+                return self.rpc
+            if self.is_running():
+                if self.process is None or self.process.poll() is not None:
+                    print(f"DEBUG: Using the aria2c RPC daemon already running on port {self.port}")
+                    self.process = None
+                self.healthy = True
+                return self.rpc
+
+            self._replace_stale()
+            cmd = [
+                self.executable,
+                '--enable-rpc=true',
+                '--rpc-listen-all=false',
+                f'--rpc-listen-port={self.port}',
+                f'--rpc-secret={self.secret}',
+                f'--max-concurrent-downloads={self.max_concurrent_downloads}',
+                '--auto-file-renaming=false',
+                '--summary-interval=0',
+                '--console-log-level=warn',
+            ]
+            print(f"DEBUG: Starting aria2c RPC daemon on port {self.port}")
+            try:
+                with open(self.log_path, 'a') as log_file:
+                    self.process = subprocess.Popen(
+                        cmd,
+                        stdout=log_file,
+                        stderr=subprocess.STDOUT,
+                        preexec_fn=os.setsid  # Keep it out of the control panel's process group
+                    )
+            except OSError as e:
+                raise Aria2RPCError(f"Cannot start aria2c: {e}")
+
+            deadline = time.time() + timeout
+            while time.time() < deadline:
+                if self.process.poll() is not None:
+                    raise Aria2RPCError(f"aria2c exited with code {self.process.returncode}, see {self.log_path}")
+                if self.is_running():
+                    self.healthy = True
+                    return self.rpc
+                time.sleep(0.1)
+            raise Aria2RPCError(f"aria2c RPC did not come up on port {self.port}")
+
+    def _replace_stale(self):
+        """
+        Stop an aria2c that holds the port but does not accept the secret.
+
+        Raises:
+            Aria2RPCError: Another program holds the port
+        """
+        stale = []
+        for pid in port_owners(self.port, self.proc_root):
+            try:
+                with open(os.path.join(self.proc_root, str(pid), 'comm')) as f:
+                    name = f.read().strip()
+            except OSError:
+                continue
+            if name != 'aria2c' or pid == os.getpid():
+                raise Aria2RPCError(f"Port {self.port} is used by {name} (PID {pid})")
+            stale.append(pid)
+        if not stale:
+            return
+        print(f"DEBUG: Stopping aria2c {stale} that holds port {self.port} with another secret")
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            for pid in stale:
+                try:
+                    os.kill(pid, sig)
+                except ProcessLookupError:
+                    pass
+            stale = wait_for_exit(stale, 5, self.proc_root)
+            if not stale:
+                return
+        raise Aria2RPCError(f"aria2c {sorted(stale)} holding port {self.port} did not exit")
+
+    def stop(self):
+        """Shut down the daemon this control panel started or adopted."""
+        with self._lock:
+            if not self.process and not self.healthy:
+                return
+            try:
+                self.rpc.call('aria2.shutdown')
+            except Aria2RPCError as e:
+                print(f"DEBUG: Could not shut down aria2c: {e}")
+            if self.process:
+                try:
+                    self.process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    self.process.kill()
+                    self.process.wait()
+            self.process = None
+            self.healthy = False
+
+
+def load_secret(secret_path):
+    """
+    Read the RPC secret from secret_path, generating and saving one when there is none.
+
+    Returns:
+        str: The secret, a fresh one that is not saved when the file cannot be written
+    """
+    if secret_path:
+        try:
+            with open(secret_path) as f:
+                secret = f.read().strip()
+            if secret:
+                return secret
+        except OSError:
+            pass
+    secret = secrets.token_hex(16)
+    if secret_path:
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(secret_path)), exist_ok=True)
+            fd = os.open(secret_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                f.write(secret)
+        except OSError as e:
+            print(f"DEBUG: Could not save the aria2c RPC secret to {secret_path}: {e}")
+    return secret
+
+
+def status_to_progress(status):
+    """
+    Extract byte counters from an aria2.tellStatus result.
+
+    Returns:
+        dict: downloaded, total and speed in bytes plus the aria2c state
+    """
+    return {
+        'state': status.get('status', ''),
+        'downloaded': int(status.get('completedLength', 0) or 0),
+        'total': int(status.get('totalLength', 0) or 0),
+        'speed': int(status.get('downloadSpeed', 0) or 0),
+        'connections': int(status.get('connections', 0) or 0),
+        'error': status.get('errorMessage', ''),
+        'error_code': status.get('errorCode', ''),
+    }
+
+
+class Aria2RPCBackend:
+    """
+    Download scheduler backend that submits every file to the aria2c daemon.
+
+    All active tasks are refreshed with a single system.multicall request.
+
+    Args:
+        rpc: Connected Aria2RPC client
+        extra_options: Options added to every download (e.g. allow-overwrite)
+    """
+
+    def __init__(self, rpc, extra_options=None):
+        self.rpc = rpc
+        self.extra_options = dict(extra_options or {})
+
+    def options_for(self, task):
+        options = dict(task.options)
+        options.update(self.extra_options)
+        if task.directory:
+            options['dir'] = task.directory
+        if task.filename:
+            options['out'] = task.filename
+        options['max-connection-per-server'] = str(task.connections)
+        options['split'] = str(task.connections)
+        headers = list(options.get('header', []))
+        headers.extend(f"{name}: {value}" for name, value in task.headers.items())
+        if headers:
+            options['header'] = headers
+        return options
+
+    def start(self, task):
+        task.handle = self.rpc.add_uri([task.url], self.options_for(task))
+        print(f"DEBUG: Added {task.label} to aria2c as GID {task.handle}")
+
+    def refresh(self, tasks):
+        tasks = [task for task in tasks if task.handle]
+        results = self.rpc.multicall([('aria2.tellStatus', [task.handle, STATUS_KEYS]) for task in tasks])
+        for task, result in zip(tasks, results):
+            if isinstance(result, Aria2RPCError):
+                task.state = 'error'
+                task.error = str(result)
+                continue
+
+            progress = status_to_progress(result)
+            task.downloaded = progress['downloaded']
+            task.total = progress['total'] or task.total
+            task.speed = progress['speed']
+
+            if progress['state'] == 'complete':
+                task.state = 'completed'
+            elif progress['state'] == 'error' and progress['error_code'] == FILE_EXISTS_ERROR:
+                # The file is already on disk and aria2c was told not to overwrite it
+                task.state = 'completed'
+                task.already_existed = True
+            elif progress['state'] == 'error':
+                task.state = 'error'
+                task.error = progress['error'] or f"aria2c error code {progress['error_code']}"
+            elif progress['state'] == 'removed':
+                task.state = 'cancelled'
+
+            if task.state in ('completed', 'error', 'cancelled'):
+                try:
+                    self.rpc.remove_download_result(task.handle)
+                except Aria2RPCError:
+                    pass
+
+    def cancel(self, task):
+        if not task.handle:
+            return
+        try:
+            self.rpc.force_remove(task.handle)
+        except Aria2RPCError as e:
+            print(f"DEBUG: Could not remove GID {task.handle}: {e}")
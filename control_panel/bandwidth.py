@@ -0,0 +1,350 @@
+"""
+Download Bandwidth Budget
+
+All control panel downloads share one budget so that provisioning models does
+not saturate the NIC and the network volume while a training run streams its
+dataset from it. The budget is the lowest of
+
+- a fixed bandwidth limit,
+- a disk-write limit (every downloaded byte is written once, so it caps the
+  download rate as well),
+- the limit of the time-window rule matching the current time, and
+- a lower limit while a training process is running.
+
+0 means unlimited everywhere. The budget is split between the running jobs by
+priority and inside a job evenly between its active files. A governor thread
+applies it to aria2c (max-overall-download-limit and max-download-limit per
+GID) every few seconds and measures the real throughput with one
+aria2.tellActive call.
+
+Time-window rules are written as "HH:MM-HH:MM=RATE" separated by ";", e.g.
+"08:00-20:00=20MiB;20:00-08:00=0". Rates accept aria2c style sizes with an
+optional "/s" ("50MiB", "50M", "6.5MB/s").
+"""
+
+import os
+import threading
+import time
+
+from download_scheduler import SIZE_UNITS, format_size
+
+# Share of the budget a job gets relative to the others
+PRIORITY_WEIGHTS = {'low': 1, 'normal': 2, 'high': 4}
+DEFAULT_PRIORITY = 'normal'
+
+# Command line fragments of the training processes (diffusion-pipe, kohya sd-scripts, fluxgym)
+TRAINING_PROCESS_PATTERNS = ('train.py --deepspeed', 'train_network.py', 'flux_train', 'sdxl_train')
+
+# Weight of the newest sample in the measured throughput
+THROUGHPUT_SMOOTHING = 0.3
+
+
+def parse_rate(value):
+    """
+    Convert a rate like "50MiB", "50M" or "6.5MB/s" to bytes per second.
+
+    Returns:
+        int: Bytes per second, 0 (unlimited) for empty values
+
+    Raises:
+        ValueError: The rate cannot be parsed
+    """
+    text = str(value or '').strip()
+    if text.endswith('/s'):
+        text = text[:-2].strip()
+    if not text:
+        return 0
+    number = text.rstrip('KMGTiB')
+    unit = text[len(number):]
+    if unit in ('K', 'M', 'G', 'T'):
+        unit += 'iB'
+    if unit not in SIZE_UNITS:
+        raise ValueError(f"Invalid rate: {value}")
+    try:
+        return int(float(number) * SIZE_UNITS[unit])
+    except ValueError:
+        raise ValueError(f"Invalid rate: {value}")
+
+
+def parse_clock(text):
+    """Minutes since midnight of "HH:MM"."""
+    hours, minutes = text.strip().split(':')
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(f"Invalid time: {text}")
+    return hours * 60 + minutes
+
+
+class TimeWindowRule:
+    """
+    Bandwidth limit applying between two times of day, wrapping around midnight.
+
+    Args:
+        start: Minutes since midnight the window opens
+        end: Minutes since midnight the window closes
+        limit: Bytes per second, 0 for unlimited
+    """
+
+    def __init__(self, start, end, limit):
+        self.start = start
+        self.end = end
+        self.limit = limit
+
+    @classmethod
+    def parse(cls, text):
+        """Parse "HH:MM-HH:MM=RATE"."""
+        window, _, rate = text.partition('=')
+        start, _, end = window.partition('-')
+        if not rate or not end:
+            raise ValueError(f"Invalid time window rule: {text}")
+        return cls(parse_clock(start), parse_clock(end), parse_rate(rate))
+
+    def matches(self, minute):
+        if self.start <= self.end:
+            return self.start <= minute < self.end
+        return minute >= self.start or minute < self.end
+
+    def __str__(self):
+        return (f"{self.start // 60:02d}:{self.start % 60:02d}-{self.end // 60:02d}:{self.end % 60:02d}"
+                f"={format_size(self.limit) + '/s' if self.limit else 'unlimited'}")
+
+
+def parse_rules(text):
+    """Parse ";" separated time window rules, skipping invalid ones."""
+    rules = []
+    for part in (text or '').split(';'):
+        if not part.strip():
+            continue
+        try:
+            rules.append(TimeWindowRule.parse(part))
+        except ValueError as e:
+            print(f"Warning: Ignoring bandwidth rule: {e}")
+    return rules
+
+
+def training_running(patterns=TRAINING_PROCESS_PATTERNS, proc_dir='/proc'):
+    """Whether a process whose command line contains one of patterns is running."""
+    try:
+        pids = [entry for entry in os.listdir(proc_dir) if entry.isdigit()]
+    except OSError:
+        return False
+    for pid in pids:
+        try:
+            with open(os.path.join(proc_dir, pid, 'cmdline'), 'rb') as f:
+                cmdline = f.read().replace(b'\0', b' ').decode('utf-8', 'replace')
+        except OSError:
+            continue
+        if any(pattern in cmdline for pattern in patterns):
+            return True
+    return False
+
+
+class BandwidthBudget:
+    """
+    Download rate limit shared by all jobs.
+
+    Args:
+        limit: Bandwidth limit in bytes per second (0 for unlimited)
+        disk_write_limit: Disk-write limit in bytes per second (0 for unlimited)
+        training_limit: Limit while training runs (0 for no back-off)
+        rules: List of TimeWindowRule, the first matching one applies
+        training_check: Callable returning whether training is running
+        training_check_interval: Seconds the result of training_check is reused
+    """
+
+    def __init__(self, limit=0, disk_write_limit=0, training_limit=0, rules=None,
+                 training_check=training_running, training_check_interval=10.0):
+        self.limit = limit
+        self.disk_write_limit = disk_write_limit
+        self.training_limit = training_limit
+        self.rules = list(rules or [])
+        self.training_check = training_check
+        self.training_check_interval = training_check_interval
+
+        self._lock = threading.Lock()
+        self._training = False
+        self._training_checked_at = None
+        self.throughput = 0.0
+        self.job_throughput = {}
+
+    def is_training(self, now=None):
+        now = time.time() if now is None else now
+        if (self._training_checked_at is None
+                or now - self._training_checked_at >= self.training_check_interval):
+            self._training = bool(self.training_check())
+            self._training_checked_at = now
+        return self._training
+
+    def current_limit(self, now=None):
+        """
+        Limit in force right now.
+
+        Returns:
+            tuple: (bytes per second or 0 for unlimited, list of reasons)
+        """
+        now = time.time() if now is None else now
+        local = time.localtime(now)
+        minute = local.tm_hour * 60 + local.tm_min
+
+        limits = []
+        if self.limit:
+            limits.append((self.limit, "bandwidth limit"))
+        if self.disk_write_limit:
+            limits.append((self.disk_write_limit, "disk-write limit"))
+        rule = next((rule for rule in self.rules if rule.matches(minute)), None)
+        if rule and rule.limit:
+            limits.append((rule.limit, f"time window {rule}"))
+        if self.training_limit and self.is_training(now):
+            limits.append((self.training_limit, "training is running"))
+
+        if not limits:
+            return 0, []
+        lowest = min(limit for limit, _ in limits)
+        return lowest, [reason for limit, reason in limits if limit == lowest]
+
+    def allocate(self, jobs, now=None):
+        """
+        Split the current limit between jobs by priority.
+
+        Args:
+            jobs: Dict of job id -> priority name
+
+        Returns:
+            dict: job id -> bytes per second (0 for unlimited)
+        """
+        total, _ = self.current_limit(now)
+        if not total:
+            return {job_id: 0 for job_id in jobs}
+        weights = {job_id: PRIORITY_WEIGHTS.get(priority, PRIORITY_WEIGHTS[DEFAULT_PRIORITY])
+                   for job_id, priority in jobs.items()}
+        weight_sum = sum(weights.values()) or 1
+        return {job_id: max(1, int(total * weight / weight_sum)) for job_id, weight in weights.items()}
+
+    def measure(self, job_speeds):
+        """Fold one sample of per-job download speeds into the measured throughput."""
+        with self._lock:
+            total = sum(job_speeds.values())
+            self.throughput += THROUGHPUT_SMOOTHING * (total - self.throughput)
+            measured = {}
+            for job_id, speed in job_speeds.items():
+                previous = self.job_throughput.get(job_id, speed)
+                measured[job_id] = previous + THROUGHPUT_SMOOTHING * (speed - previous)
+            self.job_throughput = measured
+
+    def reset_throughput(self):
+        with self._lock:
+            self.throughput = 0.0
+            self.job_throughput = {}
+
+    def stats(self, now=None):
+        """Limit, why it applies and the measured throughput, for the status API."""
+        limit, reasons = self.current_limit(now)
+        with self._lock:
+            throughput = self.throughput
+            jobs = dict(self.job_throughput)
+        return {
+            "limit_bytes": limit,
+            "limit": format_size(limit) + "/s" if limit else "unlimited",
+            "reasons": reasons,
+            "training": self._training,
+            "throughput_bytes": int(throughput),
+            "throughput": format_size(int(throughput)) + "/s",
+            "jobs": {job_id: int(speed) for job_id, speed in jobs.items()},
+            "rules": [str(rule) for rule in self.rules],
+        }
+
+
+class BandwidthGovernor:
+    """
+    Apply a BandwidthBudget to the downloads in aria2c.
+
+    Args:
+        budget: BandwidthBudget
+        get_rpc: Callable returning the Aria2RPC client
+        get_jobs: Callable returning the running jobs as (job id, priority, GIDs) tuples
+        interval: Seconds between two adjustments
+    """
+
+    def __init__(self, budget, get_rpc, get_jobs, interval=2.0):
+        self.budget = budget
+        self.get_rpc = get_rpc
+        self.get_jobs = get_jobs
+        self.interval = interval
+
+        self._applied = {}
+        self._overall = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def tick(self, now=None, jobs=None):
+        """
+        Measure the throughput and update the aria2c limits once.
+
+        Args:
+            now: Time the rules are evaluated at, None for now
+            jobs: Running jobs, read from get_jobs when None
+
+        Returns:
+            bool: Whether any job is running
+        """
+        if jobs is None:
+            jobs = self.get_jobs()
+        if not jobs:
+            return False
+        rpc = self.get_rpc()
+        speeds = {}
+        for status in rpc.tell_active(['gid', 'downloadSpeed']):
+            speeds[status['gid']] = int(status.get('downloadSpeed', 0))
+        self.budget.measure({job_id: sum(speeds.get(gid, 0) for gid in gids) for job_id, _, gids in jobs})
+
+        allocation = self.budget.allocate({job_id: priority for job_id, priority, _ in jobs}, now)
+        overall = self.budget.current_limit(now)[0]
+        if overall != self._overall:
+            rpc.change_global_option({'max-overall-download-limit': str(overall)})
+            self._overall = overall
+
+        applied = {}
+        for job_id, _, gids in jobs:
+            gids = [gid for gid in gids if gid in speeds]
+            for gid in gids:
+                limit = allocation[job_id] // len(gids) if allocation[job_id] else 0
+                applied[gid] = limit
+                if self._applied.get(gid) != limit:
+                    rpc.change_option(gid, {'max-download-limit': str(limit)})
+        self._applied = applied
+        return True
+
+    def _jobs(self):
+        try:
+            return self.get_jobs()
+        except Exception as e:
+            print(f"DEBUG: Error listing the downloads for the bandwidth budget: {e}")
+            return []
+
+    def _run(self):
+        while True:
+            jobs = self._jobs()
+            if jobs:
+                # A failing aria2c only skips this adjustment, the job list decides when to stop
+                try:
+                    self.tick(jobs=jobs)
+                except Exception as e:
+                    print(f"DEBUG: Error applying the download bandwidth budget: {e}")
+                time.sleep(self.interval)
+                continue
+            with self._lock:
+                # A job created since the list was read found this thread still set
+                if self._jobs():
+                    continue
+                self._thread = None
+            self._applied = {}
+            self._overall = None
+            self.budget.reset_throughput()
+            return
+
+    def ensure_running(self):
+        """Start the governor thread if it is not running; it stops when no job is left."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
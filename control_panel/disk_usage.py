@@ -0,0 +1,437 @@
+"""
+Disk Usage Index
+
+Keeps the size of every directory under the workspace roots (models, training
+models, datasets, configs, LoRA outputs) so that the control panel can show
+where the space went and refuse a download that will not fit, instead of
+aria2c failing halfway through a 28 GB checkpoint.
+
+The roots are walked with os.scandir and every directory is recorded with its
+mtime and its files (size, allocated blocks, mtime, inode). A refresh stats each
+directory once and lists it again only if its mtime changed, i.e. entries were
+added, removed or renamed; unchanged directories keep their recorded files.
+Sizes of files that grow in place without a rename are picked up when their
+directory changes next. Hard links (the model store links files shared by
+presets) are counted once.
+
+Duplicates are found in three steps: files of the same size, then the same
+hash of their first and last MiB, then the same SHA256. Full hashes are
+recorded with the file and reused until its size or mtime changes.
+"""
+
+import hashlib
+import heapq
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from model_store import sha256_file
+
+# Bytes hashed at the start and the end of a file before hashing all of it
+SAMPLE_SIZE = 1 << 20
+
+# Files smaller than this are not checked for duplicates
+DUPLICATE_MIN_SIZE = 1 << 20
+
+# Positions in the recorded file entries
+SIZE, BLOCKS, MTIME, DEV, INO, SHA256 = range(6)
+
+
+def existing_parent(path):
+    """The path itself or its closest ancestor that exists."""
+    path = os.path.abspath(str(path))
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def check_space(requirements, reserve=0):
+    """
+    Check that downloads fit on their filesystems.
+
+    Args:
+        requirements: Iterable of (target directory, bytes still to write)
+        reserve: Bytes to keep free on every filesystem
+
+    Returns:
+        list: One dict per filesystem that is too small, with path, needed and free bytes
+    """
+    filesystems = {}
+    for directory, needed in requirements:
+        if needed <= 0:
+            continue
+        path = existing_parent(directory)
+        device = os.stat(path).st_dev
+        entry = filesystems.setdefault(device, {"path": path, "needed": 0})
+        entry["needed"] += needed
+    shortfalls = []
+    for entry in filesystems.values():
+        free = shutil.disk_usage(entry["path"]).free
+        if entry["needed"] + reserve > free:
+            shortfalls.append(dict(entry, free=free))
+    return shortfalls
+
+
+def sample_hash(path, size, sample_size=SAMPLE_SIZE):
+    """Hash of the size, the first and the last sample_size bytes of a file."""
+    digest = hashlib.sha256(str(size).encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(sample_size))
+        if size > sample_size:
+            f.seek(max(sample_size, size - sample_size))
+            digest.update(f.read(sample_size))
+    return digest.hexdigest()
+
+
+class DiskUsageIndex:
+    """
+    Incrementally refreshed index of the files under some roots.
+
+    Args:
+        roots: Directories to index
+        record_path: JSON file the index is kept in between restarts, None for memory only
+        hash_workers: Files hashed in parallel when looking for duplicates
+        duplicate_min_size: Smallest file checked for duplicates
+    """
+
+    def __init__(self, roots, record_path=None, hash_workers=2, duplicate_min_size=DUPLICATE_MIN_SIZE):
+        self.roots = [os.path.abspath(str(root)) for root in roots]
+        self.record_path = str(record_path) if record_path else None
+        self.hash_workers = max(1, int(hash_workers))
+        self.duplicate_min_size = duplicate_min_size
+
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        # directory -> {"mtime_ns", "dirs": [names], "files": {name: [size, blocks, mtime_ns, dev, ino, sha256]}}
+        self.dirs = {}
+        # directory -> (bytes, files) including subdirectories
+        self.totals = {}
+        self.duplicate_groups = []
+        self.refreshed_at = None
+        self.last_refresh = {}
+
+        self._thread = None
+        self._wakeup = threading.Event()
+        self.load()
+
+    # ------------------------------------------------------------------
+    # Record
+    # ------------------------------------------------------------------
+
+    def load(self):
+        if not self.record_path:
+            return
+        try:
+            with open(self.record_path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"DEBUG: Ignoring unreadable disk usage index {self.record_path}: {e}")
+            return
+        with self._lock:
+            self.dirs = data.get('dirs', {})
+            self._compute_totals()
+
+    def save(self):
+        if not self.record_path:
+            return
+        with self._lock:
+            data = json.dumps({'dirs': self.dirs})
+        os.makedirs(os.path.dirname(self.record_path) or '.', exist_ok=True)
+        tmp_path = f"{self.record_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, self.record_path)
+
+    # ------------------------------------------------------------------
+    # Walk
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _scan(path, mtime_ns, previous):
+        """List a directory, keeping the hashes of files that did not change."""
+        old_files = (previous or {}).get('files', {})
+        files = {}
+        dirs = []
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.append(entry.name)
+                        continue
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                old = old_files.get(entry.name)
+                sha256 = old[SHA256] if old and old[SIZE] == stat.st_size and old[MTIME] == stat.st_mtime_ns else None
+                files[entry.name] = [stat.st_size, stat.st_blocks * 512, stat.st_mtime_ns,
+                                     stat.st_dev, stat.st_ino, sha256]
+        return {'mtime_ns': mtime_ns, 'dirs': sorted(dirs), 'files': files}
+
+    def refresh(self):
+        """
+        Bring the index up to date, listing only directories whose mtime changed.
+
+        Returns:
+            dict: Directories listed and reused, and the seconds it took
+        """
+        with self._refresh_lock:
+            started = time.monotonic()
+            listed = reused = 0
+            seen = set()
+            stack = list(reversed(self.roots))
+            while stack:
+                path = stack.pop()
+                if path in seen:
+                    continue
+                try:
+                    mtime_ns = os.stat(path).st_mtime_ns
+                except OSError:
+                    continue
+                seen.add(path)
+                with self._lock:
+                    record = self.dirs.get(path)
+                if record and record['mtime_ns'] == mtime_ns:
+                    reused += 1
+                else:
+                    try:
+                        record = self._scan(path, mtime_ns, record)
+                    except OSError as e:
+                        print(f"DEBUG: Cannot index {path}: {e}")
+                        continue
+                    listed += 1
+                    with self._lock:
+                        self.dirs[path] = record
+                stack.extend(os.path.join(path, name) for name in reversed(record['dirs']))
+
+            with self._lock:
+                # Directories that were removed since the last refresh
+                for path in [path for path in self.dirs if path not in seen]:
+                    del self.dirs[path]
+                self._compute_totals()
+                self.refreshed_at = time.time()
+                self.last_refresh = {
+                    "listed_dirs": listed,
+                    "reused_dirs": reused,
+                    "seconds": round(time.monotonic() - started, 3),
+                }
+            try:
+                self.save()
+            except OSError as e:
+                print(f"DEBUG: Could not save disk usage index: {e}")
+            return dict(self.last_refresh)
+
+    def _compute_totals(self):
+        """Sizes including subdirectories, counting every inode once."""
+        seen = set()
+        own = {}
+        for path in sorted(self.dirs):
+            size = count = 0
+            for entry in self.dirs[path]['files'].values():
+                inode = (entry[DEV], entry[INO])
+                if inode in seen:
+                    continue
+                seen.add(inode)
+                size += entry[BLOCKS]
+                count += 1
+            own[path] = (size, count)
+        totals = {}
+        # Children before their parents
+        for path in sorted(self.dirs, key=lambda p: p.count(os.sep), reverse=True):
+            size, count = own[path]
+            for name in self.dirs[path]['dirs']:
+                child = totals.get(os.path.join(path, name))
+                if child:
+                    size += child[0]
+                    count += child[1]
+            totals[path] = (size, count)
+        self.totals = totals
+
+    def _files(self):
+        with self._lock:
+            return [(os.path.join(path, name), entry)
+                    for path, record in self.dirs.items()
+                    for name, entry in record['files'].items()]
+
+    # ------------------------------------------------------------------
+    # Views
+    # ------------------------------------------------------------------
+
+    def summary(self):
+        """Size of each root, the space left on its filesystem and the last refresh."""
+        roots = []
+        for root in self.roots:
+            with self._lock:
+                size, count = self.totals.get(root, (0, 0))
+            entry = {"path": root, "bytes": size, "files": count, "indexed": root in self.totals}
+            try:
+                usage = shutil.disk_usage(existing_parent(root))
+                entry.update(free=usage.free, capacity=usage.total)
+            except OSError:
+                pass
+            roots.append(entry)
+        with self._lock:
+            reclaimable = sum(group["reclaimable"] for group in self.duplicate_groups)
+            return {
+                "roots": roots,
+                "refreshed_at": self.refreshed_at,
+                "last_refresh": dict(self.last_refresh),
+                "duplicate_groups": len(self.duplicate_groups),
+                "reclaimable_bytes": reclaimable,
+            }
+
+    def children(self, path):
+        """
+        Sizes of the subdirectories and files of an indexed directory, largest first.
+
+        Returns:
+            list: Dicts with path, bytes, files and whether the entry is a directory,
+            None if the directory is not indexed
+        """
+        path = os.path.abspath(str(path))
+        with self._lock:
+            record = self.dirs.get(path)
+            if record is None:
+                return None
+            entries = []
+            for name in record['dirs']:
+                size, count = self.totals.get(os.path.join(path, name), (0, 0))
+                entries.append({"path": os.path.join(path, name), "bytes": size, "files": count, "dir": True})
+            for name, entry in record['files'].items():
+                entries.append({"path": os.path.join(path, name), "bytes": entry[BLOCKS], "files": 1, "dir": False})
+        return sorted(entries, key=lambda entry: entry["bytes"], reverse=True)
+
+    def largest_files(self, limit=50):
+        """
+        The largest files, hard links of the same file listed together.
+
+        Returns:
+            list: Dicts with path, bytes, mtime and the other links of the file
+        """
+        inodes = {}
+        for path, entry in self._files():
+            inodes.setdefault((entry[DEV], entry[INO]), []).append((path, entry))
+        largest = heapq.nlargest(limit, inodes.values(), key=lambda links: links[0][1][SIZE])
+        result = []
+        for links in largest:
+            links.sort()
+            path, entry = links[0]
+            result.append({
+                "path": path,
+                "bytes": entry[SIZE],
+                "mtime": entry[MTIME] / 1e9,
+                "links": [link for link, _ in links[1:]],
+            })
+        return result
+
+    # ------------------------------------------------------------------
+    # Duplicates
+    # ------------------------------------------------------------------
+
+    def _set_hash(self, path, entry, sha256):
+        directory, name = os.path.split(path)
+        with self._lock:
+            current = self.dirs.get(directory, {}).get('files', {}).get(name)
+            if current and current[SIZE] == entry[SIZE] and current[MTIME] == entry[MTIME]:
+                current[SHA256] = sha256
+
+    def find_duplicates(self):
+        """
+        Group the indexed files with identical content.
+
+        Returns:
+            list: Dicts with bytes, sha256, paths and the bytes reclaimable by
+            keeping only one copy, most reclaimable first
+        """
+        by_size = {}
+        for path, entry in self._files():
+            if entry[SIZE] >= self.duplicate_min_size:
+                # Hard links of one file are one candidate
+                by_size.setdefault(entry[SIZE], {}).setdefault((entry[DEV], entry[INO]), (path, entry))
+        candidates = [list(inodes.values()) for inodes in by_size.values() if len(inodes) > 1]
+
+        # Files are always bucketed by their sample, also when the full hash
+        # is cached, so files with and without a cached hash meet
+        def sample(item):
+            path, entry = item
+            try:
+                return item, sample_hash(path, entry[SIZE])
+            except OSError:
+                return item, None
+
+        def full(item):
+            path, entry = item
+            if entry[SHA256]:
+                return item, entry[SHA256]
+            try:
+                sha256 = sha256_file(path)
+            except OSError:
+                return item, None
+            self._set_hash(path, entry, sha256)
+            return item, sha256
+
+        groups = []
+        with ThreadPoolExecutor(max_workers=self.hash_workers) as pool:
+            for same_size in candidates:
+                by_sample = {}
+                for item, digest in pool.map(sample, same_size):
+                    if digest:
+                        by_sample.setdefault(digest, []).append(item)
+                for same_sample in by_sample.values():
+                    if len(same_sample) < 2:
+                        continue
+                    by_hash = {}
+                    for item, sha256 in pool.map(full, same_sample):
+                        if sha256:
+                            by_hash.setdefault(sha256, []).append(item[0])
+                    for sha256, paths in by_hash.items():
+                        if len(paths) > 1:
+                            size = same_size[0][1][SIZE]
+                            groups.append({
+                                "bytes": size,
+                                "sha256": sha256,
+                                "paths": sorted(paths),
+                                "reclaimable": size * (len(paths) - 1),
+                            })
+        groups.sort(key=lambda group: group["reclaimable"], reverse=True)
+        with self._lock:
+            self.duplicate_groups = groups
+        try:
+            self.save()
+        except OSError as e:
+            print(f"DEBUG: Could not save disk usage index: {e}")
+        return groups
+
+    # ------------------------------------------------------------------
+    # Background indexer
+    # ------------------------------------------------------------------
+
+    def _run(self, interval):
+        while True:
+            try:
+                self.refresh()
+                self.find_duplicates()
+            except Exception as e:
+                print(f"DEBUG: Error indexing disk usage: {e}")
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+
+    def start(self, interval=300.0):
+        """Refresh the index every interval seconds in a background thread."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+                self._thread.start()
+
+    def request_refresh(self):
+        """Wake the background thread for a refresh now."""
+        self._wakeup.set()
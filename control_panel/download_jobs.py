@@ -0,0 +1,176 @@
+"""
+Download Jobs
+
+Every download the control panel starts (a CivitAI file, a HuggingFace file, a
+set of presets) is a job in a JobRegistry: it gets an id, its own status dict,
+the handle of whatever does the work (an aria2c GID or a DownloadScheduler) and
+a cancel token. Starting a second download no longer overwrites the state of
+the first one, and each job can be followed and stopped on its own.
+
+The registry caps the number of jobs running at the same time and keeps the
+most recent finished jobs so that their final status can still be read.
+"""
+
+import itertools
+import threading
+import time
+
+ACTIVE_STATES = ('queued', 'downloading')
+
+# Priorities of a job's share of the download bandwidth (see bandwidth.py)
+PRIORITIES = ('low', 'normal', 'high')
+
+# Status every job starts with, the keys the download pages expect
+IDLE_STATUS = {
+    "status": "idle",
+    "message": "",
+    "progress": 0,
+    "downloaded": "0B",
+    "total": "0B",
+    "speed": "0B/s",
+    "eta": "Unknown",
+}
+
+
+class JobLimitError(Exception):
+    """Raised when a job is created while the maximum number of jobs is running."""
+
+
+class DownloadJob:
+    """
+    One download job.
+
+    Args:
+        job_id: Id of the job in its registry
+        kind: What is downloaded, e.g. 'civitai', 'huggingface' or 'preset'
+        label: Human readable description
+        status: Initial status dict, merged over IDLE_STATUS
+        priority: One of PRIORITIES
+    """
+
+    def __init__(self, job_id, kind, label, status=None, priority='normal'):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Invalid priority {priority}, expected one of {', '.join(PRIORITIES)}")
+        self.id = job_id
+        self.kind = kind
+        self.label = label
+        self.priority = priority
+        self.status = dict(IDLE_STATUS, status="queued")
+        self.status.update(status or {})
+        self.created_at = time.time()
+        self.finished_at = None
+
+        # aria2c GID or DownloadScheduler doing the work
+        self.handle = None
+        self.thread = None
+        # Called with the job when it is cancelled, stops whatever handle points to
+        self.on_cancel = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def state(self):
+        return self.status.get("status")
+
+    @property
+    def active(self):
+        return self.state in ACTIVE_STATES
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def update(self, **kwargs):
+        """Update the status dict, noting when the job finished."""
+        self.status.update(kwargs)
+        if not self.active and self.finished_at is None:
+            self.finished_at = time.time()
+
+    def to_dict(self):
+        return dict(
+            self.status,
+            id=self.id,
+            kind=self.kind,
+            label=self.label,
+            priority=self.priority,
+            created_at=self.created_at,
+            finished_at=self.finished_at,
+        )
+
+
+class JobRegistry:
+    """
+    Thread-safe registry of download jobs.
+
+    Args:
+        max_active: Jobs allowed to run at the same time (0 for no limit)
+        history: Finished jobs kept for their final status
+    """
+
+    def __init__(self, max_active=4, history=50):
+        self.max_active = max(0, int(max_active))
+        self.history = max(1, int(history))
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._ids = itertools.count(1)
+
+    def create(self, kind, label, status=None, priority='normal'):
+        """
+        Register a new job.
+
+        Raises:
+            JobLimitError: max_active jobs are already running
+            ValueError: Unknown priority
+        """
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job.active)
+            if self.max_active and running >= self.max_active:
+                raise JobLimitError(f"{running} downloads are already running, wait for one of them to finish")
+            job = DownloadJob(str(next(self._ids)), kind, label, status, priority)
+            self._jobs[job.id] = job
+            self._prune()
+        print(f"DEBUG: Created {kind} download job {job.id}: {label}")
+        return job
+
+    def _prune(self):
+        finished = sorted((job for job in self._jobs.values() if not job.active), key=lambda job: job.created_at)
+        for job in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(str(job_id))
+
+    def jobs(self, kind=None):
+        """Jobs in the order they were created, optionally only one kind."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job for job in jobs if kind is None or job.kind == kind]
+
+    def active(self, kind=None):
+        return [job for job in self.jobs(kind) if job.active]
+
+    def latest(self, kind):
+        """The most recently created job of a kind, or None."""
+        jobs = self.jobs(kind)
+        return jobs[-1] if jobs else None
+
+    def cancel(self, job_id):
+        """
+        Cancel a job: set its cancel token and stop its handle.
+
+        Returns:
+            DownloadJob: The job, or None if there is no job with this id
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if not job.active:
+            return job
+        job.cancel_event.set()
+        if job.on_cancel:
+            try:
+                job.on_cancel(job)
+            except Exception as e:
+                print(f"DEBUG: Error cancelling download job {job.id}: {e}")
+        job.update(status="stopped", message="Download stopped by user")
+        return job
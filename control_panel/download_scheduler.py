@@ -0,0 +1,488 @@
+"""
+Download Scheduler
+
+Runs several model file downloads at the same time instead of one after another.
+A global connection budget is shared between the active files, the number of
+files fetched from the same host is capped, and small files are started first so
+that VAEs and text encoders are not stuck behind 30 GB diffusion models.
+
+The scheduler itself does not know how a file is fetched. That is done by a
+backend object with three methods:
+
+    start(task)     -- begin downloading task using task.connections connections
+    refresh(tasks)  -- update progress fields of the active tasks and set
+                       task.state to 'completed' or 'error' when they finish
+    cancel(task)    -- abort the download of a single task
+"""
+
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse
+
+# Directories whose files are usually small and shared between many presets.
+# Used to order downloads when the real size could not be probed.
+SMALL_FILE_DIRS = ('vae', 'text_encoders', 'clip', 'clip_vision', 'loras', 'upscale_models')
+
+# Size assumed for files that could not be probed
+SMALL_FILE_ESTIMATE = 1 << 30
+LARGE_FILE_ESTIMATE = 20 << 30
+
+# aria2c refuses more than 16 connections per server
+MAX_CONNECTIONS_PER_FILE = 16
+
+SIZE_UNITS = {
+    '': 1,
+    'B': 1,
+    'KiB': 1 << 10,
+    'MiB': 1 << 20,
+    'GiB': 1 << 30,
+    'TiB': 1 << 40,
+    'KB': 1000,
+    'MB': 1000 ** 2,
+    'GB': 1000 ** 3,
+    'TB': 1000 ** 4,
+}
+
+FINISHED_STATES = ('completed', 'error', 'cancelled')
+
+# HuggingFace LFS ETags are the SHA256 of the file
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+# Consecutive failed progress refreshes after which active downloads are
+# marked as failed (e.g. the download daemon died)
+MAX_REFRESH_FAILURES = 30
+
+
+def parse_size(value):
+    """
+    Convert an aria2c style size string (e.g. "16GiB", "512.3MiB") to bytes.
+
+    Args:
+        value: Size string or number
+
+    Returns:
+        int: Size in bytes, 0 if the value cannot be parsed
+    """
+    if value is None:
+        return 0
+    if isinstance(value, (int, float)):
+        return int(value)
+
+    match = re.match(r'^\s*([\d.]+)\s*([KMGT]i?B|B)?\s*$', str(value))
+    if not match:
+        return 0
+    return int(float(match.group(1)) * SIZE_UNITS.get(match.group(2) or '', 1))
+
+
+def format_size(num_bytes):
+    """
+    Format a byte count the same way aria2c prints it (e.g. "1.5GiB").
+
+    Args:
+        num_bytes: Size in bytes
+
+    Returns:
+        str: Human readable size
+    """
+    num_bytes = float(num_bytes or 0)
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if num_bytes < 1024:
+            return f"{int(num_bytes)}B" if unit == 'B' else f"{num_bytes:.1f}{unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f}TiB"
+
+
+def format_eta(seconds):
+    """
+    Format a number of seconds as an aria2c style ETA (e.g. "1h3m12s").
+
+    Args:
+        seconds: Remaining time in seconds, or None
+
+    Returns:
+        str: ETA string, "Unknown" if the remaining time is not known
+    """
+    if seconds is None or seconds < 0:
+        return "Unknown"
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    eta = ""
+    if hours:
+        eta += f"{hours}h"
+    if minutes:
+        eta += f"{minutes}m"
+    return eta + f"{seconds}s"
+
+
+class NoRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """Hand 3xx responses back to the caller instead of following them."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def _head(url, headers, timeout, follow_redirects):
+    """
+    Send a HEAD request and return (status, headers, location) of the answer.
+
+    Without follow_redirects a 3xx answer is returned as it is, with the URL it
+    points to as location.
+    """
+    req = urllib.request.Request(url, method='HEAD', headers=headers or {})
+    opener = urllib.request.build_opener() if follow_redirects else urllib.request.build_opener(NoRedirectHandler)
+    try:
+        with opener.open(req, timeout=timeout) as response:
+            return response.status, response.headers, None
+    except urllib.error.HTTPError as e:
+        if 300 <= e.code < 400 and not follow_redirects:
+            location = e.headers.get('Location')
+            e.close()
+            return e.code, e.headers, urljoin(url, location) if location else None
+        raise
+
+
+def probe_remote_file(url, headers=None, timeout=5):
+    """
+    Ask the server for the size and SHA256 of a file without downloading it.
+
+    HuggingFace answers the first (redirecting) request with X-Linked-Size and,
+    for LFS files, an X-Linked-Etag holding the SHA256 of the content. The CDN
+    it redirects to does not send them, so the redirect is not followed when
+    they are present. Everything else is expected to return Content-Length.
+
+    Args:
+        url: File URL
+        headers: Optional dict of extra request headers
+        timeout: Request timeout in seconds
+
+    Returns:
+        tuple: (size, sha256), either may be None if the server did not tell
+    """
+    size = sha256 = None
+    try:
+        status, response_headers, location = _head(url, headers, timeout, follow_redirects=False)
+        linked_size = response_headers.get('X-Linked-Size')
+        if linked_size and linked_size.isdigit():
+            size = int(linked_size)
+        etag = (response_headers.get('X-Linked-Etag') or '').strip('"').lower()
+        if SHA256_PATTERN.match(etag):
+            sha256 = etag
+        if size is None:
+            if location:
+                # Content-Length of the redirect is the size of its body
+                status, response_headers, _ = _head(location, headers, timeout, follow_redirects=True)
+            value = response_headers.get('Content-Length')
+            if value and value.isdigit() and status < 300:
+                size = int(value)
+    except Exception as e:
+        print(f"DEBUG: Could not probe size of {url}: {e}")
+    return size, sha256
+
+
+def probe_content_length(url, headers=None, timeout=5):
+    """
+    Ask the server for the size of a file without downloading it.
+
+    Returns:
+        int: Size in bytes, or None if it could not be determined
+    """
+    return probe_remote_file(url, headers, timeout)[0]
+
+
+class DownloadTask:
+    """A single file handled by the scheduler."""
+
+    def __init__(self, task_id, url, directory, filename, command=None, headers=None, size=None, label='', refs=1,
+                 options=None, sha256=None, aliases=None):
+        self.id = task_id
+        self.url = url
+        self.directory = str(directory) if directory else ''
+        self.filename = filename
+        self.command = command
+        self.headers = dict(headers or {})
+        # Extra backend options (e.g. aria2c long options from the preset script)
+        self.options = dict(options or {})
+        self.size = size
+        # Expected SHA256 of the content, if the server or the model store knows it
+        self.sha256 = sha256
+        self.label = label or filename
+        # Number of selected presets that need this file
+        self.refs = refs
+        # Other paths that get a link to the file once it is downloaded
+        self.aliases = list(aliases or [])
+
+        self.state = 'queued'
+        self.connections = 0
+        self.downloaded = 0
+        self.total = size or 0
+        self.speed = 0
+        self.already_existed = False
+        # Hardlinked from an identical file instead of downloaded
+        self.linked = False
+        self.error = ''
+        self.started_at = None
+        self.finished_at = None
+        # Backend specific handle (process, GID, ...)
+        self.handle = None
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, self.filename)
+
+    @property
+    def host(self):
+        return urlparse(self.url or '').netloc.lower()
+
+    def estimated_size(self):
+        """Return the probed size, or a guess based on the target directory."""
+        if self.size:
+            return self.size
+        directory = self.directory.rstrip('/').split('/')[-1] if self.directory else ''
+        return SMALL_FILE_ESTIMATE if directory in SMALL_FILE_DIRS else LARGE_FILE_ESTIMATE
+
+    def priority(self):
+        """Sort key: small files first, files shared by more presets break ties."""
+        return (self.estimated_size(), -self.refs, self.id)
+
+    def progress(self):
+        if self.state == 'completed':
+            return 100
+        return int(100 * self.downloaded / self.total) if self.total else 0
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "label": self.label,
+            "filename": self.filename,
+            "directory": self.directory,
+            "host": self.host,
+            "state": self.state,
+            "connections": self.connections,
+            "progress": self.progress(),
+            "downloaded_bytes": self.downloaded,
+            "total_bytes": self.total,
+            "speed_bytes": self.speed,
+            "downloaded": format_size(self.downloaded),
+            "total": format_size(self.total),
+            "speed": format_size(self.speed) + "/s",
+            "already_existed": self.already_existed,
+            "linked": self.linked,
+            "aliases": [os.path.basename(alias) for alias in self.aliases],
+            "error": self.error,
+        }
+
+
+class DownloadScheduler:
+    """
+    Run a set of DownloadTasks concurrently.
+
+    Args:
+        backend: Object implementing start/refresh/cancel (see module docstring)
+        max_concurrent: Maximum number of files downloading at once
+        max_connections: Total number of connections shared by all active files
+        per_host_limit: Maximum number of files downloading from one host at once
+        poll_interval: Seconds between progress refreshes
+        on_update: Optional callback receiving snapshot() after every refresh
+    """
+
+    def __init__(self, backend, max_concurrent=4, max_connections=32, per_host_limit=3,
+                 poll_interval=1.0, on_update=None):
+        self.backend = backend
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_connections = max(1, int(max_connections))
+        self.per_host_limit = max(1, int(per_host_limit))
+        self.poll_interval = poll_interval
+        self.on_update = on_update
+
+        self.tasks = []
+        self._lock = threading.RLock()
+        self._cancel_event = threading.Event()
+        self._started_at = None
+
+    # ------------------------------------------------------------------
+    # Task setup
+    # ------------------------------------------------------------------
+
+    def add(self, task):
+        with self._lock:
+            self.tasks.append(task)
+        return task
+
+    def probe_sizes(self, max_workers=8):
+        """Fill in the size and, when the server publishes it, the SHA256 of every queued task missing them."""
+        unknown = [task for task in self.tasks if task.state == 'queued' and not task.size and task.url]
+        if not unknown:
+            return
+
+        def probe(task):
+            size, sha256 = probe_remote_file(task.url, task.headers)
+            if size:
+                task.size = size
+                task.total = task.total or size
+            task.sha256 = task.sha256 or sha256
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            list(pool.map(probe, unknown))
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+
+    def _active(self):
+        return [task for task in self.tasks if task.state == 'downloading']
+
+    def _queued(self):
+        return sorted((task for task in self.tasks if task.state == 'queued'), key=lambda t: t.priority())
+
+    def _launch_ready(self):
+        """Start as many queued tasks as the concurrency, host and connection limits allow."""
+        active = self._active()
+        host_counts = {}
+        for task in active:
+            host_counts[task.host] = host_counts.get(task.host, 0) + 1
+
+        launchable = []
+        for task in self._queued():
+            if len(active) + len(launchable) >= self.max_concurrent:
+                break
+            if host_counts.get(task.host, 0) >= self.per_host_limit:
+                continue
+            host_counts[task.host] = host_counts.get(task.host, 0) + 1
+            launchable.append(task)
+
+        used = sum(task.connections for task in active)
+        for index, task in enumerate(launchable):
+            free = self.max_connections - used
+            slots = len(launchable) - index
+            task.connections = max(1, min(MAX_CONNECTIONS_PER_FILE, free // slots))
+            used += task.connections
+            task.state = 'downloading'
+            task.started_at = time.time()
+            try:
+                self.backend.start(task)
+                print(f"DEBUG: Started {task.label} with {task.connections} connections")
+            except Exception as e:
+                print(f"DEBUG: Failed to start {task.label}: {e}")
+                task.state = 'error'
+                task.error = str(e)
+                task.finished_at = time.time()
+                used -= task.connections
+
+    def run(self):
+        """
+        Download every task and block until all of them finished or cancel() was called.
+
+        Returns:
+            bool: True if every task completed successfully
+        """
+        self._started_at = time.time()
+        refresh_failures = 0
+        while not self._cancel_event.is_set():
+            with self._lock:
+                self._launch_ready()
+                active = self._active()
+            if active:
+                try:
+                    self.backend.refresh(active)
+                    refresh_failures = 0
+                except Exception as e:
+                    print(f"DEBUG: Error refreshing download progress: {e}")
+                    refresh_failures += 1
+                    if refresh_failures >= MAX_REFRESH_FAILURES:
+                        for task in active:
+                            task.state = 'error'
+                            task.error = f"Lost track of download: {e}"
+                for task in active:
+                    if task.state in FINISHED_STATES and task.finished_at is None:
+                        task.finished_at = time.time()
+                        task.speed = 0
+                        if task.state == 'completed':
+                            task.downloaded = task.total = max(task.total, task.downloaded)
+
+            if self.on_update:
+                self.on_update(self.snapshot())
+
+            with self._lock:
+                if not self._active() and not self._queued():
+                    break
+            self._cancel_event.wait(self.poll_interval)
+
+        return all(task.state == 'completed' for task in self.tasks)
+
+    def cancel(self):
+        """Stop scheduling new tasks and abort every active download."""
+        self._cancel_event.set()
+        with self._lock:
+            for task in self.tasks:
+                if task.state == 'downloading':
+                    try:
+                        self.backend.cancel(task)
+                    except Exception as e:
+                        print(f"DEBUG: Error cancelling {task.label}: {e}")
+                if task.state not in ('completed', 'error'):
+                    task.state = 'cancelled'
+                    task.speed = 0
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def handles(self):
+        """Backend handles (e.g. aria2c GIDs) of the files downloading right now."""
+        with self._lock:
+            return [task.handle for task in self._active() if task.handle]
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+
+    def snapshot(self):
+        """
+        Return combined and per-file progress.
+
+        Returns:
+            dict: Counts, byte totals and a "files" list in scheduling order
+        """
+        with self._lock:
+            tasks = list(self.tasks)
+
+        downloaded = sum(task.downloaded for task in tasks)
+        total = sum(task.total or task.size or 0 for task in tasks)
+        speed = sum(task.speed for task in tasks if task.state == 'downloading')
+        completed = sum(1 for task in tasks if task.state == 'completed')
+        failed = sum(1 for task in tasks if task.state == 'error')
+
+        if total:
+            progress = int(100 * downloaded / total)
+        else:
+            progress = int(100 * completed / len(tasks)) if tasks else 0
+        # Never report 100% while files are still queued or downloading, the
+        # status endpoint treats 100% as finished
+        if any(task.state not in FINISHED_STATES for task in tasks):
+            progress = min(progress, 99)
+        eta = (total - downloaded) / speed if speed and total else None
+
+        ordered = sorted(tasks, key=lambda t: (t.state != 'downloading', t.state != 'queued', t.priority()))
+        return {
+            "total_files": len(tasks),
+            "completed_files": completed,
+            "failed_files": failed,
+            "active_files": sum(1 for task in tasks if task.state == 'downloading'),
+            "existing_files": sum(1 for task in tasks if task.already_existed),
+            "downloaded_bytes": downloaded,
+            "total_bytes": total,
+            "speed_bytes": speed,
+            "progress": min(progress, 100),
+            "downloaded": format_size(downloaded),
+            "total": format_size(total),
+            "speed": format_size(speed) + "/s",
+            "eta": format_eta(eta),
+            "elapsed": round(time.time() - self._started_at, 1) if self._started_at else 0,
+            "files": [task.to_dict() for task in ordered],
+        }
@@ -0,0 +1,272 @@
+"""
+Download Specs
+
+The preset scripts are plain bash: aria2c calls split over several lines with
+backslashes, quoted paths with spaces, `--out=` and `-o` forms, `cd` into a
+target directory and calls to hfd.sh for whole HuggingFace repositories.
+Instead of rebuilding those commands as strings and running them through a
+shell, each script is tokenized the way bash would (shlex, with line
+continuations, multi-line quotes, comments and ;/&&/|| separators) and turned
+into DownloadSpec objects: URL, directory, file name, headers and the remaining
+aria2c options. The download engine takes the specs as they are.
+
+Parsed scripts are cached and only parsed again when their size or mtime
+changes.
+"""
+
+import os
+import re
+import shlex
+import threading
+
+from aria2_rpc import aria2c_args_to_options
+
+# Commands that run the command following them
+WRAPPERS = ('stdbuf', 'nohup', 'env', 'exec', 'time')
+
+# hfd.sh options taking one value, and the ones taking a list of patterns
+HFD_VALUE_OPTIONS = {
+    '--hf_username': 'hf_username',
+    '--hf_token': 'hf_token',
+    '--tool': 'tool',
+    '-x': 'threads',
+    '-j': 'jobs',
+    '--local-dir': 'local_dir',
+    '--revision': 'revision',
+}
+HFD_LIST_OPTIONS = {'--include': 'include', '--exclude': 'exclude'}
+
+HF_ENDPOINT = 'https://huggingface.co'
+
+# A line ending in an odd number of backslashes continues on the next line
+CONTINUATION_PATTERN = re.compile(r'(?<!\\)(?:\\\\)*\\$')
+OPERATOR_CHARS = ';&|'
+ASSIGNMENT_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*=')
+
+
+class DownloadSpec:
+    """
+    One download described by a script.
+
+    Args:
+        tool: 'aria2c' for a single file, 'hfd' for a HuggingFace repository
+        url: Source URL (the repository page for hfd)
+        directory: Target directory
+        filename: Target file name, empty for hfd
+        headers: Dict of HTTP headers given on the command line
+        options: Remaining tool options (aria2c long option names for aria2c)
+        argv: The tokenized command
+    """
+
+    def __init__(self, tool, url, directory='', filename='', headers=None, options=None, argv=None):
+        self.tool = tool
+        self.url = url
+        self.directory = directory
+        self.filename = filename
+        self.headers = dict(headers or {})
+        self.options = dict(options or {})
+        self.argv = list(argv or [])
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, self.filename)
+
+    @property
+    def command(self):
+        """The command, quoted so that it can be logged or copied into a shell."""
+        return shlex.join(self.argv)
+
+    def to_dict(self):
+        return {
+            'tool': self.tool,
+            'url': self.url,
+            'dir': self.directory,
+            'out': self.filename,
+            'headers': dict(self.headers),
+            'options': dict(self.options),
+        }
+
+    def __repr__(self):
+        return f"DownloadSpec({self.tool}, {self.url!r} -> {self.path!r})"
+
+
+def _tokenize(line):
+    lexer = shlex.shlex(line, posix=True, punctuation_chars=OPERATOR_CHARS)
+    lexer.whitespace_split = True
+    return list(lexer)
+
+
+def iter_commands(text):
+    """
+    Split a bash script into simple commands.
+
+    Args:
+        text: Script source
+
+    Yields:
+        list: Tokens of each command, quotes removed
+    """
+    buffer = ''
+    for line in text.splitlines():
+        if CONTINUATION_PATTERN.search(line):
+            buffer += line[:-1]
+            continue
+        buffer += line
+        try:
+            tokens = _tokenize(buffer)
+        except ValueError:
+            # A quoted string continues on the next line
+            buffer += '\n'
+            continue
+        buffer = ''
+
+        command = []
+        for token in tokens:
+            if token and not token.strip(OPERATOR_CHARS):
+                if command:
+                    yield command
+                command = []
+            else:
+                command.append(token)
+        if command:
+            yield command
+
+    if buffer.strip():
+        print(f"DEBUG: Ignoring unterminated command at the end of the script: {buffer.strip()[:80]}")
+
+
+def _unwrap(argv):
+    """Drop variable assignments and wrappers like `stdbuf -oL` in front of a command."""
+    argv = list(argv)
+    while argv:
+        if ASSIGNMENT_PATTERN.match(argv[0]):
+            argv.pop(0)
+        elif os.path.basename(argv[0]) in WRAPPERS:
+            argv.pop(0)
+            while argv and (argv[0].startswith('-') or ASSIGNMENT_PATTERN.match(argv[0])):
+                argv.pop(0)
+        else:
+            break
+    return argv
+
+
+def _aria2c_spec(argv, cwd):
+    uris, options = aria2c_args_to_options(argv)
+    if not uris:
+        return None
+    url = uris[0]
+    directory = options.pop('dir', '')
+    if cwd:
+        directory = os.path.join(cwd, directory) if directory else cwd
+    filename = options.pop('out', '') or url.split('/')[-1].split('?')[0]
+    headers = {}
+    for header in options.pop('header', []):
+        name, _, value = header.partition(':')
+        headers[name.strip()] = value.strip()
+    return DownloadSpec('aria2c', url, directory, filename, headers, options, argv)
+
+
+def _hfd_spec(argv, cwd):
+    args = argv[1:]
+    if not args or args[0].startswith('-'):
+        return None
+    repo = args[0]
+    options = {}
+    i = 1
+    while i < len(args):
+        arg = args[i]
+        if arg in HFD_LIST_OPTIONS:
+            values = options.setdefault(HFD_LIST_OPTIONS[arg], [])
+            while i + 1 < len(args) and not args[i + 1].startswith('-'):
+                values.append(args[i + 1])
+                i += 1
+        elif arg in HFD_VALUE_OPTIONS and i + 1 < len(args):
+            options[HFD_VALUE_OPTIONS[arg]] = args[i + 1]
+            i += 1
+        elif arg == '--dataset':
+            options['dataset'] = True
+        i += 1
+
+    directory = options.pop('local_dir', None) or repo.split('/')[-1]
+    if cwd:
+        directory = os.path.join(cwd, directory)
+    kind = 'datasets/' if options.get('dataset') else ''
+    return DownloadSpec('hfd', f"{HF_ENDPOINT}/{kind}{repo}", directory, '', None, options, argv)
+
+
+def parse_download_script(text):
+    """
+    Parse the downloads of a preset or training model script.
+
+    aria2c calls become one spec per file and `bash hfd.sh <repo>` calls one
+    spec per repository. `cd` is followed so that relative directories and
+    downloads without -d end up where the script would put them.
+
+    Args:
+        text: Script source
+
+    Returns:
+        list: DownloadSpec objects in script order
+    """
+    specs = []
+    cwd = ''
+    for argv in iter_commands(text):
+        argv = _unwrap(argv)
+        if not argv:
+            continue
+        program = os.path.basename(argv[0])
+        if program in ('bash', 'sh') and len(argv) > 1:
+            argv = argv[1:]
+            program = os.path.basename(argv[0])
+
+        spec = None
+        if program == 'cd' and len(argv) > 1:
+            cwd = os.path.normpath(os.path.join(cwd, argv[1]))
+        elif program == 'aria2c':
+            spec = _aria2c_spec(argv, cwd)
+        elif program in ('hfd.sh', 'hfd'):
+            spec = _hfd_spec(argv, cwd)
+        if spec:
+            specs.append(spec)
+    return specs
+
+
+class SpecCache:
+    """Parsed download specs per script, refreshed when a script's size or mtime changes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, script_path):
+        """
+        Download specs of a script.
+
+        Returns:
+            list: DownloadSpec objects, empty if the script cannot be read
+        """
+        script_path = str(script_path)
+        try:
+            stat = os.stat(script_path)
+        except OSError as e:
+            print(f"DEBUG: Cannot read download script {script_path}: {e}")
+            return []
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(script_path)
+        if entry and entry[0] == key:
+            return list(entry[1])
+
+        with open(script_path, 'r') as f:
+            specs = parse_download_script(f.read())
+        with self._lock:
+            self._entries[script_path] = (key, specs)
+        print(f"DEBUG: Parsed {len(specs)} downloads from {script_path}")
+        return list(specs)
+
+    def invalidate(self, script_path=None):
+        with self._lock:
+            if script_path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(script_path), None)
@@ -0,0 +1,227 @@
+"""
+Status Event Stream
+
+Pushes status changes to the browser over Server-Sent Events instead of having
+every open tab poll each status endpoint once a second.
+
+Each channel (e.g. "model", "huggingface") is registered with a getter that
+returns the current status dict, the same data its JSON endpoint returns. A
+single pump thread reads the getters while at least one client is connected,
+at most max_rate times per second, and only when a worker called notify() or
+the poll interval elapsed. Clients receive the full state once and after that
+only the keys that changed:
+
+    event: model
+    data: {"set": {"progress": 42, "speed": "12.5MiB/s"}, "append": {"output": ["line"]}}
+
+Lists that only grew (log output) are sent as "append" with the new items. A
+list that is the window of a longer log, paired with a "<key>_start" integer
+holding the position of its first item in the log, is also sent as "append"
+when the window moved forward; the client drops the items before the new start.
+"""
+
+import copy
+import json
+import threading
+import time
+
+
+def state_delta(old, new):
+    """
+    Compute the difference between two status dicts.
+
+    Args:
+        old: Previously sent state, or None
+        new: Current state
+
+    Returns:
+        dict: {"set": {...}, "append": {...}} with only the changed keys, empty if nothing changed
+    """
+    if old is None:
+        return {"set": new, "reset": True}
+
+    changed = {}
+    appended = {}
+    for key, value in new.items():
+        if key in old and old[key] == value:
+            continue
+        previous = old.get(key)
+        if not (isinstance(value, list) and isinstance(previous, list) and previous):
+            changed[key] = value
+            continue
+        start_key = f"{key}_start"
+        if isinstance(new.get(start_key), int) and isinstance(old.get(start_key), int):
+            # Window of a longer log: new items if it moved forward without a gap
+            old_end = old[start_key] + len(previous)
+            new_end = new[start_key] + len(value)
+            if old[start_key] <= new[start_key] <= old_end < new_end:
+                appended[key] = value[len(value) - (new_end - old_end):]
+            else:
+                changed[key] = value
+        elif len(value) > len(previous) and value[:len(previous)] == previous:
+            appended[key] = value[len(previous):]
+        else:
+            changed[key] = value
+
+    delta = {}
+    if changed:
+        delta["set"] = changed
+    if appended:
+        delta["append"] = appended
+    return delta
+
+
+def format_sse(event, data):
+    """Encode one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class StatusBroadcaster:
+    """
+    Fan out status changes of several channels to any number of SSE clients.
+
+    Args:
+        max_rate: Maximum number of updates per second sent to a client
+        poll_interval: Seconds after which every channel is re-read even without notify()
+        heartbeat: Seconds between keep-alive comments on an idle stream
+    """
+
+    def __init__(self, max_rate=4.0, poll_interval=1.0, heartbeat=15.0):
+        self.min_interval = 1.0 / max_rate if max_rate > 0 else 0
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+
+        self._getters = {}
+        self._states = {}
+        self._version = 0
+        self._subscribers = 0
+        self._dirty = set()
+        self._condition = threading.Condition()
+        self._wakeup = threading.Event()
+        self._pump_thread = None
+
+    def register(self, channel, getter):
+        """Add a channel whose state is read with getter()."""
+        self._getters[channel] = getter
+
+    def notify(self, channel=None):
+        """
+        Tell the broadcaster that a channel changed. Cheap enough to call from
+        worker loops; the state itself is only read by the pump thread.
+        """
+        if not self._subscribers:
+            return
+        with self._condition:
+            if channel is None:
+                self._dirty.update(self._getters)
+            else:
+                self._dirty.add(channel)
+        self._wakeup.set()
+
+    # ------------------------------------------------------------------
+    # Pump
+    # ------------------------------------------------------------------
+
+    def _read(self, channel):
+        try:
+            return copy.deepcopy(self._getters[channel]())
+        except Exception as e:
+            print(f"DEBUG: Error reading {channel} status: {e}")
+            return None
+
+    def pump_once(self, channels=None):
+        """Re-read channels and wake the streams if any state changed."""
+        channels = list(self._getters) if channels is None else channels
+        updated = {}
+        for channel in channels:
+            state = self._read(channel)
+            if state is not None and state != self._states.get(channel):
+                updated[channel] = state
+
+        if updated:
+            with self._condition:
+                self._states.update(updated)
+                self._version += 1
+                self._condition.notify_all()
+        return bool(updated)
+
+    def _pump(self):
+        last_poll = 0
+        while True:
+            with self._condition:
+                if not self._subscribers:
+                    self._pump_thread = None
+                    return
+
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+            with self._condition:
+                dirty = set(self._dirty)
+                self._dirty.clear()
+            now = time.time()
+            if now - last_poll >= self.poll_interval:
+                dirty = None  # Re-read every channel
+                last_poll = now
+            self.pump_once(dirty)
+
+            # Coalesce bursts of notify() into at most max_rate updates per second
+            time.sleep(self.min_interval)
+
+    def _subscribe(self):
+        with self._condition:
+            self._subscribers += 1
+            if self._pump_thread is None:
+                self._pump_thread = threading.Thread(target=self._pump, daemon=True)
+                self._pump_thread.start()
+
+    def _unsubscribe(self):
+        with self._condition:
+            self._subscribers -= 1
+
+    # ------------------------------------------------------------------
+    # Streams
+    # ------------------------------------------------------------------
+
+    def stream(self, channels=None):
+        """
+        Generator producing the SSE body for one client.
+
+        Args:
+            channels: Channel names to send, all registered channels when None
+        """
+        channels = [c for c in (channels or self._getters) if c in self._getters]
+        sent = {}
+        version = -1
+        self._subscribe()
+        try:
+            # Send the current state right away instead of waiting for the pump
+            self.pump_once(channels)
+            yield "retry: 3000\n\n"
+            while True:
+                with self._condition:
+                    if self._version == version:
+                        self._condition.wait(self.heartbeat)
+                    if self._version == version:
+                        states = None
+                    else:
+                        version = self._version
+                        states = {channel: self._states.get(channel) for channel in channels}
+
+                if states is None:
+                    yield ": keep-alive\n\n"
+                    continue
+
+                for channel, state in states.items():
+                    if state is None:
+                        continue
+                    delta = state_delta(sent.get(channel), state)
+                    if delta:
+                        sent[channel] = state
+                        yield format_sse(channel, delta)
+        finally:
+            self._unsubscribe()
+
+    @property
+    def subscribers(self):
+        return self._subscribers
@@ -0,0 +1,112 @@
+"""
+Log Buffer
+
+Output of long running installs (pip-heavy setup scripts print tens of
+thousands of lines) is kept in a bounded ring buffer instead of a list that
+grows with every line and is serialized in full on every status poll.
+
+Every line gets a sequence number that keeps increasing across runs, so a
+client that has seen everything before sequence N asks for `since=N` and gets
+only the new lines, and can tell from the start of the window whether lines
+it never saw were dropped. The complete output of a run is written to a log
+file next to the buffer.
+"""
+
+import collections
+import os
+import threading
+
+
+class LogBuffer:
+    """
+    The last lines of a run's output, numbered, with the full output in a file.
+
+    Args:
+        capacity: Lines kept in memory
+    """
+
+    def __init__(self, capacity=2000):
+        self.capacity = max(1, int(capacity))
+        self._lock = threading.Lock()
+        self._lines = collections.deque(maxlen=self.capacity)
+        # Sequence number of the next line, and of the first line of the current run
+        self._next = 0
+        self._run_start = 0
+        self._file = None
+        self.log_path = None
+
+    def start(self, log_path=None):
+        """
+        Begin a new run: forget the lines of the previous one and write to log_path.
+
+        Sequence numbers are not reset, so clients following the previous run
+        see the new one as new lines.
+        """
+        with self._lock:
+            self._close()
+            self._lines.clear()
+            self._run_start = self._next
+            self.log_path = str(log_path) if log_path else None
+            if self.log_path:
+                try:
+                    os.makedirs(os.path.dirname(self.log_path) or '.', exist_ok=True)
+                    self._file = open(self.log_path, 'w', buffering=1)
+                except OSError as e:
+                    print(f"DEBUG: Cannot write log file {self.log_path}: {e}")
+                    self.log_path = None
+
+    def append(self, line):
+        """Add a line, returning its sequence number."""
+        with self._lock:
+            seq = self._next
+            self._next += 1
+            self._lines.append(line)
+            if self._file:
+                try:
+                    self._file.write(line + '\n')
+                except (OSError, ValueError) as e:
+                    print(f"DEBUG: Cannot write log file {self.log_path}: {e}")
+                    self._close()
+            return seq
+
+    def close(self):
+        """Finish the run's log file; the lines stay readable."""
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._file:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+    @property
+    def next_seq(self):
+        with self._lock:
+            return self._next
+
+    def since(self, seq=None):
+        """
+        Lines of the current run with a sequence number of at least seq.
+
+        Args:
+            seq: First sequence number wanted, None for every line still buffered
+
+        Returns:
+            dict: lines, start (sequence number of lines[0]), next (sequence
+            number of the next line) and dropped (lines after seq that are no
+            longer buffered, read them from the log file)
+        """
+        with self._lock:
+            window_start = self._next - len(self._lines)
+            wanted = window_start if seq is None else max(int(seq), self._run_start)
+            start = max(wanted, window_start)
+            lines = list(self._lines)[start - window_start:] if start < self._next else []
+            return {
+                "lines": lines,
+                "start": min(start, self._next),
+                "next": self._next,
+                "dropped": max(0, window_start - wanted),
+            }
@@ -0,0 +1,357 @@
+"""
+Model Store
+
+Keeps a record of every model file the control panel downloaded or found in the
+model directories: its SHA256, size and mtime and the URL it came from. With it
+a preset download can
+
+- skip files that are already complete without asking the server again,
+- hardlink a file another preset already downloaded under a different name
+  (the same umt5 and VAE files are used by many presets),
+- resume partial downloads, which aria2c marks with a .aria2 control file next
+  to them, instead of starting over, and
+- catch corrupted or outdated files by their hash.
+
+A file is only hashed again when its size or mtime changed since it was recorded.
+The store works on DownloadTask objects (see download_scheduler.py).
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HASH_CHUNK_SIZE = 8 << 20
+
+
+def sha256_file(path, chunk_size=HASH_CHUNK_SIZE):
+    """Return the hex SHA256 of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def control_file(path):
+    """Path of the aria2c control file kept next to a partial download."""
+    return f"{path}.aria2"
+
+
+class ModelStore:
+    """
+    Content record of the downloaded model files.
+
+    Args:
+        record_path: JSON file the record is kept in
+        hash_workers: Files hashed in parallel after a download
+    """
+
+    def __init__(self, record_path, hash_workers=4):
+        self.record_path = str(record_path)
+        self.hash_workers = max(1, int(hash_workers))
+        self._lock = threading.RLock()
+        # path -> {"sha256", "size", "mtime_ns", "url"}
+        self.files = {}
+        # url -> {"sha256", "size"} of the complete file
+        self.urls = {}
+        self.load()
+
+    # ------------------------------------------------------------------
+    # Record
+    # ------------------------------------------------------------------
+
+    def load(self):
+        try:
+            with open(self.record_path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"DEBUG: Ignoring unreadable model store {self.record_path}: {e}")
+            return
+        with self._lock:
+            self.files = data.get('files', {})
+            self.urls = data.get('urls', {})
+
+    def save(self):
+        with self._lock:
+            data = json.dumps({'files': self.files, 'urls': self.urls}, indent=1)
+        os.makedirs(os.path.dirname(self.record_path) or '.', exist_ok=True)
+        tmp_path = f"{self.record_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, self.record_path)
+
+    def _unchanged(self, path, record):
+        """Whether a recorded file is still on disk with the recorded size and mtime."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return stat.st_size == record['size'] and stat.st_mtime_ns == record['mtime_ns']
+
+    def file_hash(self, path):
+        """
+        SHA256 of a file on disk, from the record if the file did not change since.
+
+        Returns:
+            str: Hex digest, or None if the file does not exist
+        """
+        with self._lock:
+            record = self.files.get(path)
+        if record and self._unchanged(path, record):
+            return record['sha256']
+        try:
+            stat = os.stat(path)
+            sha256 = sha256_file(path)
+        except OSError:
+            return None
+        with self._lock:
+            self.files[path] = {
+                'sha256': sha256,
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'url': (record or {}).get('url'),
+            }
+        return sha256
+
+    def remember(self, url, path, sha256):
+        """Record that url has the content sha256, now stored at path."""
+        with self._lock:
+            record = self.files.get(path)
+            if record:
+                record['url'] = url
+            if url and record:
+                self.urls[url] = {'sha256': sha256, 'size': record['size']}
+
+    def forget(self, path):
+        with self._lock:
+            self.files.pop(path, None)
+
+    def find_copy(self, sha256, size, exclude=None):
+        """
+        Path of an unchanged recorded file with this content.
+
+        Args:
+            exclude: Path whose inode does not count (the target itself)
+        """
+        try:
+            excluded = os.stat(exclude) if exclude else None
+        except OSError:
+            excluded = None
+        with self._lock:
+            candidates = [(path, dict(record)) for path, record in self.files.items()
+                          if record['sha256'] == sha256 and record['size'] == size and path != exclude]
+        for path, record in candidates:
+            if not self._unchanged(path, record):
+                continue
+            if excluded:
+                stat = os.stat(path)
+                if (stat.st_dev, stat.st_ino) == (excluded.st_dev, excluded.st_ino):
+                    continue
+            return path
+        return None
+
+    def link(self, source, target):
+        """Hardlink source to target, replacing target. Raises OSError across filesystems."""
+        os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+        tmp_path = f"{target}.link"
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+        os.link(source, tmp_path)
+        os.replace(tmp_path, target)
+        with self._lock:
+            record = dict(self.files[source])
+            record['url'] = (self.files.get(target) or {}).get('url') or record.get('url')
+            self.files[target] = record
+
+    # ------------------------------------------------------------------
+    # Download tasks
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _finish(task, size, linked=False):
+        task.state = 'completed'
+        task.already_existed = True
+        task.linked = linked
+        task.size = task.size or size
+        task.total = task.downloaded = size
+        task.finished_at = time.time()
+
+    def _discard(self, task, reason):
+        print(f"DEBUG: Downloading {task.label} again, {reason}")
+        try:
+            os.remove(task.path)
+        except OSError as e:
+            print(f"DEBUG: Could not remove {task.path}: {e}")
+        self.forget(task.path)
+
+    def prepare(self, tasks):
+        """
+        Finish the tasks that can be served from disk, before anything goes over the network.
+
+        A complete target matching the recorded hash of its URL is skipped, a
+        missing target whose content is recorded under another name is hardlinked.
+        Targets that don't match the recorded hash are removed. Partial downloads
+        are left alone for aria2c to continue.
+
+        Returns:
+            list: The tasks that still need the network
+        """
+        remaining = []
+        for task in tasks:
+            path = task.path
+            with self._lock:
+                expected = self.urls.get(task.url)
+            if not expected or os.path.exists(control_file(path)):
+                remaining.append(task)
+                continue
+            if os.path.isfile(path):
+                if self.file_hash(path) == expected['sha256']:
+                    self.remember(task.url, path, expected['sha256'])
+                    self._finish(task, expected['size'])
+                    continue
+                self._discard(task, "its hash does not match the recorded one")
+            source = self.find_copy(expected['sha256'], expected['size'])
+            if source:
+                try:
+                    self.link(source, path)
+                    self.remember(task.url, path, expected['sha256'])
+                    self._finish(task, expected['size'], linked=True)
+                    print(f"DEBUG: Linked {task.label} from {source}")
+                    continue
+                except OSError as e:
+                    print(f"DEBUG: Could not link {source} to {path}: {e}")
+            task.sha256 = task.sha256 or expected['sha256']
+            remaining.append(task)
+        self.save()
+        return remaining
+
+    def check_existing(self, tasks):
+        """
+        Check files found on disk for queued tasks against the probed size and SHA256.
+
+        Complete matching files are recorded and skipped, shorter ones are left
+        for aria2c to continue and anything else is removed and downloaded again.
+        Files are kept when the server published neither size nor hash.
+        """
+        for task in tasks:
+            path = task.path
+            if task.state != 'queued' or not os.path.isfile(path) or os.path.exists(control_file(path)):
+                continue
+            size = os.path.getsize(path)
+            if task.size and size < task.size:
+                continue
+            if task.size and size != task.size:
+                self._discard(task, f"it has {size} bytes instead of {task.size}")
+                continue
+            sha256 = self.file_hash(path)
+            if task.sha256 and sha256 != task.sha256:
+                self._discard(task, "its hash does not match the server")
+                continue
+            self.remember(task.url, path, sha256)
+            self._finish(task, size)
+        self.save()
+
+    def verify(self, tasks):
+        """
+        Hash the files downloaded by tasks, record them and link duplicates.
+
+        A file whose hash differs from the one the server published is removed
+        and its task fails. So does a file of another size than the probed one;
+        a shorter file is kept for the next download to continue.
+
+        Returns:
+            int: Bytes freed by replacing duplicates with hardlinks
+        """
+        downloaded = [task for task in tasks if task.state == 'completed' and not task.already_existed]
+
+        def check(task):
+            try:
+                size = os.path.getsize(task.path)
+            except OSError:
+                size = None
+            if size is not None and task.size and size != task.size:
+                task.state = 'error'
+                task.error = f"Size mismatch: expected {task.size} bytes, got {size}"
+                if size > task.size:
+                    self._discard(task, "it is larger than the file on the server")
+                return
+            sha256 = self.file_hash(task.path)
+            if sha256 is None:
+                task.state = 'error'
+                task.error = f"{task.path} is missing after the download"
+            elif task.sha256 and sha256 != task.sha256:
+                task.state = 'error'
+                task.error = f"Checksum mismatch: expected {task.sha256[:12]}..., got {sha256[:12]}..."
+                self._discard(task, "its hash does not match the server")
+            else:
+                self.remember(task.url, task.path, sha256)
+
+        with ThreadPoolExecutor(max_workers=self.hash_workers) as pool:
+            list(pool.map(check, downloaded))
+        saved = self.deduplicate([task.path for task in downloaded if task.state == 'completed'])
+        self.save()
+        return saved
+
+    def link_aliases(self, tasks):
+        """
+        Link the aliases of the completed tasks to their downloaded file.
+
+        Aliases that already are the same file are left alone, anything else at
+        an alias path is replaced. Falls back to a symlink across filesystems.
+
+        Returns:
+            int: Number of aliases created
+        """
+        created = 0
+        for task in tasks:
+            if task.state != 'completed':
+                continue
+            for alias in task.aliases:
+                try:
+                    if os.path.exists(alias) and os.path.samefile(alias, task.path):
+                        continue
+                    self.file_hash(task.path)
+                    try:
+                        self.link(task.path, alias)
+                    except OSError:
+                        tmp_path = f"{alias}.link"
+                        if os.path.lexists(tmp_path):
+                            os.remove(tmp_path)
+                        os.symlink(os.path.abspath(task.path), tmp_path)
+                        os.replace(tmp_path, alias)
+                    self.remember(task.url, alias, self.file_hash(task.path))
+                    created += 1
+                except OSError as e:
+                    task.error = f"Could not link {alias}: {e}"
+                    print(f"DEBUG: {task.error}")
+        self.save()
+        return created
+
+    def deduplicate(self, paths):
+        """
+        Replace each of paths with a hardlink to an identical recorded file.
+
+        Returns:
+            int: Bytes freed
+        """
+        saved = 0
+        for path in paths:
+            with self._lock:
+                record = dict(self.files.get(path) or {})
+            if not record or not self._unchanged(path, record):
+                continue
+            source = self.find_copy(record['sha256'], record['size'], exclude=path)
+            if not source:
+                continue
+            try:
+                self.link(source, path)
+                saved += record['size']
+                print(f"DEBUG: Replaced {path} with a hardlink to {source}")
+            except OSError as e:
+                print(f"DEBUG: Could not link {source} to {path}: {e}")
+        return saved
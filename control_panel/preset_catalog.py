@@ -0,0 +1,180 @@
+"""
+Script Catalog
+
+The preset model scripts and the training tool scripts describe themselves with
+header comments (# Model:, # Description:, ...). Parsing 60+ of them on every
+page load is wasted file I/O, so the parsed headers are kept in memory and only
+rebuilt when the script directory changes.
+
+The directory mtime changes whenever a script is added, removed or replaced
+(git checkouts and image rebuilds write files through a rename). Call
+invalidate() after editing a script in place.
+
+Many presets download the same text encoders and VAEs, often under different
+names. FileGraph collects the files of the selected presets by source URL so
+that each of them is fetched once and linked to its other names.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import threading
+
+
+class ScriptCatalog:
+    """
+    Cached list of parsed script headers for one directory.
+
+    Args:
+        directory: Directory containing the scripts
+        pattern: Glob pattern of the scripts inside the directory
+        parser: Callable taking a script path and returning a dict describing it
+        id_func: Callable turning a script path into its catalog id
+    """
+
+    def __init__(self, directory, pattern, parser, id_func):
+        self.directory = str(directory)
+        self.pattern = pattern
+        self.parser = parser
+        self.id_func = id_func
+
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._entries = {}
+        self._paths = {}
+        self._etag = None
+
+    def _directory_mtime(self):
+        try:
+            return os.stat(self.directory).st_mtime_ns
+        except OSError:
+            return None
+
+    def _rebuild(self, mtime):
+        entries = {}
+        paths = {}
+        for path in glob.glob(os.path.join(self.directory, self.pattern)):
+            script_id = self.id_func(path)
+            entry = dict(self.parser(path))
+            entry['id'] = script_id
+            entries[script_id] = entry
+            paths[script_id] = path
+
+        self._entries = entries
+        self._paths = paths
+        self._mtime = mtime
+        data = json.dumps(self._sorted(entries), sort_keys=True).encode('utf-8')
+        self._etag = hashlib.sha1(data).hexdigest()
+        print(f"DEBUG: Indexed {len(entries)} scripts in {self.directory}")
+
+    @staticmethod
+    def _sorted(entries):
+        return sorted(entries.values(), key=lambda entry: (entry.get('name') or entry['id']).lower())
+
+    def _ensure_fresh(self):
+        mtime = self._directory_mtime()
+        with self._lock:
+            if self._etag is None or mtime != self._mtime:
+                self._rebuild(mtime)
+
+    def invalidate(self):
+        """Force the next lookup to re-read every script."""
+        with self._lock:
+            self._etag = None
+
+    def entries(self):
+        """Return copies of all entries sorted by name."""
+        self._ensure_fresh()
+        with self._lock:
+            return [dict(entry) for entry in self._sorted(self._entries)]
+
+    def get(self, script_id):
+        """
+        Look up one script.
+
+        Returns:
+            tuple: (path, entry) or (None, None) if the script does not exist
+        """
+        self._ensure_fresh()
+        with self._lock:
+            if script_id not in self._entries:
+                return None, None
+            return self._paths[script_id], dict(self._entries[script_id])
+
+    @property
+    def etag(self):
+        self._ensure_fresh()
+        with self._lock:
+            return self._etag
+
+
+class FileGraph:
+    """
+    Files needed by a set of presets, deduplicated by source URL.
+
+    Each URL is one node with every target path it should end up at and the
+    presets that need it. It is fetched once, the other targets are aliases.
+    A target already claimed by another URL is skipped so that two downloads
+    never write the same file.
+    """
+
+    def __init__(self):
+        self._nodes = {}
+        self._targets = {}
+        self.conflicts = []
+
+    def add(self, preset, url, directory, filename, **details):
+        """
+        Add one file of a preset.
+
+        Args:
+            preset: Preset id needing the file
+            url: Source URL
+            directory: Target directory
+            filename: Target file name
+            **details: Kept on the node of the first preset adding the URL (e.g. options)
+
+        Returns:
+            dict: The node of the URL
+        """
+        target = os.path.join(str(directory), filename)
+        owner = self._targets.setdefault(target, url)
+        if owner != url:
+            self.conflicts.append((preset, target, url))
+            print(f"DEBUG: {preset} wants {target} from {url}, it already comes from {owner}")
+            return self._nodes[owner]
+
+        node = self._nodes.get(url)
+        if node is None:
+            node = self._nodes[url] = dict(details, url=url, targets=[], presets=[])
+        if target not in node['targets']:
+            node['targets'].append(target)
+        if preset not in node['presets']:
+            node['presets'].append(preset)
+        return node
+
+    def nodes(self):
+        """Nodes in the order their URLs were first added."""
+        return list(self._nodes.values())
+
+    def summary(self, sizes=None):
+        """
+        Count fetches and aliases.
+
+        Args:
+            sizes: Optional dict of url -> size in bytes
+
+        Returns:
+            dict: files (target paths), fetches, aliases, shared (URLs needed by
+            more than one preset) and saved_bytes (alias bytes not downloaded)
+        """
+        sizes = sizes or {}
+        nodes = self.nodes()
+        return {
+            'files': sum(len(node['targets']) for node in nodes),
+            'fetches': len(nodes),
+            'aliases': sum(len(node['targets']) - 1 for node in nodes),
+            'shared': sum(1 for node in nodes if len(node['presets']) > 1),
+            'saved_bytes': sum((sizes.get(node['url']) or 0) * (len(node['targets']) - 1) for node in nodes),
+        }
@@ -0,0 +1,188 @@
+"""
+Service Health
+
+A service is restarted once it answers HTTP requests, not when its restart
+script returns (restart_comfyui.sh puts ComfyUI in the background and exits at
+once) or when its log prints a known phrase. Each service has a HealthProbe:
+an HTTP GET on its port and a path that is only served once the application is
+up (ComfyUI's /system_stats answers after the custom nodes are imported, the
+Gradio UIs answer on /). The probe is repeated with a short request timeout and
+an exponential backoff between attempts.
+
+The durations of the recent restarts of every service are kept in a small JSON
+record, so that slow cold starts (custom nodes, first model imports) show up as
+a trend instead of as a single slow restart.
+"""
+
+import http.client
+import json
+import os
+import statistics
+import threading
+import time
+
+from service_supervisor import retry_with_backoff
+
+# A restart counts as slow when it takes this much longer than the median of the ones before
+SLOW_RESTART_FACTOR = 1.5
+
+
+class HealthProbe:
+    """
+    HTTP readiness check of a service.
+
+    Args:
+        path: Path requested with GET
+        request_timeout: Seconds one request may take
+        host: Host the service listens on
+    """
+
+    def __init__(self, path='/', request_timeout=2.0, host='127.0.0.1'):
+        self.path = path
+        self.request_timeout = request_timeout
+        self.host = host
+
+    def url(self, port):
+        return f"http://{self.host}:{port}{self.path}"
+
+    def check(self, port, timeout=None):
+        """
+        Request the probe path once.
+
+        Returns:
+            tuple: (ready, detail) where ready is True for any response below 500
+        """
+        connection = http.client.HTTPConnection(self.host, int(port), timeout=timeout or self.request_timeout)
+        try:
+            connection.request('GET', self.path)
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException) as e:
+            return False, str(e) or e.__class__.__name__
+        finally:
+            connection.close()
+        return response.status < 500, f"HTTP {response.status}"
+
+    def wait(self, port, timeout, abort=None, max_backoff=2.0, on_attempt=None):
+        """
+        Probe until the service is ready, timeout seconds passed or abort returns True.
+
+        Args:
+            port: Port of the service
+            timeout: Seconds to give up after
+            abort: Optional callable, stop probing once it returns True
+            max_backoff: Longest pause between two attempts
+            on_attempt: Optional callable receiving (seconds elapsed, detail) after a failed attempt
+
+        Returns:
+            tuple: (seconds until ready or None, detail of the last attempt)
+        """
+        seconds, detail = retry_with_backoff(
+            lambda remaining: self.check(port, min(self.request_timeout, remaining)),
+            timeout, abort, max_backoff, on_attempt
+        )
+        return seconds, detail or "not probed"
+
+
+# Probes of the services the control panel restarts
+SERVICE_PROBES = {
+    'comfyui': HealthProbe('/system_stats'),
+    'diffusionpipe': HealthProbe('/'),
+    'fluxgym': HealthProbe('/'),
+    'kohya': HealthProbe('/'),
+}
+
+
+def probe_for(service):
+    """Health probe of a service, GET / for services without their own."""
+    return SERVICE_PROBES.get(service) or HealthProbe('/')
+
+
+class RestartHistory:
+    """
+    Durations of the recent restarts of each service.
+
+    Args:
+        record_path: JSON file the history is kept in, None to keep it in memory only
+        size: Restarts kept per service
+    """
+
+    def __init__(self, record_path=None, size=20):
+        self.record_path = str(record_path) if record_path else None
+        self.size = max(1, int(size))
+        self._lock = threading.Lock()
+        # service -> list of restarts, oldest first
+        self.restarts = {}
+        self.load()
+
+    def load(self):
+        if not self.record_path:
+            return
+        try:
+            with open(self.record_path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"DEBUG: Ignoring unreadable restart history {self.record_path}: {e}")
+            return
+        with self._lock:
+            self.restarts = {service: list(entries)[-self.size:] for service, entries in data.items()}
+
+    def save(self):
+        if not self.record_path:
+            return
+        with self._lock:
+            data = json.dumps(self.restarts, indent=1)
+        os.makedirs(os.path.dirname(self.record_path) or '.', exist_ok=True)
+        tmp_path = f"{self.record_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, self.record_path)
+
+    def record(self, service, status, stop_seconds=None, ready_seconds=None, restart_seconds=None):
+        """Add a finished restart and save the history."""
+        entry = {
+            'time': time.time(),
+            'status': status,
+            'stop_seconds': stop_seconds,
+            'ready_seconds': ready_seconds,
+            'restart_seconds': restart_seconds,
+        }
+        with self._lock:
+            entries = self.restarts.setdefault(service, [])
+            entries.append(entry)
+            del entries[:-self.size]
+        try:
+            self.save()
+        except OSError as e:
+            print(f"DEBUG: Could not save restart history: {e}")
+        return entry
+
+    def recent(self, service):
+        """Restarts of a service, oldest first."""
+        with self._lock:
+            return [dict(entry) for entry in self.restarts.get(service, [])]
+
+    def trend(self, service):
+        """
+        Summary of the successful restart durations of a service.
+
+        Returns:
+            dict: count, last, median, min and max restart seconds and whether
+            the last restart was slow compared to the ones before it, None
+            without a successful restart
+        """
+        durations = [entry['restart_seconds'] for entry in self.recent(service)
+                     if entry['status'] == 'success' and entry['restart_seconds'] is not None]
+        if not durations:
+            return None
+        previous = durations[:-1]
+        return {
+            'count': len(durations),
+            'last': durations[-1],
+            'median': round(statistics.median(durations), 2),
+            'min': min(durations),
+            'max': max(durations),
+            'slow': bool(previous) and durations[-1] > SLOW_RESTART_FACTOR * statistics.median(previous),
+        }
@@ -0,0 +1,344 @@
+"""
+Service Supervisor
+
+Restarts ComfyUI, diffusion-pipe, kohya and fluxgym without shelling out to
+lsof and without fixed sleeps:
+
+- the processes listening on a port are found by reading /proc/net/tcp(6) for
+  the listening socket inode and /proc/<pid>/fd for its owner,
+- services launched by the supervisor run in their own session, so their
+  process group (including the workers they started and the processes a
+  restart script put in the background with &) is remembered from launch,
+- whole process groups are stopped, SIGTERM first and SIGKILL for what is still
+  alive after a timeout, and exits are waited for with pidfds (polling /proc
+  where pidfds are not available) instead of sleeping,
+- readiness is measured by probing the port after launch.
+
+A process group is never signalled if it is the control panel's own group (the
+container start script may have started a service next to it); the owner of the
+port and its descendants are signalled one by one instead.
+"""
+
+import os
+import select
+import signal
+import socket
+import subprocess
+import threading
+import time
+
+# /proc/net/tcp socket state of a listening socket
+TCP_LISTEN = '0A'
+
+# Seconds between exit checks of processes that cannot be waited on with a pidfd
+EXIT_POLL_INTERVAL = 0.05
+
+
+def listening_inodes(port, proc_root='/proc'):
+    """Inodes of the TCP sockets listening on port (IPv4 and IPv6)."""
+    inodes = set()
+    for table in ('tcp', 'tcp6'):
+        try:
+            with open(os.path.join(proc_root, 'net', table), 'r') as f:
+                next(f, None)
+                for line in f:
+                    fields = line.split()
+                    if len(fields) < 10 or fields[3] != TCP_LISTEN:
+                        continue
+                    if int(fields[1].rsplit(':', 1)[1], 16) == int(port):
+                        inodes.add(fields[9])
+        except OSError:
+            continue
+    return inodes
+
+
+def port_owners(port, proc_root='/proc'):
+    """
+    PIDs of the processes holding a listening socket on port.
+
+    Returns:
+        list: Sorted PIDs, empty if nothing listens on the port
+    """
+    inodes = listening_inodes(port, proc_root)
+    if not inodes:
+        return []
+    targets = {f"socket:[{inode}]" for inode in inodes}
+    owners = set()
+    for entry in os.listdir(proc_root):
+        if not entry.isdigit():
+            continue
+        fd_dir = os.path.join(proc_root, entry, 'fd')
+        try:
+            fds = os.listdir(fd_dir)
+        except OSError:
+            continue
+        for fd in fds:
+            try:
+                if os.readlink(os.path.join(fd_dir, fd)) in targets:
+                    owners.add(int(entry))
+                    break
+            except OSError:
+                continue
+    return sorted(owners)
+
+
+def read_processes(proc_root='/proc'):
+    """
+    Parent, process group and state of every process.
+
+    Returns:
+        dict: pid -> (ppid, pgrp, state)
+    """
+    processes = {}
+    for entry in os.listdir(proc_root):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(os.path.join(proc_root, entry, 'stat'), 'r') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name is in parentheses and may contain spaces
+        fields = stat[stat.rfind(')') + 2:].split()
+        if len(fields) >= 3:
+            processes[int(entry)] = (int(fields[1]), int(fields[2]), fields[0])
+    return processes
+
+
+def descendants(pid, processes):
+    """PIDs of all children, grandchildren, ... of pid."""
+    children = {}
+    for child, (ppid, _, _) in processes.items():
+        children.setdefault(ppid, []).append(child)
+    found = set()
+    stack = [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            if child not in found:
+                found.add(child)
+                stack.append(child)
+    return found
+
+
+def pid_alive(pid, proc_root='/proc'):
+    """Whether pid exists and is not a zombie."""
+    try:
+        with open(os.path.join(proc_root, str(pid), 'stat'), 'r') as f:
+            stat = f.read()
+    except OSError:
+        return False
+    return stat[stat.rfind(')') + 2:].split()[0] != 'Z'
+
+
+def wait_for_exit(pids, timeout, proc_root='/proc'):
+    """
+    Wait until every process in pids exited, or timeout seconds passed.
+
+    Returns:
+        set: PIDs still alive
+    """
+    pidfds = {}
+    polled = set()
+    for pid in pids:
+        try:
+            pidfds[os.pidfd_open(pid)] = pid
+        except ProcessLookupError:
+            continue
+        except (AttributeError, OSError):
+            polled.add(pid)
+
+    poller = select.poll()
+    for fd in pidfds:
+        poller.register(fd, select.POLLIN)
+
+    deadline = time.monotonic() + timeout
+    try:
+        while pidfds or polled:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            wait = min(remaining, EXIT_POLL_INTERVAL) if polled else remaining
+            for fd, _ in poller.poll(wait * 1000):
+                poller.unregister(fd)
+                os.close(fd)
+                del pidfds[fd]
+            polled = {pid for pid in polled if pid_alive(pid, proc_root)}
+    finally:
+        for fd in pidfds:
+            os.close(fd)
+    return set(pidfds.values()) | polled
+
+
+def retry_with_backoff(attempt, timeout, abort=None, max_backoff=2.0, on_attempt=None):
+    """
+    Repeat an attempt with an exponential backoff until it succeeds.
+
+    Args:
+        attempt: Callable receiving the seconds left and returning (succeeded, detail)
+        timeout: Seconds to give up after
+        abort: Optional callable, stop retrying once it returns True
+        max_backoff: Longest pause between two attempts
+        on_attempt: Optional callable receiving (seconds elapsed, detail) after a failed attempt
+
+    Returns:
+        tuple: (seconds until the attempt succeeded or None, detail of the last attempt)
+    """
+    started = time.monotonic()
+    backoff = 0.1
+    detail = None
+    while True:
+        elapsed = time.monotonic() - started
+        if elapsed >= timeout or (abort and abort()):
+            return None, detail
+        succeeded, detail = attempt(timeout - elapsed)
+        if succeeded:
+            return time.monotonic() - started, detail
+        if on_attempt:
+            on_attempt(time.monotonic() - started, detail)
+        time.sleep(min(backoff, max(0.0, timeout - (time.monotonic() - started))))
+        backoff = min(backoff * 2, max_backoff)
+
+
+def wait_for_port(port, timeout, host='127.0.0.1', abort=None, max_backoff=2.0):
+    """
+    Probe a TCP port until it accepts connections.
+
+    Args:
+        port: Port to connect to
+        timeout: Seconds to give up after
+        host: Host to connect to
+        abort: Optional callable, stop probing once it returns True
+        max_backoff: Longest pause between two probes
+
+    Returns:
+        float: Seconds until the port accepted a connection, None on timeout or abort
+    """
+    def connect(remaining):
+        try:
+            with socket.create_connection((host, int(port)), timeout=min(1.0, remaining)):
+                return True, None
+        except OSError as e:
+            return False, str(e)
+
+    return retry_with_backoff(connect, timeout, abort, max_backoff)[0]
+
+
+class ServiceSupervisor:
+    """
+    Launch, find and stop the services of the pod.
+
+    Args:
+        term_timeout: Seconds to wait for SIGTERM before sending SIGKILL
+        kill_timeout: Seconds to wait for SIGKILL
+        proc_root: Mount point of procfs
+    """
+
+    def __init__(self, term_timeout=10.0, kill_timeout=5.0, proc_root='/proc'):
+        self.term_timeout = term_timeout
+        self.kill_timeout = kill_timeout
+        self.proc_root = proc_root
+        self._lock = threading.Lock()
+        # service -> Popen of the last launch
+        self.launched = {}
+
+    def launch(self, service, args, cwd=None, env=None):
+        """
+        Start a service in its own session and remember its process group.
+
+        Returns:
+            subprocess.Popen: The launched process, stdout and stderr combined in stdout
+        """
+        process = subprocess.Popen(
+            args,
+            cwd=cwd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            env=env,
+            start_new_session=True
+        )
+        with self._lock:
+            self.launched[service] = process
+        print(f"DEBUG: Launched {service} with PID {process.pid}")
+        return process
+
+    def find(self, service, port=None):
+        """PIDs of a service: its launched process group and the owners of its port."""
+        pids = set()
+        with self._lock:
+            process = self.launched.get(service)
+        if process and process.poll() is None:
+            pids.add(process.pid)
+        if port:
+            pids.update(port_owners(port, self.proc_root))
+        return sorted(pids)
+
+    def stop(self, service, port=None):
+        """
+        Stop every process of a service and wait for them to exit.
+
+        Returns:
+            dict: pids (signalled), forced (SIGKILL was needed), remaining (still
+            alive) and seconds (time taken)
+        """
+        started = time.monotonic()
+        targets = self.find(service, port)
+        with self._lock:
+            launched = self.launched.get(service)
+        processes = read_processes(self.proc_root)
+        own_group = os.getpgrp()
+
+        groups = set()
+        singles = set()
+        if launched and any(pgrp == launched.pid for _, pgrp, _ in processes.values()):
+            # Everything the launch started, even if the launched script itself
+            # already exited after putting the service in the background
+            groups.add(launched.pid)
+        for pid in targets:
+            pgrp = processes.get(pid, (0, 0, ''))[1]
+            # A whole group is only signalled when this supervisor started it or
+            # the port owner leads it. Otherwise the group may be start.sh's and
+            # hold Jupyter, TensorBoard and the other services too.
+            if pgrp and pgrp != own_group and (pgrp == pid or pgrp in groups):
+                groups.add(pgrp)
+            else:
+                singles.add(pid)
+                singles.update(descendants(pid, processes))
+
+        members = {pid for pid, (_, pgrp, _) in processes.items() if pgrp in groups} | singles
+        members.discard(os.getpid())
+
+        forced = False
+        remaining = set()
+        if members:
+            self._signal(groups, singles, signal.SIGTERM)
+            remaining = wait_for_exit(members, self.term_timeout, self.proc_root)
+            if remaining:
+                forced = True
+                print(f"DEBUG: {service} did not stop after SIGTERM, killing {sorted(remaining)}")
+                self._signal(groups, singles, signal.SIGKILL)
+                remaining = wait_for_exit(remaining, self.kill_timeout, self.proc_root)
+
+        if launched:
+            # Reap the launched process so it does not stay a zombie
+            launched.poll()
+        return {
+            "pids": sorted(members),
+            "forced": forced,
+            "remaining": sorted(remaining),
+            "seconds": time.monotonic() - started,
+        }
+
+    @staticmethod
+    def _signal(groups, singles, sig):
+        for pgrp in groups:
+            try:
+                os.killpg(pgrp, sig)
+            except (ProcessLookupError, PermissionError) as e:
+                print(f"DEBUG: Could not signal process group {pgrp}: {e}")
+        for pid in singles:
+            try:
+                os.kill(pid, sig)
+            except (ProcessLookupError, PermissionError) as e:
+                print(f"DEBUG: Could not signal process {pid}: {e}")
@@ -0,0 +1,251 @@
+"""
+Trash Purge
+
+Empties a trash directory like /workspace/.Trash-0, which can hold hundreds of
+GB of deleted checkpoints, in a background job instead of a blocking request
+running chmod -R, chown -R, rm -rf and find -exec rm one after the other.
+
+- The tree is walked once with os.scandir. Files are handed to a pool of worker
+  threads as soon as they are found, so the unlinks overlap with the walk and
+  with each other, which is what makes deletion fast on network filesystems
+  where every unlink is a round trip.
+- Directories are removed afterwards, deepest first, each depth level in
+  parallel.
+- Permissions are only fixed for entries that fail: on EACCES/EPERM the parent
+  directory (or the directory that cannot be listed) is made u+rwx and the
+  operation is retried once.
+- Bytes freed and entries remaining are updated after every entry and reported
+  through an on_progress callback. A file that has other hard links frees no
+  space and is not counted.
+"""
+
+import errno
+import os
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from download_scheduler import format_size
+
+# Errors fixed by making the parent directory writable and searchable
+PERMISSION_ERRORS = (errno.EACCES, errno.EPERM)
+
+# Failures kept in the status
+MAX_ERRORS = 20
+
+
+def _make_accessible(path):
+    """Add u+rwx to a directory, returning whether the mode could be changed."""
+    try:
+        mode = os.lstat(path).st_mode
+        os.chmod(path, stat.S_IMODE(mode) | stat.S_IRWXU)
+        return True
+    except OSError:
+        return False
+
+
+def _retry_with_permissions(operation, path, fix_path):
+    """Run operation(path), fixing the permissions of fix_path and retrying once on EACCES/EPERM."""
+    try:
+        return operation(path)
+    except OSError as e:
+        if e.errno not in PERMISSION_ERRORS or not _make_accessible(fix_path):
+            raise
+    return operation(path)
+
+
+class TrashPurge:
+    """
+    Background job deleting everything inside a directory.
+
+    Args:
+        root: Directory to empty; the directory itself is kept
+        workers: Unlinks running in parallel
+        on_progress: Optional callable, called after progress was made
+    """
+
+    def __init__(self, root, workers=16, on_progress=None):
+        self.root = str(root)
+        self.workers = max(1, int(workers))
+        self.on_progress = on_progress
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self.cancel_event = threading.Event()
+
+        self.status = "idle"
+        self.message = ""
+        self.entries_found = 0
+        self.entries_removed = 0
+        self.bytes_freed = 0
+        self.walk_done = False
+        self.errors = []
+        self.error_count = 0
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def running(self):
+        return self.status == "running"
+
+    def start(self):
+        """Start the purge in a background thread."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.status = "running"
+            self.message = f"Emptying {self.root}..."
+            self.started_at = time.time()
+            self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        """Stop handing out more entries; unlinks already running finish."""
+        self.cancel_event.set()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _progress(self):
+        if self.on_progress:
+            try:
+                self.on_progress()
+            except Exception as e:
+                print(f"DEBUG: Error reporting trash purge progress: {e}")
+
+    def _error(self, path, error):
+        with self._lock:
+            self.error_count += 1
+            if len(self.errors) < MAX_ERRORS:
+                self.errors.append(f"{path}: {error.strerror or error}")
+
+    def _unlink(self, path, freed):
+        if self.cancel_event.is_set():
+            return
+        try:
+            _retry_with_permissions(os.unlink, path, os.path.dirname(path))
+        except FileNotFoundError:
+            freed = 0
+        except OSError as e:
+            self._error(path, e)
+            return
+        with self._lock:
+            self.entries_removed += 1
+            self.bytes_freed += freed
+        self._progress()
+
+    def _rmdir(self, path):
+        try:
+            _retry_with_permissions(os.rmdir, path, os.path.dirname(path))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self._error(path, e)
+            return
+        with self._lock:
+            self.entries_removed += 1
+        self._progress()
+
+    def _scan(self, path):
+        """Entries of a directory, fixing its permissions if it cannot be listed."""
+        def listing(directory):
+            with os.scandir(directory) as it:
+                return list(it)
+        return _retry_with_permissions(listing, path, path)
+
+    def run(self):
+        """Empty the directory in the calling thread."""
+        if self.started_at is None:
+            self.started_at = time.time()
+            self.status = "running"
+        directories = []
+        pending = []
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='trash-purge') as pool:
+                stack = [(self.root, 0)]
+                while stack and not self.cancel_event.is_set():
+                    path, depth = stack.pop()
+                    try:
+                        entries = self._scan(path)
+                    except FileNotFoundError:
+                        continue
+                    except OSError as e:
+                        self._error(path, e)
+                        continue
+                    with self._lock:
+                        self.entries_found += len(entries)
+                    for entry in entries:
+                        try:
+                            is_dir = entry.is_dir(follow_symlinks=False)
+                            info = None if is_dir else entry.stat(follow_symlinks=False)
+                        except OSError:
+                            is_dir, info = False, None
+                        if is_dir:
+                            directories.append((depth, entry.path))
+                            stack.append((entry.path, depth + 1))
+                        else:
+                            # Only the last link of a file frees its blocks
+                            freed = info.st_blocks * 512 if info and info.st_nlink <= 1 else 0
+                            pending.append(pool.submit(self._unlink, entry.path, freed))
+                    # Drop finished futures so that huge trees do not keep them all
+                    if len(pending) > self.workers * 64:
+                        pending = [future for future in pending if not future.done()]
+                    self._progress()
+                with self._lock:
+                    self.walk_done = True
+                wait(pending)
+
+                # Deepest directories first, every level in parallel
+                for level in sorted({depth for depth, _ in directories}, reverse=True):
+                    if self.cancel_event.is_set():
+                        break
+                    wait([pool.submit(self._rmdir, path) for depth, path in directories if depth == level])
+        except Exception as e:
+            with self._lock:
+                self.status = "error"
+                self.message = f"Error emptying {self.root}: {e}"
+        else:
+            self._finish()
+        finally:
+            self.finished_at = time.time()
+            self._progress()
+
+    def _finish(self):
+        remaining = self.entries_remaining()
+        freed = format_size(self.bytes_freed)
+        with self._lock:
+            if self.cancel_event.is_set():
+                self.status = "stopped"
+                self.message = f"Stopped emptying {self.root}, {freed} freed"
+            elif self.error_count:
+                self.status = "error"
+                self.message = (f"Emptied {self.root} partially, {remaining} entries could not be removed, "
+                                f"{freed} freed")
+            else:
+                self.status = "success"
+                self.message = (f"Successfully cleared contents of {self.root}, "
+                                f"{self.entries_removed} entries and {freed} freed")
+
+    def entries_remaining(self):
+        with self._lock:
+            return self.entries_found - self.entries_removed
+
+    def to_dict(self):
+        remaining = self.entries_remaining()
+        with self._lock:
+            finished = self.finished_at or time.time()
+            return {
+                "status": self.status,
+                "message": self.message,
+                "path": self.root,
+                "bytes_freed": self.bytes_freed,
+                "entries_found": self.entries_found,
+                "entries_removed": self.entries_removed,
+                "entries_remaining": remaining,
+                "walk_done": self.walk_done,
+                "errors": list(self.errors),
+                "error_count": self.error_count,
+                "seconds": round(finished - self.started_at, 2) if self.started_at else 0,
+            }
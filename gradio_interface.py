@@ -1,8 +1,19 @@
 import queue
 import signal
+import codecs
+import errno
+import fcntl
+import collections
+import logging
+import logging.handlers
+import math
 import subprocess
 import threading
 import gradio as gr
+import pandas as pd
+from PIL import Image
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
 import os
 from datetime import datetime, timedelta
 import json
@@ -16,6 +27,12 @@ import argparse
 import toml
 import shutil
 import zipfile
+import zlib
+import io
+import hashlib
+import struct
+import urllib.parse
+import concurrent.futures
 import tempfile
 import time
 from pathlib import Path
@@ -45,6 +62,70 @@ DOWNLOAD_SCRIPTS_DIR = SCRIPT_PATH / "download_training_transformers"
 # Maximum number of media to display in the gallery
 MAX_MEDIA = 50
 
+# File types shown in the gallery and accepted by the dataset upload
+GALLERY_MEDIA_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp', '.mp4')
+VIDEO_EXTENSIONS = ('.mp4',)
+
+# Gallery previews: longest side in pixels, disk budget and how long a page waits for new ones
+THUMBNAIL_CACHE_DIR = BASE_PATH / "cache" / "thumbnails"
+THUMBNAIL_SIZE = 384
+THUMBNAIL_CACHE_BUDGET_MB = int(os.getenv("THUMBNAIL_CACHE_BUDGET_MB", "1024"))
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", str(min(os.cpu_count() or 1, 8))))
+THUMBNAIL_WAIT_SECONDS = 10
+
+DATASET_FILE_EXTENSIONS = GALLERY_MEDIA_EXTENSIONS + ('.txt',)
+
+# Processes reading image headers and video metadata for the dataset analysis
+DATASET_ANALYZER_WORKERS = int(os.getenv("DATASET_ANALYZER_WORKERS", str(min(os.cpu_count() or 1, 8))))
+
+# Training memory planner: architectures used when a model has no config.json on disk yet.
+# num_layers counts single-stream blocks (a double-stream block counts twice, blocks is the real
+# count used by blocks_to_swap), linears is the number of dim x dim matrices per block besides
+# the feed-forward, latent is the (temporal, spatial) VAE compression times the patch size and
+# text_tokens the prompt tokens that join the attention sequence.
+MODEL_ARCHITECTURES = {
+    "wan": {"dim": 5120, "num_layers": 40, "ffn_dim": 13824, "linears": 8, "latent": (4, 16), "text_tokens": 0},
+    "wan-1.3b": {"dim": 1536, "num_layers": 30, "ffn_dim": 8960, "linears": 8, "latent": (4, 16), "text_tokens": 0},
+    "wan-5b": {"dim": 3072, "num_layers": 30, "ffn_dim": 14336, "linears": 8, "latent": (4, 32), "text_tokens": 0},
+    "wan-14b": {"dim": 5120, "num_layers": 40, "ffn_dim": 13824, "linears": 8, "latent": (4, 16), "text_tokens": 0},
+    "hunyuan-video": {"dim": 3072, "num_layers": 80, "blocks": 60, "ffn_dim": 12288, "linears": 8, "latent": (4, 16), "text_tokens": 256},
+    "ltx-video": {"dim": 2048, "num_layers": 28, "ffn_dim": 8192, "linears": 8, "latent": (8, 32), "text_tokens": 0},
+    "flux": {"dim": 3072, "num_layers": 76, "blocks": 57, "ffn_dim": 12288, "linears": 8, "latent": (1, 16), "text_tokens": 512},
+    # Mixture of experts: all experts are in memory, the shared one and two routed ones compute
+    "hidream": {"dim": 2560, "num_layers": 64, "blocks": 48, "ffn_dim": 34560, "active_ffn_dim": 20736, "linears": 8, "latent": (1, 16), "text_tokens": 256},
+}
+DTYPE_BYTES = {"float32": 4, "float16": 2, "bfloat16": 2, "float8": 1, "nf4": 0.5}
+# Optimizer state per trained parameter, everything else keeps two fp32 moments
+OPTIMIZER_STATE_BYTES = {"adamw8bit": 2, "adamw8bitKahan": 4, "automagic": 2, "sgd": 0, "offload": 0}
+# Assumed throughput of the GPU (dense bf16 TFLOPS actually reached) and of the PCIe link for
+# swapped blocks, plus the memory taken by the CUDA context, latents and fragmentation
+PLANNER_GPU_TFLOPS = float(os.getenv("PLANNER_GPU_TFLOPS", "150"))
+PLANNER_PCIE_GBPS = float(os.getenv("PLANNER_PCIE_GBPS", "20"))
+PLANNER_OVERHEAD_GB = float(os.getenv("PLANNER_OVERHEAD_GB", "2.5"))
+PLANNER_SATURATION_TOKENS = 256  # Tokens per micro batch at which the GPU runs at half its throughput
+
+# Per-dataset file lists with sizes (see DatasetManifest)
+DATASET_MANIFEST_DIR = BASE_PATH / "cache" / "dataset_manifests"
+
+# ioctl cloning a file's extents into another file (linux/fs.h), see reflink_file
+FICLONE = 0x40049409
+
+# ZIP export: already compressed formats are stored, small compressible files are deflated in threads
+ZIP_STORED_EXTENSIONS = {
+    '.safetensors', '.ckpt', '.pt', '.pth', '.bin', '.gguf',
+    '.png', '.jpg', '.jpeg', '.webp', '.gif', '.avif',
+    '.mp4', '.mov', '.webm', '.mkv', '.avi',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.zst', '.7z',
+}
+ZIP_COMPRESS_WORKERS = int(os.getenv("ZIP_COMPRESS_WORKERS", str(min(os.cpu_count() or 1, 8))))
+ZIP_PARALLEL_MAX_BYTES = 16 * 1024 * 1024
+ZIP_CHUNK_SIZE = 1024 * 1024
+ZIP_FLAGS = 0x0808  # Data descriptor after each entry, UTF-8 names
+
+# Uploaded ZIP files: extraction threads and seconds between progress messages
+ZIP_EXTRACT_WORKERS = int(os.getenv("ZIP_EXTRACT_WORKERS", str(min(os.cpu_count() or 1, 8))))
+ZIP_PROGRESS_INTERVAL = 0.5
+
 # Determine if running on Runpod by checking the environment variable
 IS_RUNPOD = os.getenv("IS_RUNPOD", "false").lower() == "true"
 
@@ -53,10 +134,276 @@ CONDA_DIR = os.getenv("CONDA_DIR", "/opt/conda")  # Directory where Conda is ins
 # Maximum upload size in MB (Gradio expects max_file_size in MB)
 MAX_UPLOAD_SIZE_MB = 500 if IS_RUNPOD else None  # 500MB or no limit
 
-process_dict = {}
-process_lock = threading.Lock()
+# Training log: lines kept in memory, lines shown in the log box and the rotated file on disk
+TRAINING_LOG_BUFFER_LINES = int(os.getenv("TRAINING_LOG_BUFFER_LINES", "20000"))
+TRAINING_LOG_TAIL_LINES = int(os.getenv("TRAINING_LOG_TAIL_LINES", "500"))
+TRAINING_LOG_PATH = BASE_PATH / "logs" / "training.log"
+TRAINING_LOG_MAX_BYTES = 50 * 1024 * 1024
+TRAINING_LOG_BACKUP_COUNT = 5
+
+# Number of training steps kept for the metrics plots and /metrics
+TRAINING_METRICS_MAX_POINTS = int(os.getenv("TRAINING_METRICS_MAX_POINTS", "5000"))
+
+# Training queue: jobs and their logs survive restarts of the UI
+TRAINING_QUEUE_PATH = CONFIG_DIR / "training_queue.json"
+TRAINING_JOB_LOG_DIR = BASE_PATH / "logs" / "jobs"
+TRAINING_QUEUE_HISTORY = 100  # Finished jobs kept in the queue file
+TRAINING_QUEUE_MAX_BACKFILL_WAIT = int(os.getenv("TRAINING_QUEUE_MAX_BACKFILL_WAIT", "1800"))
+JOB_ACTIVE_STATES = ("queued", "running")
+JOB_TABLE_HEADERS = ["Job", "Dataset", "State", "GPUs", "Assigned GPUs", "Started", "Result"]
+DIFFPIPE_VENV_ACTIVATE = "/workspace/diffusion-pipe/diffpipe_venv/bin/activate"
+DEEPSPEED_BASE_PORT = 29500
+
+class TrainingLogStore:
+    """
+    Bounded, line-indexed store for the training output.
+    
+    Every line gets a sequence number so clients can ask for the lines after
+    the last one they have seen. Only the newest max_lines stay in memory; the
+    full log is written to a rotating file. Progress bars redrawn with \\r
+    (tqdm) keep replacing the unfinished line and only their final state is
+    stored.
+    """
+    
+    def __init__(self, max_lines=TRAINING_LOG_BUFFER_LINES, log_path=TRAINING_LOG_PATH,
+                 max_bytes=TRAINING_LOG_MAX_BYTES, backup_count=TRAINING_LOG_BACKUP_COUNT, on_line=None):
+        self.on_line = on_line  # Called with every completed line, from the writing thread
+        self.lines = collections.deque(maxlen=max_lines)  # (seq, text) pairs
+        self.next_seq = 0
+        self.version = 0  # Bumped on every change, including progress bar redraws
+        self.lock = threading.Lock()
+        self.log_path = str(log_path) if log_path else None
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._partial = ""  # Unfinished last line
+        self._redraw = False  # A \r was seen, the next text replaces the unfinished line
+        self._logger = None
+        
+    def _file_logger(self):
+        if self._logger is None and self.log_path:
+            try:
+                os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+                handler = logging.handlers.RotatingFileHandler(
+                    self.log_path, maxBytes=self.max_bytes, backupCount=self.backup_count, encoding='utf-8'
+                )
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                self._logger = logging.getLogger(f"training_log.{id(self)}")
+                self._logger.setLevel(logging.INFO)
+                self._logger.propagate = False
+                self._logger.addHandler(handler)
+            except OSError as e:
+                print(f"Warning: Cannot write training log to {self.log_path}: {e}")
+                self.log_path = None
+        return self._logger
+        
+    def _append(self, text):
+        self.lines.append((self.next_seq, text))
+        self.next_seq += 1
+        if self.on_line:
+            try:
+                self.on_line(text)
+            except Exception as e:
+                print(f"Error processing log line: {e}")
+        logger = self._file_logger()
+        if logger:
+            logger.info(text)
+            
+    def write(self, text):
+        """Add raw output. Text after a \\r replaces the unfinished line (progress bar redraw)."""
+        with self.lock:
+            for piece in re.split(r'(\r\n|\r|\n)', text):
+                if piece in ('\n', '\r\n'):
+                    self._append(self._partial)
+                    self._partial = ""
+                    self._redraw = False
+                elif piece == '\r':
+                    self._redraw = True
+                elif piece:
+                    if self._redraw:
+                        self._partial = piece
+                        self._redraw = False
+                    else:
+                        self._partial += piece
+            self.version += 1
+            
+    def read(self, offset=0, limit=None):
+        """
+        Return completed lines with a sequence number >= offset.
+        
+        Returns:
+            dict: lines, next_offset to pass on the next call, first_offset still in
+            memory and dropped (lines after offset that are only left in the log file)
+        """
+        with self.lock:
+            first_offset = self.lines[0][0] if self.lines else self.next_seq
+            offset = max(int(offset or 0), 0)
+            page = [text for seq, text in self.lines if seq >= offset]
+            if limit:
+                page = page[:int(limit)]
+            return {
+                "lines": page,
+                "next_offset": max(offset, first_offset) + len(page),
+                "first_offset": first_offset,
+                "dropped": max(first_offset - offset, 0),
+            }
+            
+    def tail(self, count=TRAINING_LOG_TAIL_LINES):
+        """Return the last count lines as text, including an unfinished progress bar line."""
+        with self.lock:
+            lines = [self.lines[i][1] for i in range(max(len(self.lines) - count, 0), len(self.lines))]
+            if self._partial:
+                lines = lines[1:] if len(lines) >= count else lines
+                lines.append(self._partial)
+            return "\n".join(lines)
+            
+    def clear(self):
+        """Forget the lines in memory. The log file keeps them."""
+        with self.lock:
+            self.lines.clear()
+            self._partial = ""
+            self._redraw = False
+            self.version += 1
+
+# Patterns of the progress lines printed by diffusion-pipe and deepspeed, e.g.
+#   Total steps: 1200 / Steps per epoch: 40 / Started new epoch: 3
+#   [Rank 0] step=120, skipped=0, lr=[2e-05], mom=[(0.9, 0.99)]
+#   steps: 120 loss: 0.0913 iter time (s): 2.104 samples/sec: 0.951
+#   100%|####| 40/40 [01:24<00:00,  2.11s/it] or 1.52it/s
+# Other tqdm bars (caching latents and text embeddings, eval) share the last
+# format, so a bar only counts as training progress when it runs over the steps
+# of an epoch or of the whole run and its description does not name another phase.
+TOTAL_STEPS_RE = re.compile(r'Total steps:\s*(\d+)')
+STEPS_PER_EPOCH_RE = re.compile(r'Steps per epoch:\s*(\d+)')
+EPOCH_RE = re.compile(r'Started new epoch:\s*(\d+)')
+STEP_RE = re.compile(r'(?<!Total )\bsteps?[=:]\s*(\d+)')
+LOSS_RE = re.compile(r'\bloss[=:]\s*([-+]?(?:\d+\.?\d*(?:[eE][-+]?\d+)?|nan|inf))')
+LR_RE = re.compile(r'\blr=\[?\s*([-+]?\d+\.?\d*(?:[eE][-+]?\d+)?)')
+ITER_TIME_RE = re.compile(r'iter time \(s\):\s*(\d+\.?\d*)')
+SAMPLES_PER_SEC_RE = re.compile(r'samples/sec[=:]\s*(\d+\.?\d*)')
+PROGRESS_BAR_RE = re.compile(
+    r'^(?P<desc>[^|]*?)\d+%\|[^|]*\|\s*\d+/(?P<total>\d+)\s*\[[^\]]*?(?P<rate>\d+\.?\d*)\s*(?P<unit>it/s|s/it)'
+)
+NON_TRAINING_BAR_RE = re.compile(r'cach|latent|embed|eval|valid|map|load', re.IGNORECASE)
+
+class TrainingMetrics:
+    """
+    Step, epoch, loss, learning rate and throughput parsed from the training log.
+    
+    parse_line() is called once per completed log line by the reader thread;
+    one point per optimizer step is kept in a bounded time series.
+    """
+    
+    def __init__(self, max_points=TRAINING_METRICS_MAX_POINTS):
+        self.points = collections.deque(maxlen=max_points)
+        self.lock = threading.Lock()
+        self.version = 0  # Bumped whenever the time series changes
+        self.reset()
+        
+    def reset(self):
+        with self.lock:
+            self.points.clear()
+            self.version += 1
+            self.started_at = time.time()
+            self.current = {
+                "total_steps": 0,
+                "steps_per_epoch": 0,
+                "epoch": None,
+                "step": 0,
+                "loss": None,
+                "lr": None,
+                "it_s": None,
+                "samples_s": None,
+            }
+            
+    def _is_training_bar(self, match):
+        """Whether a tqdm bar matched by PROGRESS_BAR_RE counts the training steps."""
+        if NON_TRAINING_BAR_RE.search(match.group("desc")):
+            return False
+        with self.lock:
+            step_counts = {self.current["steps_per_epoch"], self.current["total_steps"]} - {0}
+        return int(match.group("total")) in step_counts
+        
+    def parse_line(self, line):
+        """Update the metrics from one log line."""
+        updates = {}
+        for key, pattern in (("total_steps", TOTAL_STEPS_RE), ("steps_per_epoch", STEPS_PER_EPOCH_RE),
+                             ("epoch", EPOCH_RE), ("step", STEP_RE)):
+            match = pattern.search(line)
+            if match:
+                updates[key] = int(match.group(1))
+                
+        for key, pattern in (("loss", LOSS_RE), ("lr", LR_RE), ("samples_s", SAMPLES_PER_SEC_RE)):
+            match = pattern.search(line)
+            if match:
+                value = float(match.group(1))
+                # nan/inf loss is reported as missing, JSON has no value for it
+                updates[key] = value if math.isfinite(value) else None
+                
+        match = ITER_TIME_RE.search(line)
+        if match and float(match.group(1)) > 0:
+            updates["it_s"] = 1 / float(match.group(1))
+        else:
+            match = PROGRESS_BAR_RE.search(line)
+            if match and self._is_training_bar(match) and float(match.group("rate")) > 0:
+                rate = float(match.group("rate"))
+                updates["it_s"] = rate if match.group("unit") == "it/s" else 1 / rate
+                
+        if not updates:
+            return
+            
+        with self.lock:
+            self.current.update(updates)
+            if not ({"step", "loss", "lr", "it_s", "samples_s"} & updates.keys()):
+                return
+            point = {
+                "time": round(time.time() - self.started_at, 1),
+                "step": self.current["step"],
+                "epoch": self.current["epoch"],
+                "loss": self.current["loss"] if "loss" in updates else None,
+                "lr": self.current["lr"],
+                "it_s": self.current["it_s"],
+                "samples_s": self.current["samples_s"],
+            }
+            if self.points and self.points[-1]["step"] == point["step"]:
+                # Several lines describe the same step, merge them
+                last = self.points[-1]
+                last.update({key: value for key, value in point.items() if value is not None})
+            else:
+                self.points.append(point)
+            self.version += 1
+                
+    def snapshot(self, since_step=None):
+        """
+        Return the latest values and the time series.
+        
+        Args:
+            since_step: Only include points after this step
+        """
+        with self.lock:
+            points = [dict(point) for point in self.points
+                      if since_step is None or point["step"] > since_step]
+            return dict(self.current, version=self.version, elapsed=round(time.time() - self.started_at, 1),
+                        points=points)
+
+def metrics_plot_data(points):
+    """Build the data frames of the loss and throughput plots from metric points."""
+    frame = pd.DataFrame(points, columns=["time", "step", "epoch", "loss", "lr", "it_s", "samples_s"])
+    loss = frame.dropna(subset=["loss"])[["step", "loss"]]
+    throughput = frame.dropna(subset=["it_s"])[["step", "it_s"]]
+    return loss, throughput
 
-log_queue = queue.Queue()
+def get_training_metrics(since_step: int = None):
+    """JSON for /metrics: latest step, epoch, loss, lr, it/s, samples/s and the time series."""
+    return training_metrics.snapshot(since_step)
+
+training_metrics = TrainingMetrics()
+training_log = TrainingLogStore(on_line=training_metrics.parse_line)
+
+# Model configurations parsed from DOWNLOAD_SCRIPTS_DIR (see parse_model_configs)
+model_configs_lock = threading.Lock()
+model_config_cache = {}  # script name -> ((mtime_ns, size), (model_name, config) or None)
+model_configs_signatures = {}
+model_configs_registry = None
 
 # Define custom CSS for styling the log box and search box
 custom_log_box_css = """
@@ -79,32 +426,442 @@ max-height: 320px!important;
 }
 """
 
-def read_subprocess_output(proc, log_queue):
-    # Read lines from stdout
-    for line in iter(proc.stdout.readline, b''):
-        decoded_line = line.decode('utf-8', errors='replace')
-        # Strip out carriage returns and replace with newlines if needed
-        decoded_line = decoded_line.replace('\r', '\n')
-        log_queue.put(decoded_line)
-    
-    proc.stdout.close()
-    proc.wait()
-    with process_lock:
-        pid = proc.pid
-        if pid in process_dict:
-            del process_dict[pid]
+def detect_gpus():
+    """Return the indices of the local GPUs from nvidia-smi, or range(NUM_GPUS) without it."""
+    try:
+        result = subprocess.run(
+            ["nvidia-smi", "--query-gpu=index", "--format=csv,noheader"],
+            capture_output=True, text=True, timeout=10
+        )
+        if result.returncode == 0:
+            gpus = [int(line) for line in result.stdout.split() if line.strip().isdigit()]
+            if gpus:
+                return gpus
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"Warning: Cannot query GPUs with nvidia-smi: {e}")
+    return list(range(int(os.getenv("NUM_GPUS", "1"))))
+
+def detect_gpu_memory_gb():
+    """Memory of the smallest local GPU in GB from nvidia-smi, or None without it."""
+    try:
+        result = subprocess.run(
+            ["nvidia-smi", "--query-gpu=memory.total", "--format=csv,noheader,nounits"],
+            capture_output=True, text=True, timeout=10
+        )
+        if result.returncode == 0:
+            sizes = [int(line) for line in result.stdout.split() if line.strip().isdigit()]
+            if sizes:
+                return round(min(sizes) / 1024)
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"Warning: Cannot query GPU memory with nvidia-smi: {e}")
+    return None
+
+def pid_alive(pid):
+    """Check whether a process exists, also for processes started before a UI restart."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def snapshot_job_configs(training_config_path, job_dir):
+    """
+    Copy a training config and the dataset config it references into job_dir.
+    
+    The copy of the training config points at the copy of the dataset config, so
+    the job keeps its settings when the UI writes new configs for the same
+    dataset before the job starts.
+    
+    Returns:
+        str: Path of the copied training config
+    """
+    os.makedirs(job_dir, exist_ok=True)
+    with open(training_config_path, "r") as f:
+        training_config = toml.load(f)
+    dataset_config_path = training_config.get("dataset")
+    if dataset_config_path:
+        job_dataset_config_path = os.path.join(job_dir, os.path.basename(dataset_config_path))
+        shutil.copyfile(dataset_config_path, job_dataset_config_path)
+        training_config["dataset"] = job_dataset_config_path
+    job_config_path = os.path.join(job_dir, os.path.basename(training_config_path))
+    with open(job_config_path, "w") as f:
+        toml.dump(training_config, f)
+    return job_config_path
+
+def launch_deepspeed_job(job, log_file):
+    """Start diffusion-pipe for a job on its assigned GPUs, writing all output to log_file."""
+    gpus = ",".join(str(gpu) for gpu in job["gpus"])
+    resume_checkpoint = "--resume_from_checkpoint" if job["resume"] else ""
+    
+    # --include pins the job to its GPUs (deepspeed sets CUDA_VISIBLE_DEVICES from it) and
+    # every job needs its own rendezvous port to run next to the others
+    cmd = (
+        f"bash -c 'source {DIFFPIPE_VENV_ACTIVATE} && "
+        f"NCCL_P2P_DISABLE=1 NCCL_IB_DISABLE=1 {'NCCL_SHM_DISABLE=1' if len(job['gpus']) > 1 else ''} "
+        f"deepspeed --include localhost:{gpus} --master_port {job['master_port']} "
+        f"train.py --deepspeed --config {job['config_path']} {resume_checkpoint}'"
+    )
+    job["command"] = cmd
+    log_file.write(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Training started on GPU(s) {gpus}: {cmd}\n".encode())
+    log_file.flush()
+    
+    # The output goes straight to the job's log file instead of a pipe, so the run
+    # survives a restart of this UI and its log can be followed again afterwards
+    return subprocess.Popen(
+        cmd,
+        shell=True,  # Required for complex shell commands
+        stdout=log_file,
+        stderr=subprocess.STDOUT,
+        preexec_fn=os.setsid
+    )
+
+class TrainingQueue:
+    """
+    Persistent queue of training jobs sharing the GPUs of this machine.
+    
+    Each job is a generated training config plus the number of GPUs it needs.
+    Queued jobs start as soon as enough GPUs are free and several jobs run side
+    by side on disjoint GPU subsets. Jobs are kept in a JSON file so queued and
+    running jobs are picked up again after a restart of the UI; a running job
+    keeps going because it writes to its own log file, not to this process.
+    
+    Scheduling is first come, first served with backfill: a job that does not
+    fit yet does not block smaller jobs behind it, which packs single-GPU runs
+    into the gaps next to larger ones. Once the oldest queued job has waited
+    longer than max_backfill_wait seconds no new jobs start until it fits.
+    
+    Args:
+        state_path: JSON file holding the jobs
+        log_dir: Directory of the per-job log files
+        gpu_inventory: Callable returning the list of usable GPU indices
+        launcher: Callable (job, log_file) starting a job and returning its Popen
+        max_backfill_wait: Seconds after which the oldest job stops being overtaken
+        poll_interval: Seconds between scheduling passes of the monitor thread
+    """
+    
+    def __init__(self, state_path=TRAINING_QUEUE_PATH, log_dir=TRAINING_JOB_LOG_DIR, gpu_inventory=detect_gpus,
+                 launcher=launch_deepspeed_job, max_backfill_wait=TRAINING_QUEUE_MAX_BACKFILL_WAIT, poll_interval=2.0):
+        self.state_path = str(state_path)
+        self.log_dir = str(log_dir)
+        self.gpu_inventory = gpu_inventory
+        self.launcher = launcher
+        self.max_backfill_wait = max_backfill_wait
+        self.poll_interval = poll_interval
+        self.jobs = []  # Job dicts in submission order
+        self.processes = {}  # job id -> Popen of the jobs started by this process
+        self.lock = threading.RLock()
+        self._gpus = None
+        self._monitor = None
+        self.load()
+        
+    @property
+    def gpus(self):
+        if self._gpus is None:
+            self._gpus = sorted(self.gpu_inventory())
+        return self._gpus
+        
+    def load(self):
+        """Read the saved jobs. Running jobs whose process is gone are marked as ended."""
+        try:
+            with open(self.state_path, 'r') as f:
+                jobs = json.load(f).get("jobs", [])
+        except FileNotFoundError:
+            jobs = []
+        except (OSError, ValueError) as e:
+            print(f"Warning: Cannot read training queue {self.state_path}: {e}")
+            jobs = []
+        with self.lock:
+            self.jobs = jobs
+            self._reap()
+            
+    def save(self):
+        with self.lock:
+            finished = [job for job in self.jobs if job["state"] not in JOB_ACTIVE_STATES]
+            for job in finished[:-TRAINING_QUEUE_HISTORY]:
+                self.jobs.remove(job)
+                if job.get("config_dir"):
+                    shutil.rmtree(job["config_dir"], ignore_errors=True)
+            data = json.dumps({"jobs": self.jobs}, indent=2)
+        try:
+            os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+            tmp_path = f"{self.state_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(data)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            print(f"Warning: Cannot save training queue {self.state_path}: {e}")
+            
+    def _find(self, job_id):
+        for job in self.jobs:
+            if job["id"] == job_id:
+                return job
+        return None
+    
+    def get(self, job_id):
+        """Return a copy of one job or None."""
+        with self.lock:
+            job = self._find(job_id)
+            return dict(job) if job else None
+        
+    def list(self):
+        """Return copies of all jobs, oldest first."""
+        with self.lock:
+            return [dict(job) for job in self.jobs]
+        
+    def is_active(self, job_id):
+        with self.lock:
+            job = self._find(job_id)
+            return bool(job) and job["state"] in JOB_ACTIVE_STATES
+        
+    def submit(self, name, config_path, output_dir, num_gpus=1, resume=False, config_dir=None):
+        """
+        Queue a training run and start it right away if its GPUs are free.
+        
+        Args:
+            config_dir: If given, the training and dataset configs are copied to
+                config_dir/<job id>/ and the job runs with the copies
+        
+        Returns:
+            tuple: (error message or None, copy of the job)
+        """
+        num_gpus = int(num_gpus or 1)
+        if num_gpus < 1 or num_gpus > len(self.gpus):
+            return f"A job can use 1 to {len(self.gpus)} GPU(s), got {num_gpus}.", None
+        
+        with self.lock:
+            job_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{len(self.jobs) + 1}"
+            while self._find(job_id):
+                job_id += "x"
+            job_config_dir = None
+            if config_dir:
+                job_config_dir = os.path.join(config_dir, job_id)
+                try:
+                    config_path = snapshot_job_configs(config_path, job_config_dir)
+                except (OSError, ValueError) as e:
+                    shutil.rmtree(job_config_dir, ignore_errors=True)
+                    return f"Could not copy the configs of the job: {e}", None
+            job = {
+                "id": job_id,
+                "name": name,
+                "config_path": str(config_path),
+                "config_dir": job_config_dir,
+                "output_dir": str(output_dir),
+                "resume": bool(resume),
+                "num_gpus": num_gpus,
+                "state": "queued",
+                "gpus": [],
+                "master_port": None,
+                "pid": None,
+                "log_path": os.path.join(self.log_dir, f"{job_id}.log"),
+                "command": None,
+                "submitted_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "returncode": None,
+                "error": None,
+            }
+            self.jobs.append(job)
+            self.schedule()
+            return None, dict(job)
+        
+    def free_gpus(self):
+        with self.lock:
+            busy = {gpu for job in self.jobs if job["state"] == "running" for gpu in job["gpus"]}
+            return [gpu for gpu in self.gpus if gpu not in busy]
+        
+    def _finish(self, job, state, returncode=None, error=None):
+        job.update(state=state, returncode=returncode, finished_at=time.time())
+        if error:
+            job["error"] = error
+        self.processes.pop(job["id"], None)
+        
+    def _reap(self):
+        """Collect the jobs whose process exited."""
+        for job in self.jobs:
+            if job["state"] != "running":
+                continue
+            proc = self.processes.get(job["id"])
+            if proc is not None:
+                returncode = proc.poll()
+                if returncode is None:
+                    continue
+            elif job["pid"] and pid_alive(job["pid"]):
+                continue  # Started before a restart of the UI and still running
+            else:
+                returncode = None
+            
+            if job.get("stop_requested"):
+                self._finish(job, "stopped", returncode)
+            elif returncode is None:
+                self._finish(job, "ended", error="Exit code unknown, the job ended while the UI was restarting")
+            else:
+                self._finish(job, "completed" if returncode == 0 else "failed", returncode)
+                
+    def _start(self, job, gpus):
+        used_ports = {j["master_port"] for j in self.jobs if j["state"] == "running"}
+        port = DEEPSPEED_BASE_PORT
+        while port in used_ports:
+            port += 1
+        job.update(gpus=gpus, master_port=port, started_at=time.time())
+        try:
+            os.makedirs(os.path.dirname(job["log_path"]), exist_ok=True)
+            with open(job["log_path"], 'ab') as log_file:
+                proc = self.launcher(job, log_file)
+        except Exception as e:
+            self._finish(job, "failed", error=f"Could not start training: {e}")
+            return
+        job.update(state="running", pid=proc.pid)
+        self.processes[job["id"]] = proc
+        print(f"Started training job {job['id']} on GPU(s) {gpus} (pid {proc.pid})")
+        
+    def schedule(self):
+        """Reap finished jobs and start the queued jobs that fit on the free GPUs."""
+        with self.lock:
+            self._reap()
+            free = self.free_gpus()
+            queued = [job for job in self.jobs if job["state"] == "queued"]
+            for position, job in enumerate(queued):
+                if job["num_gpus"] <= len(free):
+                    self._start(job, free[:job["num_gpus"]])
+                    free = free[job["num_gpus"]:]
+                elif position == 0 and time.time() - job["submitted_at"] > self.max_backfill_wait:
+                    break  # Let the GPUs drain for the oldest job instead of starving it
+            self.save()
+            
+    def _wait(self, proc, pid, timeout):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            exited = proc.poll() is not None if proc is not None else not pid_alive(pid)
+            if exited:
+                return True
+            time.sleep(0.1)
+        return False
+            
+    def stop(self, job_id, timeout=5):
+        """Remove a queued job or terminate a running one with its whole process group."""
+        with self.lock:
+            job = self._find(job_id)
+            if job is None:
+                return "No training process is currently running."
+            if job["state"] == "queued":
+                self._finish(job, "cancelled")
+                self.save()
+                return f"Training job {job_id} removed from the queue."
+            if job["state"] != "running":
+                return "Training process has already finished."
+            job["stop_requested"] = True
+            pid = job["pid"]
+            proc = self.processes.get(job_id)
+            
+        try:
+            # Send SIGTERM signal to the entire process group
+            os.killpg(os.getpgid(pid), signal.SIGTERM)
+            if self._wait(proc, pid, timeout):
+                message = "Training process terminated gracefully."
+            else:
+                # Force termination if SIGTERM does not work
+                os.killpg(os.getpgid(pid), signal.SIGKILL)
+                self._wait(proc, pid, timeout)
+                message = "Training process killed forcefully."
+        except ProcessLookupError:
+            message = "Training process has already finished."
+        except Exception as e:
+            return f"Error stopping training process: {str(e)}"
+        
+        self.schedule()
+        return message
+    
+    def _run(self):
+        while True:
+            try:
+                self.schedule()
+            except Exception as e:
+                print(f"Error in training queue: {e}")
+            time.sleep(self.poll_interval)
+            
+    def start(self):
+        """Start the monitor thread that reaps finished jobs and starts queued ones."""
+        if self._monitor is None:
+            self._monitor = threading.Thread(target=self._run, daemon=True)
+            self._monitor.start()
+
+def follow_log_file(path, log_store, stop_event, is_active):
+    """Copy a job's log file into log_store as it grows, until the job ended or stop_event is set."""
+    # Queued jobs have no log file yet
+    while not os.path.exists(path):
+        if not is_active() or stop_event.wait(0.5):
+            return
+    
+    # Read whatever is available instead of whole lines, so progress bars that
+    # only redraw with \r show up while they run
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    with open(path, 'rb') as f:
+        while not stop_event.is_set():
+            active = is_active()
+            chunk = f.read(65536)
+            if chunk:
+                log_store.write(decoder.decode(chunk))
+            elif not active:
+                break
+            else:
+                stop_event.wait(0.5)
+    log_store.write(decoder.decode(b'', final=True))
+
+def watch_training_job(job_id):
+    """Show a job in the log box and the metrics: restart the log follower on its log file."""
+    job = training_queue.get(job_id)
+    if job is None:
+        return False
+    
+    with log_follower_lock:
+        if log_follower["stop"] is not None:
+            log_follower["stop"].set()
+            log_follower["thread"].join(timeout=2)
+        training_log.clear()
+        training_metrics.reset()
+        stop_event = threading.Event()
+        thread = threading.Thread(
+            target=follow_log_file,
+            args=(job["log_path"], training_log, stop_event, lambda: training_queue.is_active(job_id)),
+            daemon=True
+        )
+        log_follower.update(job_id=job_id, stop=stop_event, thread=thread)
+        thread.start()
+    return True
+
+def training_job_rows():
+    """Rows of the training queue table, newest job first."""
+    rows = []
+    for job in reversed(training_queue.list()):
+        started = datetime.fromtimestamp(job["started_at"]).strftime('%Y-%m-%d %H:%M:%S') if job["started_at"] else ""
+        rows.append([
+            job["id"],
+            job["name"],
+            job["state"],
+            job["num_gpus"],
+            ",".join(str(gpu) for gpu in job["gpus"]),
+            started,
+            job["error"] or (f"exit code {job['returncode']}" if job["returncode"] else ""),
+        ])
+    return rows
+
+training_queue = TrainingQueue()
+log_follower_lock = threading.Lock()
+log_follower = {"job_id": None, "stop": None, "thread": None}
 
 def update_logs(log_box, subprocess_proc):
-    new_logs = ""
-    while not log_queue.empty():
-        new_logs += log_queue.get()
-    return log_box + new_logs
+    return training_log.tail()
 
 def clear_logs():
-    while not log_queue.empty():
-        log_queue.get()
+    training_log.clear()
     return ""
 
+def get_training_log_page(offset, limit=1000):
+    """Return up to limit training log lines starting at line number offset."""
+    return training_log.read(offset, limit)
+
 def create_dataset_config(dataset_path: str,
                         config_dir: str,
                         num_repeats: int, 
@@ -199,7 +956,10 @@ def create_training_config(
     enable_wandb: bool = False,
     wandb_run_name: str = None,
     wandb_tracker_name: str = None,
-    wandb_api_key: str = None
+    wandb_api_key: str = None,
+    
+    # Number of GPUs one copy of the model is split over
+    pipeline_stages: int = None
 ):
     """
     Creates a training configuration dictionary from individual parameters.
@@ -287,7 +1047,7 @@ def create_training_config(
         "caching_batch_size": caching_batch_size,
         "steps_per_print": steps_per_print,
         "video_clip_mode": video_clip_mode,
-        "pipeline_stages": num_gpus,
+        "pipeline_stages": int(pipeline_stages) if pipeline_stages else num_gpus,
         # Model configuration with fixed type and sampling method
         "model": model_config,
         # Adapter configuration with fixed type
@@ -529,6 +1289,383 @@ def validate_ar_buckets(ar_buckets):
     except Exception as e:
         return f"Unexpected error while validating ar_buckets: {str(e)}", None
     
+def probe_media(path):
+    """
+    Read the dimensions and frame count of a dataset file without decoding it.
+    Runs in the worker processes of analyze_dataset.
+    
+    Returns:
+        dict: width, height, frames, fps and error (None if the file could be read)
+    """
+    info = {"path": path, "width": None, "height": None, "frames": 1, "fps": None, "error": None}
+    try:
+        if path.lower().endswith(VIDEO_EXTENSIONS):
+            result = subprocess.run(
+                ["ffprobe", "-v", "error", "-select_streams", "v:0",
+                 "-show_entries", "stream=width,height,nb_frames,avg_frame_rate,duration", "-of", "json", path],
+                capture_output=True, text=True, timeout=30
+            )
+            if result.returncode != 0:
+                raise OSError(result.stderr.strip() or "ffprobe failed")
+            stream = json.loads(result.stdout)["streams"][0]
+            num, _, den = stream.get("avg_frame_rate", "0/1").partition("/")
+            fps = float(num) / float(den or 1) if float(den or 1) else 0.0
+            frames = int(stream.get("nb_frames") or 0)
+            if not frames and fps:
+                frames = int(float(stream.get("duration") or 0) * fps)  # Containers without a frame count
+            info.update(width=int(stream["width"]), height=int(stream["height"]), frames=frames, fps=round(fps, 3))
+        else:
+            # Opening an image only parses its header
+            with Image.open(path) as image:
+                info["width"], info["height"] = image.size
+    except Exception as e:
+        info["error"] = str(e)
+    return info
+
+def dataset_ar_buckets(enable_ar_bucket, min_ar, max_ar, num_ar_buckets, ar_buckets):
+    """Aspect ratios (width / height) of the AR buckets, as diffusion-pipe derives them."""
+    if ar_buckets:
+        return [b[0] / b[1] if isinstance(b, list) else float(b) for b in ar_buckets]
+    if not enable_ar_bucket:
+        return [1.0]
+    num_ar_buckets = max(int(num_ar_buckets), 1)
+    if num_ar_buckets == 1:
+        return [math.sqrt(min_ar * max_ar)]
+    # Evenly spaced in log space between min_ar and max_ar
+    step = (math.log(max_ar) - math.log(min_ar)) / (num_ar_buckets - 1)
+    return [math.exp(math.log(min_ar) + i * step) for i in range(num_ar_buckets)]
+
+def bucket_size(resolution, ar):
+    """Width and height of a bucket: the area of the resolution at the given aspect ratio, in multiples of 16."""
+    area = resolution[0] * resolution[1] if isinstance(resolution, list) else resolution ** 2
+    width = round(math.sqrt(area * ar) / 16) * 16
+    height = round(math.sqrt(area / ar) / 16) * 16
+    return width, height
+
+def analyze_dataset(dataset_dir, resolutions, enable_ar_bucket, min_ar, max_ar, num_ar_buckets, ar_buckets,
+                    frame_buckets, num_repeats=1, video_clip_mode="single_middle", batch_size=1,
+                    gradient_accumulation_steps=1, num_gpus=1, workers=DATASET_ANALYZER_WORKERS):
+    """
+    Predict how a dataset spreads over the buckets of a dataset config before training.
+    
+    Reads the size of every image and the size and frame count of every video
+    in a process pool (cached by path, mtime and size), assigns each one to
+    its aspect ratio and frame bucket per resolution the way diffusion-pipe
+    does, and estimates the optimizer steps per epoch.
+    
+    Returns:
+        dict: buckets (list of rows), counts, warnings and steps_per_epoch
+    """
+    manifest = get_dataset_manifest(dataset_dir)
+    media = manifest.media()
+    captions = {os.path.splitext(p)[0] for p in manifest.files if p.lower().endswith('.txt')}
+    
+    # Only files that changed since the last analysis are probed again
+    infos = []
+    to_probe = []
+    for path in media:
+        rel_path = os.path.relpath(path, dataset_dir)
+        key = (path, *manifest.files.get(rel_path, (None, None)))
+        if key in media_probe_cache:
+            infos.append(media_probe_cache[key])
+        else:
+            to_probe.append((key, path))
+    if to_probe:
+        with concurrent.futures.ProcessPoolExecutor(max(workers, 1)) as executor:
+            for (key, _), info in zip(to_probe, executor.map(probe_media, [p for _, p in to_probe], chunksize=16)):
+                media_probe_cache[key] = info
+                infos.append(info)
+    
+    ar_values = dataset_ar_buckets(enable_ar_bucket, min_ar, max_ar, num_ar_buckets, ar_buckets)
+    frame_values = sorted(set(int(f) for f in frame_buckets))
+    global_batch = max(int(batch_size), 1) * max(int(gradient_accumulation_steps), 1) * max(int(num_gpus), 1)
+    
+    counts = collections.Counter()
+    warnings = []
+    unreadable = []
+    too_short = []
+    cropped = 0
+    images = videos = 0
+    for info in infos:
+        if info["error"] or not info["width"] or not info["height"]:
+            unreadable.append(os.path.basename(info["path"]))
+            continue
+        is_video = info["path"].lower().endswith(VIDEO_EXTENSIONS)
+        if is_video:
+            videos += 1
+            # The largest frame bucket the video is long enough for
+            fitting = [f for f in frame_values if 1 < f <= info["frames"]]
+            if not fitting:
+                too_short.append(os.path.basename(info["path"]))
+                continue
+            frame_bucket = fitting[-1]
+            clips = math.ceil(info["frames"] / frame_bucket) if video_clip_mode == "multiple_overlapping" else 1
+        else:
+            images += 1
+            if 1 not in frame_values:
+                too_short.append(os.path.basename(info["path"]))
+                continue
+            frame_bucket, clips = 1, 1
+        
+        ar = info["width"] / info["height"]
+        bucket_ar = min(ar_values, key=lambda value: abs(math.log(value) - math.log(ar)))
+        if abs(math.log(bucket_ar) - math.log(ar)) > math.log(1.25):
+            cropped += 1
+        for resolution in resolutions:
+            counts[(json.dumps(resolution), bucket_size(resolution, bucket_ar), frame_bucket)] += clips
+    
+    rows = []
+    steps_per_epoch = 0
+    for (resolution, (width, height), frames), count in sorted(counts.items()):
+        samples = count * int(num_repeats)
+        batches = math.ceil(samples / global_batch)
+        steps_per_epoch += batches
+        rows.append([resolution, f"{width}x{height}", frames, count, samples, batches])
+        if samples < global_batch:
+            warnings.append(f"Bucket {width}x{height}x{frames} has {samples} samples, less than one batch of {global_batch}.")
+    
+    if unreadable:
+        warnings.append(f"{len(unreadable)} files could not be read and are dropped: {', '.join(unreadable[:10])}")
+    if too_short:
+        warnings.append(f"{len(too_short)} files fit no frame bucket {frame_values} and are dropped: {', '.join(too_short[:10])}")
+    if cropped:
+        warnings.append(f"{cropped} files are more than 25% off the aspect ratio of their bucket and get cropped.")
+    uncaptioned = sum(1 for path in media if os.path.splitext(os.path.relpath(path, dataset_dir))[0] not in captions)
+    if uncaptioned:
+        warnings.append(f"{uncaptioned} media files have no caption (.txt).")
+    if not rows:
+        warnings.append("No samples would be trained on with this configuration.")
+    
+    return {
+        "images": images,
+        "videos": videos,
+        "dropped": len(unreadable) + len(too_short),
+        "global_batch": global_batch,
+        "buckets": rows,
+        "steps_per_epoch": steps_per_epoch,
+        "warnings": warnings,
+    }
+
+def format_dataset_analysis(analysis, epochs=None):
+    """Markdown report of analyze_dataset for the UI."""
+    lines = [
+        f"**{analysis['images']} images, {analysis['videos']} videos, {analysis['dropped']} dropped.** "
+        f"Estimated steps per epoch: **{analysis['steps_per_epoch']}** (batch of {analysis['global_batch']} samples)"
+        + (f", about {analysis['steps_per_epoch'] * int(epochs)} steps for {int(epochs)} epochs." if epochs else "."),
+        "",
+        "| Resolution | Bucket | Frames | Files | Samples | Steps |",
+        "|---|---|---|---|---|---|",
+    ]
+    lines += [f"| {' | '.join(str(value) for value in row)} |" for row in analysis["buckets"]]
+    if analysis["warnings"]:
+        lines += ["", "**Warnings:**"] + [f"- {warning}" for warning in analysis["warnings"]]
+    return "\n".join(lines)
+
+media_probe_cache = {}  # (path, size, mtime) -> probe_media result
+
+def model_architecture(model_name, config):
+    """
+    Architecture parameters of a training model for the memory planner.
+
+    Reads dim, num_layers and ffn_dim from the config.json next to the downloaded
+    weights when there is one, otherwise uses MODEL_ARCHITECTURES, picking the
+    variant by the size in the model name (e.g. "Wan2.1-T2V-1.3B" -> "wan-1.3b").
+
+    Returns:
+        dict: Architecture parameters, None for an unknown model family
+    """
+    model_type = config.get("model_type", model_name)
+    size = re.search(r'(\d+(?:\.\d+)?)B\b', model_name or "")
+    arch = MODEL_ARCHITECTURES.get(f"{model_type}-{size.group(1)}b" if size else model_type) or MODEL_ARCHITECTURES.get(model_type)
+
+    diffusers_path = config.get("diffusers_path")
+    for path in (config.get("transformer_path"), config.get("ckpt_path"), diffusers_path and os.path.join(diffusers_path, "transformer")):
+        if not path or not os.path.isfile(os.path.join(path, "config.json")):
+            continue
+        try:
+            with open(os.path.join(path, "config.json"), 'r') as f:
+                transformer_config = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Cannot read {path}/config.json: {e}")
+            continue
+        # Wan names them dim/ffn_dim, diffusers models heads x head size and an MLP ratio
+        dim = transformer_config.get("dim") or transformer_config.get("hidden_size") or (
+            transformer_config.get("num_attention_heads", 0) * transformer_config.get("attention_head_dim", 0))
+        layers = transformer_config.get("num_layers")
+        if not dim or not layers or not arch:
+            continue
+        arch = dict(arch, dim=dim)
+        if "num_single_layers" in transformer_config:
+            arch["num_layers"] = 2 * layers + transformer_config["num_single_layers"]
+            arch["blocks"] = layers + transformer_config["num_single_layers"]
+        else:
+            arch["num_layers"] = layers
+            arch.pop("blocks", None)
+        if transformer_config.get("ffn_dim"):
+            arch["ffn_dim"] = transformer_config["ffn_dim"]
+        elif transformer_config.get("mlp_ratio"):
+            arch["ffn_dim"] = int(dim * transformer_config["mlp_ratio"])
+        break
+    return arch
+
+def bucket_tokens(arch, width, height, frames):
+    """Transformer sequence length of one sample of a bucket."""
+    temporal, spatial = arch["latent"]
+    latent_frames = (int(frames) - 1) // temporal + 1
+    return latent_frames * math.ceil(width / spatial) * math.ceil(height / spatial) + arch["text_tokens"]
+
+def estimate_training_run(arch, buckets, settings, num_gpus=1):
+    """
+    Estimate the peak GPU memory and the duration of one epoch of a training config.
+
+    Memory is the weights of the blocks kept on the GPU, the LoRA with its
+    gradients and optimizer state and the activations of the longest bucket
+    (flash attention, so they grow linearly with the tokens). Time is the matmul
+    FLOPs of every bucket plus the PCIe traffic of swapped blocks that the
+    compute does not hide.
+
+    Args:
+        arch: Architecture parameters (see model_architecture)
+        buckets: (width, height, frames, samples) per bucket
+        settings: Training config fields micro_batch_size_per_gpu, gradient_accumulation_steps,
+            pipeline_stages, blocks_to_swap, activation_checkpointing, transformer_dtype,
+            rank, lora_dtype and optimizer_type
+        num_gpus: GPUs of the run, every pipeline_stages of them hold one copy of the model
+
+    Returns:
+        dict: peak_bytes per GPU and epoch_seconds
+    """
+    dim, ffn_dim, layers = arch["dim"], arch["ffn_dim"], arch["num_layers"]
+    blocks = arch.get("blocks", layers)
+    stages = int(settings["pipeline_stages"])
+    micro_batch = int(settings["micro_batch_size_per_gpu"])
+    accumulation = int(settings["gradient_accumulation_steps"])
+    swap = int(settings["blocks_to_swap"])
+    checkpointing = settings["activation_checkpointing"]
+    weight_bytes = DTYPE_BYTES.get(settings["transformer_dtype"], 2)
+
+    block_bytes = layers * (arch["linears"] * dim * dim + 2 * dim * ffn_dim) * weight_bytes / blocks
+    # The first pipeline stage is the fullest one: the most layers and a micro batch in flight per stage
+    stage_layers = math.ceil(layers / stages)
+    resident_blocks = math.ceil(blocks / stages) - swap + (1 if swap else 0)  # plus the one swapped in
+    lora_params = stage_layers * int(settings["rank"]) * (arch["linears"] * 2 * dim + 2 * (dim + ffn_dim))
+    lora_bytes = lora_params * (2 * DTYPE_BYTES.get(settings["lora_dtype"], 2) + OPTIMIZER_STATE_BYTES.get(settings["optimizer_type"], 8))
+
+    tokens = max(bucket_tokens(arch, *bucket[:3]) for bucket in buckets) * micro_batch
+    layer_activations = tokens * (16 * dim + 4.5 * ffn_dim)
+    if checkpointing:
+        # Only the block inputs are kept, one block at a time is recomputed for the backward pass
+        activations = stage_layers * tokens * 2 * dim + layer_activations
+    else:
+        activations = stage_layers * layer_activations
+    activations *= min(stages, accumulation)
+    peak_bytes = resident_blocks * block_bytes + lora_bytes + activations + PLANNER_OVERHEAD_GB * 1024 ** 3
+
+    # Frozen weights: the backward pass only computes activation gradients, about one more forward
+    passes = 3 if checkpointing else 2
+    active_params = layers * (arch["linears"] * dim * dim + 2 * dim * arch.get("active_ffn_dim", ffn_dim))
+    transfer = swap * block_bytes * passes / (PLANNER_PCIE_GBPS * 1e9)
+    global_batch = micro_batch * accumulation * (num_gpus // stages)
+    epoch_seconds = 0
+    for width, height, frames, samples in buckets:
+        sample_tokens = bucket_tokens(arch, width, height, frames)
+        flops = passes * micro_batch * (2 * active_params * sample_tokens + 4 * layers * sample_tokens ** 2 * dim)
+        compute = flops / (PLANNER_GPU_TFLOPS * 1e12) * (1.1 if weight_bytes < 2 else 1)  # Upcasting fp8/nf4 weights
+        # Short sequences leave the GPU partly idle, larger micro batches fill it up
+        compute *= 1 + PLANNER_SATURATION_TOKENS / (sample_tokens * micro_batch)
+        # Swapping a block in overlaps with the compute of the blocks that stay on the GPU
+        micro_batch_seconds = compute + max(0, transfer - compute * (blocks - swap) / blocks)
+        # Every stage does its share of a micro batch, filling the pipeline costs stages - 1 of them
+        step_seconds = (accumulation + stages - 1) * micro_batch_seconds / stages
+        epoch_seconds += math.ceil(samples / global_batch) * step_seconds
+    return {"peak_bytes": peak_bytes, "epoch_seconds": epoch_seconds}
+
+def plan_training(arch, buckets, target_gb, num_gpus, settings, transformer_dtypes=None):
+    """
+    Find the fastest training config that fits into target_gb of memory per GPU.
+
+    Keeps the global batch size, the LoRA rank and the optimizer of settings and
+    tries every micro batch size, pipeline split, transformer dtype and activation
+    checkpointing setting with the fewest blocks to swap that fit.
+
+    Args:
+        transformer_dtypes: Transformer dtypes to try, only the one in settings if None
+
+    Returns:
+        dict: current, suggestion (None if nothing fits) and alternatives, each a
+        (settings, estimate) pair
+    """
+    target_bytes = target_gb * 1024 ** 3
+    global_batch = (int(settings["micro_batch_size_per_gpu"]) * int(settings["gradient_accumulation_steps"])
+                    * (num_gpus // int(settings["pipeline_stages"])))
+    blocks = arch.get("blocks", arch["num_layers"])
+    fitting = []
+    for stages in [s for s in range(1, num_gpus + 1) if num_gpus % s == 0]:
+        data_parallel = num_gpus // stages
+        for micro_batch in (1, 2, 4, 8, 16):
+            if global_batch % (micro_batch * data_parallel):
+                continue
+            for transformer_dtype in transformer_dtypes or [settings["transformer_dtype"]]:
+                for checkpointing in (False, True):
+                    # diffusion-pipe only swaps blocks without pipeline parallelism
+                    for swap in range(blocks if stages == 1 else 1):
+                        candidate = dict(
+                            settings,
+                            micro_batch_size_per_gpu=micro_batch,
+                            gradient_accumulation_steps=global_batch // (micro_batch * data_parallel),
+                            pipeline_stages=stages,
+                            transformer_dtype=transformer_dtype,
+                            activation_checkpointing=checkpointing,
+                            blocks_to_swap=swap
+                        )
+                        estimate = estimate_training_run(arch, buckets, candidate, num_gpus)
+                        if estimate["peak_bytes"] <= target_bytes:
+                            # Swapping more blocks only makes it slower
+                            fitting.append((estimate["epoch_seconds"], candidate, estimate))
+                            break
+    fitting.sort(key=lambda item: (item[0], item[2]["peak_bytes"]))
+    return {
+        "current": (settings, estimate_training_run(arch, buckets, settings, num_gpus)),
+        "suggestion": fitting[0][1:] if fitting else None,
+        "alternatives": [item[1:] for item in fitting[1:4]],
+    }
+
+def format_training_plan(plan, target_gb):
+    """Markdown report of plan_training for the UI."""
+    def duration(seconds):
+        if seconds < 60:
+            return f"{max(round(seconds), 1)}s"
+        minutes = round(seconds / 60)
+        return f"{minutes // 60}h {minutes % 60:02d}m" if minutes >= 60 else f"{minutes}m"
+
+    def row(label, settings, estimate):
+        peak = estimate["peak_bytes"] / 1024 ** 3
+        return (f"| {label} | {settings['micro_batch_size_per_gpu']} | {settings['gradient_accumulation_steps']} | "
+                f"{settings['pipeline_stages']} | {settings['transformer_dtype']} | "
+                f"{'yes' if settings['activation_checkpointing'] else 'no'} | {settings['blocks_to_swap']} | "
+                f"{peak:.1f} GB{'' if peak <= target_gb else ' (too much)'} | {duration(estimate['epoch_seconds'])} |")
+
+    if plan["suggestion"]:
+        current, suggested = plan["current"][1]["epoch_seconds"], plan["suggestion"][1]["epoch_seconds"]
+        summary = f"**Fastest config that fits into {target_gb:g} GB per GPU**"
+        if plan["current"][1]["peak_bytes"] <= target_gb * 1024 ** 3 and suggested < current:
+            summary += f", about {current / suggested:.1f}x faster than the current settings."
+    else:
+        summary = (f"**Nothing fits into {target_gb:g} GB per GPU.** Try lower resolutions, "
+                   "shorter frame buckets or a lower LoRA rank.")
+    lines = [
+        summary,
+        "",
+        "| | Micro Batch | Grad. Accum. | Pipeline Stages | Transformer Dtype | Act. Checkpointing | Blocks to Swap | Peak VRAM | Epoch |",
+        "|---|---|---|---|---|---|---|---|---|",
+        row("Current", *plan["current"]),
+    ]
+    if plan["suggestion"]:
+        lines.append(row("**Suggested**", *plan["suggestion"]))
+    lines += [row("Alternative", *alternative) for alternative in plan["alternatives"]]
+    lines += ["", f"Epoch times assume {PLANNER_GPU_TFLOPS:g} TFLOPS per GPU and are meant for comparing the configs."]
+    return "\n".join(lines)
+
 def toggle_dataset_option(option):
     if option == "Create New Dataset":
         # Show creation container and hide selection container
@@ -559,7 +1696,8 @@ def toggle_dataset_option(option):
 def train_model(model_name, model_type, dataset_path, config_dir, output_dir, epochs, batch_size, lr, save_every, eval_every, rank, lora_dtype, ckpt_path, diffusers_path,
                 transformer_path, vae_path, llm_path, llama3_path, clip_path, dtype, transformer_dtype, min_t, max_t, optimizer_type, betas, weight_decay, eps,
                 gradient_accumulation_steps, num_repeats, resolutions, enable_ar_bucket, min_ar, max_ar, num_ar_buckets, frame_buckets, ar_buckets, gradient_clipping, warmup_steps, blocks_to_swap, eval_before_first_step, eval_micro_batch_size_per_gpu, eval_gradient_accumulation_steps, checkpoint_every_n_minutes, activation_checkpointing, partition_method, save_dtype, caching_batch_size, steps_per_print, video_clip_mode, resume_from_checkpoint, only_double_blocks, enable_wandb, wandb_run_name, wandb_tracker_name, wandb_api_key,
-                timestep_sample_method, flux_shift, lumina_shift, unet_lr, text_encoder_1_lr, text_encoder_2_lr, llama3_4bit, max_llama3_sequence_length
+                timestep_sample_method, flux_shift, lumina_shift, unet_lr, text_encoder_1_lr, text_encoder_2_lr, llama3_4bit, max_llama3_sequence_length,
+                num_gpus=None, pipeline_stages=None
                 ):
     try:
         # Validate inputs
@@ -596,6 +1734,11 @@ def train_model(model_name, model_type, dataset_path, config_dir, output_dir, ep
             
         if enable_wandb and (wandb_api_key is None or wandb_api_key == ""):
                 return "Error: Wandb is enabled but API KEY is required.", None
+        
+        num_gpus = int(num_gpus or os.getenv("NUM_GPUS", "1"))
+        pipeline_stages = int(pipeline_stages or num_gpus)
+        if pipeline_stages < 1 or num_gpus % pipeline_stages:
+            return f"Error: The {num_gpus} GPU(s) of the run can't be split into {pipeline_stages} pipeline stages.", None
 
         # Create configurations
         dataset_config_path = create_dataset_config(
@@ -664,82 +1807,492 @@ def train_model(model_name, model_type, dataset_path, config_dir, output_dir, ep
             text_encoder_1_lr=text_encoder_1_lr,
             text_encoder_2_lr=text_encoder_2_lr,
             llama3_4bit=llama3_4bit,
-            max_llama3_sequence_length=max_llama3_sequence_length
+            max_llama3_sequence_length=max_llama3_sequence_length,
+            pipeline_stages=pipeline_stages
         )
 
-        venv_activate_path = "/workspace/diffusion-pipe/diffpipe_venv/bin/activate"
-        num_gpus = os.getenv("NUM_GPUS", "1")
-        
-        if not os.path.isfile(venv_activate_path):
+        if not os.path.isfile(DIFFPIPE_VENV_ACTIVATE):
             return "Error: venv activation script not found", None
         
-        resume_checkpoint =  "--resume_from_checkpoint" if resume_from_checkpoint else ""
-        
-        cmd = (
-            f"bash -c 'source {venv_activate_path} && "
-            f"NCCL_P2P_DISABLE=1 NCCL_IB_DISABLE=1 {'NCCL_SHM_DISABLE=1' if int(num_gpus) > 1 else ''} deepspeed --num_gpus={num_gpus} "
-            f"train.py --deepspeed --config {training_config_path} {resume_checkpoint}'"          
-        )
-        
-        # --regenerate_cache
-            
-        proc = subprocess.Popen(
-            cmd,
-            shell=True,  # Required for complex shell commands
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            preexec_fn=os.setsid,
-            universal_newlines=False  # To handle bytes
+        error, job = training_queue.submit(
+            name=os.path.basename(os.path.normpath(dataset_path)),
+            config_path=training_config_path,
+            output_dir=output_dir,
+            num_gpus=num_gpus,
+            resume=resume_from_checkpoint,
+            config_dir=config_dir
         )
+        if error:
+            return f"Error: {error}", None
         
-        with process_lock:
-            process_dict[proc.pid] = proc  
-        
-        thread = threading.Thread(target=read_subprocess_output, args=(proc, log_queue))
-        thread.start()
-        
-        pid = proc.pid
+        watch_training_job(job["id"])
         
-        return "Training started! Logs will appear below.\n", pid
+        if job["state"] == "running":
+            gpus = ",".join(str(gpu) for gpu in job["gpus"])
+            return f"Training job {job['id']} started on GPU(s) {gpus}! Logs will appear below.\n", job["id"]
+        if job["state"] == "queued":
+            return f"Training job {job['id']} queued, it starts when {job['num_gpus']} GPU(s) are free.\n", job["id"]
+        return f"Error: {job['error']}", None
 
     except Exception as e:
         return f"Error during training: {str(e)}", None
 
-def stop_training(pid):
-    if pid is None:
+def stop_training(job_id):
+    if job_id is None:
         return "No training process is currently running."
+    return training_queue.stop(job_id)
 
-    with process_lock:
-        proc = process_dict.get(pid)
+class DatasetManifest:
+    """
+    File list of one dataset directory: sizes, mtimes and which media have captions.
+    
+    Uploads update it file by file, so the quota check reads a running total
+    instead of walking the dataset. Changes made outside the UI (file explorer,
+    ComfyUI, a shell) are picked up by refresh(), which only stats the
+    directories and rescans the ones whose mtime changed.
+    
+    Args:
+        dataset_dir: Dataset directory
+        manifest_path: JSON file the manifest is kept in between restarts
+    """
+    
+    def __init__(self, dataset_dir, manifest_path):
+        self.dataset_dir = str(dataset_dir)
+        self.manifest_path = str(manifest_path)
+        self.files = {}  # relative path -> [size, mtime]
+        self.dirs = {}  # relative directory -> mtime_ns when it was scanned
+        self.total_size = 0
+        self.lock = threading.RLock()
+        self.load()
+        
+    def load(self):
+        try:
+            with open(self.manifest_path, 'r') as f:
+                data = json.load(f)
+            with self.lock:
+                self.files = data["files"]
+                self.dirs = data["dirs"]
+                self.total_size = sum(size for size, _ in self.files.values())
+            self.refresh()
+        except (OSError, ValueError, KeyError):
+            self.rescan()
+            
+    def save(self):
+        with self.lock:
+            data = json.dumps({"files": self.files, "dirs": self.dirs})
+        try:
+            os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+            tmp_path = f"{self.manifest_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(data)
+            os.replace(tmp_path, self.manifest_path)
+        except OSError as e:
+            print(f"Warning: Cannot save dataset manifest {self.manifest_path}: {e}")
+            
+    def _drop_dir(self, rel_dir):
+        """Forget the files of a directory (not of its subdirectories)."""
+        for rel_path in [p for p in self.files if os.path.dirname(p) == rel_dir]:
+            self.total_size -= self.files.pop(rel_path)[0]
+            
+    def _scan_dir(self, rel_dir):
+        self._drop_dir(rel_dir)
+        path = os.path.join(self.dataset_dir, rel_dir)
+        try:
+            self.dirs[rel_dir] = os.stat(path).st_mtime_ns
+            entries = list(os.scandir(path))
+        except OSError:
+            self.dirs.pop(rel_dir, None)
+            return
+        for entry in entries:
+            rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if rel_path not in self.dirs:
+                    self._scan_dir(rel_path)
+            elif entry.is_file():
+                st = entry.stat()
+                self.files[rel_path] = [st.st_size, st.st_mtime]
+                self.total_size += st.st_size
+                
+    def rescan(self):
+        """Rebuild the manifest from the directory."""
+        with self.lock:
+            self.files = {}
+            self.dirs = {}
+            self.total_size = 0
+            self._scan_dir("")
+        self.save()
+        
+    def refresh(self):
+        """Rescan only the directories that changed since they were last scanned."""
+        changed = False
+        with self.lock:
+            for rel_dir, mtime in list(self.dirs.items()):
+                if rel_dir not in self.dirs:
+                    continue  # Removed together with its parent
+                try:
+                    current = os.stat(os.path.join(self.dataset_dir, rel_dir)).st_mtime_ns
+                except OSError:
+                    current = None
+                if current == mtime:
+                    continue
+                changed = True
+                if current is None:
+                    for gone in [d for d in self.dirs if not rel_dir or d == rel_dir or d.startswith(rel_dir + os.sep)]:
+                        self._drop_dir(gone)
+                        del self.dirs[gone]
+                else:
+                    self._scan_dir(rel_dir)
+        if changed:
+            self.save()
+            
+    def add(self, paths):
+        """Record files that were just written into the dataset."""
+        with self.lock:
+            for path in paths:
+                rel_path = os.path.relpath(path, self.dataset_dir)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if rel_path in self.files:
+                    self.total_size -= self.files[rel_path][0]
+                self.files[rel_path] = [st.st_size, st.st_mtime]
+                self.total_size += st.st_size
+                
+                # Our own write changed the directory mtime, that needs no rescan
+                rel_dir = os.path.dirname(rel_path)
+                while rel_dir not in self.dirs:
+                    self.dirs[rel_dir] = None  # Created by this upload, scanned on the next refresh
+                    rel_dir = os.path.dirname(rel_dir)
+                rel_dir = os.path.dirname(rel_path)
+                if self.dirs[rel_dir] is not None:
+                    self.dirs[rel_dir] = os.stat(os.path.join(self.dataset_dir, rel_dir)).st_mtime_ns
+        self.save()
+        
+    def remove(self, paths):
+        """Record files that were deleted from the dataset."""
+        with self.lock:
+            for path in paths:
+                rel_path = os.path.relpath(path, self.dataset_dir)
+                if rel_path in self.files:
+                    self.total_size -= self.files.pop(rel_path)[0]
+                rel_dir = os.path.dirname(rel_path)
+                if self.dirs.get(rel_dir) is not None and os.path.isdir(os.path.join(self.dataset_dir, rel_dir)):
+                    self.dirs[rel_dir] = os.stat(os.path.join(self.dataset_dir, rel_dir)).st_mtime_ns
+        self.save()
+        
+    def media(self):
+        """Absolute paths of the images and videos, sorted by name."""
+        with self.lock:
+            names = sorted(p for p in self.files if p.lower().endswith(GALLERY_MEDIA_EXTENSIONS))
+        return [os.path.abspath(os.path.join(self.dataset_dir, p)) for p in names]
+    
+    def summary(self):
+        """Counts of media, captions and media without a caption, and the total size."""
+        with self.lock:
+            paths = list(self.files)
+            total_size = self.total_size
+        stems = {os.path.splitext(p)[0] for p in paths if p.lower().endswith('.txt')}
+        media = [p for p in paths if p.lower().endswith(GALLERY_MEDIA_EXTENSIONS)]
+        uncaptioned = sum(1 for p in media if os.path.splitext(p)[0] not in stems)
+        return {
+            "files": len(paths),
+            "media": len(media),
+            "captions": len(stems),
+            "uncaptioned": uncaptioned,
+            "total_size": total_size,
+        }
 
-    if proc is None:
-        return "No training process is currently running."
+def get_dataset_manifest(dataset_dir):
+    """Return the up to date manifest of a dataset directory, loading it on first use."""
+    dataset_dir = os.path.abspath(str(dataset_dir))
+    with dataset_manifests_lock:
+        manifest = dataset_manifests.get(dataset_dir)
+        if manifest is None:
+            manifest_path = os.path.join(DATASET_MANIFEST_DIR, f"{os.path.basename(dataset_dir)}.json")
+            manifest = dataset_manifests[dataset_dir] = DatasetManifest(dataset_dir, manifest_path)
+            return manifest
+    manifest.refresh()
+    return manifest
+
+def format_dataset_summary(dataset_dir):
+    """One-line description of a dataset for the UI."""
+    summary = get_dataset_manifest(dataset_dir).summary()
+    text = (f"{summary['media']} media, {summary['captions']} captions, "
+            f"{summary['total_size'] / (1024 * 1024):.1f} MB")
+    if IS_RUNPOD:
+        text += f" of {MAX_UPLOAD_SIZE_MB} MB"
+    if summary["uncaptioned"]:
+        text += f" ({summary['uncaptioned']} without a caption)"
+    return text
+
+dataset_manifests = {}  # Absolute dataset directory -> DatasetManifest
+dataset_manifests_lock = threading.Lock()
+
+class IngestStats:
+    """Bytes and files brought into a dataset, by how they got there."""
+    
+    # Methods that only add a directory entry or share extents, no data is written
+    ZERO_COPY_METHODS = ("moved", "hardlinked", "reflinked")
+    
+    def __init__(self):
+        self.bytes = collections.Counter()
+        self.files = collections.Counter()
+        self.lock = threading.Lock()
+        
+    def record(self, method, size):
+        with self.lock:
+            self.bytes[method] += size
+            self.files[method] += 1
+            
+    def merge(self, other):
+        with self.lock:
+            self.bytes.update(other.bytes)
+            self.files.update(other.files)
+            
+    def snapshot(self):
+        with self.lock:
+            moved = sum(self.bytes[m] for m in self.ZERO_COPY_METHODS)
+            return {
+                "bytes_moved": moved,
+                "bytes_copied": sum(self.bytes.values()) - moved,
+                "bytes": dict(self.bytes),
+                "files": dict(self.files),
+            }
+        
+    def describe(self):
+        stats = self.snapshot()
+        methods = ", ".join(f"{count} {method}" for method, count in sorted(stats["files"].items()))
+        return (f"{stats['bytes_moved'] / (1024 * 1024):.1f} MB linked/moved, "
+                f"{stats['bytes_copied'] / (1024 * 1024):.1f} MB copied ({methods})")
+
+def reflink_file(src, dst):
+    """Clone src into the new file dst with the FICLONE ioctl (btrfs, XFS, bcachefs...)."""
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
 
-    if proc.poll() is not None:
-        return "Training process has already finished."
+def kernel_copy_file(src, dst):
+    """
+    Copy src to dst inside the kernel with copy_file_range, or sendfile where
+    that is not supported. Returns the name of the method that was used.
+    """
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        method = "copy_file_range"
+        offset = 0
+        while offset < size:
+            try:
+                if method == "copy_file_range":
+                    sent = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - offset)
+                else:
+                    sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, size - offset)
+            except OSError as e:
+                if method == "copy_file_range" and offset == 0 and e.errno in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                    method = "sendfile"
+                    continue
+                raise
+            if sent == 0:
+                break  # The file shrank while copying
+            offset += sent
+    return method
 
+def ingest_file(src, dst, stats, move=False):
+    """
+    Bring a file into a dataset writing as little data as possible.
+    
+    Tries, in order: rename (only with move=True), hardlink and reflink, which
+    are free on the same filesystem, then an in-kernel copy and finally a
+    plain copy. The destination is replaced atomically.
+    
+    Args:
+        src: File to ingest
+        dst: Destination path
+        stats: IngestStats the used method and the size are recorded in
+        move: Whether src may be consumed (e.g. our own temporary files)
+    
+    Returns:
+        str: The method that was used
+    """
+    size = os.path.getsize(src)
+    
+    if move:
+        try:
+            os.replace(src, dst)
+            stats.record("moved", size)
+            return "moved"
+        except OSError:
+            pass
+    
+    tmp_dst = f"{dst}.ingest-{os.getpid()}-{threading.get_ident()}"
     try:
-        # Send SIGTERM signal to the entire process group
-        os.killpg(os.getpgid(proc.pid), signal.SIGTERM)
         try:
-            proc.wait(timeout=5)  # Wait 5 seconds to terminate
-            with process_lock:
-                del process_dict[pid]
-            return "Training process terminated gracefully."
-        except subprocess.TimeoutExpired:
-            # Force termination if SIGTERM does not work
-            os.killpg(os.getpgid(proc.pid), signal.SIGKILL)
-            proc.wait()
-            with process_lock:
-                del process_dict[pid]
-            return "Training process killed forcefully."
-    except Exception as e:
-        return f"Error stopping training process: {str(e)}"
+            os.link(src, tmp_dst)
+            method = "hardlinked"
+        except OSError:
+            try:
+                reflink_file(src, tmp_dst)
+                method = "reflinked"
+            except OSError:
+                try:
+                    method = kernel_copy_file(src, tmp_dst)
+                except OSError:
+                    shutil.copyfile(src, tmp_dst)
+                    method = "copied"
+                shutil.copymode(src, tmp_dst)
+        os.replace(tmp_dst, dst)
+    finally:
+        if os.path.exists(tmp_dst):
+            os.remove(tmp_dst)
+    
+    stats.record(method, size)
+    return method
+
+def zip_member_target(info, dest_dir):
+    """
+    Decide where a ZIP member goes in the dataset.
+    
+    Returns:
+        tuple: (destination path, None) or (None, reason the member is skipped)
+    """
+    name = info.filename.replace('\\', '/')
+    parts = [part for part in name.split('/') if part not in ('', '.')]
+    if not parts or '..' in parts or name.startswith('/'):
+        return None, "unsafe path"
+    if parts[0] == '__MACOSX' or any(part.startswith('.') for part in parts):
+        return None, "system file"
+    if not parts[-1].lower().endswith(DATASET_FILE_EXTENSIONS):
+        return None, "unsupported format"
+    if info.flag_bits & 0x1:
+        return None, "encrypted"
+    return os.path.join(dest_dir, *parts), None
+
+def extract_dataset_zip(zip_path, dest_dir, stats, quota_bytes=None, progress=None, workers=ZIP_EXTRACT_WORKERS):
+    """
+    Extract the media and captions of an uploaded ZIP into a dataset.
+    
+    Members are streamed to disk by a thread pool (zlib releases the GIL), each
+    worker reading through its own handle of the archive. Only files with the
+    extensions the uploader accepts are kept; __MACOSX, hidden files and paths
+    leaving the dataset are skipped. The quota is checked against the declared
+    sizes first and against the bytes actually written while extracting, so a
+    ZIP with lying headers cannot fill the disk. Members are written next to
+    their targets and only moved into place once the whole ZIP is extracted, so
+    when the quota is exceeded the dataset is left as it was, including files
+    the ZIP would have replaced.
+    
+    Args:
+        zip_path: Uploaded ZIP file
+        dest_dir: Dataset directory
+        stats: IngestStats the extracted bytes are recorded in
+        quota_bytes: Bytes this ZIP may add, None for no limit
+        progress: Callable receiving status messages, at most every ZIP_PROGRESS_INTERVAL seconds
+        workers: Extraction threads
+    
+    Returns:
+        tuple: (extracted paths, Counter of skipped members by reason, error message or None)
+    """
+    skipped = collections.Counter()
+    members = []
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        for info in zip_ref.infolist():
+            if info.is_dir():
+                continue
+            target, reason = zip_member_target(info, dest_dir)
+            if reason:
+                skipped[reason] += 1
+            else:
+                members.append((info, target))
+    
+    total_bytes = sum(info.file_size for info, _ in members)
+    if quota_bytes is not None and total_bytes > quota_bytes:
+        return [], skipped, "would exceed the upload size limit"
+    
+    written = {"bytes": 0}
+    written_lock = threading.Lock()
+    abort = threading.Event()
+    handles = threading.local()
+    opened = []
+    staged = []  # (target, extracted file waiting to replace it)
+    
+    def extract(index, info, target):
+        zip_ref = getattr(handles, "zip_ref", None)
+        if zip_ref is None:
+            zip_ref = handles.zip_ref = zipfile.ZipFile(zip_path, 'r')
+            with written_lock:
+                opened.append(zip_ref)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.extract-{index}"
+        complete = False
+        try:
+            with zip_ref.open(info) as src, open(tmp_path, 'wb') as dst:
+                for chunk in iter(lambda: src.read(ZIP_CHUNK_SIZE), b''):
+                    with written_lock:
+                        written["bytes"] += len(chunk)
+                        over_quota = quota_bytes is not None and written["bytes"] > quota_bytes
+                    if over_quota:
+                        abort.set()
+                    if abort.is_set():
+                        return None
+                    dst.write(chunk)
+            complete = True
+        finally:
+            if not complete and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        with written_lock:
+            staged.append((target, tmp_path))
+        stats.record("extracted", info.file_size)
+        return target
+    
+    done = 0
+    last_report = 0
+    with concurrent.futures.ThreadPoolExecutor(max(workers, 1)) as executor:
+        futures = {executor.submit(extract, index, info, target): info for index, (info, target) in enumerate(members)}
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                done += 1
+                try:
+                    future.result()
+                except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+                    print(f"Skipping corrupt ZIP member {futures[future].filename}: {e}")
+                    skipped["corrupt"] += 1
+                    continue
+                if progress and time.time() - last_report >= ZIP_PROGRESS_INTERVAL:
+                    last_report = time.time()
+                    progress(
+                        f"Extracting {os.path.basename(zip_path)}: {done}/{len(members)} files, "
+                        f"{written['bytes'] / (1024 * 1024):.1f} / {total_bytes / (1024 * 1024):.1f} MB"
+                    )
+        except BaseException:
+            abort.set()
+            raise
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            for zip_ref in opened:
+                zip_ref.close()
+            if abort.is_set():
+                for _, tmp_path in staged:
+                    try:
+                        os.remove(tmp_path)
+                    except OSError:
+                        pass
+    
+    if abort.is_set():
+        return [], skipped, "exceeded the upload size limit while extracting"
+    for target, tmp_path in staged:
+        os.replace(tmp_path, target)
+    return [target for target, _ in staged], skipped, None
+
+def get_ingest_stats():
+    """JSON for /ingest_stats: bytes linked/moved vs copied into datasets since the UI started."""
+    return ingest_stats.snapshot()
+
+ingest_stats = IngestStats()
 
-def upload_dataset(files, current_dataset, action, dataset_name=None):
+def upload_dataset(files, current_dataset, action, dataset_name=None, progress=None):
     """
     Handle uploaded dataset files and store them in a unique directory.
     Action can be 'start' (initialize a new dataset) or 'add' (add files to current dataset).
+    progress is called with status messages while ZIP files are extracted.
     """
     if action == "start":
         if not dataset_name:
@@ -751,6 +2304,7 @@ def upload_dataset(files, current_dataset, action, dataset_name=None):
         if os.path.exists(dataset_dir):
             return current_dataset, f"Dataset '{dataset_name}' already exists. Please choose a different name.", []
         os.makedirs(dataset_dir, exist_ok=True)
+        get_dataset_manifest(dataset_dir)
         return dataset_dir, f"Started new dataset: {dataset_dir}", show_media(dataset_dir)
 
     if not current_dataset:
@@ -759,12 +2313,8 @@ def upload_dataset(files, current_dataset, action, dataset_name=None):
     if not files:
         return current_dataset, "No files uploaded.", []
     
-    # Calculate the total size of the current dataset
-    total_size = 0
-    for root, dirs, files_in_dir in os.walk(current_dataset):
-        for f in files_in_dir:
-            fp = os.path.join(root, f)
-            total_size += os.path.getsize(fp)
+    # The manifest keeps the dataset size, no need to walk the directory
+    manifest = get_dataset_manifest(current_dataset)
 
     # Calculate the size of the new files
     new_files_size = 0
@@ -773,10 +2323,11 @@ def upload_dataset(files, current_dataset, action, dataset_name=None):
             new_files_size += os.path.getsize(file.name)
 
     # Check if adding these files would exceed the limit
-    if IS_RUNPOD and (total_size + new_files_size) > MAX_UPLOAD_SIZE_MB * 1024 * 1024:
+    if IS_RUNPOD and (manifest.total_size + new_files_size) > MAX_UPLOAD_SIZE_MB * 1024 * 1024:
         return current_dataset, f"Upload would exceed the {MAX_UPLOAD_SIZE_MB}MB limit on Runpod. Please upload smaller files or finalize the dataset.", show_media(current_dataset)
 
     uploaded_files = []
+    stats = IngestStats()
 
     for file in files:
         file_path = file.name
@@ -784,24 +2335,40 @@ def upload_dataset(files, current_dataset, action, dataset_name=None):
         dest_path = os.path.join(current_dataset, filename)
 
         if zipfile.is_zipfile(file_path):
-            # If the file is a ZIP, extract its contents
+            # If the file is a ZIP, extract the media and captions it contains
+            quota = MAX_UPLOAD_SIZE_MB * 1024 * 1024 - manifest.total_size if IS_RUNPOD else None
             try:
-                with zipfile.ZipFile(file_path, 'r') as zip_ref:
-                    zip_ref.extractall(current_dataset)
-                uploaded_files.append(f"{filename} (extracted)")
+                extracted, skipped, error = extract_dataset_zip(file_path, current_dataset, stats, quota, progress)
             except zipfile.BadZipFile:
                 uploaded_files.append(f"{filename} (invalid ZIP)")
                 continue
+            manifest.add(extracted)
+            if error:
+                uploaded_files.append(f"{filename} ({error})")
+                continue
+            details = [f"{len(extracted)} files extracted"]
+            details += [f"{count} skipped: {reason}" for reason, count in sorted(skipped.items())]
+            uploaded_files.append(f"{filename} ({', '.join(details)})")
         else:
             # Check if the file is a supported format
-            if filename.lower().endswith(('.mp4', '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.txt')):
-                shutil.copy(file_path, dest_path)
+            if filename.lower().endswith(DATASET_FILE_EXTENSIONS):
+                ingest_file(file_path, dest_path, stats)
+                manifest.add([dest_path])
                 uploaded_files.append(filename)
             else:
                 uploaded_files.append(f"{filename} (unsupported format)")
                 continue
 
-    return current_dataset, f"Uploaded files: {', '.join(uploaded_files)}", show_media(current_dataset)
+    ingest_stats.merge(stats)
+    print(f"Dataset upload to {current_dataset}: {stats.describe()}")
+    
+    return (
+        current_dataset,
+        f"Uploaded files: {', '.join(uploaded_files)}\n"
+        f"Dataset: {format_dataset_summary(current_dataset)}\n"
+        f"Ingest: {stats.describe()}",
+        show_media(current_dataset)
+    )
 
 
 def update_ui_with_config(config_values):
@@ -1037,100 +2604,421 @@ def force_save(output_dir, file_name):
 
     return None  # Return None if no folder is found
                 
-def show_media(dataset_dir):
-    """Display uploaded images and .mp4 videos in a single gallery."""
-    if not dataset_dir or not os.path.exists(dataset_dir):
+class ThumbnailCache:
+    """
+    Downscaled WebP previews of dataset media for the gallery.
+    
+    Images are shrunk to THUMBNAIL_SIZE pixels, videos get a poster made from
+    their first frame with ffmpeg. A preview is stored under a hash of the
+    media's path, mtime and size, so edited or replaced files get a new one.
+    Previews are built by a thread pool when a gallery page is first shown;
+    the total size of the cache is kept under budget_bytes by deleting the
+    least recently shown previews.
+    
+    Args:
+        cache_dir: Directory of the previews
+        budget_bytes: Maximum total size of the previews
+        size: Longest side of a preview in pixels
+        workers: Threads building previews
+    """
+    
+    def __init__(self, cache_dir=THUMBNAIL_CACHE_DIR, budget_bytes=THUMBNAIL_CACHE_BUDGET_MB * 1024 * 1024,
+                 size=THUMBNAIL_SIZE, workers=THUMBNAIL_WORKERS):
+        self.cache_dir = str(cache_dir)
+        self.budget_bytes = budget_bytes
+        self.size = size
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.pending = {}  # cache path -> Future of a preview being built
+        self.total_size = None  # Computed on first use
+        self._executor = None
+        self._evicting = threading.Lock()
+        
+    def cache_path(self, path):
+        st = os.stat(path)
+        key = hashlib.sha1(f"{os.path.abspath(path)}\0{st.st_mtime_ns}\0{st.st_size}".encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], f"{key}.webp")
+    
+    def _load_image(self, path):
+        if path.lower().endswith(VIDEO_EXTENSIONS):
+            result = subprocess.run(
+                ["ffmpeg", "-v", "error", "-i", path, "-frames:v", "1",
+                 "-vf", f"scale='min({self.size},iw)':-2", "-f", "image2pipe", "-vcodec", "png", "-"],
+                capture_output=True, timeout=60
+            )
+            if result.returncode != 0 or not result.stdout:
+                raise OSError(f"ffmpeg could not read a frame: {result.stderr.decode(errors='replace').strip()}")
+            return Image.open(io.BytesIO(result.stdout))
+        image = Image.open(path)
+        image.draft('RGB', (self.size, self.size))  # Let JPEG decode at a reduced scale
+        return image
+    
+    def _build(self, path, thumb_path):
+        try:
+            image = self._load_image(path)
+            image.thumbnail((self.size, self.size))
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+            
+            os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+            tmp_path = f"{thumb_path}.{threading.get_ident()}.tmp"
+            image.save(tmp_path, 'WEBP', quality=80)
+            os.replace(tmp_path, thumb_path)
+            
+            with self.lock:
+                if self.total_size is not None:
+                    self.total_size += os.path.getsize(thumb_path)
+            return thumb_path
+        finally:
+            with self.lock:
+                self.pending.pop(thumb_path, None)
+    
+    def _cache_size(self):
+        total = 0
+        for root, dirs, files in os.walk(self.cache_dir):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+    
+    def evict(self):
+        """Delete the least recently shown previews until the cache is under budget."""
+        with self._evicting:
+            self._evict()
+            
+    def _evict(self):
+        with self.lock:
+            if self.total_size is None:
+                self.total_size = self._cache_size()
+            if self.total_size <= self.budget_bytes:
+                return
+        
+        entries = []
+        for root, dirs, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        
+        total = sum(size for _, size, _ in entries)
+        target = self.budget_bytes * 0.9  # Leave some room so not every new preview evicts
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        with self.lock:
+            self.total_size = total
+    
+    def previews(self, paths, timeout=THUMBNAIL_WAIT_SECONDS):
+        """
+        Return a preview path for each media path, building the missing ones.
+        
+        Waits up to timeout seconds for new previews; media whose preview is
+        not ready by then (or cannot be built) are returned as they are.
+        """
+        results = {}
+        futures = {}
+        for path in paths:
+            try:
+                thumb_path = self.cache_path(path)
+            except OSError:
+                results[path] = path
+                continue
+            if os.path.exists(thumb_path):
+                # The mtime of a preview is when it was last shown, for evict()
+                try:
+                    os.utime(thumb_path)
+                except OSError:
+                    pass
+                results[path] = thumb_path
+                continue
+            with self.lock:
+                if self._executor is None:
+                    self._executor = concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix="thumbnail")
+                future = self.pending.get(thumb_path)
+                if future is None:
+                    future = self.pending[thumb_path] = self._executor.submit(self._build, path, thumb_path)
+            futures[future] = path
+        
+        if futures:
+            done, _ = concurrent.futures.wait(futures, timeout=timeout)
+            for future, path in futures.items():
+                results[path] = path
+                if future in done:
+                    try:
+                        results[path] = future.result()
+                    except Exception as e:
+                        print(f"Cannot build preview of {path}: {e}")
+            with self.lock:
+                over_budget = self.total_size is None or self.total_size > self.budget_bytes
+            if over_budget:
+                threading.Thread(target=self.evict, daemon=True).start()
+        
+        return [results[path] for path in paths]
+
+thumbnail_cache = ThumbnailCache()
+
+def is_dataset_dir(path):
+    """Whether path is a dataset directory (and not the datasets root)."""
+    return bool(path) and os.path.isdir(path) and not os.path.samefile(path, BASE_DATASET_DIR)
+
+def gallery_page_count(dataset_dir):
+    if not is_dataset_dir(dataset_dir):
+        return 1
+    return max(math.ceil(len(get_dataset_manifest(dataset_dir).media()) / MAX_MEDIA), 1)
+
+def show_media(dataset_dir, page=0):
+    """Display one page of uploaded images and .mp4 videos in a single gallery."""
+    if not is_dataset_dir(dataset_dir):
         # Return an empty list if the dataset_dir is invalid
         return []
 
-    # List of image and .mp4 video files
-    media_files = [
-        f for f in os.listdir(dataset_dir)
-        if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp', '.mp4'))
-    ]
+    # Images and .mp4 videos from the dataset manifest, shown as downscaled previews
+    media = get_dataset_manifest(dataset_dir).media()[page * MAX_MEDIA:(page + 1) * MAX_MEDIA]
+    previews = thumbnail_cache.previews(media)
+    return [(preview, os.path.basename(path)) for preview, path in zip(previews, media)]
 
-    # Get absolute paths of the files
-    media_paths = [os.path.abspath(os.path.join(dataset_dir, f)) for f in media_files[:MAX_MEDIA]]
+def zip_dos_time(mtime):
+    """Convert a timestamp to the (time, date) fields of a ZIP header."""
+    t = time.localtime(mtime)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1  # 1980-01-01, the earliest date a ZIP can hold
+    dostime = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dosdate = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dostime, dosdate
 
-    # Check if the files exist
-    existing_media = [f for f in media_paths if os.path.exists(f)]
+def deflate_file(path):
+    """Compress a whole file in memory. Runs in the worker threads of StreamingZip (zlib releases the GIL)."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    crc = 0
+    size = 0
+    parts = []
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(ZIP_CHUNK_SIZE), b''):
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            parts.append(compressor.compress(chunk))
+    parts.append(compressor.flush())
+    return b''.join(parts), crc, size
 
-    return existing_media
+class StreamingZip:
+    """
+    Writes a ZIP64 archive front to back as a stream of byte chunks.
+    
+    Nothing is seeked or buffered on disk, so the archive can go straight into
+    an HTTP response while it is built. Every entry has a data descriptor with
+    its CRC and sizes after the data, which keeps files of any size (and
+    archives over 4 GB) valid without knowing them up front.
+    
+    Files that are already compressed (ZIP_STORED_EXTENSIONS: weights, images,
+    videos) are stored as they are. The rest is deflated; files up to
+    ZIP_PARALLEL_MAX_BYTES (captions, TOML, JSON) are compressed ahead in
+    `workers` threads while the stored files stream.
+    
+    Args:
+        workers: Compression threads, 0 to compress in the streaming thread
+    """
+    
+    def __init__(self, workers=ZIP_COMPRESS_WORKERS):
+        self.workers = workers
+        self.offset = 0
+        self.entries = []
+        
+    @staticmethod
+    def compressible(path):
+        return os.path.splitext(path)[1].lower() not in ZIP_STORED_EXTENSIONS
+        
+    def _emit(self, data):
+        self.offset += len(data)
+        return data
+    
+    def _local_header(self, entry):
+        name = entry["name"].encode('utf-8')
+        extra = struct.pack('<HHQQ', 0x0001, 16, 0, 0)  # ZIP64 sizes, the real ones follow the data
+        return struct.pack(
+            '<IHHHHHIIIHH', 0x04034b50, 45, ZIP_FLAGS, entry["method"], entry["dostime"], entry["dosdate"],
+            0, 0xFFFFFFFF, 0xFFFFFFFF, len(name), len(extra)
+        ) + name + extra
+    
+    def _data_descriptor(self, entry):
+        return struct.pack('<IIQQ', 0x08074b50, entry["crc"], entry["compressed_size"], entry["size"])
+    
+    def _entry(self, path, arcname, st, future):
+        entry = {"name": arcname.replace(os.sep, '/'), "offset": self.offset, "mode": st.st_mode}
+        entry["dostime"], entry["dosdate"] = zip_dos_time(st.st_mtime)
+        
+        if future is not None:
+            data, crc, size = future.result()
+            entry.update(method=zipfile.ZIP_DEFLATED, crc=crc, size=size, compressed_size=len(data))
+            yield self._emit(self._local_header(entry))
+            yield self._emit(data)
+        else:
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -15) if self.compressible(path) else None
+            entry["method"] = zipfile.ZIP_DEFLATED if compressor else zipfile.ZIP_STORED
+            yield self._emit(self._local_header(entry))
+            
+            crc = 0
+            size = 0
+            start = self.offset
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(ZIP_CHUNK_SIZE), b''):
+                    crc = zlib.crc32(chunk, crc)
+                    size += len(chunk)
+                    if compressor:
+                        chunk = compressor.compress(chunk)
+                    if chunk:
+                        yield self._emit(chunk)
+            if compressor:
+                yield self._emit(compressor.flush())
+            entry.update(crc=crc, size=size, compressed_size=self.offset - start)
+            
+        yield self._emit(self._data_descriptor(entry))
+        self.entries.append(entry)
+        
+    def _central_directory(self):
+        start = self.offset
+        records = []
+        for entry in self.entries:
+            name = entry["name"].encode('utf-8')
+            extra = struct.pack('<HHQQQ', 0x0001, 24, entry["size"], entry["compressed_size"], entry["offset"])
+            records.append(struct.pack(
+                '<IHHHHHHIIIHHHHHII', 0x02014b50, (3 << 8) | 45, 45, ZIP_FLAGS, entry["method"],
+                entry["dostime"], entry["dosdate"], entry["crc"], 0xFFFFFFFF, 0xFFFFFFFF,
+                len(name), len(extra), 0, 0, 0, (entry["mode"] & 0xFFFF) << 16, 0xFFFFFFFF
+            ) + name + extra)
+        directory = b''.join(records)
+        
+        count = len(self.entries)
+        end_offset = start + len(directory)
+        zip64_end = struct.pack(
+            '<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 0, 0, count, count, len(directory), start
+        )
+        locator = struct.pack('<IIQI', 0x07064b50, 0, end_offset, 1)
+        end = struct.pack(
+            '<IHHHHIIH', 0x06054b50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+            min(len(directory), 0xFFFFFFFF), min(start, 0xFFFFFFFF), 0
+        )
+        return self._emit(directory + zip64_end + locator + end)
+    
+    def stream(self, files):
+        """
+        Generate the archive.
+        
+        Args:
+            files: Iterable of (file path, name in the archive)
+            
+        Yields:
+            bytes: The next part of the archive
+        """
+        executor = concurrent.futures.ThreadPoolExecutor(self.workers) if self.workers > 0 else None
+        lookahead = self.workers * 4
+        pending = collections.deque()
+        try:
+            for path, arcname in files:
+                st = os.stat(path)
+                future = None
+                if executor and self.compressible(path) and st.st_size <= ZIP_PARALLEL_MAX_BYTES:
+                    future = executor.submit(deflate_file, path)
+                pending.append((path, arcname, st, future))
+                # Keep up to lookahead files compressing while earlier ones are written
+                if len(pending) > lookahead:
+                    yield from self._entry(*pending.popleft())
+            while pending:
+                yield from self._entry(*pending.popleft())
+            yield self._central_directory()
+        finally:
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                
+    def write_to(self, fileobj, files):
+        """Write the whole archive to a file object."""
+        for chunk in self.stream(files):
+            fileobj.write(chunk)
 
 def create_zip(dataset_name, download_dataset, download_config, download_outputs):
     """
-    Creates a ZIP archive containing the dataset, config, and output directories.
+    Prepares a streamed ZIP archive of the dataset, config, and output directories.
     
     Args:
         dataset_name (str): The name of the dataset.
     
     Returns:
-        str: Path to the created ZIP file.
+        tuple: Archive file name, generator of the archive bytes and error message (or None).
     """
     try:
         # Define paths
         dataset_dir = os.path.join(BASE_DATASET_DIR, dataset_name)
         config_dir_path = os.path.join(CONFIG_DIR, dataset_name)
         output_dir_path = os.path.join(OUTPUT_DIR, dataset_name)
-
-        # Check if all directories exist
-        # if not all([os.path.exists(dataset_dir), os.path.exists(config_dir_path), os.path.exists(output_dir_path)]):
-        #     return None, "One or more directories (dataset, config, output) do not exist."
-
-        # Create a temporary directory to store the ZIP
-        temp_dir = tempfile.mkdtemp()
-        zip_filename = f"{dataset_name}_archive_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
-        zip_path = os.path.join(temp_dir, zip_filename)
         
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            # Add dataset directory
-            
-            if download_dataset:
-                for root, dirs, files in os.walk(dataset_dir):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, start=os.path.dirname(dataset_dir))
-                        zipf.write(file_path, arcname)
-
-            if download_config:
-                # Add config directory
-                for root, dirs, files in os.walk(config_dir_path):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, start=os.path.dirname(config_dir_path))
-                        zipf.write(file_path, arcname)
-
-            if download_outputs:
-                # Add output directory
-                for root, dirs, files in os.walk(output_dir_path):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, start=os.path.dirname(output_dir_path))
-                        zipf.write(file_path, arcname)
-            
-                
-            
-                
-
-        return zip_path, None
+        selected_dirs = []
+        if download_dataset:
+            selected_dirs.append(dataset_dir)
+        if download_config:
+            selected_dirs.append(config_dir_path)
+        if download_outputs:
+            selected_dirs.append(output_dir_path)
+        
+        files = []
+        for directory in selected_dirs:
+            for root, dirs, filenames in os.walk(directory):
+                for file in filenames:
+                    file_path = os.path.join(root, file)
+                    files.append((file_path, os.path.relpath(file_path, start=os.path.dirname(directory))))
+                    
+        if not files:
+            return None, None, "No files to download in the selected folders."
+        
+        zip_filename = f"{dataset_name}_archive_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        return zip_filename, StreamingZip().stream(files), None
 
     except Exception as e:
-        return None, f"Error creating ZIP archive: {str(e)}"
+        return None, None, f"Error creating ZIP archive: {str(e)}"
+
+def export_zip(dataset: str, parts: str = "Dataset,Configs,Outputs"):
+    """Stream a ZIP archive of a dataset, e.g. /export?dataset=my_lora&parts=Outputs,Configs"""
+    dataset_name = os.path.basename(dataset)
+    if not dataset_name or not os.path.isdir(os.path.join(BASE_DATASET_DIR, dataset_name)):
+        raise HTTPException(status_code=404, detail="Dataset not found.")
+    
+    selected = parts.split(",")
+    zip_filename, chunks, error = create_zip(dataset_name, "Dataset" in selected, "Configs" in selected, "Outputs" in selected)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    
+    return StreamingResponse(
+        chunks,
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{zip_filename}"'}
+    )
 
 def handle_download(dataset_path, selected_files):
     """
-    Handles the download button click by creating a ZIP and returning it for download.
+    Handles the download button click by returning a link to the streamed ZIP.
     
     Args:
         dataset_path (str): Path to the dataset.
     
     Returns:
-        tuple: File object for download and status message.
+        tuple: Download link HTML and status message.
     """
     
     try:
         if not dataset_path or dataset_path == BASE_DATASET_DIR or not os.path.exists(dataset_path):
             return None, "Invalid dataset path."
+        
+        if not selected_files:
+            return None, "Select what to download."
 
         dataset_name = os.path.basename(dataset_path)
         
@@ -1138,13 +3026,15 @@ def handle_download(dataset_path, selected_files):
         download_config = "Configs" in selected_files
         download_outputs = "Outputs" in selected_files
         
-        zip_path, error = create_zip(dataset_name,  download_dataset, download_config, download_outputs)
+        zip_filename, _, error = create_zip(dataset_name,  download_dataset, download_config, download_outputs)
 
         if error:
             return None, error
 
-        # Return the ZIP file for download
-        return zip_path, "Download ready."
+        # The archive is built while the browser downloads it from /export
+        query = urllib.parse.urlencode({"dataset": dataset_name, "parts": ",".join(selected_files)})
+        link = f'<a href="export?{query}" download="{zip_filename}">Download {zip_filename}</a>'
+        return link, "Download ready."
     
     except Exception as e:
         return None, f"Error during download: {str(e)}"
@@ -1220,62 +3110,108 @@ def get_selected_file(file_paths):
 
     return None, "Invalid or no file selected."
 
-def parse_model_configs():
-    """Parse model configurations from download scripts."""
-    configs = {}
+def parse_model_config_script(script, script_path):
+    """Parse the # CONFIG: block of one download script. Returns (model_name, config) or None."""
+    try:
+        with open(script_path, 'r') as f:
+            content = f.read()
+            
+        # Extract JSON config from comments - match the exact format
+        match = re.search(r'# CONFIG:\s*#\s*{\s*#\s*([\s\S]*?)\s*#\s*}', content)
+        if match:
+            try:
+                # Clean up the matched JSON string
+                json_str = match.group(1)
+                # Remove comment markers and clean up the JSON
+                json_str = re.sub(r'^\s*#\s*', '', json_str, flags=re.MULTILINE)
+                json_str = re.sub(r'\s*#\s*$', '', json_str, flags=re.MULTILINE)
+                json_str = re.sub(r',\s*#\s*', ',', json_str, flags=re.MULTILINE)
+                json_str = re.sub(r'#\s*', '', json_str, flags=re.MULTILINE)
+                json_str = '{' + json_str + '}'
+                
+                config = json.loads(json_str)
+                
+                # Add token requirement based on model type
+                if config.get('model_type') in ['flux', 'hidream']:
+                    config['requires_hf_token'] = True
+                else:
+                    config['requires_hf_token'] = False
+                    
+                # Add the script filename to the config
+                config['script_name'] = script
+                    
+                # Ensure all paths are absolute
+                for key, value in config.items():
+                    if isinstance(value, str) and key.endswith('_path'):
+                        if not os.path.isabs(value):
+                            config[key] = os.path.join(BASE_PATH, value.lstrip('/'))
+                            
+                # Use model_name as the key
+                model_name = config.get('model_name', script.replace('download_', '').replace('.sh', ''))
+                return model_name, config
+                
+            except json.JSONDecodeError as e:
+                print(f"Error parsing JSON in {script}: {str(e)}")
+                print(f"JSON string was: {json_str}")
+    except Exception as e:
+        print(f"Error reading {script}: {str(e)}")
+    return None
+
+def parse_model_configs(reload=False):
+    """
+    Parse model configurations from download scripts.
+    
+    The result is cached: a script is only parsed again when its mtime or size
+    changes, and as long as no script changed every caller gets the very same
+    dict (and config objects) back. Callers must treat it as read-only.
+    
+    Args:
+        reload: Re-parse every script even if nothing changed on disk
+    """
+    global model_configs_registry
     
     if not os.path.exists(DOWNLOAD_SCRIPTS_DIR):
         print(f"Warning: Scripts directory not found at {DOWNLOAD_SCRIPTS_DIR}")
-        return configs
+        return {}
         
-    for script in os.listdir(DOWNLOAD_SCRIPTS_DIR):
-        if script.endswith('.sh'):
-            script_path = os.path.join(DOWNLOAD_SCRIPTS_DIR, script)
+    # Cheap change detection: one stat per script instead of reading and parsing it
+    signatures = {}
+    for entry in os.scandir(DOWNLOAD_SCRIPTS_DIR):
+        if entry.name.endswith('.sh'):
             try:
-                with open(script_path, 'r') as f:
-                    content = f.read()
-                    
-                # Extract JSON config from comments - match the exact format
-                match = re.search(r'# CONFIG:\s*#\s*{\s*#\s*([\s\S]*?)\s*#\s*}', content)
-                if match:
-                    try:
-                        # Clean up the matched JSON string
-                        json_str = match.group(1)
-                        # Remove comment markers and clean up the JSON
-                        json_str = re.sub(r'^\s*#\s*', '', json_str, flags=re.MULTILINE)
-                        json_str = re.sub(r'\s*#\s*$', '', json_str, flags=re.MULTILINE)
-                        json_str = re.sub(r',\s*#\s*', ',', json_str, flags=re.MULTILINE)
-                        json_str = re.sub(r'#\s*', '', json_str, flags=re.MULTILINE)
-                        json_str = '{' + json_str + '}'
-                        
-                        config = json.loads(json_str)
-                        
-                        # Add token requirement based on model type
-                        if config.get('model_type') in ['flux', 'hidream']:
-                            config['requires_hf_token'] = True
-                        else:
-                            config['requires_hf_token'] = False
-                            
-                        # Add the script filename to the config
-                        config['script_name'] = script
-                            
-                        # Ensure all paths are absolute
-                        for key, value in config.items():
-                            if isinstance(value, str) and key.endswith('_path'):
-                                if not os.path.isabs(value):
-                                    config[key] = os.path.join(BASE_PATH, value.lstrip('/'))
-                                    
-                        # Use model_name as the key
-                        model_name = config.get('model_name', script.replace('download_', '').replace('.sh', ''))
-                        configs[model_name] = config
-                        
-                    except json.JSONDecodeError as e:
-                        print(f"Error parsing JSON in {script}: {str(e)}")
-                        print(f"JSON string was: {json_str}")
-            except Exception as e:
-                print(f"Error reading {script}: {str(e)}")
+                stat = entry.stat()
+            except OSError:
+                continue
+            signatures[entry.name] = (stat.st_mtime_ns, stat.st_size)
+            
+    with model_configs_lock:
+        if reload:
+            model_config_cache.clear()
+        elif model_configs_registry is not None and signatures == model_configs_signatures:
+            return model_configs_registry
+            
+        configs = {}
+        for script in sorted(signatures):
+            cached = model_config_cache.get(script)
+            if cached is None or cached[0] != signatures[script]:
+                parsed = parse_model_config_script(script, os.path.join(DOWNLOAD_SCRIPTS_DIR, script))
+                cached = (signatures[script], parsed)
+                model_config_cache[script] = cached
+            if cached[1]:
+                model_name, config = cached[1]
+                configs[model_name] = config
                 
-    return configs
+        for script in set(model_config_cache) - set(signatures):
+            del model_config_cache[script]
+            
+        model_configs_signatures.clear()
+        model_configs_signatures.update(signatures)
+        model_configs_registry = configs
+        return configs
+
+def reload_model_configs():
+    """Drop the cached model configurations and parse every download script again."""
+    return parse_model_configs(reload=True)
 
 def get_model_types():
     """Get list of available model types from download scripts."""
@@ -1587,8 +3523,22 @@ with gr.Blocks(theme=theme, css=custom_log_box_css) as demo:
     )
     
     def handle_upload(files, current_dataset):
-        updated_dataset, message, media = upload_dataset(files, current_dataset, "add")
-        return updated_dataset, message, media
+        # Run the upload in a thread and show its progress in the status box meanwhile
+        updates = queue.Queue()
+        result = {}
+        
+        def run_upload():
+            try:
+                result["value"] = upload_dataset(files, current_dataset, "add", progress=updates.put)
+            except Exception as e:
+                result["value"] = (current_dataset, f"Error during upload: {str(e)}", show_media(current_dataset))
+            finally:
+                updates.put(None)
+                
+        threading.Thread(target=run_upload, daemon=True).start()
+        for message in iter(updates.get, None):
+            yield current_dataset, message, gr.update()
+        yield result["value"]
     
     # Container to select existing dataset
     with gr.Row(visible=False, elem_id="select_existing_dataset_container") as select_existing_container:
@@ -1611,15 +3561,25 @@ with gr.Blocks(theme=theme, css=custom_log_box_css) as demo:
         height="auto",
         visible=True
     )
+    with gr.Row():
+        previous_page_button = gr.Button("Previous", size="sm", scale=0)
+        gallery_page_label = gr.Markdown("Page 1 / 1")
+        next_page_button = gr.Button("Next", size="sm", scale=0)
+    gallery_page = gr.State(0)
+    dataset_summary = gr.Markdown("")
     
    
     
     # Upload files and update gallery
     upload_files.upload(
-        fn=lambda files, current_dataset: handle_upload(files, current_dataset),
+        fn=handle_upload,
         inputs=[upload_files, current_dataset_state],
         outputs=[current_dataset_state, upload_status, gallery],
         queue=True
+    ).then(
+        fn=lambda path: (0, f"Page 1 / {gallery_page_count(path)}"),  # The gallery shows the first page again
+        inputs=current_dataset_state,
+        outputs=[gallery_page, gallery_page_label]
     )
     
     # Function to handle selecting an existing dataset and updating the gallery
@@ -1698,11 +3658,32 @@ with gr.Blocks(theme=theme, css=custom_log_box_css) as demo:
         return config_path, output_path
     
      
-    # Update gallery when dataset path changes
+    def show_dataset(path):
+        summary = format_dataset_summary(path) if is_dataset_dir(path) else ""
+        return show_media(path), summary, 0, f"Page 1 / {gallery_page_count(path)}"
+    
+    def change_gallery_page(path, page, step):
+        pages = gallery_page_count(path)
+        page = min(max(page + step, 0), pages - 1)
+        return show_media(path, page), page, f"Page {page + 1} / {pages}"
+    
+    # Update gallery and dataset size when dataset path changes
     dataset_path.change(
-        fn=lambda path: show_media(path),
+        fn=show_dataset,
         inputs=dataset_path,
-        outputs=gallery
+        outputs=[gallery, dataset_summary, gallery_page, gallery_page_label]
+    )
+    
+    previous_page_button.click(
+        fn=lambda path, page: change_gallery_page(path, page, -1),
+        inputs=[dataset_path, gallery_page],
+        outputs=[gallery, gallery_page, gallery_page_label]
+    )
+    
+    next_page_button.click(
+        fn=lambda path, page: change_gallery_page(path, page, 1),
+        inputs=[dataset_path, gallery_page],
+        outputs=[gallery, gallery_page, gallery_page_label]
     )
     
     dataset_path.change(
@@ -1992,6 +3973,20 @@ with gr.Blocks(theme=theme, css=custom_log_box_css) as demo:
                 value="[512]",
                 info="Resolutions to train on, given as a list. Example: [512] or [512, 768, 1024] or [[512, 512], [1280, 720]], defining only one side it will be a square, [512] = 512x512"
             )
+        
+        with gr.Row():
+            analyze_dataset_button = gr.Button("Analyze Dataset", scale=0)
+            target_vram = gr.Number(
+                label="Target GPU Memory (GB)",
+                value=detect_gpu_memory_gb() or 24,
+                minimum=1,
+                info="Plan Memory suggests the fastest settings that fit into this much memory per GPU"
+            )
+            plan_memory_button = gr.Button("Plan Memory", scale=0)
+            apply_plan_button = gr.Button("Apply Suggestion", scale=0, visible=False)
+        dataset_analysis = gr.Markdown("")
+        training_plan = gr.Markdown("")
+        planned_settings = gr.State(None)
                 
         gr.Markdown("#### Optimizer Parameters")
         with gr.Row():
@@ -2039,8 +4034,8 @@ with gr.Blocks(theme=theme, css=custom_log_box_css) as demo:
                 value=0,
                 step=1,
                 minimum=0,
-                maximum=30,
-                info="Number of blocks to swap during training (0-30)"
+                maximum=100,
+                info="Number of transformer blocks kept in CPU memory and swapped in when needed"
             )
         with gr.Row():
             eval_before_first_step = gr.Checkbox(
@@ -2141,9 +4136,36 @@ with gr.Blocks(theme=theme, css=custom_log_box_css) as demo:
                 
                 only_double_blocks = gr.Checkbox(label="Train only double blocks (Experimental)", info="This option will be used to train only double blocks, some people report that training only double blocks can reduce the amount of motion blur and improve the final quality of the video.")
                 
+                job_gpus = gr.Number(
+                    label="GPUs for this run",
+                    value=int(os.getenv("NUM_GPUS", "1")),
+                    precision=0,
+                    minimum=1,
+                    info="Runs that don't fit on the free GPUs wait in the training queue"
+                )
+                pipeline_stages = gr.Number(
+                    label="Pipeline Stages",
+                    value=int(os.getenv("NUM_GPUS", "1")),
+                    precision=0,
+                    minimum=1,
+                    info="GPUs one copy of the model is split over, the other GPUs of the run train in data parallel"
+                )
+                
                 train_button = gr.Button("Start Training", visible=True)
                 stop_button = gr.Button("Stop Training", visible=False)
                 
+                with gr.Accordion("Training Queue", open=False):
+                    training_jobs = gr.Dataframe(
+                        headers=JOB_TABLE_HEADERS,
+                        value=training_job_rows,
+                        interactive=False
+                    )
+                    with gr.Row():
+                        job_selector = gr.Dropdown(label="Job", choices=[], scale=2)
+                        watch_job_button = gr.Button("Show Logs", scale=1)
+                        stop_job_button = gr.Button("Stop Job", scale=1)
+                    queue_status = gr.Textbox(label="Queue Status", interactive=False)
+                
                 # Add fields for displaying current step and epoch
                 with gr.Row():
                     total_steps = gr.State(0)
@@ -2151,6 +4173,10 @@ with gr.Blocks(theme=theme, css=custom_log_box_css) as demo:
                     current_epoch_display = gr.Textbox(label="Epoch Progress", interactive=False, value="Epoch: N/A")
                     current_step_display = gr.Textbox(label="Step Progress", interactive=False, value="Step: N/A")
                     
+                with gr.Row():
+                    loss_plot = gr.LinePlot(x="step", y="loss", title="Loss", height=250)
+                    throughput_plot = gr.LinePlot(x="step", y="it_s", title="Throughput (it/s)", height=250)
+                    
                 with gr.Row():
                     force_save_model_button = gr.Button("Force Save Model", visible=False)
                     force_save_checkpoint_button = gr.Button("Force Save Checkpoint", visible=False)
@@ -2163,6 +4189,17 @@ with gr.Blocks(theme=theme, css=custom_log_box_css) as demo:
                             interactive=False,
                             elem_id="log_box"
                         )
+                        
+                # Incremental pages of the training log for API clients:
+                # call /training_log with the next_offset of the previous page
+                log_page_offset = gr.Number(value=0, visible=False)
+                log_page = gr.JSON(visible=False)
+                log_page_offset.change(
+                    fn=get_training_log_page,
+                    inputs=log_page_offset,
+                    outputs=log_page,
+                    api_name="training_log"
+                )
                 
                 def force_save_model(output_dir_path):
                     force_save(output_dir_path, "save_model")
@@ -2204,7 +4241,7 @@ with gr.Blocks(theme=theme, css=custom_log_box_css) as demo:
         with gr.Column():
             download_options = gr.CheckboxGroup(["Outputs", "Dataset", "Configs"], label="Bulk Download Options"),
             download_button = gr.Button("Download ZIP", visible=True)
-        download_zip = gr.File(label="Download ZIP", visible=True)
+        download_zip = gr.HTML(label="Download ZIP", visible=True)
         download_status = gr.Textbox(label="Bulk Download Status", interactive=False, visible=True)
 
     
@@ -2212,14 +4249,10 @@ with gr.Blocks(theme=theme, css=custom_log_box_css) as demo:
         model_name, model_type, dataset_path, config_dir, output_dir, epochs, batch_size, lr, save_every, eval_every, rank, lora_dtype, ckpt_path, diffusers_path,
         transformer_path, vae_path, llm_path, llama3_path, clip_path, dtype, transformer_dtype, min_t, max_t, optimizer_type, betas, weight_decay, eps,
         gradient_accumulation_steps, num_repeats, resolutions_input, enable_ar_bucket, min_ar, max_ar, num_ar_buckets, frame_buckets, ar_buckets, gradient_clipping, warmup_steps, blocks_to_swap, eval_before_first_step, eval_micro_batch_size_per_gpu, eval_gradient_accumulation_steps, checkpoint_every_n_minutes, activation_checkpointing, partition_method, save_dtype, caching_batch_size, steps_per_print, video_clip_mode, resume_from_checkpoint, only_double_blocks, enable_wandb, wandb_run_name, wandb_tracker_name, wandb_api_key,
-        timestep_sample_method, flux_shift, lumina_shift, unet_lr, text_encoder_1_lr, text_encoder_2_lr, llama3_4bit, max_llama3_sequence_length
+        timestep_sample_method, flux_shift, lumina_shift, unet_lr, text_encoder_1_lr, text_encoder_2_lr, llama3_4bit, max_llama3_sequence_length,
+        job_gpus, pipeline_stages
     ):
-        
-        with process_lock:
-            if process_dict:
-                return "A training process is already running. Please stop it before starting a new one.", training_process_pid, gr.update(interactive=False)
-            
-        message, pid = train_model(
+        message, job_id = train_model(
             model_name=model_name,
             model_type=model_type,
             dataset_path=dataset_path,
@@ -2282,18 +4315,128 @@ with gr.Blocks(theme=theme, css=custom_log_box_css) as demo:
             text_encoder_1_lr=text_encoder_1_lr,
             text_encoder_2_lr=text_encoder_2_lr,
             llama3_4bit=llama3_4bit,
-            max_llama3_sequence_length=max_llama3_sequence_length
+            max_llama3_sequence_length=max_llama3_sequence_length,
+            num_gpus=job_gpus,
+            pipeline_stages=pipeline_stages
         )
         
-        if pid:
-            # Disable the training button while training is active
-            return message, pid, gr.update(visible=False), gr.update(visible=True), gr.update(visible=True), gr.update(visible=True)
+        if job_id:
+            # The training button stays available, further runs go to the queue
+            return message, job_id, gr.update(visible=True), gr.update(visible=True), gr.update(visible=True), gr.update(visible=True)
         else:
-            return message, pid, gr.update(visible=True), gr.update(visible=False),  gr.update(visible=False),  gr.update(visible=False)
+            return message, job_id, gr.update(visible=True), gr.update(visible=False),  gr.update(visible=False),  gr.update(visible=False)
+
+    def analyze_selected_dataset(dataset_path, resolutions, enable_ar_bucket, min_ar, max_ar, num_ar_buckets, ar_buckets,
+                                 frame_buckets, num_repeats, video_clip_mode, batch_size, gradient_accumulation_steps, job_gpus):
+        if not is_dataset_dir(dataset_path):
+            return "Error: Please select a dataset first.", None
+        
+        resolutions_error, resolutions_list = validate_resolutions(resolutions)
+        if resolutions_error:
+            return resolutions_error, None
+        try:
+            frame_buckets_list = json.loads(frame_buckets)
+            if not isinstance(frame_buckets_list, list) or not all(isinstance(b, int) for b in frame_buckets_list):
+                return "Error: Frame buckets must be a list of integers. Example: [1, 33, 65]", None
+        except Exception as e:
+            return f"Error parsing frame buckets: {str(e)}", None
+        ar_buckets_list = None
+        if len(ar_buckets) > 0:
+            ar_buckets_error, ar_buckets_list = validate_ar_buckets(ar_buckets)
+            if ar_buckets_error:
+                return ar_buckets_error, None
+        
+        return None, analyze_dataset(
+            dataset_path, resolutions_list, enable_ar_bucket, min_ar, max_ar, num_ar_buckets, ar_buckets_list,
+            frame_buckets_list, num_repeats=num_repeats, video_clip_mode=video_clip_mode, batch_size=batch_size,
+            gradient_accumulation_steps=gradient_accumulation_steps, num_gpus=job_gpus
+        )
+    
+    def handle_analyze_click(dataset_path, resolutions, enable_ar_bucket, min_ar, max_ar, num_ar_buckets, ar_buckets,
+                             frame_buckets, num_repeats, video_clip_mode, batch_size, gradient_accumulation_steps, job_gpus, epochs):
+        error, analysis = analyze_selected_dataset(
+            dataset_path, resolutions, enable_ar_bucket, min_ar, max_ar, num_ar_buckets, ar_buckets,
+            frame_buckets, num_repeats, video_clip_mode, batch_size, gradient_accumulation_steps, job_gpus
+        )
+        return error or format_dataset_analysis(analysis, epochs)
+    
+    def handle_plan_click(model_name, dataset_path, resolutions, enable_ar_bucket, min_ar, max_ar, num_ar_buckets, ar_buckets,
+                          frame_buckets, num_repeats, video_clip_mode, batch_size, gradient_accumulation_steps, job_gpus,
+                          pipeline_stages, blocks_to_swap, activation_checkpointing, transformer_dtype, dtype, rank,
+                          lora_dtype, optimizer_type, target_vram):
+        no_plan = (None, gr.update(visible=False))
+        config = parse_model_configs().get(model_name, {})
+        arch = model_architecture(model_name, config)
+        if not arch:
+            return (f"Error: No architecture parameters known for {model_name}.", *no_plan)
+        job_gpus = int(job_gpus or 1)
+        pipeline_stages = int(pipeline_stages or job_gpus)
+        if pipeline_stages < 1 or job_gpus % pipeline_stages:
+            return (f"Error: The {job_gpus} GPU(s) of the run can't be split into {pipeline_stages} pipeline stages.", *no_plan)
+        
+        error, analysis = analyze_selected_dataset(
+            dataset_path, resolutions, enable_ar_bucket, min_ar, max_ar, num_ar_buckets, ar_buckets,
+            frame_buckets, num_repeats, video_clip_mode, batch_size, gradient_accumulation_steps, job_gpus
+        )
+        if error:
+            return (error, *no_plan)
+        buckets = [[int(size) for size in row[1].split("x")] + [row[2], row[4]] for row in analysis["buckets"]]
+        if not buckets:
+            return ("Error: No samples would be trained on with this configuration.", *no_plan)
+        
+        # Models without a transformer_dtype option load the transformer in dtype
+        has_transformer_dtype = "transformer_dtype" in config
+        settings = {
+            "micro_batch_size_per_gpu": int(batch_size),
+            "gradient_accumulation_steps": int(gradient_accumulation_steps),
+            "pipeline_stages": pipeline_stages,
+            "blocks_to_swap": int(blocks_to_swap or 0),
+            "activation_checkpointing": activation_checkpointing,
+            "transformer_dtype": transformer_dtype if has_transformer_dtype else dtype,
+            "rank": int(rank),
+            "lora_dtype": lora_dtype,
+            "optimizer_type": optimizer_type,
+        }
+        plan = plan_training(
+            arch, buckets, float(target_vram), job_gpus, settings,
+            transformer_dtypes=["bfloat16", "float8"] if has_transformer_dtype else None
+        )
+        suggestion = plan["suggestion"][0] if plan["suggestion"] else None
+        return format_training_plan(plan, float(target_vram)), suggestion, gr.update(visible=suggestion is not None)
+    
+    def handle_apply_plan(settings):
+        if not settings:
+            return [gr.update()] * 6
+        return (
+            gr.update(value=settings["micro_batch_size_per_gpu"]),
+            gr.update(value=settings["gradient_accumulation_steps"]),
+            gr.update(value=settings["pipeline_stages"]),
+            gr.update(value=settings["blocks_to_swap"]),
+            gr.update(value=settings["activation_checkpointing"]),
+            gr.update(value=settings["transformer_dtype"]),
+        )
 
-    def handle_stop_click(pid):
-        message = stop_training(pid)
+    def handle_stop_click(job_id):
+        message = stop_training(job_id)
         return message, gr.update(visible=True), gr.update(visible=False)
+        
+    def refresh_training_jobs(job_ids):
+        """Update the queue table, and the job dropdown only when jobs were added or removed."""
+        rows = training_job_rows()
+        ids = [row[0] for row in rows]
+        if ids == job_ids:
+            return rows, gr.update(), job_ids
+        return rows, gr.update(choices=ids), ids
+        
+    def handle_watch_job_click(job_id):
+        if not job_id or not watch_training_job(job_id):
+            return "Select a job first.", None, gr.update(active=False)
+        return f"Showing the logs of training job {job_id}.", job_id, gr.update(active=True)
+        
+    def handle_stop_job_click(job_id):
+        if not job_id:
+            return "Select a job first.", training_job_rows()
+        return stop_training(job_id), training_job_rows()
 
     def refresh_logs(
         log_box, 
@@ -2303,45 +4446,16 @@ with gr.Blocks(theme=theme, css=custom_log_box_css) as demo:
         total_steps, 
         steps_per_epoch, 
         last_step, 
-        last_epoch
+        last_epoch,
+        metrics_version,
+        log_version
     ):
-        new_logs = ""
-        updated_epoch = last_epoch
-        updated_step = last_step
-        total_steps_value = total_steps
-        steps_per_epoch_value = steps_per_epoch
-
-        while not log_queue.empty():
-            log_line = log_queue.get()
-            new_logs += log_line
-
-            # Extract total steps
-            if "Total steps:" in log_line:
-                try:
-                    total_steps_value = int(log_line.split("Total steps:")[1].strip())
-                except Exception as e:
-                    print(f"Error parsing total steps: {e}")
-
-            # Extract steps per epoch
-            if "Steps per epoch:" in log_line:
-                try:
-                    steps_per_epoch_value = int(log_line.split("Steps per epoch:")[1].strip())
-                except Exception as e:
-                    print(f"Error parsing steps per epoch: {e}")
-
-            # Extract step information
-            if "step=" in log_line:
-                try:
-                    updated_step = int(log_line.split("step=")[1].split(",")[0].strip())
-                except Exception as e:
-                    print(f"Error parsing step info: {e}")
-
-            # Extract epoch information
-            if "Started new epoch:" in log_line:
-                try:
-                    updated_epoch = int(log_line.split("Started new epoch:")[1].strip())
-                except Exception as e:
-                    print(f"Error parsing epoch info: {e}")
+        # Progress comes from the metrics the log reader thread already parsed
+        metrics = training_metrics.snapshot()
+        total_steps_value = metrics["total_steps"] or total_steps
+        steps_per_epoch_value = metrics["steps_per_epoch"] or steps_per_epoch
+        updated_step = metrics["step"] or last_step
+        updated_epoch = metrics["epoch"] or last_epoch
 
         # Calculate progress
         total_epochs = total_steps_value // steps_per_epoch_value if steps_per_epoch_value else 0
@@ -2352,21 +4466,37 @@ with gr.Blocks(theme=theme, css=custom_log_box_css) as demo:
         step_percentage = (updated_step / total_steps_value * 100) if total_steps_value else 0
         step_progress = f"Step: {updated_step} / {total_steps_value} ({step_percentage:.1f}%)"
 
+        # Redraw the plots only when new steps were logged
+        if metrics["version"] != metrics_version:
+            loss_update, throughput_update = metrics_plot_data(metrics["points"])
+        else:
+            loss_update, throughput_update = gr.update(), gr.update()
+
+        # Send the log box only when the log changed, and then only its tail
+        version = training_log.version
+        log_update = training_log.tail(TRAINING_LOG_TAIL_LINES) if version != log_version else gr.update()
+
         # Return updated values
         return (
-            log_box + new_logs,
+            log_update,
             epoch_progress,
             step_progress,
             total_steps_value,
             steps_per_epoch_value,
             updated_step,
             updated_epoch,
+            metrics["version"],
+            version,
+            loss_update,
+            throughput_update,
         )
 
 
     # Persistent states for step and epoch tracking
     last_step = gr.State(0)
     last_epoch = gr.State(1)
+    metrics_version = gr.State(-1)
+    log_version = gr.State(-1)
 
     # Timer to refresh logs
     log_timer = gr.Timer(0.5, active=False)
@@ -2383,6 +4513,8 @@ with gr.Blocks(theme=theme, css=custom_log_box_css) as demo:
             steps_per_epoch,         # Steps per epoch state
             last_step,               # Last step state
             last_epoch,              # Last epoch state
+            metrics_version,         # Metrics version shown in the plots
+            log_version,             # Log version shown in the log box
         ],
         outputs=[
             output,                  # Updated log box
@@ -2392,6 +4524,10 @@ with gr.Blocks(theme=theme, css=custom_log_box_css) as demo:
             steps_per_epoch,         # Updated steps per epoch state
             last_step,               # Updated last step state
             last_epoch,              # Updated last epoch state
+            metrics_version,         # Updated metrics version
+            log_version,             # Updated log version
+            loss_plot,               # Updated loss plot
+            throughput_plot,         # Updated throughput plot
         ]
     )
 
@@ -2408,7 +4544,8 @@ with gr.Blocks(theme=theme, css=custom_log_box_css) as demo:
             eval_micro_batch_size_per_gpu, eval_gradient_accumulation_steps, checkpoint_every_n_minutes,
             activation_checkpointing, partition_method, save_dtype, caching_batch_size, steps_per_print,
             video_clip_mode, resume_from_checkpoint, only_double_blocks, enable_wandb, wandb_run_name, wandb_tracker_name, wandb_api_key,
-            timestep_sample_method, flux_shift, lumina_shift, unet_lr, text_encoder_1_lr, text_encoder_2_lr, llama3_4bit, max_llama3_sequence_length
+            timestep_sample_method, flux_shift, lumina_shift, unet_lr, text_encoder_1_lr, text_encoder_2_lr, llama3_4bit, max_llama3_sequence_length,
+            job_gpus, pipeline_stages
         ],
         outputs=[output, training_process_pid, train_button, stop_button, force_save_model_button, force_save_checkpoint_button],
         api_name=None
@@ -2432,6 +4569,53 @@ with gr.Blocks(theme=theme, css=custom_log_box_css) as demo:
         outputs=log_timer
     )
     
+    analyze_dataset_button.click(
+        fn=handle_analyze_click,
+        inputs=[
+            dataset_path, resolutions_input, enable_ar_bucket, min_ar, max_ar, num_ar_buckets, ar_buckets,
+            frame_buckets, num_repeats, video_clip_mode, batch_size, gradient_accumulation_steps, job_gpus, epochs
+        ],
+        outputs=dataset_analysis
+    )
+    
+    plan_memory_button.click(
+        fn=handle_plan_click,
+        inputs=[
+            model_name, dataset_path, resolutions_input, enable_ar_bucket, min_ar, max_ar, num_ar_buckets, ar_buckets,
+            frame_buckets, num_repeats, video_clip_mode, batch_size, gradient_accumulation_steps, job_gpus,
+            pipeline_stages, blocks_to_swap, activation_checkpointing, transformer_dtype, dtype, rank,
+            lora_dtype, optimizer_type, target_vram
+        ],
+        outputs=[training_plan, planned_settings, apply_plan_button]
+    )
+    
+    apply_plan_button.click(
+        fn=handle_apply_plan,
+        inputs=planned_settings,
+        outputs=[batch_size, gradient_accumulation_steps, pipeline_stages, blocks_to_swap, activation_checkpointing, transformer_dtype]
+    )
+    
+    # Training queue table, refreshed while the page is open
+    training_job_ids = gr.State([])
+    jobs_timer = gr.Timer(2.0)
+    jobs_timer.tick(
+        fn=refresh_training_jobs,
+        inputs=[training_job_ids],
+        outputs=[training_jobs, job_selector, training_job_ids]
+    )
+    
+    watch_job_button.click(
+        fn=handle_watch_job_click,
+        inputs=[job_selector],
+        outputs=[queue_status, training_process_pid, log_timer]
+    )
+    
+    stop_job_button.click(
+        fn=handle_stop_job_click,
+        inputs=[job_selector],
+        outputs=[queue_status, training_jobs]
+    )
+    
     
     # Handle Download Button Click
     download_button.click(
@@ -2786,8 +4970,18 @@ if __name__ == "__main__":
     # Create directories if they don't exist
     for dir_path in [MODEL_DIR, BASE_DATASET_DIR, OUTPUT_DIR, CONFIG_DIR]:
         os.makedirs(dir_path, exist_ok=True)
+        
+    # Pick up the jobs of the last session and start the queued ones
+    training_queue.start()
     
     if DOCKER_DEV:
-        demo.launch(server_name="0.0.0.0", server_port=7000, root_path="/diffusion/", allowed_paths=["/workspace", ".", os.getcwd()])
+        demo.launch(server_name="0.0.0.0", server_port=7000, root_path="/diffusion/", allowed_paths=["/workspace", ".", os.getcwd()], prevent_thread_lock=True)
     else:
-        demo.launch(server_name="0.0.0.0", server_port=7000, allowed_paths=["/workspace", ".", os.getcwd()])
+        demo.launch(server_name="0.0.0.0", server_port=7000, allowed_paths=["/workspace", ".", os.getcwd()], prevent_thread_lock=True)
+    
+    # Plain JSON endpoint next to the Gradio routes, e.g. /metrics?since_step=100
+    demo.app.add_api_route("/metrics", get_training_metrics, methods=["GET"])
+    # Streamed ZIP archives linked by the Download ZIP button
+    demo.app.add_api_route("/export", export_zip, methods=["GET"])
+    demo.app.add_api_route("/ingest_stats", get_ingest_stats, methods=["GET"])
+    demo.block_thread()
@@ -0,0 +1,55 @@
+"""
+Micro-benchmark for the model dropdown in the Gradio trainer.
+
+A change of the model dropdown runs handle_model_type_change, update_model_status
+and toggle_hf_fields_visibility (twice); each of them looks up the model
+configurations. This compares re-parsing every download script on each lookup
+(the old behaviour, forced with reload=True) against the cached registry.
+
+Usage:
+    python tests/benchmark_model_configs.py [iterations]
+"""
+
+import os
+import sys
+import time
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import gradio_interface
+from gradio_interface import parse_model_configs, check_model_exists, toggle_hf_fields_visibility
+
+def dropdown_change(model_name, reload):
+    """Run the config lookups triggered by one dropdown change."""
+    if reload:
+        # Every lookup parses the whole scripts directory again
+        original = gradio_interface.parse_model_configs
+        gradio_interface.parse_model_configs = lambda: original(reload=True)
+        try:
+            return dropdown_change(model_name, reload=False)
+        finally:
+            gradio_interface.parse_model_configs = original
+
+    gradio_interface.parse_model_configs().get(model_name, {})  # handle_model_type_change
+    check_model_exists(model_name)  # update_model_status
+    toggle_hf_fields_visibility(model_name)  # hf_token
+    toggle_hf_fields_visibility(model_name)  # hf_username
+
+def measure(model_name, iterations, reload):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        dropdown_change(model_name, reload)
+    return (time.perf_counter() - start) / iterations * 1000
+
+if __name__ == '__main__':
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    configs = parse_model_configs()
+    if not configs:
+        sys.exit(f"No model configurations found in {gradio_interface.DOWNLOAD_SCRIPTS_DIR}")
+    model_name = sorted(configs)[0]
+
+    uncached = measure(model_name, iterations, reload=True)
+    cached = measure(model_name, iterations, reload=False)
+    print(f"{len(configs)} model configs, {iterations} dropdown changes of {model_name!r}")
+    print(f"  re-parse on every lookup: {uncached:.3f} ms per change")
+    print(f"  cached registry:          {cached:.3f} ms per change ({uncached / cached:.1f}x faster)")
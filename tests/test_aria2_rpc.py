@@ -0,0 +1,220 @@
+import unittest
+import os
+import sys
+import json
+import stat
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+# Add the control panel directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'control_panel'))
+from aria2_rpc import Aria2Daemon, Aria2RPC, Aria2RPCBackend, Aria2RPCError, aria2c_command_to_options
+from download_scheduler import DownloadScheduler, DownloadTask
+
+SECRET = "test-secret"
+
+class FakeAria2:
+    """In-memory stand-in for the aria2c RPC interface."""
+
+    def __init__(self):
+        self.downloads = {}
+        self.calls = []
+
+    def handle(self, method, params):
+        self.calls.append(method)
+        if method == 'system.multicall':
+            results = []
+            for call in params[0]:
+                try:
+                    results.append([self.handle(call['methodName'], call['params'])])
+                except KeyError:
+                    results.append({'code': 1, 'message': 'GID not found'})
+            return results
+
+        if params[0] != f"token:{SECRET}":
+            raise PermissionError('Unauthorized')
+        params = params[1:]
+
+        if method == 'aria2.getVersion':
+            return {'version': 'fake'}
+        if method == 'aria2.addUri':
+            gid = f"{len(self.downloads) + 1:016x}"
+            self.downloads[gid] = {'gid': gid, 'status': 'active', 'totalLength': '1000',
+                                   'completedLength': '0', 'downloadSpeed': '500',
+                                   'uris': params[0], 'options': params[1]}
+            return gid
+        if method == 'aria2.tellStatus':
+            download = self.downloads[params[0]]
+            completed = min(int(download['completedLength']) + 500, 1000)
+            download['completedLength'] = str(completed)
+            if completed == 1000 and download['status'] == 'active':
+                download['status'] = 'complete'
+            return dict(download)
+        if method in ('aria2.forceRemove', 'aria2.remove'):
+            self.downloads[params[0]]['status'] = 'removed'
+            return params[0]
+        if method in ('aria2.removeDownloadResult', 'aria2.shutdown'):
+            return 'OK'
+        raise KeyError(method)
+
+def make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            try:
+                body = {'id': request['id'], 'jsonrpc': '2.0',
+                        'result': fake.handle(request['method'], request['params'])}
+                code = 200
+            except (KeyError, PermissionError) as e:
+                body = {'id': request['id'], 'jsonrpc': '2.0', 'error': {'code': 1, 'message': str(e)}}
+                code = 400
+            data = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+    return Handler
+
+class TestAria2RPC(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeAria2()
+        self.server = HTTPServer(('127.0.0.1', 0), make_handler(self.fake))
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.rpc = Aria2RPC(f"http://127.0.0.1:{self.server.server_port}/jsonrpc", SECRET)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_call_sends_secret(self):
+        self.assertEqual(self.rpc.get_version()['version'], 'fake')
+        with self.assertRaises(Aria2RPCError):
+            Aria2RPC(self.rpc.url, 'wrong').get_version()
+
+    def test_unreachable_daemon_raises(self):
+        with self.assertRaises(Aria2RPCError):
+            Aria2RPC("http://127.0.0.1:1/jsonrpc", timeout=1).get_version()
+
+    def test_scheduler_with_rpc_backend(self):
+        backend = Aria2RPCBackend(self.rpc, {'allow-overwrite': 'true'})
+        scheduler = DownloadScheduler(backend, max_concurrent=2, poll_interval=0)
+        for task_id in range(1, 4):
+            scheduler.add(DownloadTask(task_id, f"https://example.com/f{task_id}", "/models/vae", f"f{task_id}",
+                                       headers={"Authorization": "Bearer tok"}))
+
+        self.assertTrue(scheduler.run())
+        snapshot = scheduler.snapshot()
+        self.assertEqual(snapshot["downloaded_bytes"], 3000)
+        self.assertEqual(snapshot["completed_files"], 3)
+
+        options = self.fake.downloads['0000000000000001']['options']
+        self.assertEqual(options['dir'], '/models/vae')
+        self.assertEqual(options['header'], ['Authorization: Bearer tok'])
+        self.assertEqual(options['allow-overwrite'], 'true')
+        # Every refresh is a single multicall, never one tellStatus request per file
+        self.assertNotIn('aria2.tellActive', self.fake.calls)
+
+    def test_cancel_removes_gid(self):
+        backend = Aria2RPCBackend(self.rpc)
+        task = DownloadTask(1, "https://example.com/f", "/models", "f")
+        task.connections = 4
+        backend.start(task)
+        backend.cancel(task)
+        self.assertEqual(self.fake.downloads[task.handle]['status'], 'removed')
+
+    def test_lost_daemon_fails_downloads(self):
+        rpc = Aria2RPC("http://127.0.0.1:1/jsonrpc", timeout=1)
+        scheduler = DownloadScheduler(Aria2RPCBackend(rpc), poll_interval=0)
+        task = scheduler.add(DownloadTask(1, "https://example.com/f", "/models", "f"))
+        task.state = 'downloading'
+        task.handle = '0000000000000001'
+
+        self.assertFalse(scheduler.run())
+        self.assertEqual(task.state, 'error')
+
+class TestAria2Daemon(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeAria2()
+        self.server = HTTPServer(('127.0.0.1', 0), make_handler(self.fake))
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.tmp = tempfile.TemporaryDirectory()
+        # Starting a new aria2c always fails, only a daemon answering on the port can be used
+        self.missing = os.path.join(self.tmp.name, 'aria2c')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def test_secret_survives_restart(self):
+        path = os.path.join(self.tmp.name, 'state', 'secret')
+        first = Aria2Daemon(secret_path=path)
+        self.assertEqual(Aria2Daemon(secret_path=path).secret, first.secret)
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+        self.assertEqual(Aria2Daemon(secret='given', secret_path=path).secret, 'given')
+
+    def test_running_daemon_is_adopted_and_probed_after_failures_only(self):
+        daemon = Aria2Daemon(port=self.server.server_port, secret=SECRET, executable=self.missing)
+        rpc = daemon.ensure_running()
+        self.assertIsNone(daemon.process)
+        for _ in range(3):
+            self.assertIs(daemon.ensure_running(), rpc)
+        self.assertEqual(self.fake.calls.count('aria2.getVersion'), 1)
+
+        # An unknown GID is not a daemon failure
+        with self.assertRaises(Aria2RPCError):
+            rpc.tell_status('0000000000000009')
+        daemon.ensure_running()
+        self.assertEqual(self.fake.calls.count('aria2.getVersion'), 1)
+
+        # Once aria2c is gone, the next call probes it and tries to start a new one
+        self.server.shutdown()
+        self.server.server_close()
+        with self.assertRaises(Aria2RPCError):
+            rpc.tell_status('0000000000000001')
+        self.assertFalse(daemon.healthy)
+        with self.assertRaises(Aria2RPCError):
+            daemon.ensure_running(timeout=1)
+
+    def test_port_held_by_another_program(self):
+        # Answers on the port, but not with this secret and it is no aria2c
+        daemon = Aria2Daemon(port=self.server.server_port, secret='other', executable=self.missing)
+        with self.assertRaisesRegex(Aria2RPCError, 'is used by'):
+            daemon.ensure_running(timeout=1)
+
+    def test_stop_shuts_down_adopted_daemon(self):
+        daemon = Aria2Daemon(port=self.server.server_port, secret=SECRET, executable=self.missing)
+        daemon.stop()
+        self.assertNotIn('aria2.shutdown', self.fake.calls)
+        daemon.ensure_running()
+        daemon.stop()
+        self.assertIn('aria2.shutdown', self.fake.calls)
+        self.assertFalse(daemon.healthy)
+
+class TestCommandParsing(unittest.TestCase):
+    def test_preset_command(self):
+        cmd = ('aria2c -x 16 -s 16 -d "/workspace/ComfyUI/models/vae" -o "wan 2.1 vae.safetensors" '
+               '--auto-file-renaming=false --header="Authorization: Bearer x" -c '
+               '"https://huggingface.co/repo/resolve/main/vae.safetensors"')
+        uris, options = aria2c_command_to_options(cmd)
+        self.assertEqual(uris, ["https://huggingface.co/repo/resolve/main/vae.safetensors"])
+        self.assertEqual(options['dir'], "/workspace/ComfyUI/models/vae")
+        self.assertEqual(options['out'], "wan 2.1 vae.safetensors")
+        self.assertEqual(options['max-connection-per-server'], "16")
+        self.assertEqual(options['header'], ["Authorization: Bearer x"])
+        self.assertEqual(options['continue'], "true")
+        self.assertEqual(options['auto-file-renaming'], "false")
+
+    def test_boolean_option_before_uri(self):
+        uris, options = aria2c_command_to_options(
+            'aria2c --allow-overwrite --header "Referer: https://example.com" https://example.com/f')
+        self.assertEqual(uris, ["https://example.com/f"])
+        self.assertEqual(options['allow-overwrite'], "true")
+        self.assertEqual(options['header'], ["Referer: https://example.com"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+import os
+import sys
+import tempfile
+import time
+
+# Add the control panel directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'control_panel'))
+from bandwidth import BandwidthBudget, BandwidthGovernor, TimeWindowRule, parse_rate, parse_rules, training_running
+
+MiB = 1 << 20
+
+def at(hour, minute=0):
+    """Timestamp of today at hour:minute local time."""
+    local = time.localtime()
+    return time.mktime((local.tm_year, local.tm_mon, local.tm_mday, hour, minute, 0, 0, 0, -1))
+
+class FakeRPC:
+    def __init__(self, speeds):
+        self.speeds = speeds
+        self.global_options = []
+        self.options = {}
+
+    def tell_active(self, keys=None):
+        return [{'gid': gid, 'downloadSpeed': str(speed)} for gid, speed in self.speeds.items()]
+
+    def change_global_option(self, options):
+        self.global_options.append(options)
+
+    def change_option(self, gid, options):
+        self.options[gid] = options
+
+class TestBandwidth(unittest.TestCase):
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate("50MiB"), 50 * MiB)
+        self.assertEqual(parse_rate("50M"), 50 * MiB)
+        self.assertEqual(parse_rate("6MB/s"), 6 * 1000 ** 2)
+        self.assertEqual(parse_rate("0"), 0)
+        self.assertEqual(parse_rate(""), 0)
+        with self.assertRaises(ValueError):
+            parse_rate("fast")
+
+    def test_time_window_rules(self):
+        night, = parse_rules("22:00-06:00=10MiB;bogus")
+        self.assertTrue(night.matches(23 * 60))
+        self.assertTrue(night.matches(5 * 60))
+        self.assertFalse(night.matches(12 * 60))
+        self.assertEqual(str(night), "22:00-06:00=10.0MiB/s")
+
+    def test_lowest_limit_applies(self):
+        training = [False]
+        budget = BandwidthBudget(
+            limit=100 * MiB, disk_write_limit=80 * MiB, training_limit=20 * MiB,
+            rules=[TimeWindowRule(8 * 60, 20 * 60, 50 * MiB)],
+            training_check=lambda: training[0], training_check_interval=0
+        )
+        self.assertEqual(budget.current_limit(at(3)), (80 * MiB, ["disk-write limit"]))
+        self.assertEqual(budget.current_limit(at(12))[0], 50 * MiB)
+        training[0] = True
+        self.assertEqual(budget.current_limit(at(12)), (20 * MiB, ["training is running"]))
+        self.assertEqual(BandwidthBudget(training_check=lambda: True).current_limit(), (0, []))
+
+    def test_allocation_by_priority(self):
+        budget = BandwidthBudget(limit=70 * MiB)
+        allocation = budget.allocate({'1': 'high', '2': 'normal', '3': 'low'})
+        self.assertEqual(allocation, {'1': 40 * MiB, '2': 20 * MiB, '3': 10 * MiB})
+        self.assertEqual(BandwidthBudget().allocate({'1': 'high'}), {'1': 0})
+
+    def test_governor_applies_limits(self):
+        budget = BandwidthBudget(limit=60 * MiB)
+        rpc = FakeRPC({'a': 10 * MiB, 'b': 10 * MiB, 'c': 30 * MiB})
+        jobs = [('1', 'normal', ['a', 'b']), ('2', 'normal', ['c', 'gone'])]
+        governor = BandwidthGovernor(budget, lambda: rpc, lambda: jobs)
+
+        self.assertTrue(governor.tick())
+        self.assertEqual(rpc.global_options, [{'max-overall-download-limit': str(60 * MiB)}])
+        self.assertEqual(rpc.options['a'], {'max-download-limit': str(15 * MiB)})
+        self.assertEqual(rpc.options['c'], {'max-download-limit': str(30 * MiB)})
+        self.assertEqual(budget.stats()['jobs'], {'1': 20 * MiB, '2': 30 * MiB})
+
+        # Unchanged limits are not sent again
+        rpc.options.clear()
+        governor.tick()
+        self.assertEqual(rpc.options, {})
+        self.assertEqual(len(rpc.global_options), 1)
+
+    def test_governor_stops_without_jobs_when_aria2c_fails(self):
+        jobs = [('1', 'normal', ['a'])]
+        rpc_calls = []
+        def broken_rpc():
+            rpc_calls.append(1)
+            raise OSError("aria2c is not running")
+        governor = BandwidthGovernor(BandwidthBudget(), broken_rpc, lambda: list(jobs), interval=0.01)
+        self.assertFalse(governor.tick(jobs=[]))
+        self.assertEqual(rpc_calls, [])
+
+        governor.ensure_running()
+        time.sleep(0.1)
+        # Still running while the job is, although every adjustment fails
+        self.assertIsNotNone(governor._thread)
+        self.assertTrue(rpc_calls)
+
+        jobs.clear()
+        thread = governor._thread
+        thread.join(timeout=2)
+        self.assertFalse(thread.is_alive())
+        self.assertIsNone(governor._thread)
+
+    def test_governor_keeps_job_created_while_stopping(self):
+        calls = []
+        def get_jobs():
+            # The job appears between the empty list and the check before stopping
+            calls.append(1)
+            return [('1', 'normal', [])] if len(calls) == 2 else []
+        governor = BandwidthGovernor(BandwidthBudget(), lambda: FakeRPC({}), get_jobs, interval=0.01)
+        governor.ensure_running()
+        for _ in range(200):
+            if governor._thread is None:
+                break
+            time.sleep(0.01)
+        self.assertIsNone(governor._thread)
+        # Listed again after the new job instead of stopping right away
+        self.assertGreaterEqual(len(calls), 3)
+
+    def test_training_detection(self):
+        with tempfile.TemporaryDirectory() as proc:
+            os.makedirs(os.path.join(proc, "42"))
+            with open(os.path.join(proc, "42", "cmdline"), "wb") as f:
+                f.write(b"python\0train.py\0--deepspeed\0--config\0x.toml\0")
+            self.assertTrue(training_running(proc_dir=proc))
+            self.assertFalse(training_running(patterns=('train_network.py',), proc_dir=proc))
+
+if __name__ == '__main__':
+    unittest.main()
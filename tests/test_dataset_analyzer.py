@@ -0,0 +1,62 @@
+import unittest
+import os
+import sys
+import tempfile
+from PIL import Image
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import gradio_interface
+from gradio_interface import analyze_dataset, bucket_size, dataset_ar_buckets
+
+class TestDatasetAnalyzer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dataset_dir = os.path.join(self.tmp.name, "dataset")
+        os.makedirs(self.dataset_dir)
+        self.manifest_dir = gradio_interface.DATASET_MANIFEST_DIR
+        gradio_interface.DATASET_MANIFEST_DIR = os.path.join(self.tmp.name, "manifests")
+
+        for i in range(12):
+            Image.new("RGB", (1024, 768)).save(os.path.join(self.dataset_dir, f"landscape_{i}.png"))
+            with open(os.path.join(self.dataset_dir, f"landscape_{i}.txt"), "w") as f:
+                f.write("a landscape")
+        for i in range(3):
+            Image.new("RGB", (768, 1024)).save(os.path.join(self.dataset_dir, f"portrait_{i}.jpg"))
+        with open(os.path.join(self.dataset_dir, "broken.png"), "wb") as f:
+            f.write(b"not an image")
+
+    def tearDown(self):
+        gradio_interface.DATASET_MANIFEST_DIR = self.manifest_dir
+        self.tmp.cleanup()
+
+    def test_ar_buckets(self):
+        buckets = dataset_ar_buckets(True, 0.5, 2.0, 3, None)
+        self.assertEqual([round(b, 3) for b in buckets], [0.5, 1.0, 2.0])
+        self.assertEqual(dataset_ar_buckets(False, 0.5, 2.0, 7, None), [1.0])
+        self.assertEqual(dataset_ar_buckets(True, 0.5, 2.0, 7, [[512, 512], [448, 576]]), [1.0, 448 / 576])
+        self.assertEqual(bucket_size(512, 1.0), (512, 512))
+        self.assertEqual(bucket_size([1280, 720], 1.0), (960, 960))
+
+    def test_bucket_counts_and_steps(self):
+        analysis = analyze_dataset(
+            self.dataset_dir, [512], True, 0.5, 2.0, 7, None, [1, 33],
+            num_repeats=2, batch_size=1, gradient_accumulation_steps=4, workers=2
+        )
+        self.assertEqual((analysis["images"], analysis["dropped"]), (15, 1))
+        buckets = {row[1]: row for row in analysis["buckets"]}
+        self.assertEqual(buckets["576x464"][3:], [12, 24, 6])
+        self.assertEqual(buckets["464x576"][3:], [3, 6, 2])
+        self.assertEqual(analysis["steps_per_epoch"], 8)
+        warnings = "\n".join(analysis["warnings"])
+        self.assertIn("broken.png", warnings)
+        self.assertIn("4 media files have no caption", warnings)
+
+    def test_images_need_frame_bucket_1(self):
+        analysis = analyze_dataset(self.dataset_dir, [512], True, 0.5, 2.0, 7, None, [33], workers=1)
+        self.assertEqual(analysis["buckets"], [])
+        self.assertEqual(analysis["steps_per_epoch"], 0)
+        self.assertIn("No samples would be trained on with this configuration.", analysis["warnings"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+import os
+import sys
+import tempfile
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gradio_interface import DatasetManifest
+
+class TestDatasetManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dataset_dir = os.path.join(self.tmp.name, "my_dataset")
+        self.manifest_path = os.path.join(self.tmp.name, "manifests", "my_dataset.json")
+        os.makedirs(self.dataset_dir)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, size):
+        path = os.path.join(self.dataset_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+        return path
+
+    def test_add_keeps_running_total(self):
+        manifest = DatasetManifest(self.dataset_dir, self.manifest_path)
+        manifest.add([self.write("clip_1.mp4", 1000), self.write("clip_1.txt", 10)])
+        manifest.add([self.write("clip_2.mp4", 500)])
+
+        self.assertEqual(manifest.total_size, 1510)
+        summary = manifest.summary()
+        self.assertEqual((summary["media"], summary["captions"], summary["uncaptioned"]), (2, 1, 1))
+
+        # Replacing a file counts its new size only
+        manifest.add([self.write("clip_2.mp4", 200)])
+        self.assertEqual(manifest.total_size, 1210)
+
+    def test_external_changes_are_picked_up(self):
+        self.write("image_1.png", 100)
+        manifest = DatasetManifest(self.dataset_dir, self.manifest_path)
+        self.assertEqual(manifest.total_size, 100)
+
+        self.write("frames/image_2.png", 50)
+        os.remove(os.path.join(self.dataset_dir, "image_1.png"))
+        manifest.refresh()
+        self.assertEqual(manifest.total_size, 50)
+        self.assertEqual(manifest.media(), [os.path.join(self.dataset_dir, "frames", "image_2.png")])
+
+    def test_manifest_survives_reload(self):
+        manifest = DatasetManifest(self.dataset_dir, self.manifest_path)
+        manifest.add([self.write("image_1.png", 100), self.write("image_1.txt", 5)])
+        manifest.remove([os.path.join(self.dataset_dir, "image_1.txt")])
+        os.remove(os.path.join(self.dataset_dir, "image_1.txt"))
+
+        reloaded = DatasetManifest(self.dataset_dir, self.manifest_path)
+        self.assertEqual(reloaded.files, {"image_1.png": manifest.files["image_1.png"]})
+        self.assertEqual(reloaded.total_size, 100)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+from unittest import mock
+
+# Add the control panel directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'control_panel'))
+import disk_usage
+from disk_usage import DiskUsageIndex, check_space, existing_parent
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+class TestDiskUsageIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.models = os.path.join(self.tmp.name, 'models')
+        self.datasets = os.path.join(self.tmp.name, 'datasets')
+        write(os.path.join(self.models, 'vae', 'vae.safetensors'), b'v' * 300000)
+        write(os.path.join(self.models, 'loras', 'a.safetensors'), b'a' * 50000)
+        write(os.path.join(self.datasets, 'set1', 'img.png'), b'i' * 10000)
+        self.index = DiskUsageIndex([self.models, self.datasets], duplicate_min_size=1)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_totals_and_children(self):
+        self.index.refresh()
+        summary = self.index.summary()
+        models = summary['roots'][0]
+        self.assertEqual(models['files'], 2)
+        self.assertGreaterEqual(models['bytes'], 350000)
+        self.assertIn('free', models)
+
+        children = self.index.children(self.models)
+        self.assertEqual([os.path.basename(c['path']) for c in children], ['vae', 'loras'])
+        self.assertIsNone(self.index.children(os.path.join(self.tmp.name, 'other')))
+
+    def test_incremental_refresh(self):
+        first = self.index.refresh()
+        self.assertEqual(first['listed_dirs'], 5)
+
+        second = self.index.refresh()
+        self.assertEqual(second['listed_dirs'], 0)
+        self.assertEqual(second['reused_dirs'], 5)
+
+        write(os.path.join(self.models, 'loras', 'b.safetensors'), b'b' * 1000)
+        shutil.rmtree(os.path.join(self.datasets, 'set1'))
+        third = self.index.refresh()
+        # loras and datasets changed
+        self.assertEqual(third['listed_dirs'], 2)
+        self.assertEqual(self.index.summary()['roots'][0]['files'], 3)
+        self.assertEqual(self.index.summary()['roots'][1]['files'], 0)
+        self.assertNotIn(os.path.join(self.datasets, 'set1'), self.index.dirs)
+
+    def test_hardlinks_counted_once(self):
+        os.link(os.path.join(self.models, 'vae', 'vae.safetensors'), os.path.join(self.models, 'vae', 'alias.safetensors'))
+        self.index.refresh()
+        self.assertEqual(self.index.summary()['roots'][0]['files'], 2)
+
+        largest = self.index.largest_files(2)
+        self.assertEqual(largest[0]['path'], os.path.join(self.models, 'vae', 'alias.safetensors'))
+        self.assertEqual(largest[0]['links'], [os.path.join(self.models, 'vae', 'vae.safetensors')])
+        self.assertEqual(largest[1]['bytes'], 50000)
+
+        # Links of one file are not duplicates
+        self.assertEqual(self.index.find_duplicates(), [])
+
+    def test_find_duplicates(self):
+        copy = os.path.join(self.datasets, 'copy.safetensors')
+        shutil.copy(os.path.join(self.models, 'vae', 'vae.safetensors'), copy)
+        # Same size as the VAE, different content
+        write(os.path.join(self.datasets, 'other.bin'), b'x' * 300000)
+        self.index.refresh()
+
+        with mock.patch.object(disk_usage, 'sha256_file', wraps=disk_usage.sha256_file) as full_hash:
+            groups = self.index.find_duplicates()
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(groups[0]['paths'], sorted([copy, os.path.join(self.models, 'vae', 'vae.safetensors')]))
+        self.assertEqual(groups[0]['reclaimable'], 300000)
+        # other.bin differs in its sample and is never hashed in full
+        self.assertEqual(full_hash.call_count, 2)
+
+        # Hashes are reused while the files do not change
+        with mock.patch.object(disk_usage, 'sha256_file') as full_hash:
+            self.index.refresh()
+            self.assertEqual(len(self.index.find_duplicates()), 1)
+        full_hash.assert_not_called()
+
+    def test_copies_found_after_first_scan(self):
+        vae = os.path.join(self.models, 'vae', 'vae.safetensors')
+        first = os.path.join(self.datasets, 'a.safetensors')
+        shutil.copy(vae, first)
+        self.index.refresh()
+        self.assertEqual(self.index.find_duplicates()[0]['paths'], sorted([first, vae]))
+
+        # A new copy has no cached hash yet and still joins the group
+        second = os.path.join(self.datasets, 'c.safetensors')
+        shutil.copy(vae, second)
+        self.index.refresh()
+        groups = self.index.find_duplicates()
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(groups[0]['paths'], sorted([first, second, vae]))
+        self.assertEqual(groups[0]['reclaimable'], 600000)
+
+        # Deleting a hashed copy leaves a hashed and an unhashed one
+        os.remove(first)
+        self.index.refresh()
+        groups = self.index.find_duplicates()
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(groups[0]['paths'], sorted([second, vae]))
+
+    def test_persistence(self):
+        path = os.path.join(self.tmp.name, 'index.json')
+        DiskUsageIndex([self.models], path).refresh()
+        index = DiskUsageIndex([self.models], path)
+        self.assertEqual(index.summary()['roots'][0]['files'], 2)
+        self.assertEqual(index.refresh()['listed_dirs'], 0)
+
+class TestCheckSpace(unittest.TestCase):
+    def test_check_space(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            missing = os.path.join(tmp, 'not', 'created')
+            self.assertEqual(existing_parent(missing), tmp)
+            free = shutil.disk_usage(tmp).free
+
+            self.assertEqual(check_space([(missing, 1024)]), [])
+            self.assertEqual(check_space([(missing, 0)], reserve=free * 2), [])
+            shortfalls = check_space([(missing, free), (tmp, 1)])
+            self.assertEqual(len(shortfalls), 1)
+            self.assertEqual(shortfalls[0]['needed'], free + 1)
+            self.assertEqual(check_space([(tmp, 1024)], reserve=free)[0]['path'], tmp)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import os
+import sys
+import threading
+
+# Add the control panel directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'control_panel'))
+from download_jobs import JobLimitError, JobRegistry
+
+class TestJobRegistry(unittest.TestCase):
+    def test_jobs_keep_their_own_status(self):
+        registry = JobRegistry(max_active=0)
+        first = registry.create('huggingface', 'a.safetensors')
+        second = registry.create('huggingface', 'b.safetensors')
+        first.update(status='downloading', progress=40)
+        second.update(status='completed', progress=100)
+
+        self.assertNotEqual(first.id, second.id)
+        self.assertEqual(registry.get(first.id).status['progress'], 40)
+        self.assertIs(registry.latest('huggingface'), second)
+        self.assertEqual(registry.active(), [first])
+        self.assertIsNotNone(second.finished_at)
+        self.assertEqual(second.to_dict()['kind'], 'huggingface')
+
+    def test_concurrent_job_cap(self):
+        registry = JobRegistry(max_active=2)
+        registry.create('civitai', 'a')
+        job = registry.create('civitai', 'b')
+        with self.assertRaises(JobLimitError):
+            registry.create('preset', 'c')
+        job.update(status='error')
+        registry.create('preset', 'c')
+
+    def test_cancel(self):
+        registry = JobRegistry()
+        job = registry.create('preset', 'wan')
+        job.update(status='downloading')
+        cancelled = []
+        job.on_cancel = cancelled.append
+
+        self.assertIs(registry.cancel(job.id), job)
+        self.assertTrue(job.cancelled)
+        self.assertEqual(cancelled, [job])
+        self.assertEqual(job.state, 'stopped')
+        self.assertIsNone(registry.cancel('missing'))
+
+        # Finished jobs are not cancelled again
+        registry.cancel(job.id)
+        self.assertEqual(cancelled, [job])
+
+    def test_history_is_pruned(self):
+        registry = JobRegistry(max_active=0, history=2)
+        jobs = [registry.create('civitai', str(i)) for i in range(4)]
+        for job in jobs[:3]:
+            job.update(status='completed')
+        registry.create('civitai', 'new')
+        self.assertEqual([job.label for job in registry.jobs()], ['1', '2', '3', 'new'])
+
+    def test_threads_get_unique_ids(self):
+        registry = JobRegistry(max_active=0)
+        created = []
+        threads = [threading.Thread(target=lambda: created.append(registry.create('civitai', 'x').id))
+                   for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(created)), 20)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+import unittest
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the control panel directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'control_panel'))
+from download_scheduler import DownloadScheduler, DownloadTask, parse_size, format_size, format_eta, probe_remote_file
+
+class FakeBackend:
+    """Backend that finishes every download after a fixed number of refreshes."""
+
+    def __init__(self, refreshes_needed=2, fail=()):
+        self.refreshes_needed = refreshes_needed
+        self.fail = set(fail)
+        self.started = []
+        self.cancelled = []
+        self.max_active = 0
+
+    def start(self, task):
+        self.started.append(task.id)
+        task.handle = 0
+
+    def refresh(self, tasks):
+        self.max_active = max(self.max_active, len(tasks))
+        for task in tasks:
+            task.handle += 1
+            task.downloaded = task.total * task.handle // self.refreshes_needed
+            if task.handle >= self.refreshes_needed:
+                task.state = 'error' if task.id in self.fail else 'completed'
+
+    def cancel(self, task):
+        self.cancelled.append(task.id)
+
+SHA256 = "a" * 64
+
+class HubHandler(BaseHTTPRequestHandler):
+    """Redirects like the HuggingFace hub: linked headers on the redirect, none on the CDN."""
+
+    def do_HEAD(self):
+        if self.path == '/hub/model.safetensors':
+            self.send_response(302)
+            self.send_header('Location', '/cdn/model.safetensors')
+            self.send_header('X-Linked-Size', '1234')
+            self.send_header('X-Linked-Etag', f'"{SHA256}"')
+            self.send_header('Content-Length', '1')
+        elif self.path == '/moved/model.safetensors':
+            self.send_response(301)
+            self.send_header('Location', '/cdn/model.safetensors')
+            self.send_header('Content-Length', '1')
+        elif self.path == '/cdn/model.safetensors':
+            self.send_response(200)
+            self.send_header('Content-Length', '1234')
+        else:
+            self.send_response(404)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+class TestProbeRemoteFile(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), HubHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_linked_headers_read_from_redirect(self):
+        self.assertEqual(probe_remote_file(f"{self.base}/hub/model.safetensors"), (1234, SHA256))
+
+    def test_plain_redirect_is_followed(self):
+        self.assertEqual(probe_remote_file(f"{self.base}/moved/model.safetensors"), (1234, None))
+        self.assertEqual(probe_remote_file(f"{self.base}/cdn/model.safetensors"), (1234, None))
+        self.assertEqual(probe_remote_file(f"{self.base}/missing"), (None, None))
+
+class TestDownloadScheduler(unittest.TestCase):
+    def make_task(self, task_id, size, host='huggingface.co', directory='/models/diffusion_models'):
+        return DownloadTask(task_id, f"https://{host}/file{task_id}", directory, f"file{task_id}", size=size)
+
+    def test_small_files_start_first(self):
+        backend = FakeBackend()
+        scheduler = DownloadScheduler(backend, max_concurrent=1, poll_interval=0)
+        for task_id, size in [(1, 30 << 30), (2, 300 << 20), (3, 5 << 30)]:
+            scheduler.add(self.make_task(task_id, size))
+
+        self.assertTrue(scheduler.run())
+        self.assertEqual(backend.started, [2, 3, 1])
+
+    def test_concurrency_and_host_limits(self):
+        backend = FakeBackend()
+        scheduler = DownloadScheduler(backend, max_concurrent=3, per_host_limit=1, poll_interval=0)
+        scheduler.add(self.make_task(1, 100, host='a.example'))
+        scheduler.add(self.make_task(2, 100, host='a.example'))
+        scheduler.add(self.make_task(3, 100, host='b.example'))
+
+        scheduler._launch_ready()
+        active_hosts = sorted(task.host for task in scheduler._active())
+        self.assertEqual(active_hosts, ['a.example', 'b.example'])
+
+    def test_connection_budget_is_shared(self):
+        backend = FakeBackend()
+        scheduler = DownloadScheduler(backend, max_concurrent=4, max_connections=20, poll_interval=0)
+        for task_id in range(1, 5):
+            scheduler.add(self.make_task(task_id, 100, host=f"host{task_id}"))
+
+        scheduler._launch_ready()
+        connections = [task.connections for task in scheduler._active()]
+        self.assertEqual(len(connections), 4)
+        self.assertLessEqual(sum(connections), 20)
+        self.assertTrue(all(c >= 1 for c in connections))
+
+    def test_failed_file_does_not_stop_others(self):
+        backend = FakeBackend(fail={2})
+        scheduler = DownloadScheduler(backend, max_concurrent=1, poll_interval=0)
+        for task_id in range(1, 4):
+            scheduler.add(self.make_task(task_id, task_id * 100))
+
+        self.assertFalse(scheduler.run())
+        snapshot = scheduler.snapshot()
+        self.assertEqual(snapshot["completed_files"], 2)
+        self.assertEqual(snapshot["failed_files"], 1)
+
+    def test_cancel_aborts_active_downloads(self):
+        backend = FakeBackend(refreshes_needed=1000)
+        scheduler = DownloadScheduler(backend, max_concurrent=2, poll_interval=0)
+        for task_id in range(1, 4):
+            scheduler.add(self.make_task(task_id, 100, host=f"host{task_id}"))
+
+        scheduler._launch_ready()
+        scheduler.cancel()
+        self.assertFalse(scheduler.run())
+        self.assertEqual(sorted(backend.cancelled), [1, 2])
+        self.assertTrue(all(task.state == 'cancelled' for task in scheduler.tasks))
+
+    def test_snapshot_never_reports_done_early(self):
+        scheduler = DownloadScheduler(FakeBackend(), poll_interval=0)
+        done = scheduler.add(self.make_task(1, 100))
+        scheduler.add(DownloadTask(2, "https://huggingface.co/unknown", "/models/vae", "unknown"))
+        done.state = 'completed'
+        done.downloaded = 100
+
+        snapshot = scheduler.snapshot()
+        self.assertEqual(snapshot["progress"], 99)
+        self.assertEqual(len(snapshot["files"]), 2)
+
+    def test_size_helpers(self):
+        self.assertEqual(parse_size("16GiB"), 16 << 30)
+        self.assertEqual(parse_size("1.5MiB"), int(1.5 * (1 << 20)))
+        self.assertEqual(parse_size("garbage"), 0)
+        self.assertEqual(format_size(1536), "1.5KiB")
+        self.assertEqual(format_eta(3725), "1h2m5s")
+        self.assertEqual(format_eta(None), "Unknown")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import os
+import sys
+import tempfile
+
+# Add the control panel directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'control_panel'))
+from download_spec import SpecCache, iter_commands, parse_download_script
+
+SCRIPT = r'''#!/bin/bash
+# Model: Example
+echo "Downloading; please wait..."
+mkdir -p "/workspace/ComfyUI/models"
+
+# Download the VAE
+aria2c -x 16 -s 16 -d "/workspace/ComfyUI/models/my vae" \
+    -o "wan 2.1 vae.safetensors" --auto-file-renaming=false \
+    --header="Authorization: Bearer abc" \
+    "https://huggingface.co/repo/resolve/main/vae.safetensors"
+stdbuf -oL aria2c --dir=/workspace/ComfyUI/models/loras --out='lora #1.safetensors' https://example.com/lora.safetensors?download=true # trailing
+cd /workspace/training_models && aria2c https://example.com/t5.safetensors
+bash /hfd.sh HiDream-ai/HiDream-I1-Full --include "*.json" "transformer/*" --hf_token "$HUGGINGFACE_TOKEN"
+echo "All downloads completed!"
+'''
+
+class TestDownloadSpec(unittest.TestCase):
+    def test_commands(self):
+        commands = list(iter_commands(SCRIPT))
+        self.assertEqual(commands[0], ['echo', 'Downloading; please wait...'])
+        self.assertEqual(commands[2][:3], ['aria2c', '-x', '16'])
+        self.assertEqual(commands[4], ['cd', '/workspace/training_models'])
+        self.assertEqual(list(iter_commands("echo 'multi\nline' | cat")), [['echo', 'multi\nline'], ['cat']])
+
+    def test_specs(self):
+        vae, lora, t5, repo = parse_download_script(SCRIPT)
+
+        self.assertEqual(vae.url, "https://huggingface.co/repo/resolve/main/vae.safetensors")
+        self.assertEqual(vae.path, "/workspace/ComfyUI/models/my vae/wan 2.1 vae.safetensors")
+        self.assertEqual(vae.headers, {"Authorization": "Bearer abc"})
+        self.assertEqual(vae.options, {'max-connection-per-server': '16', 'split': '16', 'auto-file-renaming': 'false'})
+
+        self.assertEqual(lora.path, "/workspace/ComfyUI/models/loras/lora #1.safetensors")
+        self.assertEqual(t5.path, "/workspace/training_models/t5.safetensors")
+
+        self.assertEqual(repo.tool, 'hfd')
+        self.assertEqual(repo.url, "https://huggingface.co/HiDream-ai/HiDream-I1-Full")
+        self.assertEqual(repo.directory, "/workspace/training_models/HiDream-I1-Full")
+        self.assertEqual(repo.options['include'], ["*.json", "transformer/*"])
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "download_example.sh")
+            with open(path, "w") as f:
+                f.write(SCRIPT)
+            cache = SpecCache()
+            first = cache.get(path)
+            self.assertEqual(len(first), 4)
+            self.assertIs(cache.get(path)[0], first[0])
+
+            with open(path, "a") as f:
+                f.write("aria2c https://example.com/extra.safetensors\n")
+            self.assertEqual(len(cache.get(path)), 5)
+            self.assertEqual(cache.get(os.path.join(tmp, "missing.sh")), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import os
+import sys
+import json
+
+# Add the control panel directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'control_panel'))
+from event_stream import StatusBroadcaster, state_delta
+
+def parse_event(chunk):
+    lines = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+    return lines['event'], json.loads(lines['data'])
+
+class TestStateDelta(unittest.TestCase):
+    def test_first_state_is_sent_in_full(self):
+        self.assertEqual(state_delta(None, {"a": 1}), {"set": {"a": 1}, "reset": True})
+
+    def test_only_changed_keys(self):
+        old = {"status": "downloading", "progress": 10, "output": ["a"]}
+        new = {"status": "downloading", "progress": 20, "output": ["a", "b", "c"]}
+        self.assertEqual(state_delta(old, new), {"set": {"progress": 20}, "append": {"output": ["b", "c"]}})
+        self.assertEqual(state_delta(new, dict(new)), {})
+
+    def test_replaced_list_is_set(self):
+        self.assertEqual(state_delta({"output": ["a", "b"]}, {"output": ["c"]}), {"set": {"output": ["c"]}})
+
+    def test_moving_window_is_appended(self):
+        old = {"output": ["a", "b", "c"], "output_start": 10}
+        # Window of three lines moved by two
+        new = {"output": ["c", "d", "e"], "output_start": 12}
+        self.assertEqual(state_delta(old, new), {"set": {"output_start": 12}, "append": {"output": ["d", "e"]}})
+        # A new run starts where the previous one ended
+        self.assertEqual(state_delta(old, {"output": ["x"], "output_start": 13}),
+                         {"set": {"output_start": 13}, "append": {"output": ["x"]}})
+        # Lines were missed, the window is sent in full
+        gap = {"output": ["y", "z"], "output_start": 20}
+        self.assertEqual(state_delta(old, gap), {"set": gap})
+
+class TestStatusBroadcaster(unittest.TestCase):
+    def test_stream_sends_deltas(self):
+        status = {"status": "idle", "progress": 0, "message": ""}
+        events = StatusBroadcaster(max_rate=100, poll_interval=0.05, heartbeat=5)
+        events.register('model', lambda: status)
+
+        stream = events.stream(['model'])
+        self.assertTrue(next(stream).startswith('retry:'))
+        self.assertEqual(parse_event(next(stream)), ('model', {"set": status, "reset": True}))
+        self.assertEqual(events.subscribers, 1)
+
+        status.update({"status": "downloading", "progress": 5})
+        events.notify('model')
+        channel, delta = parse_event(next(stream))
+        self.assertEqual(channel, 'model')
+        self.assertEqual(delta, {"set": {"status": "downloading", "progress": 5}})
+
+        stream.close()
+        self.assertEqual(events.subscribers, 0)
+
+    def test_unknown_channels_are_ignored(self):
+        events = StatusBroadcaster()
+        events.register('model', lambda: {"status": "idle"})
+        stream = events.stream(['model', 'missing'])
+        next(stream)
+        self.assertEqual(parse_event(next(stream))[0], 'model')
+        stream.close()
+
+    def test_notify_without_subscribers_is_free(self):
+        calls = []
+        events = StatusBroadcaster()
+        events.register('model', lambda: calls.append(1) or {})
+        events.notify('model')
+        self.assertEqual(calls, [])
+
+if __name__ == '__main__':
+    unittest.main()
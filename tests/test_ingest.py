@@ -0,0 +1,120 @@
+import unittest
+import os
+import sys
+import tempfile
+import zipfile
+from unittest.mock import patch
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import gradio_interface
+from gradio_interface import IngestStats, ingest_file, extract_dataset_zip
+
+class TestIngestFile(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self.tmp.name, "upload.mp4")
+        self.data = os.urandom(200000)
+        with open(self.src, "wb") as f:
+            f.write(self.data)
+        self.stats = IngestStats()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def ingest(self, name, **kwargs):
+        dst = os.path.join(self.tmp.name, name)
+        method = ingest_file(self.src, dst, self.stats, **kwargs)
+        with open(dst, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+        return method
+
+    def test_same_filesystem_is_linked(self):
+        self.assertEqual(self.ingest("clip.mp4"), "hardlinked")
+        self.assertTrue(os.path.exists(self.src))
+        self.assertEqual(self.stats.snapshot()["bytes_moved"], len(self.data))
+
+    def test_move_consumes_source(self):
+        self.assertEqual(self.ingest("clip.mp4", move=True), "moved")
+        self.assertFalse(os.path.exists(self.src))
+
+    def test_cross_device_falls_back_to_kernel_copy(self):
+        with patch("os.link", side_effect=OSError("cross-device link")), \
+             patch.object(gradio_interface, "reflink_file", side_effect=OSError("not supported")):
+            self.assertIn(self.ingest("clip.mp4"), ("copy_file_range", "sendfile"))
+        stats = self.stats.snapshot()
+        self.assertEqual(stats["bytes_moved"], 0)
+        self.assertEqual(stats["bytes_copied"], len(self.data))
+
+    def test_existing_file_is_replaced(self):
+        with open(os.path.join(self.tmp.name, "clip.mp4"), "wb") as f:
+            f.write(b"old")
+        self.ingest("clip.mp4")
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ["clip.mp4", "upload.mp4"])
+
+class TestExtractDatasetZip(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dataset_dir = os.path.join(self.tmp.name, "dataset")
+        os.makedirs(self.dataset_dir)
+        self.zip_path = os.path.join(self.tmp.name, "upload.zip")
+        with zipfile.ZipFile(self.zip_path, "w", zipfile.ZIP_DEFLATED) as zip_ref:
+            for i in range(50):
+                zip_ref.writestr(f"clips/clip_{i}.mp4", os.urandom(2000))
+                zip_ref.writestr(f"clips/clip_{i}.txt", "a caption")
+            zip_ref.writestr("__MACOSX/clips/._clip_0.mp4", "resource fork")
+            zip_ref.writestr("clips/.DS_Store", "junk")
+            zip_ref.writestr("../outside.txt", "escape")
+            zip_ref.writestr("notes.docx", "unsupported")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def dataset_files(self):
+        return sorted(os.path.relpath(os.path.join(root, f), self.dataset_dir)
+                      for root, _, files in os.walk(self.dataset_dir) for f in files)
+
+    def test_whitelist_and_progress(self):
+        messages = []
+        extracted, skipped, error = extract_dataset_zip(self.zip_path, self.dataset_dir, IngestStats(),
+                                                        progress=messages.append, workers=4)
+        self.assertIsNone(error)
+        self.assertEqual(len(extracted), 100)
+        self.assertEqual(skipped, {"system file": 2, "unsafe path": 1, "unsupported format": 1})
+        self.assertEqual(len(self.dataset_files()), 100)
+        self.assertTrue(messages)
+
+        with zipfile.ZipFile(self.zip_path) as zip_ref:
+            with open(os.path.join(self.dataset_dir, "clips", "clip_7.mp4"), "rb") as f:
+                self.assertEqual(f.read(), zip_ref.read("clips/clip_7.mp4"))
+
+    def test_quota_leaves_dataset_untouched(self):
+        extracted, _, error = extract_dataset_zip(self.zip_path, self.dataset_dir, IngestStats(), quota_bytes=10000)
+        self.assertEqual(extracted, [])
+        self.assertIsNotNone(error)
+        self.assertEqual(self.dataset_files(), [])
+
+    def test_existing_files_replaced_only_on_success(self):
+        existing = os.path.join(self.dataset_dir, "clips", "clip_0.mp4")
+        os.makedirs(os.path.dirname(existing))
+        with open(existing, "wb") as f:
+            f.write(b"original")
+
+        def interrupt(message):
+            raise KeyboardInterrupt
+        with patch.object(gradio_interface, "ZIP_PROGRESS_INTERVAL", 0):
+            with self.assertRaises(KeyboardInterrupt):
+                extract_dataset_zip(self.zip_path, self.dataset_dir, IngestStats(), progress=interrupt, workers=4)
+        self.assertEqual(self.dataset_files(), ["clips/clip_0.mp4"])
+        with open(existing, "rb") as f:
+            self.assertEqual(f.read(), b"original")
+
+        extracted, _, error = extract_dataset_zip(self.zip_path, self.dataset_dir, IngestStats(), workers=4)
+        self.assertIsNone(error)
+        self.assertIn(existing, extracted)
+        self.assertEqual(len(self.dataset_files()), 100)
+        with zipfile.ZipFile(self.zip_path) as zip_ref, open(existing, "rb") as f:
+            self.assertEqual(f.read(), zip_ref.read("clips/clip_0.mp4"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+import os
+import sys
+import tempfile
+
+# Add the control panel directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'control_panel'))
+from log_buffer import LogBuffer
+
+class TestLogBuffer(unittest.TestCase):
+    def test_since(self):
+        log = LogBuffer(capacity=5)
+        self.assertEqual(log.since(), {"lines": [], "start": 0, "next": 0, "dropped": 0})
+        for i in range(3):
+            self.assertEqual(log.append(f"line {i}"), i)
+
+        self.assertEqual(log.since()["lines"], ["line 0", "line 1", "line 2"])
+        self.assertEqual(log.since(1), {"lines": ["line 1", "line 2"], "start": 1, "next": 3, "dropped": 0})
+        self.assertEqual(log.since(3), {"lines": [], "start": 3, "next": 3, "dropped": 0})
+        self.assertEqual(log.since(10)["lines"], [])
+
+    def test_ring_drops_oldest(self):
+        log = LogBuffer(capacity=3)
+        for i in range(10):
+            log.append(str(i))
+        self.assertEqual(log.since(), {"lines": ["7", "8", "9"], "start": 7, "next": 10, "dropped": 0})
+        # Lines 2 to 6 are gone
+        self.assertEqual(log.since(2), {"lines": ["7", "8", "9"], "start": 7, "next": 10, "dropped": 5})
+
+    def test_runs_keep_numbering_and_write_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            log = LogBuffer(capacity=2)
+            first = os.path.join(tmp, 'logs', 'kohya_install.log')
+            log.start(first)
+            for i in range(4):
+                log.append(f"a{i}")
+            log.close()
+
+            log.start(os.path.join(tmp, 'logs', 'diffpipe_install.log'))
+            log.append("b0")
+            # Lines of the previous run are not returned, even when asked for
+            self.assertEqual(log.since(0), {"lines": ["b0"], "start": 4, "next": 5, "dropped": 0})
+            log.close()
+
+            with open(first) as f:
+                self.assertEqual(f.read().splitlines(), ["a0", "a1", "a2", "a3"])
+            self.assertEqual(log.log_path, os.path.join(tmp, 'logs', 'diffpipe_install.log'))
+
+if __name__ == '__main__':
+    unittest.main()
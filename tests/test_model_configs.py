@@ -0,0 +1,101 @@
+import unittest
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import gradio_interface
+from gradio_interface import parse_model_configs
+
+def config_script(model_name, dtype="bfloat16"):
+    return (
+        "# CONFIG:\n"
+        "# {\n"
+        "#   \"model_type\": \"wan\",\n"
+        f"#   \"model_name\": \"{model_name}\",\n"
+        f"#   \"ckpt_path\": \"/workspace/training_models/{model_name}\",\n"
+        f"#   \"dtype\": \"{dtype}\"\n"
+        "# }\n"
+        "\n"
+        "mkdir -p /workspace/training_models\n"
+    )
+
+class TestModelConfigCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.scripts = self.tmp.name
+        self.write("download_wan_a.sh", config_script("Wan-A"))
+        patcher = patch.object(gradio_interface, "DOWNLOAD_SCRIPTS_DIR", self.scripts)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.reset_cache()
+        self.addCleanup(self.reset_cache)
+        parse = patch.object(gradio_interface, "parse_model_config_script",
+                             wraps=gradio_interface.parse_model_config_script)
+        self.parse = parse.start()
+        self.addCleanup(parse.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def reset_cache(self):
+        gradio_interface.model_config_cache.clear()
+        gradio_interface.model_configs_signatures.clear()
+        gradio_interface.model_configs_registry = None
+
+    def write(self, name, content, mtime_ns=None):
+        path = os.path.join(self.scripts, name)
+        with open(path, "w") as f:
+            f.write(content)
+        if mtime_ns is not None:
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+        return path
+
+    def parsed_scripts(self):
+        scripts = [call.args[0] for call in self.parse.call_args_list]
+        self.parse.reset_mock()
+        return scripts
+
+    def test_repeated_call_returns_cached_registry(self):
+        configs = parse_model_configs()
+        self.assertEqual(list(configs), ["Wan-A"])
+        self.assertEqual(configs["Wan-A"]["script_name"], "download_wan_a.sh")
+        self.assertEqual(self.parsed_scripts(), ["download_wan_a.sh"])
+
+        self.assertIs(parse_model_configs(), configs)
+        self.assertEqual(self.parsed_scripts(), [])
+
+        # reload parses every script again
+        self.assertEqual(gradio_interface.reload_model_configs(), configs)
+        self.assertEqual(self.parsed_scripts(), ["download_wan_a.sh"])
+
+    def test_changed_scripts_are_parsed_again(self):
+        path = os.path.join(self.scripts, "download_wan_a.sh")
+        mtime_ns = os.stat(path).st_mtime_ns
+        parse_model_configs()
+        self.parsed_scripts()
+
+        # Other size, same mtime
+        self.write("download_wan_a.sh", config_script("Wan-A", dtype="float16"), mtime_ns=mtime_ns)
+        self.assertEqual(parse_model_configs()["Wan-A"]["dtype"], "float16")
+        self.assertEqual(self.parsed_scripts(), ["download_wan_a.sh"])
+
+        # Same size, other mtime
+        self.write("download_wan_a.sh", config_script("Wan-A", dtype="float32"), mtime_ns=mtime_ns + 10 ** 9)
+        self.assertEqual(parse_model_configs()["Wan-A"]["dtype"], "float32")
+        self.assertEqual(self.parsed_scripts(), ["download_wan_a.sh"])
+
+        # A new script is parsed on its own, the unchanged one comes from the cache
+        self.write("download_wan_b.sh", config_script("Wan-B"))
+        self.assertEqual(sorted(parse_model_configs()), ["Wan-A", "Wan-B"])
+        self.assertEqual(self.parsed_scripts(), ["download_wan_b.sh"])
+
+        os.remove(path)
+        self.assertEqual(list(parse_model_configs()), ["Wan-B"])
+        self.assertEqual(self.parsed_scripts(), [])
+        self.assertNotIn("download_wan_a.sh", gradio_interface.model_config_cache)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import unittest
+import os
+import sys
+import hashlib
+import tempfile
+
+# Add the control panel directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'control_panel'))
+from download_scheduler import DownloadTask
+from model_store import ModelStore
+
+URL = "https://huggingface.co/Comfy-Org/Wan_2.1_ComfyUI_repackaged/resolve/main/split_files/vae/wan_2.1_vae.safetensors"
+DATA = os.urandom(300000)
+SHA256 = hashlib.sha256(DATA).hexdigest()
+
+class TestModelStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.models = os.path.join(self.tmp.name, "models")
+        self.record_path = os.path.join(self.models, ".model_store.json")
+        self.store = ModelStore(self.record_path, hash_workers=2)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def task(self, directory, filename, url=URL, size=None, sha256=None):
+        return DownloadTask(1, url, os.path.join(self.models, directory), filename, size=size, sha256=sha256)
+
+    def write(self, task, data=DATA):
+        os.makedirs(task.directory, exist_ok=True)
+        with open(task.path, "wb") as f:
+            f.write(data)
+
+    def download(self, task, data=DATA):
+        """Pretend aria2c downloaded the task and let the store verify it."""
+        self.write(task, data)
+        task.state = 'completed'
+        return self.store.verify([task])
+
+    def test_verified_file_is_skipped_without_network(self):
+        self.download(self.task("vae", "wan_2.1_vae.safetensors", sha256=SHA256))
+
+        store = ModelStore(self.record_path)
+        task = self.task("vae", "wan_2.1_vae.safetensors")
+        self.assertEqual(store.prepare([task]), [])
+        self.assertEqual((task.state, task.already_existed, task.total), ('completed', True, len(DATA)))
+
+    def test_same_content_under_another_name_is_linked(self):
+        first = self.task("vae", "wan_2.1_vae.safetensors")
+        self.download(first)
+
+        second = self.task("vae", "Wan2_1_VAE_bf16.safetensors")
+        self.assertEqual(self.store.prepare([second]), [])
+        self.assertTrue(second.linked)
+        self.assertTrue(os.path.samefile(first.path, second.path))
+
+    def test_duplicate_downloads_are_linked(self):
+        first = self.task("vae", "wan_2.1_vae.safetensors")
+        self.download(first)
+        other = self.task("text_encoders", "copy.safetensors", url="https://example.com/copy.safetensors")
+        self.assertEqual(self.download(other), len(DATA))
+        self.assertTrue(os.path.samefile(first.path, other.path))
+
+    def test_changed_file_is_downloaded_again(self):
+        self.download(self.task("vae", "wan_2.1_vae.safetensors"))
+        task = self.task("vae", "wan_2.1_vae.safetensors")
+        self.write(task, b"truncated")
+        self.assertEqual(self.store.prepare([task]), [task])
+        self.assertFalse(os.path.exists(task.path))
+        self.assertEqual(task.sha256, SHA256)
+
+    def test_partial_download_is_kept(self):
+        self.download(self.task("vae", "wan_2.1_vae.safetensors"))
+        task = self.task("vae", "wan_2.1_vae.safetensors")
+        self.write(task, DATA[:1000])
+        with open(task.path + ".aria2", "wb") as f:
+            f.write(b"control")
+        self.assertEqual(self.store.prepare([task]), [task])
+        self.store.check_existing([task])
+        self.assertEqual(task.state, 'queued')
+        self.assertEqual(os.path.getsize(task.path), 1000)
+
+    def test_existing_files_are_checked_against_the_server(self):
+        complete = self.task("vae", "complete.safetensors", url="https://example.com/a", size=len(DATA), sha256=SHA256)
+        shorter = self.task("vae", "shorter.safetensors", url="https://example.com/b", size=len(DATA))
+        corrupt = self.task("vae", "corrupt.safetensors", url="https://example.com/c", size=len(DATA), sha256="0" * 64)
+        self.write(complete)
+        self.write(shorter, DATA[:1000])
+        self.write(corrupt)
+
+        self.store.check_existing([complete, shorter, corrupt])
+        self.assertEqual([t.state for t in (complete, shorter, corrupt)], ['completed', 'queued', 'queued'])
+        self.assertTrue(os.path.exists(shorter.path))
+        self.assertFalse(os.path.exists(corrupt.path))
+        self.assertEqual(self.store.urls["https://example.com/a"]["sha256"], SHA256)
+
+    def test_aliases_are_linked_after_download(self):
+        task = self.task("vae", "wan_2.1_vae.safetensors")
+        alias = os.path.join(self.models, "vae", "Wan2_1_VAE_bf16.safetensors")
+        task.aliases = [alias]
+        self.download(task)
+        self.assertEqual(self.store.link_aliases([task]), 1)
+        self.assertTrue(os.path.samefile(task.path, alias))
+        self.assertEqual(self.store.link_aliases([task]), 0)
+
+    def test_checksum_mismatch_fails_the_task(self):
+        task = self.task("vae", "wan_2.1_vae.safetensors", sha256="0" * 64)
+        self.download(task)
+        self.assertEqual(task.state, 'error')
+        self.assertIn("Checksum mismatch", task.error)
+        self.assertFalse(os.path.exists(task.path))
+
+    def test_size_mismatch_fails_the_task(self):
+        # A truncated file aria2c reported as complete is kept to be continued
+        task = self.task("vae", "wan_2.1_vae.safetensors", size=len(DATA) + 10)
+        self.download(task)
+        self.assertEqual(task.state, 'error')
+        self.assertIn("Size mismatch", task.error)
+        self.assertTrue(os.path.exists(task.path))
+
+        task = self.task("vae", "wan_2.1_vae.safetensors", size=len(DATA) - 10)
+        self.download(task)
+        self.assertEqual(task.state, 'error')
+        self.assertFalse(os.path.exists(task.path))
+
+        task = self.task("vae", "wan_2.1_vae.safetensors", size=len(DATA))
+        self.download(task)
+        self.assertEqual(task.state, 'completed')
+
+if __name__ == '__main__':
+    unittest.main()
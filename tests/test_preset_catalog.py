@@ -0,0 +1,82 @@
+import unittest
+import os
+import sys
+import tempfile
+
+# Add the control panel directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'control_panel'))
+from preset_catalog import FileGraph, ScriptCatalog
+
+def script_id(path):
+    return os.path.basename(path).replace('download_', '').replace('.sh', '')
+
+class TestScriptCatalog(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.parsed = []
+        self.catalog = ScriptCatalog(self.tmp.name, 'download_*.sh', self.parse, script_id)
+        self.write('download_b.sh', 'Beta')
+        self.write('download_a.sh', 'Alpha')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, filename, name):
+        with open(os.path.join(self.tmp.name, filename), 'w') as f:
+            f.write(f"# Model: {name}\n")
+
+    def parse(self, path):
+        self.parsed.append(path)
+        with open(path) as f:
+            return {'name': f.readline().replace('# Model:', '').strip()}
+
+    def test_entries_are_cached_and_sorted(self):
+        self.assertEqual([e['id'] for e in self.catalog.entries()], ['a', 'b'])
+        etag = self.catalog.etag
+        self.catalog.entries()
+        self.assertEqual(len(self.parsed), 2)
+        self.assertEqual(self.catalog.etag, etag)
+
+    def test_directory_change_rebuilds(self):
+        etag = self.catalog.etag
+        self.write('download_c.sh', 'Gamma')
+        # Make sure the directory mtime moves even on coarse filesystems
+        os.utime(self.tmp.name, ns=(0, os.stat(self.tmp.name).st_mtime_ns + 10 ** 9))
+        self.assertEqual(len(self.catalog.entries()), 3)
+        self.assertNotEqual(self.catalog.etag, etag)
+
+    def test_get(self):
+        path, entry = self.catalog.get('a')
+        self.assertEqual(entry['name'], 'Alpha')
+        self.assertTrue(path.endswith('download_a.sh'))
+        self.assertEqual(self.catalog.get('missing'), (None, None))
+
+class TestFileGraph(unittest.TestCase):
+    VAE = "https://example.com/wan_2.1_vae.safetensors"
+    T5 = "https://example.com/umt5_xxl_fp8_e4m3fn_scaled.safetensors"
+
+    def test_shared_files_are_fetched_once(self):
+        graph = FileGraph()
+        graph.add('wan_t2v', self.VAE, '/models/vae', 'wan_2.1_vae.safetensors', options={'dir': '/models/vae'})
+        graph.add('wan_t2v', self.T5, '/models/text_encoders', 'umt5.safetensors')
+        graph.add('wan_i2v', self.VAE, '/models/vae', 'wan_2.1_vae.safetensors')
+        graph.add('wan_vace', self.VAE, '/models/vae', 'Wan2_1_VAE.safetensors')
+
+        nodes = graph.nodes()
+        self.assertEqual([node['url'] for node in nodes], [self.VAE, self.T5])
+        self.assertEqual(nodes[0]['presets'], ['wan_t2v', 'wan_i2v', 'wan_vace'])
+        self.assertEqual(nodes[0]['targets'], [os.path.join('/models/vae', 'wan_2.1_vae.safetensors'),
+                                               os.path.join('/models/vae', 'Wan2_1_VAE.safetensors')])
+        self.assertEqual(nodes[0]['options'], {'dir': '/models/vae'})
+        self.assertEqual(graph.summary({self.VAE: 100}),
+                         {'files': 3, 'fetches': 2, 'aliases': 1, 'shared': 1, 'saved_bytes': 100})
+
+    def test_conflicting_target_keeps_first_url(self):
+        graph = FileGraph()
+        graph.add('a', self.VAE, '/models/vae', 'vae.safetensors')
+        graph.add('b', self.T5, '/models/vae', 'vae.safetensors')
+        self.assertEqual([node['url'] for node in graph.nodes()], [self.VAE])
+        self.assertEqual(graph.conflicts, [('b', os.path.join('/models/vae', 'vae.safetensors'), self.T5)])
+
+if __name__ == '__main__':
+    unittest.main()
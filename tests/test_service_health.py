@@ -0,0 +1,102 @@
+import unittest
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the control panel directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'control_panel'))
+from service_health import HealthProbe, RestartHistory, probe_for
+
+class Handler(BaseHTTPRequestHandler):
+    # Status returned for each path, 404 for the others
+    responses = {'/system_stats': 200, '/broken': 500}
+
+    def do_GET(self):
+        self.send_response(self.responses.get(self.path, 404))
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+class TestHealthProbe(unittest.TestCase):
+    def serve(self, port, delay=0.0):
+        def run():
+            time.sleep(delay)
+            self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+            self.server.serve_forever()
+        self.server = None
+        threading.Thread(target=run, daemon=True).start()
+
+    def tearDown(self):
+        if getattr(self, 'server', None):
+            self.server.shutdown()
+            self.server.server_close()
+
+    def test_check(self):
+        port = free_port()
+        self.assertFalse(HealthProbe('/system_stats').check(port)[0])
+
+        self.serve(port)
+        self.assertIsNotNone(HealthProbe('/').wait(port, 5)[0])
+        self.assertEqual(HealthProbe('/system_stats').check(port), (True, 'HTTP 200'))
+        # The server answers, the page is just not there
+        self.assertEqual(HealthProbe('/').check(port), (True, 'HTTP 404'))
+        self.assertEqual(HealthProbe('/broken').check(port), (False, 'HTTP 500'))
+
+    def test_wait_for_slow_start(self):
+        port = free_port()
+        self.serve(port, delay=0.5)
+        attempts = []
+        ready, detail = HealthProbe('/system_stats').wait(port, 10, on_attempt=lambda *a: attempts.append(a))
+        self.assertGreaterEqual(ready, 0.5)
+        self.assertEqual(detail, 'HTTP 200')
+        self.assertTrue(attempts)
+
+    def test_wait_timeout_and_abort(self):
+        port = free_port()
+        ready, detail = HealthProbe('/').wait(port, 0.5)
+        self.assertIsNone(ready)
+        self.assertNotEqual(detail, 'not probed')
+        self.assertEqual(HealthProbe('/').wait(port, 10, abort=lambda: True), (None, 'not probed'))
+
+    def test_probe_for(self):
+        self.assertEqual(probe_for('comfyui').path, '/system_stats')
+        self.assertEqual(probe_for('unknown').path, '/')
+
+class TestRestartHistory(unittest.TestCase):
+    def test_record_and_trend(self):
+        history = RestartHistory(size=3)
+        self.assertIsNone(history.trend('comfyui'))
+        for seconds in (10.0, 12.0, 11.0):
+            history.record('comfyui', 'success', 1.0, seconds - 1, seconds)
+        history.record('comfyui', 'error')
+        self.assertEqual(len(history.recent('comfyui')), 3)
+
+        trend = history.trend('comfyui')
+        self.assertEqual(trend['count'], 2)
+        self.assertEqual(trend['median'], 11.5)
+        self.assertFalse(trend['slow'])
+
+        history.record('comfyui', 'success', 1.0, 39.0, 40.0)
+        self.assertTrue(history.trend('comfyui')['slow'])
+        self.assertEqual(history.recent('kohya'), [])
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'restarts.json')
+            RestartHistory(path).record('fluxgym', 'success', 0.5, 20.0, 20.5)
+            history = RestartHistory(path)
+            self.assertEqual(history.trend('fluxgym')['last'], 20.5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+import unittest
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+# Add the control panel directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'control_panel'))
+from service_supervisor import (ServiceSupervisor, descendants, listening_inodes, pid_alive,
+                                port_owners, read_processes, retry_with_backoff, wait_for_exit,
+                                wait_for_port)
+
+# Listens on the port given as argv[1] after a short delay, like a service starting up
+SERVER = """
+import socket, sys, time
+time.sleep(0.3)
+s = socket.socket()
+s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+s.bind(('127.0.0.1', int(sys.argv[1])))
+s.listen()
+while True:
+    time.sleep(1)
+"""
+
+# Ignores SIGTERM so that only SIGKILL stops it
+STUBBORN = """
+import signal, time
+signal.signal(signal.SIGTERM, signal.SIG_IGN)
+print('ready', flush=True)
+while True:
+    time.sleep(1)
+"""
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+class TestProcTables(unittest.TestCase):
+    def test_listening_inodes(self):
+        with tempfile.TemporaryDirectory() as proc:
+            os.makedirs(os.path.join(proc, 'net'))
+            header = "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+            with open(os.path.join(proc, 'net', 'tcp'), 'w') as f:
+                f.write(header)
+                # 127.0.0.1:8188 listening, 127.0.0.1:8188 established, 0.0.0.0:7000 listening
+                f.write("   0: 0100007F:1FFC 00000000:0000 0A 00000000:00000000 00:00000000 00000000     0        0 111 1\n")
+                f.write("   1: 0100007F:1FFC 0100007F:D431 01 00000000:00000000 00:00000000 00000000     0        0 222 1\n")
+                f.write("   2: 00000000:1B58 00000000:0000 0A 00000000:00000000 00:00000000 00000000     0        0 333 1\n")
+            with open(os.path.join(proc, 'net', 'tcp6'), 'w') as f:
+                f.write(header)
+                f.write("   0: 00000000000000000000000000000000:1FFC 00000000000000000000000000000000:0000 0A "
+                        "00000000:00000000 00:00000000 00000000     0        0 444 1\n")
+            self.assertEqual(listening_inodes(8188, proc), {'111', '444'})
+            self.assertEqual(listening_inodes(7000, proc), {'333'})
+            self.assertEqual(listening_inodes(6000, proc), set())
+
+    def test_descendants(self):
+        processes = {1: (0, 1, 'S'), 10: (1, 10, 'S'), 11: (10, 10, 'S'), 12: (11, 10, 'S'), 20: (1, 20, 'S')}
+        self.assertEqual(descendants(10, processes), {11, 12})
+        self.assertEqual(descendants(20, processes), set())
+
+class TestServiceSupervisor(unittest.TestCase):
+    def setUp(self):
+        self.supervisor = ServiceSupervisor(term_timeout=2, kill_timeout=2)
+
+    def tearDown(self):
+        for process in self.supervisor.launched.values():
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+
+    def test_launch_find_and_stop(self):
+        port = free_port()
+        process = self.supervisor.launch('service', [sys.executable, '-c', SERVER, str(port)])
+
+        ready = wait_for_port(port, 10)
+        self.assertIsNotNone(ready)
+        self.assertIn(process.pid, port_owners(port))
+        self.assertEqual(self.supervisor.find('service', port), [process.pid])
+
+        stopped = self.supervisor.stop('service', port)
+        self.assertEqual(stopped['pids'], [process.pid])
+        self.assertFalse(stopped['forced'])
+        self.assertEqual(stopped['remaining'], [])
+        self.assertEqual(port_owners(port), [])
+        self.assertIsNotNone(process.poll())
+
+    def test_stop_backgrounded_service(self):
+        # The script puts the server in the background and exits, like restart_comfyui.sh
+        port = free_port()
+        script = f"{sys.executable} -c \"$1\" {port} > /dev/null 2>&1 &\necho started"
+        process = self.supervisor.launch('service', ['bash', '-c', script, 'bash', SERVER])
+        self.assertEqual(process.wait(timeout=10), 0)
+
+        self.assertIsNotNone(wait_for_port(port, 10))
+        server = port_owners(port)
+        self.assertEqual(len(server), 1)
+        self.assertEqual(os.getpgid(server[0]), process.pid)
+
+        stopped = self.supervisor.stop('service', port)
+        self.assertEqual(stopped['pids'], server)
+        self.assertEqual(stopped['remaining'], [])
+        self.assertFalse(pid_alive(server[0]))
+
+    def test_stop_spares_group_of_other_services(self):
+        # Started by start.sh, not by the supervisor: the server shares its group
+        # with the other services of the pod
+        port = free_port()
+        script = f"{sys.executable} -c \"$1\" {port} > /dev/null 2>&1 &\nsleep 30 &\nwait"
+        start_sh = subprocess.Popen(['bash', '-c', script, 'bash', SERVER], start_new_session=True)
+        try:
+            self.assertIsNotNone(wait_for_port(port, 10))
+            server = port_owners(port)
+            others = [pid for pid in descendants(start_sh.pid, read_processes()) if pid not in server]
+            self.assertEqual(len(others), 1)
+
+            stopped = self.supervisor.stop('service', port)
+            self.assertEqual(stopped['pids'], server)
+            self.assertEqual(stopped['remaining'], [])
+            self.assertFalse(pid_alive(server[0]))
+            self.assertTrue(pid_alive(others[0]))
+            self.assertIsNone(start_sh.poll())
+        finally:
+            os.killpg(start_sh.pid, signal.SIGKILL)
+            start_sh.wait()
+
+    def test_stop_kills_after_timeout(self):
+        self.supervisor.term_timeout = 0.5
+        process = self.supervisor.launch('service', [sys.executable, '-c', STUBBORN])
+        self.assertEqual(process.stdout.readline().strip(), 'ready')
+
+        stopped = self.supervisor.stop('service')
+        self.assertTrue(stopped['forced'])
+        self.assertEqual(stopped['remaining'], [])
+        self.assertIsNotNone(process.poll())
+
+    def test_stop_without_process(self):
+        stopped = self.supervisor.stop('service', free_port())
+        self.assertEqual(stopped['pids'], [])
+        self.assertFalse(stopped['forced'])
+
+class TestWaits(unittest.TestCase):
+    def test_wait_for_port_timeout(self):
+        started = time.monotonic()
+        self.assertIsNone(wait_for_port(free_port(), 0.5))
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_wait_for_port_abort(self):
+        self.assertIsNone(wait_for_port(free_port(), 10, abort=lambda: True))
+
+    def test_retry_with_backoff(self):
+        attempts = []
+        failures = []
+        def attempt(remaining):
+            attempts.append(remaining)
+            return len(attempts) == 3, f"attempt {len(attempts)}"
+        seconds, detail = retry_with_backoff(attempt, 10, on_attempt=lambda elapsed, detail: failures.append(detail))
+        self.assertIsNotNone(seconds)
+        self.assertEqual(detail, "attempt 3")
+        self.assertEqual(failures, ["attempt 1", "attempt 2"])
+        self.assertTrue(all(0 < remaining <= 10 for remaining in attempts))
+
+        self.assertEqual(retry_with_backoff(lambda remaining: (False, "down"), 0.3), (None, "down"))
+
+    def test_wait_for_exit_of_missing_process(self):
+        self.assertEqual(wait_for_exit([2 ** 22 + 1], 1), set())
+
+if __name__ == '__main__':
+    unittest.main()
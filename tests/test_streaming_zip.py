@@ -0,0 +1,67 @@
+import unittest
+import os
+import sys
+import io
+import tempfile
+import zipfile
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gradio_interface import StreamingZip
+
+class TestStreamingZip(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.files = []
+        for i in range(20):
+            self.add(f"dataset/clip_{i}.mp4", os.urandom(4096))
+            self.add(f"dataset/clip_{i}.txt", b"a person walking on the beach " * 20)
+        self.add("outputs/epoch1/adapter_model.safetensors", os.urandom(65536))
+        self.add("configs/training_config.toml", b"epochs = 10\n" * 1000)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def add(self, name, data):
+        path = os.path.join(self.tmp.name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        self.files.append((path, name))
+
+    def build(self, workers):
+        buffer = io.BytesIO()
+        StreamingZip(workers=workers).write_to(buffer, self.files)
+        return zipfile.ZipFile(io.BytesIO(buffer.getvalue()))
+
+    def test_archive_is_valid(self):
+        for workers in (0, 4):
+            archive = self.build(workers)
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(archive.namelist(), [name for _, name in self.files])
+            for path, name in self.files:
+                with open(path, "rb") as f:
+                    self.assertEqual(archive.read(name), f.read())
+
+    def test_incompressible_files_are_stored(self):
+        archive = self.build(workers=2)
+        self.assertEqual(archive.getinfo("dataset/clip_0.mp4").compress_type, zipfile.ZIP_STORED)
+        self.assertEqual(archive.getinfo("outputs/epoch1/adapter_model.safetensors").compress_type, zipfile.ZIP_STORED)
+        self.assertEqual(archive.getinfo("dataset/clip_0.txt").compress_type, zipfile.ZIP_DEFLATED)
+        self.assertEqual(archive.getinfo("configs/training_config.toml").compress_type, zipfile.ZIP_DEFLATED)
+
+    def test_stream_does_not_seek(self):
+        class Unseekable:
+            def __init__(self):
+                self.parts = []
+
+            def write(self, data):
+                self.parts.append(data)
+
+        out = Unseekable()
+        StreamingZip(workers=2).write_to(out, self.files)
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(out.parts)))
+        self.assertEqual(len(archive.infolist()), len(self.files))
+
+if __name__ == '__main__':
+    unittest.main()
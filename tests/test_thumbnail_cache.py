@@ -0,0 +1,64 @@
+import unittest
+import os
+import sys
+import tempfile
+import time
+from PIL import Image
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gradio_interface import ThumbnailCache
+
+class TestThumbnailCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.images = []
+        for i in range(6):
+            path = os.path.join(self.tmp.name, f"frame_{i}.jpg")
+            Image.effect_noise((1600, 1200), 60 + i).convert("RGB").save(path, quality=95)
+            self.images.append(path)
+        self.cache = ThumbnailCache(cache_dir=os.path.join(self.tmp.name, "thumbnails"), size=256, workers=2)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_previews_are_small_webp(self):
+        previews = self.cache.previews(self.images)
+        for preview, image in zip(previews, self.images):
+            self.assertNotEqual(preview, image)
+            with Image.open(preview) as thumb:
+                self.assertEqual(thumb.format, "WEBP")
+                self.assertLessEqual(max(thumb.size), 256)
+            self.assertLess(os.path.getsize(preview), os.path.getsize(image))
+
+        # Served from the cache the second time
+        self.assertEqual(self.cache.previews(self.images), previews)
+
+    def test_changed_file_gets_new_preview(self):
+        first = self.cache.previews(self.images[:1])[0]
+        Image.new("RGB", (800, 600)).save(self.images[0])
+        second = self.cache.previews(self.images[:1])[0]
+        self.assertNotEqual(first, second)
+
+    def test_unreadable_media_fall_back_to_original(self):
+        broken = os.path.join(self.tmp.name, "broken.png")
+        with open(broken, "wb") as f:
+            f.write(b"not an image")
+        self.assertEqual(self.cache.previews([broken]), [broken])
+
+    def test_evicts_least_recently_shown(self):
+        previews = self.cache.previews(self.images)
+        sizes = [os.path.getsize(preview) for preview in previews]
+        # Mark the first preview as shown most recently
+        old = time.time() - 100
+        for preview in previews[1:]:
+            os.utime(preview, (old, old))
+
+        self.cache.budget_bytes = int(sizes[0] * 1.5)
+        self.cache.evict()
+        self.assertTrue(os.path.exists(previews[0]))
+        self.assertFalse(any(os.path.exists(preview) for preview in previews[1:]))
+        self.assertEqual(self.cache.total_size, sizes[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import os
+import sys
+import tempfile
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gradio_interface import TrainingLogStore
+
+class TestTrainingLogStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_progress_bar_redraws_collapse(self):
+        seen = []
+        store = TrainingLogStore(log_path=None, on_line=seen.append)
+        store.write("caching latents\n 10%|#")
+        store.write("\r 50%|#####")
+        self.assertEqual(store.tail(), "caching latents\n 50%|#####")
+        store.write("\r100%|##########|\r\ndone\n")
+        self.assertEqual(store.read()["lines"], ["caching latents", "100%|##########|", "done"])
+        self.assertEqual(seen, ["caching latents", "100%|##########|", "done"])
+
+    def test_paged_read_after_eviction(self):
+        store = TrainingLogStore(max_lines=5, log_path=None)
+        store.write("".join(f"line {i}\n" for i in range(12)))
+        # Lines 0 to 6 were evicted
+        page = store.read(offset=3, limit=2)
+        self.assertEqual(page, {"lines": ["line 7", "line 8"], "next_offset": 9, "first_offset": 7, "dropped": 4})
+        page = store.read(offset=page["next_offset"], limit=2)
+        self.assertEqual(page, {"lines": ["line 9", "line 10"], "next_offset": 11, "first_offset": 7, "dropped": 0})
+        page = store.read(offset=page["next_offset"])
+        self.assertEqual((page["lines"], page["next_offset"]), (["line 11"], 12))
+        self.assertEqual(store.read(offset=12)["lines"], [])
+
+    def test_tail(self):
+        store = TrainingLogStore(log_path=None)
+        store.write("".join(f"line {i}\n" for i in range(5)))
+        self.assertEqual(store.tail(2), "line 3\nline 4")
+        # The unfinished line is shown and keeps the tail at count lines
+        store.write(" 10%|#")
+        self.assertEqual(store.tail(2), "line 4\n 10%|#")
+        store.clear()
+        self.assertEqual(store.tail(), "")
+
+    def test_log_file_rotates(self):
+        path = os.path.join(self.tmp.name, "logs", "training.log")
+        store = TrainingLogStore(max_lines=2, log_path=path, max_bytes=100, backup_count=2)
+        lines = [f"line {i:03d} " + "x" * 20 for i in range(20)]
+        store.write("".join(line + "\n" for line in lines))
+        for handler in store._logger.handlers:
+            handler.close()
+
+        self.assertTrue(os.path.exists(path + ".1"))
+        self.assertTrue(os.path.exists(path + ".2"))
+        self.assertFalse(os.path.exists(path + ".3"))
+        kept = []
+        for name in (path + ".2", path + ".1", path):
+            with open(name) as f:
+                kept += f.read().splitlines()
+        # The newest lines are in the files, in order, after the oldest were rotated away
+        self.assertEqual(kept, lines[-len(kept):])
+        self.assertLess(len(kept), len(lines))
+
+if __name__ == '__main__':
+    unittest.main()
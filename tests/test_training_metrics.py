@@ -0,0 +1,68 @@
+import unittest
+import os
+import sys
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gradio_interface import (TrainingMetrics, TOTAL_STEPS_RE, STEP_RE, LOSS_RE, LR_RE, ITER_TIME_RE,
+                              PROGRESS_BAR_RE)
+
+HEADER = "Total steps: 1200 / Steps per epoch: 40 / Started new epoch: 3"
+
+class TestPatterns(unittest.TestCase):
+    def test_step_lines(self):
+        self.assertEqual(TOTAL_STEPS_RE.search(HEADER).group(1), "1200")
+        # "Total steps" is not a step number
+        self.assertIsNone(STEP_RE.search(HEADER))
+        self.assertEqual(STEP_RE.search("[Rank 0] step=120, skipped=0, lr=[2e-05]").group(1), "120")
+        self.assertEqual(LR_RE.search("[Rank 0] step=120, skipped=0, lr=[2e-05]").group(1), "2e-05")
+
+        line = "steps: 120 loss: 0.0913 iter time (s): 2.104 samples/sec: 0.951"
+        self.assertEqual(STEP_RE.search(line).group(1), "120")
+        self.assertEqual(LOSS_RE.search(line).group(1), "0.0913")
+        self.assertEqual(ITER_TIME_RE.search(line).group(1), "2.104")
+        self.assertEqual(LOSS_RE.search("steps: 3 loss: nan").group(1), "nan")
+
+    def test_progress_bars(self):
+        match = PROGRESS_BAR_RE.search("100%|##########| 40/40 [01:24<00:00,  2.11s/it]")
+        self.assertEqual((match.group("desc"), match.group("total"), match.group("rate"), match.group("unit")),
+                         ("", "40", "2.11", "s/it"))
+        match = PROGRESS_BAR_RE.search("caching latents: 100%|##########| 12/12 [00:03<00:00,  3.50it/s]")
+        self.assertEqual((match.group("desc"), match.group("unit")), ("caching latents: ", "it/s"))
+        self.assertIsNone(PROGRESS_BAR_RE.search("Downloading at 3.5it/s"))
+
+class TestTrainingMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = TrainingMetrics()
+
+    def test_lines_of_one_step_are_merged(self):
+        self.metrics.parse_line(HEADER)
+        snapshot = self.metrics.snapshot()
+        self.assertEqual((snapshot["total_steps"], snapshot["steps_per_epoch"], snapshot["epoch"]), (1200, 40, 3))
+        self.assertEqual(snapshot["points"], [])
+
+        self.metrics.parse_line("[Rank 0] step=120, skipped=0, lr=[2e-05], mom=[(0.9, 0.99)]")
+        self.metrics.parse_line("steps: 120 loss: 0.0913 iter time (s): 2.000 samples/sec: 0.951")
+        self.metrics.parse_line("steps: 121 loss: nan iter time (s): 2.000 samples/sec: 0.951")
+        points = self.metrics.snapshot()["points"]
+        self.assertEqual(len(points), 2)
+        self.assertEqual((points[0]["step"], points[0]["loss"], points[0]["lr"], points[0]["it_s"]),
+                         (120, 0.0913, 2e-05, 0.5))
+        self.assertIsNone(points[1]["loss"])
+        self.assertEqual([point["step"] for point in self.metrics.snapshot(since_step=120)["points"]], [121])
+
+    def test_only_training_bars_give_the_rate(self):
+        # Before training starts no bar is known to count steps
+        self.metrics.parse_line("100%|##########| 40/40 [00:20<00:00,  2.00it/s]")
+        self.assertIsNone(self.metrics.snapshot()["it_s"])
+
+        self.metrics.parse_line(HEADER)
+        self.metrics.parse_line("caching latents: 100%|##########| 40/40 [00:03<00:00, 12.00it/s]")
+        self.metrics.parse_line("100%|##########| 12/12 [00:03<00:00,  4.00it/s]")
+        self.assertIsNone(self.metrics.snapshot()["it_s"])
+
+        self.metrics.parse_line("100%|##########| 40/40 [01:20<00:00,  2.00s/it]")
+        self.assertEqual(self.metrics.snapshot()["it_s"], 0.5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import os
+import sys
+import json
+import tempfile
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gradio_interface import MODEL_ARCHITECTURES, model_architecture, estimate_training_run, plan_training
+
+SETTINGS = {
+    "micro_batch_size_per_gpu": 1,
+    "gradient_accumulation_steps": 4,
+    "pipeline_stages": 1,
+    "blocks_to_swap": 0,
+    "activation_checkpointing": True,
+    "transformer_dtype": "float8",
+    "rank": 32,
+    "lora_dtype": "bfloat16",
+    "optimizer_type": "adamw_optimi",
+}
+BUCKETS = [(512, 512, 33, 200), (512, 512, 1, 300)]
+
+class TestModelArchitecture(unittest.TestCase):
+    def test_variant_from_model_name(self):
+        self.assertEqual(model_architecture("Wan2.1-T2V-1.3B", {"model_type": "wan"}), MODEL_ARCHITECTURES["wan-1.3b"])
+        self.assertEqual(model_architecture("Wan2.2-T2V-A14B Low Noise", {"model_type": "wan"}), MODEL_ARCHITECTURES["wan-14b"])
+        self.assertEqual(model_architecture("FLUX.1-dev", {"model_type": "flux"}), MODEL_ARCHITECTURES["flux"])
+        self.assertIsNone(model_architecture("SomethingElse", {"model_type": "unknown"}))
+
+    def test_config_json_overrides_table(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, "transformer"))
+            with open(os.path.join(tmp, "transformer", "config.json"), "w") as f:
+                json.dump({"num_attention_heads": 16, "attention_head_dim": 128, "num_layers": 10,
+                           "num_single_layers": 20, "mlp_ratio": 4.0}, f)
+            arch = model_architecture("FLUX.1-dev", {"model_type": "flux", "diffusers_path": tmp})
+        self.assertEqual((arch["dim"], arch["num_layers"], arch["blocks"], arch["ffn_dim"]), (2048, 40, 30, 8192))
+        self.assertEqual(arch["latent"], MODEL_ARCHITECTURES["flux"]["latent"])
+
+class TestTrainingPlanner(unittest.TestCase):
+    def setUp(self):
+        self.arch = MODEL_ARCHITECTURES["wan-14b"]
+
+    def peak(self, **changes):
+        return estimate_training_run(self.arch, BUCKETS, dict(SETTINGS, **changes))["peak_bytes"]
+
+    def test_memory_savers_save_memory(self):
+        self.assertLess(self.peak(blocks_to_swap=20), self.peak())
+        self.assertLess(self.peak(), self.peak(activation_checkpointing=False))
+        self.assertLess(self.peak(), self.peak(transformer_dtype="bfloat16"))
+        self.assertLess(self.peak(), self.peak(micro_batch_size_per_gpu=2))
+        self.assertLess(self.peak(), self.peak(rank=128))
+
+    def test_swapping_costs_time(self):
+        settings = dict(SETTINGS, activation_checkpointing=False)
+        fast = estimate_training_run(self.arch, BUCKETS, settings)
+        slow = estimate_training_run(self.arch, BUCKETS, dict(settings, blocks_to_swap=39))
+        self.assertLess(fast["epoch_seconds"], slow["epoch_seconds"])
+
+    def test_plan_fits_target_and_keeps_batch(self):
+        plan = plan_training(self.arch, BUCKETS, 24, 2, dict(SETTINGS, pipeline_stages=2), ["bfloat16", "float8"])
+        settings, estimate = plan["suggestion"]
+        self.assertLessEqual(estimate["peak_bytes"], 24 * 1024 ** 3)
+        data_parallel = 2 // settings["pipeline_stages"]
+        self.assertEqual(settings["micro_batch_size_per_gpu"] * settings["gradient_accumulation_steps"] * data_parallel, 4)
+        self.assertEqual(settings["rank"], 32)
+        for _, alternative in plan["alternatives"]:
+            self.assertGreaterEqual(alternative["epoch_seconds"], estimate["epoch_seconds"])
+
+    def test_nothing_fits(self):
+        plan = plan_training(self.arch, BUCKETS, 2, 1, SETTINGS)
+        self.assertIsNone(plan["suggestion"])
+        self.assertEqual(plan["current"][0], SETTINGS)
+
+if __name__ == '__main__':
+    unittest.main()
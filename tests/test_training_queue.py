@@ -0,0 +1,190 @@
+import unittest
+import os
+import sys
+import json
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gradio_interface import TrainingQueue, TrainingLogStore, follow_log_file
+
+def fake_launcher(seconds=30):
+    """Launcher running a sleep instead of deepspeed, in its own process group like the real one."""
+    def launch(job, log_file):
+        job["command"] = f"sleep {seconds}"
+        log_file.write(f"job {job['id']} on {job['gpus']}\n".encode())
+        log_file.flush()
+        return subprocess.Popen(["sleep", str(seconds)], stdout=log_file, stderr=subprocess.STDOUT,
+                                preexec_fn=os.setsid)
+    return launch
+
+class TestTrainingQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.queues = []
+
+    def tearDown(self):
+        for queue in self.queues:
+            for job in queue.list():
+                if job["state"] == "running":
+                    try:
+                        os.killpg(job["pid"], signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+            for proc in queue.processes.values():
+                proc.wait()
+        self.tmp.cleanup()
+
+    def make_queue(self, gpus=8, launcher=None, **kwargs):
+        queue = TrainingQueue(
+            state_path=os.path.join(self.tmp.name, "queue.json"),
+            log_dir=os.path.join(self.tmp.name, "logs"),
+            gpu_inventory=lambda: list(range(gpus)),
+            launcher=launcher or fake_launcher(),
+            **kwargs
+        )
+        self.queues.append(queue)
+        return queue
+
+    def submit(self, queue, num_gpus):
+        error, job = queue.submit("dataset", "/configs/training.toml", "/outputs/run", num_gpus=num_gpus)
+        self.assertIsNone(error)
+        return job
+
+    def test_small_jobs_run_side_by_side(self):
+        queue = self.make_queue(gpus=8)
+        jobs = [self.submit(queue, 1) for _ in range(3)]
+
+        self.assertEqual([job["state"] for job in jobs], ["running"] * 3)
+        self.assertEqual([job["gpus"] for job in jobs], [[0], [1], [2]])
+        self.assertEqual(len({job["master_port"] for job in jobs}), 3)
+        self.assertEqual(queue.free_gpus(), [3, 4, 5, 6, 7])
+
+    def test_backfill_packs_small_jobs(self):
+        queue = self.make_queue(gpus=4)
+        first = self.submit(queue, 2)
+        big = self.submit(queue, 4)
+        small = self.submit(queue, 1)
+
+        self.assertEqual(first["gpus"], [0, 1])
+        self.assertEqual(queue.get(big["id"])["state"], "queued")
+        # The single-GPU job does not wait behind the job needing all GPUs
+        self.assertEqual(queue.get(small["id"])["gpus"], [2])
+
+    def test_oldest_job_stops_backfill_after_waiting(self):
+        queue = self.make_queue(gpus=4, max_backfill_wait=0)
+        self.submit(queue, 2)
+        big = self.submit(queue, 4)
+        time.sleep(0.01)
+        small = self.submit(queue, 1)
+
+        self.assertEqual(queue.get(big["id"])["state"], "queued")
+        self.assertEqual(queue.get(small["id"])["state"], "queued")
+
+    def test_too_many_gpus_rejected(self):
+        queue = self.make_queue(gpus=2)
+        error, job = queue.submit("dataset", "/configs/training.toml", "/outputs/run", num_gpus=3)
+        self.assertIsNotNone(error)
+        self.assertIsNone(job)
+
+    def test_stop_frees_gpus_for_queued_job(self):
+        queue = self.make_queue(gpus=1)
+        first = self.submit(queue, 1)
+        second = self.submit(queue, 1)
+        self.assertEqual(queue.get(second["id"])["state"], "queued")
+
+        self.assertEqual(queue.stop(first["id"]), "Training process terminated gracefully.")
+        self.assertEqual(queue.get(first["id"])["state"], "stopped")
+        self.assertEqual(queue.get(second["id"])["state"], "running")
+        self.assertEqual(queue.get(second["id"])["gpus"], [0])
+
+    def test_cancel_queued_job(self):
+        queue = self.make_queue(gpus=1)
+        self.submit(queue, 1)
+        queued = self.submit(queue, 1)
+        queue.stop(queued["id"])
+        self.assertEqual(queue.get(queued["id"])["state"], "cancelled")
+
+    def test_finished_jobs_are_reaped(self):
+        queue = self.make_queue(gpus=1, launcher=fake_launcher(seconds=0))
+        job = self.submit(queue, 1)
+        queue.processes[job["id"]].wait()
+        queue.schedule()
+        finished = queue.get(job["id"])
+        self.assertEqual(finished["state"], "completed")
+        self.assertEqual(finished["returncode"], 0)
+        with open(finished["log_path"]) as f:
+            self.assertIn(f"job {job['id']}", f.read())
+
+    def test_jobs_keep_their_own_configs(self):
+        configs = os.path.join(self.tmp.name, "configs", "dataset")
+        os.makedirs(configs)
+        dataset_config = os.path.join(configs, "dataset_config.toml")
+        training_config = os.path.join(configs, "training_config.toml")
+
+        def write_configs(epochs):
+            with open(dataset_config, "w") as f:
+                f.write(f"num_repeats = {epochs}\n")
+            with open(training_config, "w") as f:
+                f.write(f'dataset = "{dataset_config}"\nepochs = {epochs}\n')
+
+        queue = self.make_queue(gpus=1)
+        jobs = []
+        # The UI rewrites the same files for the second job while the first one waits
+        for epochs in (1, 2):
+            write_configs(epochs)
+            error, job = queue.submit("dataset", training_config, "/outputs/run", config_dir=configs)
+            self.assertIsNone(error)
+            jobs.append(job)
+
+        self.assertEqual(len({job["config_dir"] for job in jobs}), 2)
+        for epochs, job in zip((1, 2), jobs):
+            self.assertEqual(os.path.dirname(job["config_path"]), job["config_dir"])
+            with open(job["config_path"]) as f:
+                config = f.read()
+            self.assertIn(f"epochs = {epochs}", config)
+            job_dataset_config = os.path.join(job["config_dir"], "dataset_config.toml")
+            self.assertIn(job_dataset_config, config)
+            with open(job_dataset_config) as f:
+                self.assertEqual(f.read(), f"num_repeats = {epochs}\n")
+
+        error, job = queue.submit("dataset", os.path.join(configs, "missing.toml"), "/outputs/run", config_dir=configs)
+        self.assertIsNotNone(error)
+        self.assertIsNone(job)
+
+    def test_queue_survives_restart(self):
+        queue = self.make_queue(gpus=1)
+        running = self.submit(queue, 1)
+        queued = self.submit(queue, 1)
+
+        # A new UI process adopts the running job and keeps the queued one waiting
+        restarted = self.make_queue(gpus=1)
+        self.assertEqual(restarted.get(running["id"])["state"], "running")
+        self.assertEqual(restarted.get(queued["id"])["state"], "queued")
+        restarted.schedule()
+        self.assertEqual(restarted.get(queued["id"])["state"], "queued")
+
+        # The process is a child of the old queue here, which has to reap it
+        threading.Thread(target=queue.processes[running["id"]].wait, daemon=True).start()
+        self.assertEqual(restarted.stop(running["id"]), "Training process terminated gracefully.")
+        restarted.schedule()
+        self.assertEqual(restarted.get(queued["id"])["state"], "running")
+
+        with open(os.path.join(self.tmp.name, "queue.json")) as f:
+            saved = {job["id"]: job["state"] for job in json.load(f)["jobs"]}
+        self.assertEqual(saved[running["id"]], "stopped")
+
+    def test_follow_log_file(self):
+        path = os.path.join(self.tmp.name, "job.log")
+        with open(path, "w") as f:
+            f.write("Total steps: 10\nstep: 1 loss: 0.5\n")
+        store = TrainingLogStore(log_path=None)
+        follow_log_file(path, store, threading.Event(), lambda: False)
+        self.assertEqual(store.read()["lines"], ["Total steps: 10", "step: 1 loss: 0.5"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+import os
+import stat
+import sys
+import tempfile
+
+# Add the control panel directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'control_panel'))
+from trash_purge import TrashPurge
+
+def write(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'\1' * size)
+
+class TestTrashPurge(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.trash = os.path.join(self.tmp.name, '.Trash-0')
+        os.makedirs(self.trash)
+
+    def tearDown(self):
+        # Restore permissions a failed test may have left behind
+        for root, dirs, _ in os.walk(self.tmp.name):
+            for name in dirs:
+                os.chmod(os.path.join(root, name), 0o755)
+        self.tmp.cleanup()
+
+    def test_purge_tree(self):
+        write(os.path.join(self.trash, 'files', 'model.safetensors'), 1 << 16)
+        write(os.path.join(self.trash, 'files', 'loras', 'a.safetensors'), 4096)
+        write(os.path.join(self.trash, 'info', 'model.safetensors.trashinfo'), 100)
+        write(os.path.join(self.trash, '.hidden'), 10)
+        os.symlink('/nonexistent', os.path.join(self.trash, 'files', 'dangling'))
+
+        updates = []
+        purge = TrashPurge(self.trash, workers=4, on_progress=lambda: updates.append(1))
+        purge.start()
+        purge.join(10)
+
+        status = purge.to_dict()
+        self.assertEqual(status['status'], 'success')
+        self.assertEqual(os.listdir(self.trash), [])
+        # 4 files, a symlink and 3 directories
+        self.assertEqual(status['entries_found'], 8)
+        self.assertEqual(status['entries_removed'], 8)
+        self.assertEqual(status['entries_remaining'], 0)
+        self.assertTrue(status['walk_done'])
+        self.assertGreaterEqual(status['bytes_freed'], (1 << 16) + 4096)
+        self.assertTrue(updates)
+
+    def test_hardlinked_file_frees_nothing(self):
+        kept = os.path.join(self.tmp.name, 'kept.safetensors')
+        write(kept, 1 << 16)
+        os.link(kept, os.path.join(self.trash, 'linked.safetensors'))
+
+        purge = TrashPurge(self.trash)
+        purge.run()
+        self.assertEqual(purge.to_dict()['entries_removed'], 1)
+        self.assertEqual(purge.bytes_freed, 0)
+        self.assertTrue(os.path.exists(kept))
+
+    @unittest.skipIf(os.geteuid() == 0, "root ignores directory permissions")
+    def test_fixes_permissions_on_failure(self):
+        locked = os.path.join(self.trash, 'locked')
+        write(os.path.join(locked, 'inner', 'file.bin'), 1024)
+        os.chmod(os.path.join(locked, 'inner'), stat.S_IRUSR | stat.S_IXUSR)
+        os.chmod(locked, 0)
+
+        purge = TrashPurge(self.trash, workers=2)
+        purge.run()
+        self.assertEqual(purge.status, 'success', purge.errors)
+        self.assertEqual(os.listdir(self.trash), [])
+
+    def test_missing_directory(self):
+        purge = TrashPurge(os.path.join(self.tmp.name, 'missing'))
+        purge.run()
+        self.assertEqual(purge.status, 'success')
+        self.assertEqual(purge.entries_found, 0)
+
+    def test_cancel(self):
+        for i in range(20):
+            write(os.path.join(self.trash, f'dir{i}', 'file.bin'), 10)
+        purge = TrashPurge(self.trash)
+        purge.cancel()
+        purge.run()
+        self.assertEqual(purge.status, 'stopped')
+        self.assertEqual(len(os.listdir(self.trash)), 20)
+
+if __name__ == '__main__':
+    unittest.main()